@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：纯文本初筛时，单个商品请求 (K=1) 与批量请求 (K=5、K=10) 的每商品成本和延迟。
+
+在本地启动一个模拟的 OpenAI 兼容接口（/v1/chat/completions）：token 数按 UTF-8 字节数 / 3 计算，
+响应耗时按 REQUEST_OVERHEAD + 输入 token / PREFILL_TOKENS_PER_SECOND + 输出 token / DECODE_TOKENS_PER_SECOND 模拟
+（实际等待时间乘以 TIME_SCALE，输出中的时间已换算回模拟值）。批量请求中约 1/15 的商品第一次不返回结论，用于验证重新排队。
+  - K=1：现有流程，每个商品调用一次 get_ai_analysis（完整 prompt + 单个商品）
+  - K=5 / K=10：AiBatcher 把多个商品打包进一次请求，prompt 只发送一次
+
+所有请求经过 AiDispatcher（并发 CONCURRENCY）。成本按示例价格（输入 PRICE_INPUT、输出 PRICE_OUTPUT 元/百万 token）估算。
+
+用法: python -m benchmarks.bench_ai_batch [商品数]
+"""
+import asyncio
+import json
+import re
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from openai import AsyncOpenAI
+
+import src.ai_batcher as ai_batcher
+import src.ai_handler as ai_handler
+from src.ai_dispatcher import AiDispatcher
+
+REQUEST_OVERHEAD = 0.4
+PREFILL_TOKENS_PER_SECOND = 8000
+DECODE_TOKENS_PER_SECOND = 60
+TIME_SCALE = 0.05
+CONCURRENCY = 4
+PRICE_INPUT = 0.8
+PRICE_OUTPUT = 2.0
+
+VERDICT = {
+    "prompt_version": "bench",
+    "is_recommended": False,
+    "reason": "价格略高于同款成色的市场价，卖家为个人但描述中电池健康度信息不完整，建议进一步询问后再决定。",
+    "risk_tags": ["电池信息不全"],
+    "criteria_analysis": {
+        "model_chip": {"status": "通过", "comment": "型号与描述一致"},
+        "battery_health": {"status": "需确认", "comment": "未提供电池健康截图"},
+        "condition": {"status": "通过", "comment": "外观描述为九五新"},
+        "history": {"status": "通过", "comment": "无拆修记录"},
+        "seller_type": {"status": "个人", "persona": "普通用户", "comment": "在售商品少",
+                        "analysis_details": {"temporal_analysis": "注册三年", "selling_behavior": "偶尔出售",
+                                             "buying_behavior": "有购买记录", "behavioral_summary": "个人自用转卖"}},
+        "shipping": {"status": "通过", "comment": "包邮"},
+        "seller_credit": {"status": "通过", "comment": "信用极好"},
+    },
+}
+STATS = {"prompt_tokens": 0, "completion_tokens": 0}
+DROPPED = set()
+
+
+def tokens(text: str) -> int:
+    return len(text.encode("utf-8")) // 3
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        texts = []
+        for message in body["messages"]:
+            content = message["content"]
+            texts.extend(part.get("text", "") for part in content) if isinstance(content, list) else texts.append(content)
+        prompt = "\n".join(texts)
+        items = json.loads(re.search(r"```json\s*(.*?)\s*```", prompt, re.S).group(1))
+        if isinstance(items, list):
+            results = []
+            for item in items:
+                product_id = item["商品信息"]["商品ID"]
+                if int(product_id) % 15 == 7 and product_id not in DROPPED:
+                    DROPPED.add(product_id)
+                    continue
+                results.append({"商品ID": product_id, **VERDICT})
+            answer = json.dumps({"results": results}, ensure_ascii=False)
+        else:
+            answer = json.dumps(VERDICT, ensure_ascii=False)
+        prompt_tokens, completion_tokens = tokens(prompt), tokens(answer)
+        STATS["prompt_tokens"] += prompt_tokens
+        STATS["completion_tokens"] += completion_tokens
+        time.sleep((REQUEST_OVERHEAD + prompt_tokens / PREFILL_TOKENS_PER_SECOND
+                    + completion_tokens / DECODE_TOKENS_PER_SECOND) * TIME_SCALE)
+        payload = json.dumps({
+            "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_prompt() -> str:
+    criteria = "\n".join(f"{n}. 检查商品的第 {n} 项标准：型号、芯片、电池健康度、成色、维修历史、卖家类型、邮寄方式和信用，"
+                         f"对照描述和卖家历史给出判断，并说明理由。" for n in range(1, 41))
+    return f"你是一名资深的二手电子产品评估专家，请根据以下标准分析商品是否值得购买。\n\n{criteria}\n\n" \
+           f"请只返回JSON，字段包括 prompt_version、is_recommended、reason、risk_tags 和 criteria_analysis。"
+
+
+def make_record(n: int) -> dict:
+    return {
+        "任务名称": "bench",
+        "商品信息": {"商品标题": f"iPhone 13 Pro 256G 国行 九五新 编号{n}", "当前售价": f"¥{4000 + n * 7}",
+                 "商品ID": str(1000 + n), "发货地区": "上海", "商品标签": ["验货宝", "包邮"],
+                 "商品描述": "自用一年，无拆无修，电池健康 88%，屏幕无划痕，配件齐全，支持当面验机。" * 3},
+        "卖家信息": {"卖家昵称": f"卖家{n}", "卖家信用等级": "极好", "在售商品数": n % 9,
+                 "卖家注册时长": "3年", "历史评价": ["发货快，描述相符"] * 5},
+    }
+
+
+async def run(name: str, records: list, evaluate):
+    for key in STATS:
+        STATS[key] = 0
+    latencies = []
+
+    async def one(record):
+        started = time.perf_counter()
+        result = await evaluate(record)
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(record) for record in records))
+    elapsed = (time.perf_counter() - started) / TIME_SCALE
+    count = len(records)
+    cost = (STATS["prompt_tokens"] * PRICE_INPUT + STATS["completion_tokens"] * PRICE_OUTPUT) / 1e6
+    print(f"{name:<6} {sum(r is not None for r in results):>6} {STATS['prompt_tokens'] / count:>14.0f} "
+          f"{STATS['completion_tokens'] / count:>14.0f} {cost / count * 1000:>16.3f} "
+          f"{statistics.mean(latencies) / TIME_SCALE:>14.1f} {elapsed / count:>14.2f}")
+    return cost / count
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = AsyncOpenAI(api_key="bench", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    prompt = make_prompt()
+    records = [make_record(n) for n in range(count)]
+    print(f"{count} 个商品，prompt {len(prompt.encode('utf-8')) / 1024:.1f} KB，"
+          f"每个商品 JSON {len(json.dumps(records[0], ensure_ascii=False).encode('utf-8')) / 1024:.1f} KB；"
+          f"AI 并发 {CONCURRENCY}")
+    print(f"{'方式':<6} {'成功':>6} {'每商品输入token':>14} {'每商品输出token':>14} {'每千商品成本(元)':>16} "
+          f"{'平均等待结论s':>14} {'每商品耗时s':>14}")
+    ai_handler.safe_print = lambda text: None
+    ai_batcher.safe_print = lambda text: None
+
+    with patch.object(ai_handler, "client", client), patch.object(ai_batcher, "client", client), \
+            patch("src.ai_handler.should_log_request", return_value=False), \
+            patch("src.ai_batcher.should_log_request", return_value=False):
+        dispatcher = AiDispatcher(max_concurrency=CONCURRENCY, rpm_limit=0, tpm_limit=0)
+        with patch.object(ai_handler, "get_ai_dispatcher", return_value=dispatcher):
+            baseline = await run("K=1", records, lambda record: ai_handler.get_ai_analysis(record, prompt_text=prompt))
+        for size in (5, 10):
+            DROPPED.clear()
+            dispatcher = AiDispatcher(max_concurrency=CONCURRENCY, rpm_limit=0, tpm_limit=0)
+            batcher = ai_batcher.AiBatcher(prompt, "bench", batch_size=size, max_wait=1.0 * TIME_SCALE)
+            with patch.object(ai_batcher, "get_ai_dispatcher", return_value=dispatcher):
+                cost = await run(f"K={size}", records, batcher.evaluate)
+                await batcher.close()
+            print(f"       {batcher.format_stats()}；每商品成本比 K=1 降低 {1 - cost / baseline:.1%}")
+    await client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
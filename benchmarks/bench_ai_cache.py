@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：AI结论缓存的命中率、节省的AI调用和 token 数。
+
+模拟多个任务（关键词有重叠）连续运行，每个任务依次分析一批商品，商品流中包含：
+  - 同一商品被另一个任务抓到（商品ID 和图片 URL 相同）
+  - 卖家重新发布的商品（新商品ID、新链接、想要人数清零，图片重新上传为新的 URL 但内容相同）
+  - 全新商品
+对比关闭和开启 ENABLE_AI_CACHE 时 _analyze_item_record 的AI调用次数、消耗的 token、
+准备图片（读取/下载并处理）的商品数，以及按每次AI调用 AI_CALL_SECONDS 秒估算的总耗时。
+AI调用为模拟，token 数按商品文本长度和图片数估算。
+
+用法: python -m benchmarks.bench_ai_cache [任务数] [每个任务的商品数]
+"""
+import asyncio
+import io
+import random
+import sys
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+
+import src.ai_handler as ai_handler
+import src.scraper as scraper
+from src.ai_verdict_cache import AiVerdictCache
+from src.image_cache import ImageCache
+
+AI_CALL_SECONDS = 4.0
+TOKENS_PER_IMAGE = 1200
+RELIST_RATE = 0.15
+OVERLAP_RATE = 0.3
+
+
+def make_image(seed: int) -> bytes:
+    rng = random.Random(seed)
+    output = io.BytesIO()
+    Image.new("RGB", (64, 48), tuple(rng.randrange(256) for _ in range(3))).save(output, "JPEG")
+    return output.getvalue()
+
+
+def make_stream(task_count: int, items_per_task: int):
+    """返回每个任务的商品记录列表，以及 {图片URL: 图片内容}。"""
+    rng = random.Random(11)
+    images, seen, tasks = {}, [], []
+    next_id = 0
+    for task in range(task_count):
+        records = []
+        for _ in range(items_per_task):
+            roll = rng.random()
+            if seen and roll < OVERLAP_RATE:
+                item = dict(rng.choice(seen))
+            elif seen and roll < OVERLAP_RATE + RELIST_RATE:
+                original = rng.choice(seen)
+                next_id += 1
+                urls = []
+                for n, url in enumerate(original["商品图片列表"]):
+                    new_url = f"https://img.example.com/{next_id}/{n}.jpg"
+                    images[new_url] = images[url]
+                    urls.append(new_url)
+                item = dict(original, 商品ID=str(next_id), 商品链接=f"https://www.goofish.com/item?id={next_id}",
+                            商品图片列表=urls, **{"“想要”人数": "0"})
+            else:
+                next_id += 1
+                urls = [f"https://img.example.com/{next_id}/{n}.jpg" for n in range(rng.randint(2, 5))]
+                for n, url in enumerate(urls):
+                    images[url] = make_image(next_id * 10 + n)
+                item = {"商品标题": f"二手商品 {next_id} 成色良好", "当前售价": f"¥{rng.randrange(100, 5000)}",
+                        "商品ID": str(next_id), "商品链接": f"https://www.goofish.com/item?id={next_id}",
+                        "“想要”人数": str(rng.randrange(20)), "商品图片列表": urls}
+                seen.append(item)
+            records.append({"任务名称": f"task{task}", "商品信息": item, "卖家信息": {}})
+        tasks.append(records)
+    return tasks, images
+
+
+async def run(name: str, tasks: list, images: dict, enabled: bool):
+    stats = {"calls": 0, "tokens": 0, "prepared": 0}
+    prepare_images_for_ai = scraper.prepare_images_for_ai
+
+    async def fetch(url):
+        return images[url]
+
+    async def prepare(product_id, image_urls):
+        stats["prepared"] += 1
+        return await prepare_images_for_ai(product_id, image_urls)
+
+    async def analysis(record, prompt_text="", image_data_urls=None, usage=None, priority=0, image_sizes=None):
+        stats["calls"] += 1
+        tokens = len(str(record)) + len(prompt_text) + TOKENS_PER_IMAGE * len(image_data_urls or [])
+        usage["prompt_tokens"] = tokens
+        usage["completion_tokens"] = 300
+        stats["tokens"] += tokens + 300
+        return {"is_recommended": False, "reason": "模拟结论"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_cache = ImageCache(tmp)
+        verdict_cache = AiVerdictCache(f"{tmp}/ai_verdicts.db") if enabled else None
+        with patch("src.config.SKIP_AI_ANALYSIS", False), \
+                patch.object(ai_handler, "_fetch_image_bytes", fetch), \
+                patch.object(ai_handler, "get_image_cache", lambda: image_cache), \
+                patch.object(scraper, "get_ai_verdict_cache", lambda: verdict_cache), \
+                patch.object(scraper, "prepare_images_for_ai", prepare), \
+                patch.object(scraper, "get_ai_analysis", analysis):
+            for records in tasks:
+                for record in records:
+                    await scraper._analyze_item_record({"ai_prompt_text": "判断是否值得购买"}, dict(record))
+        summary = verdict_cache.format_stats() if verdict_cache else "-"
+        if verdict_cache:
+            verdict_cache.close()
+        image_cache.close()
+    print(f"{name:<8} {stats['calls']:>8} {stats['tokens']:>12} {stats['prepared']:>10} "
+          f"{stats['calls'] * AI_CALL_SECONDS:>12.0f}   {summary}")
+    return stats
+
+
+async def main():
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    items_per_task = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    tasks, images = make_stream(task_count, items_per_task)
+    print(f"{task_count} 个任务，每个 {items_per_task} 个商品（约 {OVERLAP_RATE:.0%} 被其他任务抓到过，"
+          f"约 {RELIST_RATE:.0%} 为重新发布）；每次AI调用按 {AI_CALL_SECONDS} 秒估算")
+    print(f"{'方式':<8} {'AI调用':>8} {'消耗token':>12} {'准备图片':>10} {'AI耗时估算s':>12}   缓存统计")
+    ai_handler.safe_print = lambda text: None
+    scraper.print = lambda *args, **kwargs: None
+    before = await run("无缓存", tasks, images, False)
+    after = await run("AI结果缓存", tasks, images, True)
+    print(f"AI调用减少 {1 - after['calls'] / before['calls']:.1%}，token 减少 {1 - after['tokens'] / before['tokens']:.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：多个任务并发调用 AI 时的吞吐量和触发限流 (429) 的次数。
+
+模拟一个按每分钟请求数和 token 数限流的服务商（令牌桶，最多积攒 PROVIDER_BURST_SECONDS 秒额度，
+超出时返回带 Retry-After 的 429），每次调用耗时 CALL_SECONDS 秒，实际 token 用量比估算值多约 20%。
+多个任务各有 PIPELINE_AI_WORKERS 个 AI worker 同时分析商品，对比：
+  1. 旧实现：直接调用，get_ai_analysis 内部立即重试 3 次，外层 retry_on_failure 固定等待 5 秒重试 3 次
+  2. 新实现：经过 AiDispatcher，RPM/TPM 按服务商限额的 90% 配置，429 时按 Retry-After 退避。
+     与 Web 界面一样每个任务使用自己的调度器（模拟单独的任务进程）：
+       - 独立限额：令牌桶只在各自进程内生效（state_file=None）
+       - 共享限额：所有调度器共用同一个令牌桶状态文件（SharedRateState）
+各方式均未计入 OpenAI SDK 自带的重试。
+
+用法: python -m benchmarks.bench_ai_dispatcher [任务数] [每个任务的商品数]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+from openai import RateLimitError
+
+import src.ai_dispatcher as ai_dispatcher
+import src.utils as utils
+from src.ai_dispatcher import AiDispatcher, TokenBucket
+from src.config import PIPELINE_AI_WORKERS
+from src.utils import retry_on_failure
+
+PROVIDER_RPM = 600
+PROVIDER_TPM = 1_200_000
+PROVIDER_BURST_SECONDS = 5
+CALL_SECONDS = 0.8
+USAGE_ERROR = 1.2
+HEADROOM = 0.9
+
+
+class FakeResponse:
+    def __init__(self, prompt_tokens: int):
+        self.usage = type("Usage", (), {"prompt_tokens": prompt_tokens, "completion_tokens": 300,
+                                        "total_tokens": prompt_tokens + 300})()
+
+
+class FakeProvider:
+    def __init__(self):
+        self.rpm = TokenBucket(PROVIDER_RPM, PROVIDER_BURST_SECONDS)
+        self.tpm = TokenBucket(PROVIDER_TPM, PROVIDER_BURST_SECONDS)
+        self.completed = 0
+        self.rejected = 0
+        self.tokens = 0
+
+    async def create(self, estimated_tokens: int):
+        prompt_tokens = int(estimated_tokens * USAGE_ERROR)
+        wait = max(self.rpm.wait_time(1), self.tpm.wait_time(prompt_tokens + 300))
+        if wait > 0:
+            self.rejected += 1
+            response = httpx.Response(429, headers={"retry-after": f"{wait:.2f}"},
+                                      request=httpx.Request("POST", "https://api.example.com"))
+            raise RateLimitError("rate limited", response=response, body=None)
+        self.rpm.take(1)
+        self.tpm.take(prompt_tokens + 300)
+        await asyncio.sleep(CALL_SECONDS)
+        self.completed += 1
+        self.tokens += prompt_tokens + 300
+        return FakeResponse(prompt_tokens)
+
+
+async def run_tasks(task_count: int, items_per_task: int, analyze) -> float:
+    rng = random.Random(3)
+    queues = []
+    for _ in range(task_count):
+        queue = asyncio.Queue()
+        for _ in range(items_per_task):
+            queue.put_nowait(rng.randint(2500, 5000))
+        queues.append(queue)
+
+    async def worker(task, queue):
+        while not queue.empty():
+            await analyze(queue.get_nowait(), task)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(task, queue) for task, queue in enumerate(queues) for _ in range(PIPELINE_AI_WORKERS)))
+    return time.perf_counter() - started
+
+
+async def run_legacy(task_count: int, items_per_task: int) -> tuple:
+    provider = FakeProvider()
+
+    @retry_on_failure(retries=3, delay=5)
+    async def analyze(tokens, task):
+        for attempt in range(3):
+            try:
+                return await provider.create(tokens)
+            except Exception:
+                if attempt == 2:
+                    raise
+
+    return provider, await run_tasks(task_count, items_per_task, analyze)
+
+
+async def run_dispatcher(task_count: int, items_per_task: int, state_file) -> tuple:
+    provider = FakeProvider()
+    dispatchers = [AiDispatcher(max_concurrency=PIPELINE_AI_WORKERS, rpm_limit=int(PROVIDER_RPM * HEADROOM),
+                                tpm_limit=int(PROVIDER_TPM * HEADROOM), state_file=state_file)
+                   for _ in range(task_count)]
+
+    async def analyze(tokens, task):
+        try:
+            return await dispatchers[task].call(lambda: provider.create(tokens), tokens)
+        except RateLimitError:
+            return None
+
+    elapsed = await run_tasks(task_count, items_per_task, analyze)
+    print(f"    任务1的调度器: {dispatchers[0].format_stats()}")
+    return provider, elapsed
+
+
+def report(name: str, provider: FakeProvider, elapsed: float, total: int):
+    print(f"{name:<8} {elapsed:>8.1f} {provider.completed:>8} {total - provider.completed:>8} {provider.rejected:>8} "
+          f"{provider.tokens / elapsed * 60 / PROVIDER_TPM:>14.0%}")
+
+
+async def main():
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    items_per_task = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    total = task_count * items_per_task
+    print(f"{task_count} 个任务 x {PIPELINE_AI_WORKERS} 个 AI worker，共 {total} 个商品；"
+          f"服务商限额 {PROVIDER_RPM} RPM / {PROVIDER_TPM} TPM，每次调用 {CALL_SECONDS}s")
+    print(f"{'方式':<8} {'耗时s':>8} {'成功':>8} {'失败':>8} {'429次数':>8} {'TPM限额利用率':>14}")
+    utils.print = lambda *args, **kwargs: None
+    ai_dispatcher.print = lambda *args, **kwargs: None
+    report("旧实现", *await run_legacy(task_count, items_per_task), total)
+    report("独立限额", *await run_dispatcher(task_count, items_per_task, None), total)
+    with tempfile.TemporaryDirectory() as tmp:
+        report("共享限额", *await run_dispatcher(task_count, items_per_task, os.path.join(tmp, "rate.db")), total)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：每个商品发给 AI 的图片数据大小，以及从开始获取图片到 AI 返回结果的耗时。
+
+在本地启动一个模拟图片服务器，提供手机拍摄尺寸（默认 1920x1440，JPEG 质量 90）的商品图片，对比：
+  1. 旧流程：download_all_images 把原图写入磁盘，再逐张读回并以 base64 编码原图
+  2. 新流程：prepare_images_for_ai 在内存中下载、按 AI_IMAGE_MAX_EDGE 缩小并重新编码
+
+图片下载和处理的耗时为实测；AI 调用的耗时按模型估算：请求体按 UPLINK_MBPS 上传，
+图片 token 按按像素计费的视觉模型（如 Qwen-VL，每 28x28 像素 1 个 token）估算，
+并按 PREFILL_TOKENS_PER_SECOND 计入首字延迟。
+
+用法: python -m benchmarks.bench_ai_images [商品数] [每个商品的图片数] [原图长边]
+"""
+import asyncio
+import base64
+import io
+import math
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageFilter
+
+import src.ai_handler as ai_handler
+from src.config import AI_IMAGE_FORMAT, AI_IMAGE_MAX_EDGE, AI_IMAGE_QUALITY
+from src.http_client import close_http_clients
+from src.image_cache import ImageCache
+
+UPLINK_MBPS = 20
+PREFILL_TOKENS_PER_SECOND = 5000
+PATCH_PIXELS = 28
+IMAGES = {}
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = IMAGES[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_photo(seed: int, long_edge: int) -> bytes:
+    """生成带平滑渐变和细节噪声的照片（压缩率接近真实照片）。"""
+    size = (long_edge, long_edge * 3 // 4)
+    base = Image.effect_mandelbrot(size, (-2.0 + seed * 0.01, -1.0, 1.0, 1.0), 60).filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise(size, 12 + seed % 5)
+    photo = Image.merge("RGB", (base, Image.blend(base, noise, 0.3), noise.filter(ImageFilter.GaussianBlur(1))))
+    output = io.BytesIO()
+    photo.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+def image_tokens(width: int, height: int) -> int:
+    return math.ceil(width / PATCH_PIXELS) * math.ceil(height / PATCH_PIXELS)
+
+
+def data_url_tokens(data_url: str) -> int:
+    with Image.open(io.BytesIO(base64.b64decode(data_url.split(",", 1)[1]))) as image:
+        return image_tokens(*image.size)
+
+
+def modelled_ai_seconds(payload_bytes: int, tokens: int) -> float:
+    return payload_bytes * 8 / (UPLINK_MBPS * 1e6) + tokens / PREFILL_TOKENS_PER_SECOND
+
+
+async def run_disk(items: list) -> list:
+    results = []
+    for product_id, urls in items:
+        started = time.perf_counter()
+        paths = await ai_handler.download_all_images(product_id, urls, "bench")
+        data_urls = []
+        for path in paths:
+            with open(path, "rb") as f:
+                data_urls.append(f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}")
+        results.append((time.perf_counter() - started, data_urls))
+    return results
+
+
+async def run_memory(items: list) -> list:
+    results = []
+    for product_id, urls in items:
+        started = time.perf_counter()
+        data_urls, _, _ = await ai_handler.prepare_images_for_ai(product_id, urls)
+        results.append((time.perf_counter() - started, data_urls))
+    return results
+
+
+def report(name: str, results: list):
+    prepare = statistics.mean(elapsed for elapsed, _ in results)
+    payload = statistics.mean(sum(len(url) for url in urls) for _, urls in results)
+    tokens = statistics.mean(sum(data_url_tokens(url) for url in urls) for _, urls in results)
+    total = prepare + modelled_ai_seconds(payload, tokens)
+    print(f"{name:<6} {payload / 1024:>14.0f} {tokens:>14.0f} {prepare * 1000:>12.1f} {total * 1000:>16.1f}")
+
+
+async def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    images_per_item = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    long_edge = int(sys.argv[3]) if len(sys.argv) > 3 else 1920
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    items = []
+    for n in range(item_count):
+        urls = []
+        for i in range(images_per_item):
+            path = f"/img/{n}_{i}.jpg"
+            IMAGES[path] = make_photo(n * images_per_item + i, long_edge)
+            urls.append(base + path)
+        items.append((str(n), urls))
+
+    original = statistics.mean(len(data) for data in IMAGES.values())
+    print(f"{item_count} 个商品，每个 {images_per_item} 张图片（{long_edge} 像素长边，平均 {original / 1024:.0f} KB）；"
+          f"AI_IMAGE_MAX_EDGE={AI_IMAGE_MAX_EDGE} AI_IMAGE_FORMAT={AI_IMAGE_FORMAT} AI_IMAGE_QUALITY={AI_IMAGE_QUALITY}")
+    print(f"AI 调用按上传 {UPLINK_MBPS} Mbps、图片预填充 {PREFILL_TOKENS_PER_SECOND} token/s 估算")
+    print(f"{'流程':<6} {'每商品图片数据KB':>14} {'每商品图片token':>14} {'图片准备ms':>12} {'准备+AI调用估算ms':>16}")
+    ai_handler.safe_print = lambda text: None
+    for name, runner in (("旧流程", run_disk), ("新流程", run_memory)):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ImageCache(tmp)
+            ai_handler.get_image_cache = lambda: cache
+            report(name, await runner(items))
+            cache.close()
+    await close_http_clients()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
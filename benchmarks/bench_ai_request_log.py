@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：每分析 1000 个商品，AI 请求日志写入磁盘的字节数，以及事件循环被写日志占用的时间。
+
+模拟的请求与 get_ai_analysis 一致：每个商品若干张 base64 内联的图片 + 商品 JSON 和 prompt 文本。
+其中一部分商品因格式错误被整体重试（每次重试都会再记录一次），一部分商品被后续运行再次分析
+（例如价格变化后重新分析，图片相同）。对比：
+  1. 旧实现：每次调用在事件循环中同步写一个 logs/<时间>.log，内容为完整的 json.dumps(messages)
+  2. 新实现：AiRequestLog 后台批量写入，图片按内容哈希去重保存，日志中只保存引用
+
+用法: python -m benchmarks.bench_ai_request_log [商品数] [每个商品的图片数]
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.ai_request_log import AiRequestLog
+
+IMAGE_BYTES = 150 * 1024
+RETRY_RATE = 0.1
+REANALYZE_RATE = 0.3
+
+
+def make_calls(items: int, images_per_item: int) -> list:
+    """生成 (商品ID, messages) 调用序列，包含重试和重复分析。"""
+    rng = random.Random(42)
+    prompt = "你是一名二手相机交易专家，请根据以下标准判断商品是否值得购买……" * 60
+    calls = []
+    for item in range(items):
+        images = [rng.randbytes(IMAGE_BYTES) for _ in range(images_per_item)]
+        content = [{"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + base64.b64encode(image).decode()}}
+                   for image in images]
+        product = {"商品信息": {"商品ID": str(item), "商品标题": "九成新 索尼 A7M4 单机 " * 4, "当前售价": "¥9999"}}
+        content.append({"type": "text", "text": json.dumps(product, ensure_ascii=False, indent=2) + prompt})
+        messages = [{"role": "user", "content": content}]
+        repeats = 1 + (rng.random() < RETRY_RATE) + (rng.random() < REANALYZE_RATE)
+        calls.extend([(str(item), messages)] * repeats)
+    return calls
+
+
+async def run_legacy(directory: str, calls: list):
+    blocked = 0.0
+    for n, (_, messages) in enumerate(calls):
+        started = time.perf_counter()
+        with open(os.path.join(directory, f"{n:06d}.log"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(messages, ensure_ascii=False))
+        blocked += time.perf_counter() - started
+        await asyncio.sleep(0)
+    return blocked
+
+
+async def run_blob_store(directory: str, calls: list):
+    # 放宽总大小上限，只比较写入量（默认 100 MB 上限会删除旧图片，之后再出现时需要重新写入）
+    log = AiRequestLog(directory, max_bytes=100 * 1024 ** 3)
+    blocked = 0.0
+    for product_id, messages in calls:
+        started = time.perf_counter()
+        log.submit("bench", product_id, messages)
+        blocked += time.perf_counter() - started
+        # 模拟分析本身的耗时，让后台写入跟得上
+        await asyncio.sleep(0.001)
+    await log.close()
+    return blocked, log
+
+
+def disk_bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(directory) for name in files)
+
+
+async def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    images_per_item = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    calls = make_calls(items, images_per_item)
+    per_1000 = 1000 / items
+    print(f"{items} 个商品，每个 {images_per_item} 张图片（{IMAGE_BYTES // 1024} KB），共 {len(calls)} 次 AI 调用")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        blocked = await run_legacy(tmp, calls)
+        legacy = disk_bytes(tmp)
+    print(f"旧实现: 写入 {legacy * per_1000 / 1024 ** 2:9.1f} MB / 1000 商品，事件循环阻塞 {blocked * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        blocked, log = await run_blob_store(tmp, calls)
+        written = log.log_bytes + log.blob_bytes
+        on_disk = disk_bytes(tmp)
+    print(f"新实现: 写入 {written * per_1000 / 1024 ** 2:9.1f} MB / 1000 商品（日志 {log.log_bytes * per_1000 / 1024 ** 2:.1f} MB，"
+          f"图片 {log.blob_bytes * per_1000 / 1024 ** 2:.1f} MB，复用图片 {log.blobs_skipped} 张），"
+          f"磁盘占用 {on_disk * per_1000 / 1024 ** 2:.1f} MB，事件循环阻塞 {blocked * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
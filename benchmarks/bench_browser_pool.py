@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：多任务并发启动时的内存峰值与首个结果耗时。
+
+模拟 spider_v2 同时运行 N 个任务，每个任务先调用搜索接口（本地模拟 mtop 服务），对比：
+  1. 旧模型：每个任务各自 async_playwright() 启动一个浏览器并创建上下文，然后再搜索
+  2. 新模型：所有任务共享浏览器池，只有需要浏览器的任务才借出页面（比例可调，默认 0，即全部走HTTP）
+
+内存为本进程及其全部子进程（浏览器进程）的 RSS 之和，通过 /proc 采样，仅支持 Linux。
+旧模型需要可用的 Chromium（python -m playwright install chromium），不可用时只输出新模型的结果。
+
+用法: python -m benchmarks.bench_browser_pool [任务数N] [需要浏览器的任务比例]
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from playwright.async_api import async_playwright
+
+import src.browser_pool as browser_pool
+import src.scraper as scraper
+from src.http_client import close_http_clients
+
+
+def make_mock_handler():
+    search_body = json.dumps({
+        "ret": ["SUCCESS::调用成功"],
+        "data": {"resultList": [
+            {"data": {"item": {"main": {"exContent": {"title": f"商品{i}", "itemId": str(i)}}}}}
+            for i in range(30)
+        ]},
+    }, ensure_ascii=False).encode("utf-8")
+    page_body = b"<!DOCTYPE html><html><body>item</body></html>"
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body: bytes, content_type: str):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send(page_body, "text/html")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(0.05)
+            self._send(search_body, "application/json")
+
+        def log_message(self, *args):
+            pass
+
+    return MockHandler
+
+
+def process_tree_rss_mb() -> float:
+    """本进程及所有子孙进程的 RSS 之和（MB）。"""
+    children = {}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(pid))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total_kb, stack = 0, [os.getpid()]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+class PeakRssSampler:
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss_mb())
+
+
+async def legacy_task(index: int, started: float, first_results: list):
+    """旧模型：任务开始时先启动自己的浏览器和上下文。"""
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        await browser.new_context()
+        result = await scraper.search_xianyu_api(f"关键词{index}")
+        assert result["data"]["resultList"]
+        first_results.append(time.perf_counter() - started)
+        await asyncio.sleep(1)  # 保持浏览器存活，模拟任务运行期间的常驻内存
+        await browser.close()
+
+
+async def pooled_task(index: int, started: float, first_results: list, needs_browser: bool, base_url: str):
+    """新模型：搜索走HTTP，只有需要浏览器的任务才从共享池借出页面。"""
+    result = await scraper.search_xianyu_api(f"关键词{index}")
+    assert result["data"]["resultList"]
+    first_results.append(time.perf_counter() - started)
+    if needs_browser:
+        async with browser_pool.get_browser_pool().lease_page() as page:
+            await page.goto(base_url)
+    await asyncio.sleep(1)
+
+
+async def run_model(name: str, make_tasks):
+    first_results = []
+    started = time.perf_counter()
+    with PeakRssSampler() as sampler:
+        await asyncio.gather(*make_tasks(started, first_results))
+        await browser_pool.close_browser_pool()
+    await close_http_clients()
+    return name, sampler.peak, min(first_results), max(first_results)
+
+
+async def run_bench(n: int, browser_ratio: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_mock_handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    scraper.SEARCH_API_URL = base_url + "/h5/mtop.taobao.idlemtopsearch.pc.search/1.0/"
+    scraper._load_mtop_auth = lambda: ("_m_h5_tk=bench_0", "bench_0")
+    # 模拟环境中直接使用 Playwright 自带的 Chromium，且不加载登录状态
+    browser_pool.RUNNING_IN_DOCKER = True
+    browser_pool.STATE_FILE = None
+    browser_needed = int(n * browser_ratio)
+
+    baseline = process_tree_rss_mb()
+    rows = []
+    rows.append(await run_model(
+        f"共享浏览器池（{browser_needed}/{n} 个任务需要浏览器）",
+        lambda started, results: [
+            pooled_task(i, started, results, i < browser_needed, base_url) for i in range(n)
+        ],
+    ))
+    try:
+        rows.append(await run_model(
+            "每任务独立浏览器",
+            lambda started, results: [legacy_task(i, started, results) for i in range(n)],
+        ))
+    except Exception as e:
+        print(f"\n[提示] 浏览器无法启动（{str(e).splitlines()[0]}），跳过旧模型。")
+    server.shutdown()
+
+    print("\n=== 多任务启动：内存峰值与首个结果耗时 ===")
+    print(f"任务数 N={n}，进程基线 RSS {baseline:.0f} MB")
+    print(f"{'模型':<36}{'RSS峰值':>10}{'最快首个结果':>14}{'最慢首个结果':>14}")
+    for name, peak, fastest, slowest in rows:
+        print(f"{name:<36}{peak:>8.0f}MB{fastest:>13.2f}s{slowest:>13.2f}s")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    asyncio.run(run_bench(n, ratio))
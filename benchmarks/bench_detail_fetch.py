@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：单个商品获取详情的耗时。
+
+在本地启动一个模拟站点，详情接口返回 tests/fixtures/detail_response.json 中录制的响应，
+商品详情页为一个带脚本、样式和图片的 HTML 页面，页面加载后由脚本请求详情接口。分别测量：
+  1. 浏览器方式：_fetch_detail_via_browser 打开详情页并捕获详情接口响应（含关闭页面后的整理等待）
+  2. 浏览器方式 + 资源拦截：同上，但拦截图片、样式等资源（每个页面的流量见 [页面流量] 日志）
+  3. 接口方式：fetch_item_detail_api 直接签名调用详情接口
+
+浏览器方式需要可用的 Chromium（python -m playwright install chromium），不可用时只输出接口方式的结果。
+
+用法: python -m benchmarks.bench_detail_fetch [商品数] [接口延迟秒数]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from playwright.async_api import async_playwright
+
+import src.scraper as scraper
+from src.anti_crawler_config import RESOURCE_BLOCKING_POLICY
+from src.http_client import close_http_clients
+from src.resource_blocking import install_resource_blocking
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "tests", "fixtures", "detail_response.json")
+DETAIL_PATH = "/h5/mtop.taobao.idle.pc.detail/1.0/"
+
+ITEM_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>商品详情</title>
+<link rel="stylesheet" href="/static/app.css">
+<script src="/static/vendor.js"></script>
+</head><body>
+<div id="root"></div>
+%s
+<script>
+fetch("%s", {method: "POST", body: "data=" + encodeURIComponent('{"itemId":"1"}')})
+  .then(r => r.json()).then(d => { document.getElementById("root").innerText = d.data.itemDO.title; });
+</script>
+</body></html>
+"""
+
+
+def make_mock_handler(delay: float):
+    with open(FIXTURE_PATH, "rb") as f:
+        detail_body = f.read()
+    images = "".join(f'<img src="/static/img{i}.jpg">' for i in range(8))
+    page_body = (ITEM_PAGE % (images, DETAIL_PATH)).encode("utf-8")
+    # 模拟详情页加载的前端资源体积
+    static_files = {
+        "/static/app.css": (b"body{margin:0}" * 20000, "text/css"),
+        "/static/vendor.js": (b"var x=1;" * 100000, "application/javascript"),
+    }
+    image_body = b"\xff\xd8\xff" + b"\x00" * 150 * 1024
+
+    class MockSiteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body: bytes, content_type: str):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path in static_files:
+                self._send(*static_files[path])
+            elif path.startswith("/static/img"):
+                self._send(image_body, "image/jpeg")
+            else:
+                self._send(page_body, "text/html; charset=utf-8")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            self._send(detail_body, "application/json")
+
+        def log_message(self, *args):
+            pass
+
+    return MockSiteHandler
+
+
+def summarize(samples):
+    return statistics.mean(samples), statistics.median(samples), max(samples)
+
+
+async def bench_api(item_count: int):
+    samples = []
+    for i in range(item_count):
+        start = time.perf_counter()
+        detail_json = await scraper.fetch_item_detail_api(str(771234567890 + i))
+        samples.append(time.perf_counter() - start)
+        assert "SUCCESS" in str(detail_json["ret"])
+    return samples
+
+
+async def bench_browser(base_url: str, item_count: int, block_resources: bool):
+    samples = []
+    # 模拟站点位于 127.0.0.1，需要把它加入脚本放行列表
+    policy = dict(RESOURCE_BLOCKING_POLICY)
+    policy["script_hosts"] = policy["script_hosts"] + ["127.0.0.1"]
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        await install_resource_blocking(context, policy=policy, enabled=block_resources)
+        for i in range(item_count):
+            item_data = {"商品ID": str(i), "商品链接": f"{base_url}/item?id={i}"}
+            start = time.perf_counter()
+            detail_json = await scraper._fetch_detail_via_browser(context, item_data)
+            samples.append(time.perf_counter() - start)
+            assert detail_json is not None
+        await browser.close()
+    return samples
+
+
+async def run_bench(item_count: int, delay: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_mock_handler(delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    scraper.DETAIL_API_URL = base_url + DETAIL_PATH
+    scraper.DETAIL_API_URL_PATTERN = DETAIL_PATH
+    scraper._load_mtop_auth = lambda: ("_m_h5_tk=bench_0", "bench_0")
+
+    await scraper.fetch_item_detail_api("预热")
+    api_samples = await bench_api(item_count)
+    await close_http_clients()
+
+    browser_samples = blocked_samples = None
+    try:
+        browser_samples = await bench_browser(base_url, item_count, block_resources=False)
+        blocked_samples = await bench_browser(base_url, item_count, block_resources=True)
+    except Exception as e:
+        print(f"\n[提示] 浏览器方式无法运行（{str(e).splitlines()[0]}），仅输出接口方式的结果。")
+    server.shutdown()
+
+    print("\n=== 单个商品详情获取耗时 ===")
+    print(f"商品数 {item_count}，模拟接口延迟 {delay:.2f}s")
+    print(f"{'方式':<20}{'平均':>10}{'中位数':>10}{'最大':>10}")
+    rows = [
+        ("详情接口直连", api_samples),
+        ("浏览器详情页", browser_samples),
+        ("浏览器详情页+资源拦截", blocked_samples),
+    ]
+    for name, samples in rows:
+        if samples:
+            mean, median, worst = summarize(samples)
+            print(f"{name:<20}{mean:>9.3f}s{median:>9.3f}s{worst:>9.3f}s")
+        else:
+            print(f"{name:<20}{'不可用':>10}")
+
+
+if __name__ == "__main__":
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    asyncio.run(run_bench(item_count, delay))
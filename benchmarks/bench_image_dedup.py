@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：每个被分析商品发给视觉模型的图片 token 数。
+
+生成一批模拟商品：每个商品 3-9 张图片，其中约 1/4 是同一商品中前面某张图片的重新上传或轻微裁剪；
+约 1/10 的商品使用一小组被许多卖家反复使用的网图。对比：
+  1. 去重前：prepare_images_for_ai 发送全部图片（AI_IMAGE_DEDUP_DISTANCE=-1，AI_MAX_IMAGES_PER_ITEM=0）
+  2. 去重后：按感知哈希去除近似重复图片，并按 AI_MAX_IMAGES_PER_ITEM 挑选差异最大的图片
+  3. 去重后 + AI_SKIP_STOCK_PHOTO_ITEMS：图片全为网图的商品不调用AI
+
+图片 token 按按像素计费的视觉模型（如 Qwen-VL，每 28x28 像素 1 个 token）估算，图片已按 AI_IMAGE_MAX_EDGE 缩小。
+
+用法: python -m benchmarks.bench_image_dedup [商品数]
+"""
+import asyncio
+import base64
+import io
+import math
+import random
+import sys
+import tempfile
+
+from PIL import Image, ImageDraw, ImageFilter
+
+import src.ai_handler as ai_handler
+from src.config import AI_IMAGE_DEDUP_DISTANCE, AI_MAX_IMAGES_PER_ITEM, STOCK_PHOTO_MIN_LISTINGS
+from src.image_cache import ImageCache
+
+PATCH_PIXELS = 28
+STOCK_SETS = 3
+
+
+def make_photo(seed: int, crop: float = 0.0, size=(1280, 960)) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + rng.randrange(100, 800), y + rng.randrange(100, 600)),
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(3))
+    if crop:
+        image = image.crop((int(size[0] * crop), int(size[1] * crop),
+                            size[0] - int(size[0] * crop), size[1] - int(size[1] * crop)))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=rng.choice((75, 85, 92)))
+    return output.getvalue()
+
+
+def make_listings(count: int):
+    """返回 ([(商品ID, [图片URL])], {图片URL: 图片内容})。"""
+    rng = random.Random(7)
+    images = {}
+    stock_sets = [[10 ** 6 + s * 10 + i for i in range(4)] for s in range(STOCK_SETS)]
+    listings = []
+    for item in range(count):
+        urls = []
+        if rng.random() < 0.1:
+            # 网图：不同卖家上传的同一组图片（各自重新压缩）
+            for seed in rng.choice(stock_sets):
+                url = f"https://img.example.com/{item}/stock_{seed}.jpg"
+                images[url] = make_photo(seed)
+                urls.append(url)
+        else:
+            seeds = []
+            for n in range(rng.randint(3, 9)):
+                url = f"https://img.example.com/{item}/{n}.jpg"
+                if seeds and rng.random() < 0.25:
+                    images[url] = make_photo(rng.choice(seeds), crop=rng.choice((0.0, 0.02, 0.04)))
+                else:
+                    seeds.append(item * 100 + n)
+                    images[url] = make_photo(seeds[-1])
+                urls.append(url)
+        listings.append((str(item), urls))
+    return listings, images
+
+
+def image_tokens(data_url: str) -> int:
+    with Image.open(io.BytesIO(base64.b64decode(data_url.split(",", 1)[1]))) as image:
+        return math.ceil(image.width / PATCH_PIXELS) * math.ceil(image.height / PATCH_PIXELS)
+
+
+async def run(name: str, listings: list, images: dict, dedup_distance: int, max_images: int, skip_stock: bool):
+    ai_handler.AI_IMAGE_DEDUP_DISTANCE = dedup_distance
+    ai_handler.AI_MAX_IMAGES_PER_ITEM = max_images
+
+    async def fetch(url):
+        return images[url]
+
+    ai_handler._fetch_image_bytes = fetch
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ImageCache(tmp)
+        ai_handler.get_image_cache = lambda: cache
+        analyzed, sent, tokens, stock_items = 0, 0, 0, 0
+        for product_id, urls in listings:
+            data_urls, info, _ = await ai_handler.prepare_images_for_ai(product_id, urls)
+            if info["发送给AI"] and info["疑似网图"] >= info["发送给AI"]:
+                stock_items += 1
+                if skip_stock:
+                    continue
+            analyzed += 1
+            sent += len(data_urls)
+            tokens += sum(image_tokens(url) for url in data_urls)
+        cache.close()
+    print(f"{name:<16} {analyzed:>8} {sent / analyzed:>12.2f} {tokens / analyzed:>14.0f} {stock_items:>10}")
+    return tokens / analyzed
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    listings, images = make_listings(count)
+    print(f"{count} 个商品，共 {len(images)} 张图片；AI_IMAGE_DEDUP_DISTANCE={AI_IMAGE_DEDUP_DISTANCE} "
+          f"AI_MAX_IMAGES_PER_ITEM={AI_MAX_IMAGES_PER_ITEM} STOCK_PHOTO_MIN_LISTINGS={STOCK_PHOTO_MIN_LISTINGS}")
+    print(f"{'方式':<16} {'调用AI商品':>8} {'每商品图片数':>12} {'每商品图片token':>14} {'全网图商品':>10}")
+    ai_handler.safe_print = lambda text: None
+    before = await run("去重前", listings, images, -1, 0, False)
+    after = await run("去重+数量上限", listings, images, AI_IMAGE_DEDUP_DISTANCE, AI_MAX_IMAGES_PER_ITEM, False)
+    await run("去重+上限+跳过网图", listings, images, AI_IMAGE_DEDUP_DISTANCE, AI_MAX_IMAGES_PER_ITEM, True)
+    print(f"每个被分析商品的图片 token 减少 {1 - after / before:.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：从拿到商品详情到图片全部下载完成的耗时。
+
+在本地启动一个模拟图片服务器，每张图片 150 KB，响应前随机延迟（模拟 CDN 首字节时间），
+对每个商品的 9 张图片分别用以下方式获取：
+  1. 旧实现：逐张下载，每张在默认线程池中执行阻塞的 requests.get，并在事件循环中同步写文件
+  2. 新实现：download_all_images 通过共享的 keep-alive AsyncClient 并发下载，放入共享图片缓存
+  3. 新实现再次获取同一批商品（其他任务遇到相同商品，或之后重新分析）：直接命中图片缓存
+
+输出每个商品的平均耗时，以及同一商品中最慢一张图片的平均耗时（并发下载的理论下限）。
+
+用法: python -m benchmarks.bench_image_download [商品数] [每个商品的图片数]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import src.ai_handler as ai_handler
+from src.config import IMAGE_DOWNLOAD_HEADERS
+from src.http_client import close_http_clients
+from src.image_cache import ImageCache
+
+IMAGE_BODY = b"\xff\xd8\xff" + b"\x00" * 150 * 1024
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        delay = float(parse_qs(urlparse(self.path).query)["delay"][0])
+        time.sleep(delay)
+        # 每张图片内容不同
+        body = IMAGE_BODY + self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def download_legacy(url: str, save_path: str):
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(
+        None,
+        lambda: requests.get(url, headers=IMAGE_DOWNLOAD_HEADERS, timeout=20, stream=True)
+    )
+    response.raise_for_status()
+    with open(save_path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+
+
+async def run_legacy(directory: str, items: list) -> list:
+    elapsed = []
+    for product_id, urls in items:
+        started = time.perf_counter()
+        for i, url in enumerate(urls):
+            await download_legacy(url, os.path.join(directory, f"product_{product_id}_{i + 1}.jpg"))
+        elapsed.append(time.perf_counter() - started)
+    return elapsed
+
+
+async def run_concurrent(items: list) -> list:
+    elapsed = []
+    for product_id, urls in items:
+        started = time.perf_counter()
+        paths = await ai_handler.download_all_images(product_id, urls, "bench")
+        elapsed.append(time.perf_counter() - started)
+        assert len(paths) == len(urls)
+    return elapsed
+
+
+async def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    images_per_item = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    rng = random.Random(42)
+    items, slowest = [], []
+    for n in range(item_count):
+        delays = [rng.uniform(0.05, 0.3) for _ in range(images_per_item)]
+        slowest.append(max(delays))
+        items.append((str(n), [f"{base}/img/{n}_{i}.jpg?delay={d:.3f}" for i, d in enumerate(delays)]))
+
+    print(f"{item_count} 个商品，每个 {images_per_item} 张图片（{len(IMAGE_BODY) // 1024} KB，延迟 50-300 ms）")
+    print(f"最慢一张图片平均: {statistics.mean(slowest) * 1000:8.1f} ms / 商品")
+    ai_handler.safe_print = lambda text: None
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed = await run_legacy(tmp, items)
+    print(f"旧实现（逐张下载）: {statistics.mean(elapsed) * 1000:8.1f} ms / 商品")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ImageCache(tmp)
+        ai_handler.get_image_cache = lambda: cache
+        elapsed = await run_concurrent(items)
+        print(f"新实现（并发下载）: {statistics.mean(elapsed) * 1000:8.1f} ms / 商品")
+        elapsed = await run_concurrent(items)
+        print(f"新实现（命中缓存）: {statistics.mean(elapsed) * 1000:8.1f} ms / 商品，{cache.format_stats()}")
+        cache.close()
+    await close_http_clients()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
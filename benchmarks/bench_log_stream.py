@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：运行日志实时查看的延迟与磁盘读取次数。
+
+4 个任务每隔 20ms 共追加一行日志，N 个客户端同时查看日志，对比：
+  1. 旧实现：所有任务写同一个 scraper.log，每个客户端每秒请求一次 /api/logs（打开文件、seek、读取新增内容、解码）
+  2. 新实现：任务各写自己的日志文件，单个 LogTailer（inotify 或 0.5 秒轮询）读取新行并推送给所有订阅者
+
+输出每行从写入到客户端收到的平均/最大延迟，以及读取文件的次数。
+
+用法: python -m benchmarks.bench_log_stream [客户端数] [持续秒数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from src.log_streamer import LogTailer
+from src.task_logs import decode_log_bytes, task_log_path
+
+TASKS = 4
+WRITE_INTERVAL = 0.02
+
+
+async def write_lines(paths: list, duration: float):
+    """模拟多个任务进程写日志，每行带写入时刻。"""
+    deadline = time.perf_counter() + duration
+    n = 0
+    files = [open(path, "a", encoding="utf-8", buffering=1) for path in paths]
+    try:
+        while time.perf_counter() < deadline:
+            files[n % len(files)].write(f"[任务{n % TASKS}] {time.perf_counter():.6f} 正在处理商品 {n}\n")
+            n += 1
+            await asyncio.sleep(WRITE_INTERVAL)
+    finally:
+        for f in files:
+            f.close()
+    return n
+
+
+def _latencies(text: str, received_at: float) -> list:
+    return [received_at - float(line.split(" ")[1]) for line in text.splitlines() if line]
+
+
+async def poll_client(path: str, stop: asyncio.Event, stats: dict):
+    """旧版前端：每秒请求一次 /api/logs?from_pos=。"""
+    position = 0
+    while not stop.is_set():
+        with open(path, "rb") as f:
+            stats["reads"] += 1
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if position < size:
+                f.seek(position)
+                data = f.read()
+                stats["latencies"] += _latencies(decode_log_bytes(data), time.perf_counter())
+            position = size
+        try:
+            await asyncio.wait_for(stop.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def push_client(tailer: LogTailer, stop: asyncio.Event, stats: dict):
+    subscription = tailer.subscribe()
+    try:
+        while not stop.is_set():
+            try:
+                entry = await asyncio.wait_for(subscription.queue.get(), 0.2)
+            except asyncio.TimeoutError:
+                continue
+            stats["latencies"] += _latencies(entry["text"], time.perf_counter())
+    finally:
+        tailer.unsubscribe(subscription)
+
+
+async def run(mode: str, clients: int, duration: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = {"reads": 0, "latencies": []}
+        stop = asyncio.Event()
+        tailer = None
+        if mode == "poll":
+            paths = [os.path.join(tmp, "scraper.log")]
+            open(paths[0], "w").close()
+            consumers = [poll_client(paths[0], stop, stats) for _ in range(clients)]
+        else:
+            paths = [task_log_path(f"任务{i}", tmp) for i in range(TASKS)]
+            tailer = LogTailer(tmp, use_inotify=(mode == "inotify"))
+            original = tailer._read_files
+
+            def counted_read():
+                stats["reads"] += 1
+                return original()
+
+            tailer._read_files = counted_read
+            consumers = [push_client(tailer, stop, stats) for _ in range(clients)]
+
+        consumer_tasks = [asyncio.ensure_future(c) for c in consumers]
+        await asyncio.sleep(0.1)
+        written = await write_lines(paths, duration)
+        await asyncio.sleep(1.2)
+        stop.set()
+        await asyncio.gather(*consumer_tasks)
+        if tailer is not None:
+            await tailer.stop()
+
+    latencies = stats["latencies"] or [0.0]
+    print(f"{mode:<8} {written:>6} {len(latencies) // clients:>8} "
+          f"{sum(latencies) / len(latencies) * 1000:>10.1f} {max(latencies) * 1000:>10.1f} {stats['reads']:>8}")
+
+
+async def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{clients} 个客户端，{duration:g} 秒")
+    print(f"{'模式':<8} {'写入行':>6} {'每端收到':>8} {'平均延迟ms':>10} {'最大延迟ms':>10} {'读文件次':>8}")
+    for mode in ("poll", "tail", "inotify"):
+        await run(mode, clients, duration)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：固定随机延迟与自适应请求节奏的吞吐量和被限流比例。
+
+模拟一个带隐藏限流规则的详情接口：任意滑动窗口内请求数超过上限即返回 RGV587_ERROR。
+在相同的模拟时长内分别测量：
+  1. 旧实现：每次请求前 random_sleep(3, 6)
+  2. 新实现：PacingEngine 的 detail 令牌桶（连续两次运行，第二次从第一次保存的状态开始）
+
+为了快速运行，所有时间按 TIME_SCALE 缩放，输出结果已换算回真实秒数。
+
+用法: python -m benchmarks.bench_pacing [模拟时长(秒)] [限流窗口(秒)] [窗口内请求上限]
+"""
+import asyncio
+import collections
+import copy
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.anti_crawler_config import PACING_STRATEGY
+from src.pacing import PacingEngine
+
+TIME_SCALE = 0.002
+
+
+class ThrottledEndpoint:
+    """滑动窗口限流：window 秒内超过 limit 次请求即返回限流错误。"""
+
+    def __init__(self, window: float, limit: int):
+        self.window = window * TIME_SCALE
+        self.limit = limit
+        self.history = collections.deque()
+        self.requests = 0
+        self.blocks = 0
+
+    def handle(self) -> str:
+        now = time.monotonic()
+        while self.history and now - self.history[0] > self.window:
+            self.history.popleft()
+        self.history.append(now)
+        self.requests += 1
+        if len(self.history) > self.limit:
+            self.blocks += 1
+            return "['RGV587_ERROR::SM::哎哟喂,被挤爆啦,请稍后重试']"
+        return "['SUCCESS::调用成功']"
+
+
+def scaled_strategy() -> dict:
+    strategy = copy.deepcopy(PACING_STRATEGY)
+    for endpoint in strategy["endpoints"].values():
+        for key in ("base_interval", "min_interval", "max_interval"):
+            endpoint[key] *= TIME_SCALE
+    return strategy
+
+
+async def run_fixed(duration: float, endpoint: ThrottledEndpoint):
+    deadline = time.monotonic() + duration * TIME_SCALE
+    while time.monotonic() < deadline:
+        await asyncio.sleep(random.uniform(3, 6) * TIME_SCALE)
+        endpoint.handle()
+
+
+async def run_adaptive(duration: float, endpoint: ThrottledEndpoint, state_file: str) -> float:
+    engine = PacingEngine(scaled_strategy(), state_file=state_file)
+    pacer = engine.pacers["detail"]
+    start_interval = pacer.interval
+    deadline = time.monotonic() + duration * TIME_SCALE
+    while time.monotonic() < deadline:
+        await pacer.acquire()
+        engine.record_response("detail", endpoint.handle())
+    engine.save_state()
+    return start_interval / TIME_SCALE, pacer.interval / TIME_SCALE
+
+
+def report(name: str, endpoint: ThrottledEndpoint, duration: float, extra: str = ""):
+    per_minute = endpoint.requests / duration * 60
+    block_rate = endpoint.blocks / endpoint.requests if endpoint.requests else 0.0
+    print(f"{name:<28}{endpoint.requests:>8}{per_minute:>12.1f}{endpoint.blocks:>8}{block_rate:>10.1%}  {extra}")
+
+
+async def main(duration: float, window: float, limit: int):
+    print(f"模拟时长 {duration:.0f}s，限流规则：{window:.0f}s 内最多 {limit} 次请求")
+    print(f"{'策略':<28}{'请求数':>8}{'请求/分钟':>12}{'被限流':>8}{'限流比例':>10}")
+
+    fixed = ThrottledEndpoint(window, limit)
+    await run_fixed(duration, fixed)
+    report("random_sleep(3, 6)", fixed, duration)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        state_file = os.path.join(work_dir, "pacing_state.json")
+        for run in (1, 2):
+            endpoint = ThrottledEndpoint(window, limit)
+            start_interval, end_interval = await run_adaptive(duration, endpoint, state_file)
+            report(f"自适应节奏（第{run}次运行）", endpoint, duration,
+                   f"间隔 {start_interval:.2f}s -> {end_interval:.2f}s")
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    window = float(sys.argv[2]) if len(sys.argv) > 2 else 60
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 24
+    asyncio.run(main(duration, window, limit))
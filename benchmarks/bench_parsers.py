@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：搜索结果解析的单个商品耗时。
+
+使用 tests/fixtures/search_response.json 中录制的 30 条商品响应，以及将其复制扩展到 3000 条的响应，对比：
+  1. 旧实现：每次字段查找都 await 一次异步 safe_get
+  2. 新实现：同步的 parse_search_results（预先构建的字段路径）
+
+用法: python -m benchmarks.bench_parsers [重复次数]
+"""
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from src.parsers import parse_search_results
+from src.utils import safe_get
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "tests", "fixtures", "search_response.json")
+
+
+async def legacy_parse(json_data: dict) -> list:
+    """旧版 _parse_search_results_json 的商品循环（省略了日志与错误分支）。"""
+    page_data = []
+    items = await safe_get(json_data, "data", "resultList", default=[])
+    for item in items:
+        main_data = await safe_get(item, "data", "item", "main", "exContent", default={})
+        click_params = await safe_get(item, "data", "item", "main", "clickParam", "args", default={})
+
+        title = await safe_get(main_data, "title", default="未知标题")
+        price_parts = await safe_get(main_data, "price", default=[])
+        price = "".join([str(p.get("text", "")) for p in price_parts if isinstance(p, dict)]).replace("当前价", "").strip() if isinstance(price_parts, list) else "价格异常"
+        if "万" in price: price = f"¥{float(price.replace('¥', '').replace('万', '')) * 10000:.0f}"
+        area = await safe_get(main_data, "area", default="地区未知")
+        seller = await safe_get(main_data, "userNickName", default="匿名卖家")
+        raw_link = await safe_get(item, "data", "item", "main", "targetUrl", default="")
+        pub_time_ts = click_params.get("publishTime", "")
+        item_id = await safe_get(main_data, "itemId", default="未知ID")
+        original_price = await safe_get(main_data, "oriPrice", default="暂无")
+        wants_count = await safe_get(click_params, "wantNum", default='NaN')
+
+        tags = []
+        if await safe_get(click_params, "tag") == "freeship":
+            tags.append("包邮")
+        r1_tags = await safe_get(main_data, "fishTags", "r1", "tagList", default=[])
+        for tag_item in r1_tags:
+            content = await safe_get(tag_item, "data", "content", default="")
+            if "验货宝" in content:
+                tags.append("验货宝")
+
+        page_data.append({
+            "商品标题": title,
+            "当前售价": price,
+            "商品原价": original_price,
+            "“想要”人数": wants_count,
+            "商品标签": tags,
+            "发货地区": area,
+            "卖家昵称": seller,
+            "商品链接": raw_link.replace("fleamarket://", "https://www.goofish.com/"),
+            "发布时间": datetime.fromtimestamp(int(pub_time_ts)/1000).strftime("%Y-%m-%d %H:%M") if pub_time_ts.isdigit() else "未知时间",
+            "商品ID": item_id
+        })
+    return page_data
+
+
+def build_response(item_count: int) -> dict:
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+    recorded = fixture["data"]["resultList"]
+    response = copy.deepcopy(fixture)
+    response["data"]["resultList"] = [copy.deepcopy(recorded[i % len(recorded)]) for i in range(item_count)]
+    return response
+
+
+def measure(func, item_count: int, repeat: int) -> float:
+    """返回单个商品的平均解析耗时（微秒）。"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat / item_count * 1e6
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    loop = asyncio.new_event_loop()
+    print(f"{'商品数':>8}{'旧:异步safe_get':>18}{'新:同步解析':>14}{'加速':>8}")
+    for item_count in (30, 3000):
+        response = build_response(item_count)
+        # 两种实现的结果必须一致（parse_search_results 的日志输出被屏蔽）
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert loop.run_until_complete(legacy_parse(response)) == parse_search_results(response, "bench")
+            runs = max(1, repeat * 100 // item_count)
+            legacy_us = measure(lambda: loop.run_until_complete(legacy_parse(response)), item_count, runs)
+            sync_us = measure(lambda: parse_search_results(response, "bench"), item_count, runs)
+        print(f"{item_count:>10}{legacy_us:>15.2f}us{sync_us:>13.2f}us{legacy_us / sync_us:>8.1f}x")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
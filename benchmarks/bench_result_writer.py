@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：结果文件写入吞吐量（条/秒）。
+
+1 / 10 / 50 个并发生产者向同一个关键词结果文件写入记录，对比：
+  1. 旧实现：每条记录 os.makedirs + open(追加) + write + close
+  2. 新实现：JsonlWriter 批量写入（分别测试 fsync 策略 never / interval / always）
+
+用法: python -m benchmarks.bench_result_writer [每个生产者写入的记录数]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from src.result_writer import JsonlWriter
+
+
+def make_record(producer: int, n: int) -> dict:
+    return {
+        "爬取时间": "2025-01-01T00:00:00",
+        "搜索关键字": "bench",
+        "商品信息": {"商品ID": f"{producer}-{n}", "商品标题": "九成新 索尼 A7M4 单机 " * 4, "当前售价": "¥9999",
+                     "商品图片列表": [f"https://img.alicdn.com/{producer}/{n}/{i}.jpg" for i in range(6)]},
+        "卖家信息": {"卖家昵称": "卖家", "卖家信用等级": "极好", "卖家收到的评价列表": [{"评价内容": "好评" * 20}] * 5},
+        "ai_analysis": {"is_recommended": True, "reason": "符合要求" * 30},
+    }
+
+
+async def legacy_save(path: str, record: dict):
+    """旧版 save_to_jsonl 的写入部分。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+async def run_legacy(path: str, records: list):
+    async def producer(batch):
+        for record in batch:
+            await legacy_save(path, record)
+            await asyncio.sleep(0)
+    await asyncio.gather(*[producer(batch) for batch in records])
+
+
+async def run_writer(path: str, records: list, fsync_policy: str):
+    writer = JsonlWriter(path, fsync_policy=fsync_policy)
+
+    async def producer(batch):
+        for record in batch:
+            await writer.write(record)
+            await asyncio.sleep(0)
+    await asyncio.gather(*[producer(batch) for batch in records])
+    await writer.close()
+    return writer
+
+
+async def measure(run, path: str, expected: int) -> float:
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == expected, f"期望 {expected} 条，实际 {len(lines)} 条"
+    os.remove(path)
+    return expected / elapsed
+
+
+async def main(per_producer: int):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "jsonl", "bench_full_data.jsonl")
+        print(f"每个生产者写入 {per_producer} 条记录，吞吐量单位：条/秒")
+        print(f"{'生产者数':>8}{'旧:逐条open':>14}{'新:never':>12}{'新:interval':>14}{'新:always':>12}")
+        for producers in (1, 10, 50):
+            total = producers * per_producer
+            # 记录预先构建好，只测量写入本身
+            records = [[make_record(i, n) for n in range(per_producer)] for i in range(producers)]
+            row = [await measure(lambda: run_legacy(path, records), path, total)]
+            for policy in ("never", "interval", "always"):
+                row.append(await measure(lambda: run_writer(path, records, policy), path, total))
+            print(f"{producers:>10}{row[0]:>14.0f}{row[1]:>12.0f}{row[2]:>14.0f}{row[3]:>12.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+负载测试：用游标分页完整翻阅 N 条结果记录（默认 100 万条）。
+
+生成结果文件并导入 ResultsStore 后：
+  1. 用 query_page 的游标从第一页翻到最后一页，统计每页耗时的分布（开头、中间、结尾各段分别统计）
+  2. 对比 LIMIT/OFFSET 分页（query）在不同深度取一页的耗时
+  3. 带筛选条件（包邮 + 价格区间）再完整翻阅一遍
+
+用法: python -m benchmarks.bench_results_cursor [记录数N] [每页条数]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from src.results_store import ResultsStore
+
+REGIONS = ["广东深圳", "广东广州", "上海", "北京", "浙江杭州", "江苏南京"]
+
+
+def write_records(path: str, count: int):
+    rng = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            tags = [tag for tag, p in (("包邮", 0.5), ("验货宝", 0.1)) if rng.random() < p]
+            record = {
+                "爬取时间": f"2025-01-01T00:00:00.{i:07d}",
+                "任务名称": "bench",
+                "搜索关键字": "bench",
+                "商品信息": {
+                    "商品ID": str(i), "商品标题": f"商品{i}",
+                    "当前售价": f"¥{rng.randint(100, 20000)}",
+                    "发布时间": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00",
+                    "商品标签": tags, "发货地区": rng.choice(REGIONS),
+                },
+                "ai_analysis": {"is_recommended": rng.random() < 0.2,
+                                "risk_tags": ["电池老化"] if rng.random() < 0.05 else []},
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def walk(store: ResultsStore, scope: str, limit: int, **filters):
+    """游标翻页直到结束，返回 (记录总数, 每页耗时列表 ms)。"""
+    total, latencies, cursor = 0, [], None
+    while True:
+        started = time.perf_counter()
+        items, cursor = store.query_page(scope, limit=limit, cursor=cursor, **filters)
+        latencies.append((time.perf_counter() - started) * 1000)
+        total += len(items)
+        if cursor is None:
+            return total, latencies
+
+
+def summarize(name: str, latencies: list):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{name:<24}{len(latencies):>8}{statistics.median(latencies):>10.2f}{p99:>10.2f}{max(latencies):>10.2f}")
+
+
+def main(count: int, limit: int):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "bench_full_data.jsonl")
+        started = time.perf_counter()
+        write_records(path, count)
+        print(f"生成 {count} 条记录（{os.path.getsize(path) / 1024 / 1024:.0f} MB），耗时 {time.perf_counter() - started:.0f}s")
+
+        store = ResultsStore(os.path.join(work_dir, "results.db"))
+        scope = os.path.basename(path)
+        started = time.perf_counter()
+        store.sync_scope(scope, path)
+        print(f"导入结果存储耗时 {time.perf_counter() - started:.0f}s")
+
+        print(f"\n每页 {limit} 条，耗时单位 ms")
+        print(f"{'翻页方式':<24}{'页数':>8}{'中位数':>10}{'p99':>10}{'最大':>10}")
+        walked, latencies = walk(store, scope, limit, sort_by="crawl_time", sort_order="desc")
+        assert walked == count, f"翻阅到 {walked} 条，期望 {count} 条"
+        third = len(latencies) // 3
+        summarize("游标 按爬取时间 全部", latencies)
+        summarize("  其中 前1/3", latencies[:third])
+        summarize("  其中 后1/3", latencies[-third:])
+        _, latencies = walk(store, scope, limit, sort_by="price", sort_order="asc")
+        summarize("游标 按价格 全部", latencies)
+        walked, latencies = walk(store, scope, limit, tags=["包邮"], min_price=1000, max_price=5000)
+        summarize(f"游标 包邮+价格 ({walked}条)", latencies)
+
+        print(f"\n{'LIMIT/OFFSET 取一页':<24}{'深度':>12}{'耗时':>10}")
+        for depth in (0.0, 0.5, 0.99):
+            page = int(count * depth) // limit + 1
+            started = time.perf_counter()
+            store.query(scope, page=page, limit=limit)
+            print(f"{'按爬取时间':<24}{f'第{page}页':>12}{(time.perf_counter() - started) * 1000:>10.1f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    main(count, limit)
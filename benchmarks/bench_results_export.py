@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：流式导出 N 条结果记录（默认 100 万条）的吞吐量与内存峰值。
+
+生成结果文件并导入 ResultsStore 后，分别以 NDJSON、CSV（以及安装了 pyarrow 时的 Parquet）导出全部记录，
+输出丢弃，只统计字节数。作为对照，再用"先把全部记录读入内存再写出"的方式导出前 20 万条。
+内存为本进程 RSS 相对导出开始前的增量峰值，通过 /proc 采样，仅支持 Linux。
+
+用法: python -m benchmarks.bench_results_export [记录数N]
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_results_cursor import write_records
+from src.results_export import PARQUET_AVAILABLE, export_results, flatten_record
+from src.results_store import ResultsStore
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class PeakRssSampler:
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb())
+
+
+def load_all_then_csv(store: ResultsStore, scope: str, limit: int):
+    """对照：一次性取出全部记录，在内存中拼出完整的 CSV。"""
+    records = store.query(scope, page=1, limit=limit)[1]
+    rows = [flatten_record(record) for record in records]
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(rows)
+    return [buffer.getvalue().encode("utf-8")]
+
+
+def measure(name: str, make_chunks, rows: int):
+    baseline = rss_mb()
+    started = time.perf_counter()
+    total_bytes = 0
+    with PeakRssSampler() as sampler:
+        for chunk in make_chunks():
+            total_bytes += len(chunk)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<30}{rows:>10}{total_bytes / 1024 / 1024:>10.0f}MB{rows / elapsed:>12.0f}{sampler.peak - baseline:>12.0f}MB")
+
+
+def main(count: int):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "bench_full_data.jsonl")
+        write_records(path, count)
+        store = ResultsStore(os.path.join(work_dir, "results.db"))
+        scope = os.path.basename(path)
+        started = time.perf_counter()
+        store.sync_scope(scope, path)
+        print(f"{count} 条记录已导入结果存储（{time.perf_counter() - started:.0f}s）\n")
+
+        print(f"{'导出方式':<30}{'行数':>10}{'输出大小':>12}{'行/秒':>12}{'RSS增量峰值':>14}")
+        measure("流式 NDJSON", lambda: export_results(store, scope, "ndjson"), count)
+        measure("流式 CSV（两遍扫描）", lambda: export_results(store, scope, "csv"), count)
+        if PARQUET_AVAILABLE:
+            measure("流式 Parquet（两遍扫描）", lambda: export_results(store, scope, "parquet"), count)
+        else:
+            print("未安装 pyarrow，跳过 Parquet。")
+        naive_rows = min(count, 200000)
+        measure("对照：全部载入内存后写 CSV", lambda: load_all_then_csv(store, scope, naive_rows), naive_rows)
+        store.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：/api/results 单页查询耗时。
+
+生成一个包含 N 条记录的结果文件，对比：
+  1. 旧实现：每次请求完整读取、解析结果文件，在内存中筛选排序后再分页
+  2. sqlite 后端：ResultsStore（首次请求时一次性导入，之后每次请求只检查文件是否有新增内容再按索引查询）
+  3. jsonl 后端：ResultIndexCache 内存索引（首次请求建立索引，之后只读取新增内容并只解析当前页）
+
+用法: python -m benchmarks.bench_results_store [记录数N]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.result_file_index import ResultIndexCache
+from src.results_store import ResultsStore, parse_price
+
+
+def write_records(path: str, count: int):
+    rng = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            record = {
+                "爬取时间": f"2025-{1 + i * 12 // count:02d}-01T00:00:{i % 60:02d}.{i:06d}",
+                "搜索关键字": "bench",
+                "任务名称": "bench",
+                "商品信息": {
+                    "商品ID": str(i), "商品标题": "九成新 索尼 A7M4 单机 " * 3,
+                    "当前售价": f"¥{rng.randint(100, 20000)}",
+                    "发布时间": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00",
+                    "商品图片列表": [f"https://img.alicdn.com/{i}/{n}.jpg" for n in range(4)],
+                },
+                "卖家信息": {"卖家昵称": "卖家", "卖家收到的评价列表": [{"评价内容": "好评" * 10}] * 3},
+                "ai_analysis": {"is_recommended": rng.random() < 0.2, "reason": "符合要求" * 10},
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def legacy_page(path: str, page: int, limit: int, recommended_only: bool, sort_by: str, sort_order: str):
+    """旧版 get_result_file_content 的读取、筛选、排序和分页逻辑。"""
+    results = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if not recommended_only or record.get("ai_analysis", {}).get("is_recommended") is True:
+                results.append(record)
+
+    def get_sort_key(item):
+        info = item.get("商品信息", {})
+        if sort_by == "publish_time":
+            return info.get("发布时间", "0000-00-00 00:00")
+        elif sort_by == "price":
+            return parse_price(info.get("当前售价", "0"))
+        return item.get("爬取时间", "")
+
+    results.sort(key=get_sort_key, reverse=(sort_order == "desc"))
+    start = (page - 1) * limit
+    return len(results), results[start:start + limit]
+
+
+def timed(func, repeat: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main(count: int):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "bench_full_data.jsonl")
+        write_records(path, count)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        store = ResultsStore(os.path.join(work_dir, "results.db"))
+        scope = os.path.basename(path)
+        import_ms = timed(lambda: store.sync_scope(scope, path))
+        print(f"结果文件 {count} 条记录，{size_mb:.1f} MB；首次导入结果存储耗时 {import_ms / 1000:.1f}s")
+        index_cache = ResultIndexCache()
+        build_ms = timed(lambda: index_cache.query(path, 1, 20))
+        print(f"首次建立内存索引耗时 {build_ms / 1000:.1f}s")
+
+        cases = [
+            ("第1页 按爬取时间倒序", dict(page=1, recommended_only=False, sort_by="crawl_time", sort_order="desc")),
+            ("第1页 按价格升序", dict(page=1, recommended_only=False, sort_by="price", sort_order="asc")),
+            ("第1页 仅推荐 按发布时间", dict(page=1, recommended_only=True, sort_by="publish_time", sort_order="desc")),
+            ("第500页 按爬取时间倒序", dict(page=500, recommended_only=False, sort_by="crawl_time", sort_order="desc")),
+        ]
+        print(f"{'查询':<26}{'旧:整文件扫描':>14}{'sqlite后端':>14}{'内存索引':>12}")
+        for name, params in cases:
+            legacy = legacy_page(path, limit=20, **params)
+            assert legacy[0] == store.query(scope, limit=20, **params)[0]
+            assert legacy == index_cache.query(path, limit=20, **params)
+            legacy_ms = timed(lambda: legacy_page(path, limit=20, **params))
+
+            def indexed():
+                store.sync_scope(scope, path)
+                store.query(scope, limit=20, **params)
+            # 内存索引在上面的一致性校验中已完成该排序方式的首次排序，这里统计命中排序缓存后的耗时
+            print(f"{name:<26}{legacy_ms:>12.0f}ms{timed(indexed, repeat=20):>12.2f}ms"
+                  f"{timed(lambda: index_cache.query(path, limit=20, **params), repeat=20):>10.2f}ms")
+        memory_mb = sum(s["memory_bytes"] for s in index_cache.stats()) / 1024 / 1024
+        print(f"内存索引占用 {memory_mb:.1f} MB（含已缓存的排序结果）")
+        store.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：N 个关键词并发搜索时的总耗时。
+
+在本地启动一个模拟 mtop 搜索接口（每个请求固定延迟），分别测量：
+  1. 旧实现：在协程中直接调用同步的 requests.post（阻塞事件循环）
+  2. 新实现：search_xianyu_api 使用共享的异步连接池
+
+用法: python -m benchmarks.bench_search_api [并发数N] [接口延迟秒数]
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import src.scraper as scraper
+from src.http_client import close_http_clients
+
+
+def make_mock_handler(delay: float):
+    body = json.dumps({
+        "ret": ["SUCCESS::调用成功"],
+        "data": {"resultList": [
+            {"data": {"item": {"main": {"exContent": {"title": f"商品{i}", "itemId": str(i)}}}}}
+            for i in range(30)
+        ]},
+    }, ensure_ascii=False).encode("utf-8")
+
+    class MockMtopHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MockMtopHandler
+
+
+async def blocking_search(url: str, keyword: str):
+    """旧实现的等价物：async 函数内部直接调用同步 requests.post。"""
+    response = requests.post(url, data={"data": json.dumps({"keyword": keyword})}, timeout=30)
+    return response.json()
+
+
+async def run_bench(n: int, delay: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_mock_handler(delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/h5/mtop.taobao.idlemtopsearch.pc.search/1.0/"
+    scraper.SEARCH_API_URL = url
+    keywords = [f"关键词{i}" for i in range(n)]
+
+    start = time.perf_counter()
+    await blocking_search(url, "单次")
+    single_blocking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*[blocking_search(url, k) for k in keywords])
+    many_blocking = time.perf_counter() - start
+
+    # 预热一次连接池，模拟长时间运行的进程
+    await scraper.search_xianyu_api("预热")
+    start = time.perf_counter()
+    await scraper.search_xianyu_api("单次")
+    single_pooled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[scraper.search_xianyu_api(k) for k in keywords])
+    many_pooled = time.perf_counter() - start
+
+    await close_http_clients()
+    server.shutdown()
+
+    assert all(len(r["data"]["resultList"]) == 30 for r in results)
+
+    print("\n=== 搜索接口并发基准 ===")
+    print(f"并发关键词数 N={n}，模拟接口延迟 {delay:.2f}s")
+    print(f"{'实现':<24}{'单次耗时':>10}{'N次并发耗时':>14}{'倍数':>8}")
+    print(f"{'requests.post (阻塞)':<24}{single_blocking:>9.2f}s{many_blocking:>13.2f}s{many_blocking / single_blocking:>7.1f}x")
+    print(f"{'共享异步连接池':<24}{single_pooled:>9.2f}s{many_pooled:>13.2f}s{many_pooled / single_pooled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    asyncio.run(run_bench(n, delay))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试：任务启动时的去重准备耗时。
+
+对比：
+  1. 旧实现：逐行 json.loads 整个 JSONL 文件并重建链接集合
+  2. 新实现：SeenIndex 一次性迁移的耗时，以及迁移之后每次启动的耗时
+
+用法: python -m benchmarks.bench_seen_index [记录数 ...]   (默认 10000 100000 1000000)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from src.seen_index import SeenIndex, get_item_key
+from src.utils import get_link_unique_key
+
+
+def write_records(path: str, count: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            record = {
+                "爬取时间": "2025-01-01T00:00:00",
+                "搜索关键字": "macbook air m1",
+                "任务名称": "MacBook Air M1",
+                "商品信息": {
+                    "商品标题": f"自用 MacBook Air M1 8+256 成色很新 {i}",
+                    "当前售价": "¥3800",
+                    "商品链接": f"https://www.goofish.com/item?id={700000000000 + i}&categoryId=126862528",
+                    "发布时间": "2025-01-01 00:00",
+                    "商品ID": str(700000000000 + i),
+                },
+                "卖家信息": {},
+                "ai_analysis": {"is_recommended": i % 7 == 0, "reason": "电池健康度良好，个人自用。" * 4},
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def legacy_rescan(path: str) -> set:
+    processed_links = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            link = record.get("商品信息", {}).get("商品链接", "")
+            if link:
+                processed_links.add(get_link_unique_key(link))
+    return processed_links
+
+
+def bench(count: int, work_dir: str):
+    jsonl_path = os.path.join(work_dir, f"bench_{count}_full_data.jsonl")
+    db_path = os.path.join(work_dir, f"seen_{count}.db")
+    write_records(jsonl_path, count)
+    scope = os.path.basename(jsonl_path)
+    size_mb = os.path.getsize(jsonl_path) / 1024 / 1024
+
+    start = time.perf_counter()
+    links = legacy_rescan(jsonl_path)
+    legacy = time.perf_counter() - start
+    assert len(links) == count
+
+    index = SeenIndex(db_path)
+    start = time.perf_counter()
+    index.ensure_scope(scope, jsonl_path)
+    migration = time.perf_counter() - start
+    index.close()
+
+    # 迁移之后的一次常规启动：打开数据库 + 校验作用域
+    start = time.perf_counter()
+    index = SeenIndex(db_path)
+    index.ensure_scope(scope, jsonl_path)
+    startup = time.perf_counter() - start
+
+    probe_ids = [str(700000000000 + i) for i in range(0, count, max(1, count // 1000))]
+    start = time.perf_counter()
+    assert all(index.contains(scope, get_item_key({"商品ID": item_id})) for item_id in probe_ids)
+    lookup_us = (time.perf_counter() - start) / len(probe_ids) * 1e6
+    index.close()
+
+    os.remove(jsonl_path)
+    return size_mb, legacy, migration, startup, lookup_us
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for count in counts:
+            print(f"正在测试 {count} 条记录...")
+            rows.append((count, *bench(count, work_dir)))
+
+    print("\n=== 任务启动去重准备耗时 ===")
+    print(f"{'记录数':>10}{'文件大小':>10}{'旧:全量扫描':>14}{'新:一次性迁移':>14}{'新:常规启动':>12}{'单次查询':>10}")
+    for count, size_mb, legacy, migration, startup, lookup_us in rows:
+        print(f"{count:>12}{size_mb:>9.1f}MB{legacy:>14.3f}s{migration:>16.3f}s{startup:>14.4f}s{lookup_us:>10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
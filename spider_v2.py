@@ -3,8 +3,13 @@ import sys
 import os
 import argparse
 import json
+import signal
 
+from src.ai_request_log import close_ai_request_log
+from src.browser_pool import close_browser_pool, get_browser_pool
 from src.config import STATE_FILE
+from src.http_client import close_http_clients
+from src.result_writer import close_jsonl_writers
 from src.scraper import scrape_xianyu
 
 
@@ -114,8 +119,33 @@ async def main():
         print(f"-> 任务 '{task_conf['task_name']}' 已加入执行队列。")
         coroutines.append(scrape_xianyu(task_config=task_conf, debug_limit=args.debug_limit))
 
+    # Web 界面停止任务时会向整个进程组发送 SIGTERM：取消正在运行的任务，
+    # 让下面的 finally 先把结果写入器中尚未落盘的记录写完再退出
+    loop = asyncio.get_running_loop()
+    handle_sigterm = sys.platform != "win32"
+    if handle_sigterm:
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    stopping = False
+
     # 并发执行所有任务
-    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    try:
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+    except asyncio.CancelledError:
+        stopping = True
+        print("\n--- 收到停止信号，正在保存已处理的结果 ---")
+    finally:
+        if handle_sigterm:
+            loop.remove_signal_handler(signal.SIGTERM)
+        await close_jsonl_writers()
+        await close_ai_request_log()
+        if args.debug_limit and get_browser_pool().launched and not stopping:
+            input("按回车键关闭浏览器...")
+        await close_browser_pool()
+        await close_http_clients()
+
+    if stopping:
+        print("--- 任务已停止 ---")
+        return
 
     print("\n--- 所有任务执行完毕 ---")
     for i, result in enumerate(results):
@@ -0,0 +1,238 @@
+"""
+批量 AI 分析（AI_BATCH_SIZE > 1 时启用，用于纯文本初筛）。
+
+单个商品的分析请求每次都要重新发送完整的 prompt（基础 prompt + 分析标准，常有数 KB）。
+批量模式把同一任务的多个商品打包进一次请求：prompt 作为共用的 system 消息只发送一次，
+要求模型返回 {"results": [...]}，每个元素是一个商品的结论并带有 "商品ID"。
+每个结论单独用 validate_ai_response_format 校验，缺失或不合格的商品重新排队，最多尝试 BATCH_MAX_ATTEMPTS 次。
+
+批次在凑满 AI_BATCH_SIZE 个商品或第一个商品等待 AI_BATCH_MAX_WAIT 秒后发送；
+加入下一个商品会使估算的输入 + 输出 token 超过 AI_CONTEXT_WINDOW 的 CONTEXT_USAGE 时提前发送。
+任务的商品全部交给批量器后调用 close()，最后一个未凑满的批次（以及之后重新排队的商品）立即发送，不再等待。
+每个结论的输出 token 数按实际用量滑动校准。请求经过共享的AI调度器（见 src/ai_dispatcher）。
+"""
+import asyncio
+import json
+import math
+from typing import Dict, Optional
+
+from src.ai_dispatcher import estimate_prompt_tokens, get_ai_dispatcher
+from src.ai_handler import MODEL_NAME, client, safe_print, validate_ai_response_format
+from src.ai_request_log import log_ai_request, should_log_request
+from src.config import AI_BATCH_MAX_WAIT, AI_BATCH_SIZE, AI_CONTEXT_WINDOW, get_ai_request_params
+
+BATCH_MAX_ATTEMPTS = 3
+# 输入 + 输出最多占用上下文窗口的比例（token 为估算值，留出余量）
+CONTEXT_USAGE = 0.8
+# 单次请求的输出 token 上限（多数模型的输出上限）
+MAX_OUTPUT_TOKENS = 8192
+# 每个商品结论的初始输出 token 估算
+VERDICT_TOKEN_ESTIMATE = 800
+ESTIMATE_SMOOTHING = 0.3
+
+BATCH_INSTRUCTIONS = """
+
+【批量分析】本次请求包含多个商品，请按上述要求逐一独立分析每个商品，不要遗漏，也不要让商品之间互相影响。
+只返回一个JSON对象：{"results": [...]}。数组中每个元素是一个商品的完整分析结果，字段与单个商品的要求相同，
+并额外包含该商品的 "商品ID" 字段（与输入中的商品ID一致）。"""
+
+
+def _strip_code_fence(content: str) -> str:
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    elif content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return content.strip()
+
+
+def parse_batch_verdicts(content: str) -> Dict[str, dict]:
+    """解析批量响应，返回 {商品ID: 结论}（结论中去掉商品ID字段）。也接受直接返回的数组。无法解析时返回空字典。"""
+    content = _strip_code_fence(content or "")
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError:
+        start = content.find('{')
+        end = content.rfind('}')
+        try:
+            parsed = json.loads(content[start:end + 1]) if 0 <= start < end else None
+        except json.JSONDecodeError:
+            parsed = None
+    if isinstance(parsed, dict):
+        parsed = parsed.get("results")
+    if not isinstance(parsed, list):
+        return {}
+    verdicts = {}
+    for verdict in parsed:
+        if isinstance(verdict, dict) and verdict.get("商品ID") is not None:
+            verdict = dict(verdict)
+            verdicts[str(verdict.pop("商品ID"))] = verdict
+    return verdicts
+
+
+class _Entry:
+    __slots__ = ("record", "product_id", "future", "tokens", "attempts", "usage")
+
+    def __init__(self, record: dict, future: asyncio.Future, usage: Optional[dict]):
+        self.record = record
+        self.product_id = str(record.get('商品信息', {}).get('商品ID', ''))
+        self.future = future
+        self.tokens = estimate_prompt_tokens([{"content": json.dumps(record, ensure_ascii=False)}])
+        self.attempts = 0
+        self.usage = usage
+
+
+class AiBatcher:
+    def __init__(self, prompt_text: str, task_name: str = "", priority: int = 0, batch_size: int = AI_BATCH_SIZE,
+                 max_wait: float = AI_BATCH_MAX_WAIT, context_window: int = AI_CONTEXT_WINDOW):
+        self.system_prompt = prompt_text + BATCH_INSTRUCTIONS
+        self.system_tokens = estimate_prompt_tokens([{"content": self.system_prompt}])
+        self.task_name = task_name
+        self.priority = priority
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.context_window = context_window
+        self.verdict_tokens = VERDICT_TOKEN_ESTIMATE
+        self._pending = []
+        self._timer = None
+        self._running = set()
+        self._closing = False
+        self.requests = 0
+        self.items = 0
+        self.requeued = 0
+        self.failed = 0
+
+    async def evaluate(self, record: dict, usage: Optional[dict] = None) -> Optional[dict]:
+        """
+        把商品加入批次并等待其结论；多次尝试后仍没有合格结论时返回 None，请求失败时抛出异常。
+        传入 usage 字典时累计分摊到该商品的 token 用量。
+        """
+        if not client:
+            safe_print("   [AI批量] 错误：AI客户端未初始化，跳过分析。")
+            return None
+        entry = _Entry(record, asyncio.get_running_loop().create_future(), usage)
+        self._enqueue(entry)
+        return await entry.future
+
+    def _fits(self, entries: list) -> bool:
+        output = len(entries) * self.verdict_tokens
+        prompt = self.system_tokens + sum(entry.tokens for entry in entries)
+        return output <= MAX_OUTPUT_TOKENS and prompt + output <= self.context_window * CONTEXT_USAGE
+
+    def _enqueue(self, entry: _Entry):
+        if self._pending and not self._fits(self._pending + [entry]):
+            self._flush()
+        self._pending.append(entry)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            # close() 之后不会再有新商品，重新排队的商品在当前回合结束后一起发送
+            delay = 0 if self._closing else self.max_wait
+            self._timer = asyncio.get_running_loop().call_later(delay, self._flush)
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list):
+        try:
+            verdicts, usage = await self._request(batch)
+        except Exception as e:
+            safe_print(f"   [AI批量] {len(batch)} 个商品的批量请求失败: {e}")
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+            return
+
+        for entry in batch:
+            if entry.usage is not None:
+                for name, value in usage.items():
+                    entry.usage[name] = entry.usage.get(name, 0) + math.ceil(value / len(batch))
+            if entry.future.done():
+                continue
+            verdict = verdicts.get(entry.product_id)
+            if verdict is not None and validate_ai_response_format(verdict):
+                self.items += 1
+                entry.future.set_result(verdict)
+                continue
+            entry.attempts += 1
+            if entry.attempts >= BATCH_MAX_ATTEMPTS:
+                safe_print(f"   [AI批量] 商品 #{entry.product_id} 在 {entry.attempts} 次批量请求中均未得到合格结论。")
+                self.failed += 1
+                entry.future.set_result(None)
+            else:
+                safe_print(f"   [AI批量] 商品 #{entry.product_id} 的结论缺失或格式不合格，重新排队。")
+                self.requeued += 1
+                self._enqueue(entry)
+
+    async def _request(self, batch: list):
+        items_json = json.dumps([entry.record for entry in batch], ensure_ascii=False)
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"请分析以下 {len(batch)} 个商品的完整JSON数据：\n\n```json\n{items_json}\n```"},
+        ]
+        if should_log_request():
+            try:
+                log_ai_request(self.task_name, "batch_" + "_".join(entry.product_id for entry in batch[:3]), messages)
+            except Exception as e:
+                safe_print(f"   [日志] 保存AI分析日志时出错: {e}")
+
+        estimated_tokens = self.system_tokens + sum(entry.tokens for entry in batch)
+        max_tokens = min(MAX_OUTPUT_TOKENS, max(self.context_window - estimated_tokens, len(batch) * self.verdict_tokens))
+        request_params = get_ai_request_params(
+            model=MODEL_NAME,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.1,
+            max_tokens=max_tokens
+        )
+        safe_print(f"   [AI批量] 发送 {len(batch)} 个商品的批量分析请求（估算输入 {estimated_tokens} token）...")
+        # 由调度器统一重试，关闭 SDK 自带的重试
+        ai_client = client.with_options(max_retries=0)
+        response = await get_ai_dispatcher().call(
+            lambda: ai_client.chat.completions.create(**request_params), estimated_tokens, self.priority)
+        self.requests += 1
+
+        usage = {}
+        response_usage = getattr(response, "usage", None)
+        if response_usage is not None:
+            usage = {"prompt_tokens": response_usage.prompt_tokens or 0,
+                     "completion_tokens": response_usage.completion_tokens or 0}
+            if usage["completion_tokens"]:
+                per_verdict = usage["completion_tokens"] / len(batch)
+                self.verdict_tokens += ESTIMATE_SMOOTHING * (per_verdict - self.verdict_tokens)
+        return parse_batch_verdicts(response.choices[0].message.content), usage
+
+    async def close(self):
+        """不会再有新商品时调用：立即发送尚未凑满的批次，并等待所有批量请求（包括重新排队产生的请求）结束。"""
+        self._closing = True
+        self._flush()
+        while self._running or self._pending:
+            if self._running:
+                await asyncio.gather(*self._running, return_exceptions=True)
+            else:
+                self._flush()
+
+    def cancel(self):
+        """取消等待中的批次和进行中的请求（任务被停止时）。"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for entry in self._pending:
+            entry.future.cancel()
+        self._pending = []
+        for task in self._running:
+            task.cancel()
+
+    def format_stats(self) -> str:
+        average = self.items / self.requests if self.requests else 0
+        return (f"批量请求 {self.requests} 次 / 得到结论 {self.items} 个（平均每次 {average:.1f} 个）/ "
+                f"重新排队 {self.requeued} 次 / 失败 {self.failed} 个")
@@ -0,0 +1,417 @@
+"""
+AI 请求调度器。
+
+spider_v2 直接运行时在同一进程中并发运行所有任务，Web 界面则为每个任务启动单独的 spider_v2 进程；
+每个任务又有 PIPELINE_AI_WORKERS 个 AI 分析 worker，所有 AI 请求都经过调度器：
+  - 同一进程内同时在途的请求数不超过 AI_MAX_CONCURRENCY；
+  - 每分钟请求数 (AI_RPM_LIMIT) 和 token 数 (AI_TPM_LIMIT) 各用一个令牌桶限制，请求按估算的 token 数
+    （文本 + 图片 + 预留的输出）扣除，响应返回后按实际用量修正，并据此校准之后的估算。
+    令牌桶保存在 AI_RATE_STATE_FILE（SQLite）中，由同时运行的所有任务进程共享（见 SharedRateState），
+    读写在工作线程中进行，等待其他进程的锁时不阻塞事件循环；
+  - 排队的请求按任务优先级（任务配置 ai_priority，数值大者优先）发放，同优先级先到先得；
+  - 限流 (429)、超时、连接错误和 5xx 按带抖动的指数退避重试，响应带 Retry-After 时按其等待；
+    收到 429 后在等待期间暂停发放所有进程的请求，避免其他请求继续触发限流。
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from openai import APIConnectionError, APIStatusError
+
+from src.config import (
+    AI_MAX_CONCURRENCY,
+    AI_MAX_RETRIES,
+    AI_RATE_STATE_FILE,
+    AI_RETRY_BASE_DELAY,
+    AI_RETRY_MAX_DELAY,
+    AI_RPM_LIMIT,
+    AI_TPM_LIMIT,
+)
+
+# 令牌桶最多积攒的额度（秒数），限制空闲后的突发请求
+BURST_SECONDS = 3
+# 为每个请求的输出预留的 token 数，响应后按实际用量修正
+COMPLETION_TOKEN_ESTIMATE = 500
+# 图片按视觉模型每 28x28 像素 1 个 token 估算；尺寸未知时按固定值
+IMAGE_PATCH_PIXELS = 28
+DEFAULT_IMAGE_TOKENS = 1000
+# Retry-After 的上限（秒），防止异常的响应头让请求长时间挂起
+RETRY_AFTER_MAX_SECONDS = 300
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+# 实际用量 / 估算用量的滑动平均系数
+ESTIMATE_SMOOTHING = 0.2
+
+
+def _image_tokens(size: Optional[Tuple[int, int]]) -> int:
+    if not size:
+        return DEFAULT_IMAGE_TOKENS
+    width, height = size
+    return math.ceil(width / IMAGE_PATCH_PIXELS) * math.ceil(height / IMAGE_PATCH_PIXELS)
+
+
+def estimate_prompt_tokens(messages: list, image_sizes: Optional[Sequence[Optional[Tuple[int, int]]]] = None) -> int:
+    """
+    估算请求消耗的输入 token 数：文本按 UTF-8 字节数 / 3（中文约 1 字 1 token，英文和 JSON 略为高估），
+    图片按 image_sizes 中依次给出的 (宽, 高) 估算（prepare_images_for_ai 处理图片时已得到，不在此处解码图片）。
+    """
+    tokens = 0
+    sizes = iter(image_sizes or [])
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                tokens += _image_tokens(next(sizes, None))
+            else:
+                tokens += math.ceil(len(part.get("text", "").encode("utf-8")) / 3)
+    return tokens
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """读取错误响应的 Retry-After（秒数或 HTTP 日期）/ retry-after-ms 响应头。"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    # APITimeoutError 是 APIConnectionError 的子类
+    return isinstance(error, APIConnectionError)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """第 attempt 次重试（从 0 开始）前的等待时间：指数增长，在上限的一半到全部之间随机抖动。"""
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """每分钟 per_minute 个令牌的令牌桶，最多积攒 BURST_SECONDS 秒的额度。"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """距离可以扣除 amount 个令牌还需等待的秒数。超过桶容量的请求在桶满时放行（之后欠额由后续请求等待补足）。"""
+        self._refill()
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def adjust(self, amount: float):
+        """按实际用量修正已扣除的令牌：amount 为正时补扣，为负时退还。"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class SharedRateState:
+    """
+    多个任务进程共享的令牌桶和 429 暂停时间，保存在 SQLite 中。
+    检查并扣除令牌在同一个 BEGIN IMMEDIATE 事务中完成，不同进程不会重复使用同一份额度；
+    时间使用 time.time()，以便不同进程之间比较。
+    """
+
+    def __init__(self, db_path: str = AI_RATE_STATE_FILE, burst_seconds: float = BURST_SECONDS):
+        self.db_path = db_path
+        self.burst_seconds = burst_seconds
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pause (id INTEGER PRIMARY KEY CHECK (id = 0), until REAL NOT NULL)")
+
+    def _level(self, name: str, per_minute: float, now: float) -> Tuple[float, float, float]:
+        """返回桶补充后的 (令牌数, 每秒补充速率, 容量)，桶不存在时为满。"""
+        rate = per_minute / 60
+        capacity = max(1.0, rate * self.burst_seconds)
+        row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+        return tokens, rate, capacity
+
+    def _transaction(self, action):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = action(time.time())
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+    def try_acquire(self, amounts: Dict[str, Tuple[float, float]]) -> float:
+        """
+        amounts 为 {桶名: (每分钟限额, 扣除数量)}。没有处于 429 暂停且所有桶的额度都足够时全部扣除并返回 0，
+        否则不扣除，返回还需等待的秒数。超过桶容量的请求在桶满时放行，与 TokenBucket 一致。
+        """
+        def action(now):
+            row = self._conn.execute("SELECT until FROM pause WHERE id = 0").fetchone()
+            wait = max(0.0, row[0] - now) if row else 0.0
+            remaining = {}
+            for name, (per_minute, amount) in amounts.items():
+                tokens, rate, capacity = self._level(name, per_minute, now)
+                needed = min(amount, capacity)
+                if tokens < needed:
+                    wait = max(wait, (needed - tokens) / rate)
+                remaining[name] = tokens - amount
+            if wait <= 0:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    [(name, tokens, now) for name, tokens in remaining.items()]
+                )
+            return wait
+
+        return self._transaction(action)
+
+    def adjust(self, name: str, per_minute: float, amount: float):
+        """按实际用量修正已扣除的令牌：amount 为正时补扣，为负时退还。"""
+        def action(now):
+            tokens, _, capacity = self._level(name, per_minute, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, min(capacity, tokens - amount), now)
+            )
+
+        self._transaction(action)
+
+    def pause(self, until: float):
+        """在 until（time.time() 时间戳）之前暂停所有进程发放请求。"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pause (id, until) VALUES (0, ?)"
+                " ON CONFLICT(id) DO UPDATE SET until = MAX(until, excluded.until)",
+                (until,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AiDispatcher:
+    """state_file 为共享令牌桶的 SQLite 文件（设置了 RPM/TPM 限额时使用），为 None 时令牌桶只在本进程内生效。"""
+
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, rpm_limit: int = AI_RPM_LIMIT,
+                 tpm_limit: int = AI_TPM_LIMIT, max_retries: int = AI_MAX_RETRIES,
+                 base_delay: float = AI_RETRY_BASE_DELAY, max_delay: float = AI_RETRY_MAX_DELAY,
+                 state_file: Optional[str] = AI_RATE_STATE_FILE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.shared = SharedRateState(state_file) if state_file and (rpm_limit > 0 or tpm_limit > 0) else None
+        self.rpm = TokenBucket(rpm_limit) if rpm_limit > 0 and not self.shared else None
+        self.tpm = TokenBucket(tpm_limit) if tpm_limit > 0 and not self.shared else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.active = 0
+        # 实际 token 用量与估算值之比，用于校准之后的估算
+        self.estimate_ratio = 1.0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._timer = None
+        # 正在工作线程中向共享令牌桶申请额度的任务（SQLite 事务可能等待其他进程的锁，不在事件循环中执行）
+        self._taking = None
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.failures = 0
+        self.waited_seconds = 0.0
+
+    def _dispatch(self):
+        """按优先级发放名额，直到并发或速率限额用尽；速率不足时定时再次发放。"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._taking:
+            # 申请完成后会再次发放
+            return
+        while self._waiting and self.active < self.max_concurrency:
+            _, _, future, tokens = self._waiting[0]
+            if future.done():
+                # 等待中被取消，或已由 _take_shared 发放
+                heapq.heappop(self._waiting)
+                continue
+            wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                if self.shared:
+                    self._taking = asyncio.ensure_future(self._take_shared(future, tokens))
+                    return
+                wait = self._take_rate(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiting)
+            self.active += 1
+            future.set_result(None)
+
+    def _shared_amounts(self, tokens: int) -> Dict[str, Tuple[float, float]]:
+        amounts = {}
+        if self.rpm_limit > 0:
+            amounts["rpm"] = (self.rpm_limit, 1)
+        if self.tpm_limit > 0:
+            amounts["tpm"] = (self.tpm_limit, tokens)
+        return amounts
+
+    async def _take_shared(self, future: asyncio.Future, tokens: int):
+        """在工作线程中从共享令牌桶扣除额度，成功后把名额发给 future 对应的请求。"""
+        try:
+            wait = await asyncio.to_thread(self.shared.try_acquire, self._shared_amounts(tokens))
+        except Exception as e:
+            print(f"LOG: [AI调度] 读取共享令牌桶失败: {e}")
+            wait = 1.0
+        finally:
+            self._taking = None
+        if wait > 0:
+            self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+            return
+        if future.done():
+            # 申请期间请求被取消，退还额度
+            await asyncio.to_thread(self._refund_shared, tokens)
+        else:
+            self.active += 1
+            future.set_result(None)
+        self._dispatch()
+
+    def _refund_shared(self, tokens: int):
+        for name, (per_minute, amount) in self._shared_amounts(tokens).items():
+            self.shared.adjust(name, per_minute, -amount)
+
+    def _take_rate(self, tokens: int) -> float:
+        """按本进程的 RPM/TPM 令牌桶扣除一个请求和 tokens 个 token：成功时返回 0，额度不足时不扣除，返回还需等待的秒数。"""
+        wait = max(self.rpm.wait_time(1) if self.rpm else 0.0, self.tpm.wait_time(tokens) if self.tpm else 0.0)
+        if wait <= 0:
+            if self.rpm:
+                self.rpm.take(1)
+            if self.tpm:
+                self.tpm.take(tokens)
+        return wait
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    async def _acquire(self, tokens: int, priority: int, seq: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (-priority, seq, future, tokens))
+        self._dispatch()
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已发放但调用方被取消，归还名额
+                self._release()
+            raise
+        self.waited_seconds += time.monotonic() - started
+
+    async def call(self, request: Callable[[], Awaitable], estimated_tokens: int, priority: int = 0):
+        """
+        在调度器的限额内执行 request()（每次调用返回一个新的请求协程），返回其结果。
+        可重试的错误按退避重试 max_retries 次，其他错误和最后一次失败直接抛出。
+        """
+        seq = next(self._seq)
+        reserved = math.ceil(estimated_tokens * self.estimate_ratio) + COMPLETION_TOKEN_ESTIMATE
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(reserved, priority, seq)
+            try:
+                response = await request()
+            except Exception as e:
+                # 失败的请求不产生 token 用量，退还为本次尝试预留的 TPM 额度（请求已发出，RPM 额度照常计入）
+                await self._adjust_tpm(-reserved)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    delay = min(max(retry_after, 0.0), RETRY_AFTER_MAX_SECONDS)
+                if getattr(e, "status_code", None) == 429:
+                    self.rate_limited += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    if self.shared:
+                        await asyncio.to_thread(self.shared.pause, time.time() + delay)
+                self.retries += 1
+                print(f"LOG: [AI调度] 请求失败（{type(e).__name__}），{delay:.1f} 秒后第 {attempt + 1} 次重试。")
+            else:
+                self.requests += 1
+                await self._record_usage(response, estimated_tokens, reserved)
+                return response
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+
+    async def _record_usage(self, response, estimated_tokens: int, reserved: int):
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if not isinstance(total_tokens, int):
+            return
+        await self._adjust_tpm(total_tokens - reserved)
+        if isinstance(prompt_tokens, int) and prompt_tokens > 0 and estimated_tokens > 0:
+            self.estimate_ratio += ESTIMATE_SMOOTHING * (prompt_tokens / estimated_tokens - self.estimate_ratio)
+
+    async def _adjust_tpm(self, amount: float):
+        """修正 TPM 令牌桶：amount 为正时补扣，为负时退还。"""
+        if self.shared and self.tpm_limit > 0:
+            await asyncio.to_thread(self.shared.adjust, "tpm", self.tpm_limit, amount)
+        elif self.tpm:
+            self.tpm.adjust(amount)
+
+    def format_stats(self) -> str:
+        return (f"请求 {self.requests} 次 / 限流(429) {self.rate_limited} 次 / 重试 {self.retries} 次 / "
+                f"失败 {self.failures} 次 / 排队等待 {self.waited_seconds:.0f}s / 实际与估算 token 比 {self.estimate_ratio:.2f}")
+
+
+# (dispatcher, loop)，调度器的 Future 和定时器与创建它的事件循环绑定
+_dispatcher = None
+
+
+def get_ai_dispatcher() -> AiDispatcher:
+    """获取当前事件循环内共享的AI请求调度器，首次调用时创建。"""
+    global _dispatcher
+    loop = asyncio.get_running_loop()
+    if _dispatcher is None or _dispatcher[1] is not loop:
+        _dispatcher = (AiDispatcher(), loop)
+    return _dispatcher[0]
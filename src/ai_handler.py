@@ -1,14 +1,13 @@
 import asyncio
-import base64
 import json
 import os
-import re
 import sys
 import shutil
-from datetime import datetime
 from urllib.parse import urlencode, urlparse, urlunparse, parse_qsl
 
+import aiofiles
 import requests
+from openai import APIError
 
 # 设置标准输出编码为UTF-8，解决Windows控制台编码问题
 if sys.platform.startswith('win'):
@@ -18,7 +17,12 @@ if sys.platform.startswith('win'):
 
 from src.config import (
     AI_DEBUG_MODE,
+    AI_IMAGE_DEDUP_DISTANCE,
+    AI_MAX_IMAGES_PER_ITEM,
+    IMAGE_DOWNLOAD_CHUNK_SIZE,
+    IMAGE_DOWNLOAD_CONCURRENCY,
     IMAGE_DOWNLOAD_HEADERS,
+    IMAGE_DOWNLOAD_MAX_BYTES,
     IMAGE_SAVE_DIR,
     TASK_IMAGE_DIR_PREFIX,
     MODEL_NAME,
@@ -27,6 +31,7 @@ from src.config import (
     GOTIFY_TOKEN,
     BARK_URL,
     PCURL_TO_MOBILE,
+    STOCK_PHOTO_MIN_LISTINGS,
     WX_BOT_URL,
     TELEGRAM_BOT_TOKEN,
     TELEGRAM_CHAT_ID,
@@ -38,6 +43,21 @@ from src.config import (
     WEBHOOK_BODY,
     client,
 )
+from src.ai_dispatcher import estimate_prompt_tokens, get_ai_dispatcher
+from src.ai_request_log import log_ai_request, should_log_request
+from src.ai_verdict_cache import listing_cache_key
+from src.http_client import get_http_client, host_slot
+from src.image_cache import get_image_cache
+from src.image_pipeline import (
+    MIME_EXTENSIONS,
+    image_dhash,
+    image_size,
+    prepare_ai_image,
+    select_diverse_images,
+    sniff_image_mime,
+    to_data_url,
+    variant_name,
+)
 from src.utils import convert_goofish_link, retry_on_failure
 
 
@@ -54,65 +74,206 @@ def safe_print(text):
             print("[输出包含无法显示的字符]")
 
 
+# {事件循环: 信号量}，限制本进程内所有任务同时下载的图片数
+_download_semaphores = {}
+
+
+def _get_download_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _download_semaphores.get(loop)
+    if semaphore is None:
+        _download_semaphores.clear()
+        semaphore = _download_semaphores[loop] = asyncio.Semaphore(IMAGE_DOWNLOAD_CONCURRENCY)
+    return semaphore
+
+
 @retry_on_failure(retries=2, delay=3)
 async def _download_single_image(url, save_path):
-    """一个带重试的内部函数，用于异步下载单个图片。"""
-    loop = asyncio.get_running_loop()
-    # 使用 run_in_executor 运行同步的 requests 代码，避免阻塞事件循环
-    response = await loop.run_in_executor(
-        None,
-        lambda: requests.get(url, headers=IMAGE_DOWNLOAD_HEADERS, timeout=20, stream=True)
-    )
-    response.raise_for_status()
-    with open(save_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    """
+    一个带重试的内部函数，用于异步下载单个图片到磁盘。
+    旧流程（download_all_images）使用；当前的分析流程通过 _fetch_image_bytes 下载到内存。
+    """
+    # 通过共享的 keep-alive 客户端流式下载，边收边写入临时文件（aiofiles 在线程中写盘，不阻塞事件循环），
+    # 完成后再改名，避免中断的下载留下不完整的图片被下次当作"已存在"跳过
+    tmp_path = f"{save_path}.part"
+    async with _get_download_semaphore(), host_slot(url):
+        async with get_http_client().stream(
+                "GET", url, headers=IMAGE_DOWNLOAD_HEADERS, timeout=20, follow_redirects=True) as response:
+            response.raise_for_status()
+            try:
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes(IMAGE_DOWNLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
+                os.replace(tmp_path, save_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
     return save_path
 
 
+@retry_on_failure(retries=2, delay=3)
+async def _fetch_image_bytes(url):
+    """一个带重试的内部函数，把单个图片流式下载到内存。"""
+    async with _get_download_semaphore(), host_slot(url):
+        async with get_http_client().stream(
+                "GET", url, headers=IMAGE_DOWNLOAD_HEADERS, timeout=20, follow_redirects=True) as response:
+            response.raise_for_status()
+            data = bytearray()
+            async for chunk in response.aiter_bytes(IMAGE_DOWNLOAD_CHUNK_SIZE):
+                data += chunk
+                if len(data) > IMAGE_DOWNLOAD_MAX_BYTES:
+                    raise ValueError(f"图片超过 {IMAGE_DOWNLOAD_MAX_BYTES // (1024 * 1024)} MB，已放弃下载")
+    return bytes(data)
+
+
+def _read_cached_image(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return to_data_url(data, sniff_image_mime(data)), image_dhash(data), image_size(data)
+
+
+def _process_image(raw):
+    data, mime = prepare_ai_image(raw)
+    return data, mime, image_dhash(data), image_size(data)
+
+
+def _process_image_file(path):
+    """读取本地图片文件，与下载的图片一样缩小、重新编码，返回 (data URL, 尺寸)。"""
+    with open(path, "rb") as f:
+        data, mime, _, size = _process_image(f.read())
+    return to_data_url(data, mime), size
+
+
+# 批量模式（只发送文本）结论的缓存命名空间
+TEXT_ONLY_NAMESPACE = "text-only"
+
+
+def _ai_image_urls(image_urls):
+    return [url.strip() for url in image_urls or [] if url.strip().startswith('http')]
+
+
+def ai_verdict_cache_key(product_data, image_urls, prompt_text, text_only=False):
+    """
+    计算AI结论缓存的键（见 src/ai_verdict_cache），图片按共享图片缓存中处理后的内容哈希参与计算。
+    有图片尚未按当前处理参数缓存时返回 None：需要先调用 prepare_images_for_ai。
+    text_only 为批量模式（只发送文本）的结论：模型没有看到图片，依据不同，因此有意放在单独的命名空间，
+    与带图片分析的结论互不复用（即使商品没有图片）。批量模式的记录没有 "图片信息"，该字段本就不参与缓存键。
+    """
+    if text_only:
+        return listing_cache_key(product_data, [], MODEL_NAME, prompt_text, namespace=TEXT_ONLY_NAMESPACE)
+    digests = get_image_cache().content_digests(_ai_image_urls(image_urls), variant_name())
+    if digests is None:
+        return None
+    return listing_cache_key(product_data, digests, MODEL_NAME, prompt_text)
+
+
+async def prepare_images_for_ai(product_id, image_urls):
+    """
+    获取一个商品发给 AI 的图片，返回 (base64 data URL 列表, 图片信息, 图片尺寸列表)，图片顺序与 image_urls 一致。
+    图片尺寸为处理后每张图片的 (宽, 高)（无法识别时为 None），传给 get_ai_analysis 估算图片 token。
+
+    图片下载到内存后直接缩小并重新编码（见 src/image_pipeline），不经过原图的临时文件；
+    处理结果按处理参数存入共享图片缓存，其他任务或之后的重新分析直接复用。
+    近似重复的图片只保留一张，超过 AI_MAX_IMAGES_PER_ITEM 时按多样性挑选。
+    图片信息记录各环节的图片数，以及出现在至少 STOCK_PHOTO_MIN_LISTINGS 个其他商品中的疑似网图数。
+    """
+    urls = _ai_image_urls(image_urls)
+    image_info = {"图片总数": len(urls), "近似重复": 0, "超出数量上限": 0, "疑似网图": 0, "发送给AI": 0}
+    if not urls:
+        return [], image_info, []
+
+    cache = get_image_cache()
+    variant = variant_name()
+    total_images = len(urls)
+
+    async def prepare(i, url):
+        try:
+            cached_path = cache.get(url, variant)
+            if cached_path:
+                try:
+                    return await asyncio.to_thread(_read_cached_image, cached_path)
+                except FileNotFoundError:
+                    # 刚被其他进程淘汰，重新下载
+                    pass
+
+            raw = await _fetch_image_bytes(url)
+            if not raw:
+                return None
+            data, mime, dhash, size = await asyncio.to_thread(_process_image, raw)
+            await asyncio.to_thread(cache.add_bytes, url, data, MIME_EXTENSIONS.get(mime, ".jpg"), variant)
+            safe_print(f"   [图片] 图片 {i + 1}/{total_images} 已下载并处理: "
+                       f"{len(raw) / 1024:.0f} KB -> {len(data) / 1024:.0f} KB ({mime})")
+            return to_data_url(data, mime), dhash, size
+        except Exception as e:
+            safe_print(f"   [图片] 处理图片 {url} 时发生错误，已跳过此图: {e}")
+            return None
+
+    # 同一商品的图片同时下载和处理；结果保持原有顺序
+    prepared = [result for result in await asyncio.gather(*(prepare(i, url) for i, url in enumerate(urls))) if result]
+    hashes = [dhash for _, dhash, _ in prepared]
+    unique = select_diverse_images(hashes, 0, AI_IMAGE_DEDUP_DISTANCE)
+    selected = select_diverse_images(hashes, AI_MAX_IMAGES_PER_ITEM, AI_IMAGE_DEDUP_DISTANCE)
+    image_info["近似重复"] = len(prepared) - len(unique)
+    image_info["超出数量上限"] = len(unique) - len(selected)
+
+    # 记录到跨商品的哈希索引，统计被许多其他商品使用的图片
+    listings = await asyncio.to_thread(
+        cache.record_item_hashes, product_id, [hashes[i] for i in unique if hashes[i] is not None])
+    image_info["疑似网图"] = sum(count >= STOCK_PHOTO_MIN_LISTINGS for count in listings)
+
+    results = [prepared[i][0] for i in selected]
+    sizes = [prepared[i][2] for i in selected]
+    image_info["发送给AI"] = len(results)
+    safe_print(f"   [图片] 商品 #{product_id} 共 {total_images} 张图片，近似重复 {image_info['近似重复']} 张，"
+               f"超出数量上限 {image_info['超出数量上限']} 张，疑似网图 {image_info['疑似网图']} 张；"
+               f"发送给AI {len(results)} 张，图片数据 {sum(len(data_url) for data_url in results) / 1024:.0f} KB")
+    return results, image_info, sizes
+
+
 async def download_all_images(product_id, image_urls, task_name="default"):
-    """异步下载一个商品的所有图片。如果图片已存在则跳过。支持任务隔离。"""
+    """
+    【旧流程，仅供 scraper_old 使用】异步并发获取一个商品的所有原图，返回本地路径。
+    当前的分析流程使用 prepare_images_for_ai（下载到内存、缩小并重新编码后放入缓存），不再调用本函数。
+    图片来自跨任务共享的图片缓存（src/image_cache），缓存中没有的才下载并放入缓存；
+    返回的文件由缓存管理，调用方不应删除。
+    """
     if not image_urls:
         return []
 
-    # 为每个任务创建独立的图片目录
-    task_image_dir = os.path.join(IMAGE_SAVE_DIR, f"{TASK_IMAGE_DIR_PREFIX}{task_name}")
-    os.makedirs(task_image_dir, exist_ok=True)
-
     urls = [url.strip() for url in image_urls if url.strip().startswith('http')]
     if not urls:
         return []
 
-    saved_paths = []
+    cache = get_image_cache()
     total_images = len(urls)
-    for i, url in enumerate(urls):
+
+    async def download(i, url):
         try:
-            clean_url = url.split('.heic')[0] if '.heic' in url else url
-            file_name_base = os.path.basename(clean_url).split('?')[0]
-            file_name = f"product_{product_id}_{i + 1}_{file_name_base}"
-            file_name = re.sub(r'[\\/*?:"<>|]', "", file_name)
-            if not os.path.splitext(file_name)[1]:
-                file_name += ".jpg"
-
-            save_path = os.path.join(task_image_dir, file_name)
-
-            if os.path.exists(save_path):
-                safe_print(f"   [图片] 图片 {i + 1}/{total_images} 已存在，跳过下载: {os.path.basename(save_path)}")
-                saved_paths.append(save_path)
-                continue
+            cached_path = cache.get(url)
+            if cached_path:
+                safe_print(f"   [图片] 图片 {i + 1}/{total_images} 命中缓存，跳过下载: {os.path.basename(cached_path)}")
+                return cached_path
 
             safe_print(f"   [图片] 正在下载图片 {i + 1}/{total_images}: {url}")
-            if await _download_single_image(url, save_path):
-                safe_print(f"   [图片] 图片 {i + 1}/{total_images} 已成功下载到: {os.path.basename(save_path)}")
-                saved_paths.append(save_path)
+            tmp_path = cache.temp_path(url)
+            if not await _download_single_image(url, tmp_path):
+                return None
+            # 计算内容哈希并移入缓存（读取文件，放到线程中执行）
+            saved_path = await asyncio.to_thread(cache.add, url, tmp_path)
+            safe_print(f"   [图片] 图片 {i + 1}/{total_images} 已成功下载到: {os.path.basename(saved_path)}")
+            return saved_path
         except Exception as e:
             safe_print(f"   [图片] 处理图片 {url} 时发生错误，已跳过此图: {e}")
+            return None
 
-    return saved_paths
+    # 同一商品的图片同时下载，总耗时约等于最慢的一张；结果保持原有顺序
+    results = await asyncio.gather(*(download(i, url) for i, url in enumerate(urls)))
+    return [path for path in results if path]
 
 
 def cleanup_task_images(task_name):
-    """清理指定任务的图片目录"""
+    """清理指定任务的图片目录（旧版本按任务保存的临时图片；现在图片保存在共享的图片缓存中）"""
     task_image_dir = os.path.join(IMAGE_SAVE_DIR, f"{TASK_IMAGE_DIR_PREFIX}{task_name}")
     if os.path.exists(task_image_dir):
         try:
@@ -120,20 +281,6 @@ def cleanup_task_images(task_name):
             safe_print(f"   [清理] 已删除任务 '{task_name}' 的临时图片目录: {task_image_dir}")
         except Exception as e:
             safe_print(f"   [清理] 删除任务 '{task_name}' 的临时图片目录时出错: {e}")
-    else:
-        safe_print(f"   [清理] 任务 '{task_name}' 的临时图片目录不存在: {task_image_dir}")
-
-
-def encode_image_to_base64(image_path):
-    """将本地图片文件编码为 Base64 字符串。"""
-    if not image_path or not os.path.exists(image_path):
-        return None
-    try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    except Exception as e:
-        safe_print(f"编码图片时出错: {e}")
-        return None
 
 
 def validate_ai_response_format(parsed_response):
@@ -499,9 +646,13 @@ async def send_ntfy_notification(product_data, reason):
             safe_print(f"   -> 发送 Webhook 通知时发生未知错误: {e}")
 
 
-@retry_on_failure(retries=3, delay=5)
-async def get_ai_analysis(product_data, image_paths=None, prompt_text=""):
-    """将完整的商品JSON数据和所有图片发送给 AI 进行分析（异步）。"""
+async def get_ai_analysis(product_data, image_paths=None, prompt_text="", image_data_urls=None, usage=None, priority=0,
+                          image_sizes=None):
+    """
+    将完整的商品JSON数据和所有图片发送给 AI 进行分析（异步）。
+    image_sizes 为 image_data_urls 中各图片的 (宽, 高)（prepare_images_for_ai 的返回值），用于估算图片 token。
+    请求经过共享的AI调度器（见 src/ai_dispatcher），priority 越大越先发出；限流和临时错误由调度器退避重试。
+    """
     if not client:
         safe_print("   [AI分析] 错误：AI客户端未初始化，跳过分析。")
         return None
@@ -509,7 +660,7 @@ async def get_ai_analysis(product_data, image_paths=None, prompt_text=""):
     item_info = product_data.get('商品信息', {})
     product_id = item_info.get('商品ID', 'N/A')
 
-    safe_print(f"\n   [AI分析] 开始分析商品 #{product_id} (含 {len(image_paths or [])} 张图片)...")
+    safe_print(f"\n   [AI分析] 开始分析商品 #{product_id} (含 {len(image_data_urls or []) + len(image_paths or [])} 张图片)...")
     safe_print(f"   [AI分析] 标题: {item_info.get('商品标题', '无')}")
 
     if not prompt_text:
@@ -537,43 +688,38 @@ async def get_ai_analysis(product_data, image_paths=None, prompt_text=""):
 """
     user_content_list = []
 
-    # 先添加图片内容
-    if image_paths:
-        for path in image_paths:
-            base64_image = encode_image_to_base64(path)
-            if base64_image:
-                user_content_list.append(
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}})
+    # 先添加图片内容：prepare_images_for_ai 处理好的 data URL，或本地图片文件（同样在线程中缩小并重新编码）
+    image_sizes = list(image_sizes) if image_sizes else [None] * len(image_data_urls or [])
+    for data_url in image_data_urls or []:
+        user_content_list.append({"type": "image_url", "image_url": {"url": data_url}})
+    for path in image_paths or []:
+        try:
+            data_url, size = await asyncio.to_thread(_process_image_file, path)
+        except OSError as e:
+            safe_print(f"   [图片] 读取本地图片 {path} 时出错，已跳过此图: {e}")
+            continue
+        user_content_list.append({"type": "image_url", "image_url": {"url": data_url}})
+        image_sizes.append(size)
 
     # 再添加文本内容
     user_content_list.append({"type": "text", "text": combined_text_prompt})
 
     messages = [{"role": "user", "content": user_content_list}]
 
-    # 保存最终传输内容到日志文件
-    try:
-        # 创建logs文件夹
-        logs_dir = "logs"
-        os.makedirs(logs_dir, exist_ok=True)
-
-        # 生成日志文件名（当前时间）
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"{current_time}.log"
-        log_filepath = os.path.join(logs_dir, log_filename)
-
-        # 准备日志内容 - 直接保存原始传输内容
-        log_content = json.dumps(messages, ensure_ascii=False)
-
-        # 写入日志文件
-        with open(log_filepath, 'w', encoding='utf-8') as f:
-            f.write(log_content)
-
-        safe_print(f"   [日志] AI分析请求已保存到: {log_filepath}")
-
-    except Exception as e:
-        safe_print(f"   [日志] 保存AI分析日志时出错: {e}")
+    # 按抽样比例把最终传输内容放入 AI 请求归档（后台批量写入，图片只保存引用）
+    if should_log_request():
+        try:
+            log_filepath = log_ai_request(product_data.get('任务名称', 'Untitled Task'), product_id, messages)
+            if log_filepath:
+                safe_print(f"   [日志] AI分析请求将保存到: {log_filepath}")
+        except Exception as e:
+            safe_print(f"   [日志] 保存AI分析日志时出错: {e}")
 
     # 增强的AI调用，包含更严格的格式控制和重试机制
+    dispatcher = get_ai_dispatcher()
+    estimated_tokens = estimate_prompt_tokens(messages, image_sizes)
+    # 由调度器统一重试，关闭 SDK 自带的重试
+    ai_client = client.with_options(max_retries=0)
     max_retries = 3
     for attempt in range(max_retries):
         try:
@@ -582,17 +728,22 @@ async def get_ai_analysis(product_data, image_paths=None, prompt_text=""):
 
             from src.config import get_ai_request_params
             
-            response = await client.chat.completions.create(
-                **get_ai_request_params(
-                    model=MODEL_NAME,
-                    messages=messages,
-                    response_format={"type": "json_object"},
-                    temperature=current_temperature,
-                    max_tokens=4000
-                )
+            request_params = get_ai_request_params(
+                model=MODEL_NAME,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=current_temperature,
+                max_tokens=4000
             )
+            response = await dispatcher.call(
+                lambda: ai_client.chat.completions.create(**request_params), estimated_tokens, priority)
 
             ai_response_content = response.choices[0].message.content
+            # 调用方传入 usage 字典时累计本次分析（含重试）消耗的 token
+            response_usage = getattr(response, "usage", None)
+            if usage is not None and response_usage is not None:
+                usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (response_usage.prompt_tokens or 0)
+                usage["completion_tokens"] = usage.get("completion_tokens", 0) + (response_usage.completion_tokens or 0)
 
             if AI_DEBUG_MODE:
                 safe_print(f"\n--- [AI DEBUG] 第{attempt + 1}次尝试 ---")
@@ -663,6 +814,10 @@ async def get_ai_analysis(product_data, image_paths=None, prompt_text=""):
                     else:
                         raise json.JSONDecodeError("No valid JSON object found", ai_response_content, 0)
 
+        except APIError as e:
+            # 调度器已按退避重试过，不再重复请求
+            safe_print(f"   [AI分析] AI调用失败: {e}")
+            raise
         except Exception as e:
             safe_print(f"   [AI分析] 第{attempt + 1}次尝试AI调用失败: {e}")
             if attempt < max_retries - 1:
@@ -0,0 +1,290 @@
+"""
+AI 请求归档。
+
+按 AI_REQUEST_LOG_SAMPLE_RATE 抽样，把发给 AI 的请求追加到 logs/ai_requests/<任务名>.jsonl
+（按大小/每天轮转并压缩，见 src/task_logs.RotatingLogFile）。请求中以 base64 内联的商品图片不写入日志，
+而是按内容的 SHA-256 存入去重的图片库 logs/ai_requests/blobs/，日志中只记录引用：
+同一张图片无论重试多少次、被多少次运行分析，都只落盘一次。
+
+get_ai_analysis 只把请求放进有界队列（队列满时丢弃该条日志，不阻塞分析），后台协程攒批后
+在线程中完成图片解码、哈希和写盘。保留策略：超过 AI_REQUEST_LOG_RETENTION_DAYS 天未被引用的图片
+和日志分段会被删除，日志与图片的总大小超过 AI_REQUEST_LOG_MAX_BYTES 时按最久未使用的顺序删除。
+进程退出前需调用 close_ai_request_log() 写完队列中的日志。
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.config import AI_REQUEST_LOG_MAX_BYTES, AI_REQUEST_LOG_RETENTION_DAYS, AI_REQUEST_LOG_SAMPLE_RATE
+from src.task_logs import RotatingLogFile, task_log_filename
+
+AI_REQUEST_LOG_DIR = os.path.join("logs", "ai_requests")
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 1.0
+QUEUE_SIZE = 200
+# 保留策略的检查间隔（秒）
+SWEEP_INTERVAL = 3600
+
+DATA_URL_PATTERN = re.compile(r"data:image/([\w.+-]+);base64,", re.ASCII)
+
+_CLOSE = object()
+
+
+class BlobStore:
+    """按内容哈希存放图片，相同内容只写一次。"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._known = set()
+
+    def relative_path(self, digest: str, extension: str) -> str:
+        return f"blobs/{digest[:2]}/{digest}.{extension}"
+
+    def put(self, data: bytes, extension: str) -> Tuple[str, int]:
+        """保存内容，返回 (相对路径, 新写入的字节数)；已存在时只刷新修改时间（供保留策略判断）。"""
+        digest = hashlib.sha256(data).hexdigest()
+        relative = self.relative_path(digest, extension)
+        path = os.path.join(self.directory, relative)
+        if relative in self._known or os.path.exists(path):
+            self._known.add(relative)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # 已被保留策略删除，重新写入
+                self._known.discard(relative)
+                return self.put(data, extension)
+            return relative, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._known.add(relative)
+        return relative, len(data)
+
+    def forget(self):
+        self._known.clear()
+
+
+def strip_inline_images(messages: list, blobs: BlobStore) -> Tuple[list, int, int]:
+    """
+    返回把内联 base64 图片替换为图片库引用后的消息副本（不修改原消息），
+    以及 (新写入的图片字节数, 已存在而跳过的图片数)。
+    """
+    written = skipped = 0
+    result = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, list):
+            result.append(message)
+            continue
+        parts = []
+        for part in content:
+            url = (part.get("image_url") or {}).get("url", "") if part.get("type") == "image_url" else ""
+            match = DATA_URL_PATTERN.match(url)
+            if not match:
+                parts.append(part)
+                continue
+            try:
+                data = base64.b64decode(url[match.end():], validate=True)
+            except (binascii.Error, ValueError):
+                parts.append(part)
+                continue
+            extension = "jpg" if match.group(1) == "jpeg" else match.group(1)
+            relative, new_bytes = blobs.put(data, extension)
+            written += new_bytes
+            skipped += new_bytes == 0
+            parts.append({"type": "image_url", "image_url": {
+                "url": f"blob:sha256:{os.path.basename(relative).split('.')[0]}",
+                "blob": relative,
+                "bytes": len(data),
+            }})
+        result.append({**message, "content": parts})
+    return result, written, skipped
+
+
+class AiRequestLog:
+    """AI 请求日志的批量写入器。"""
+
+    def __init__(self, directory: str = AI_REQUEST_LOG_DIR, max_bytes: int = AI_REQUEST_LOG_MAX_BYTES,
+                 retention_days: float = AI_REQUEST_LOG_RETENTION_DAYS, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, queue_size: int = QUEUE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_days * 86400
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        # 单个日志分段最多占总上限的 1/10
+        self.segment_bytes = max(1024 * 1024, max_bytes // 10)
+        self.blobs = BlobStore(directory)
+        self.records = 0
+        self.dropped = 0
+        self.log_bytes = 0
+        self.blob_bytes = 0
+        self.blobs_skipped = 0
+        self._files: Dict[str, RotatingLogFile] = {}
+        self._last_sweep = 0.0
+        self._written_since_sweep = 0
+        self._queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._task = asyncio.ensure_future(self._run())
+        self._closed = False
+
+    def submit(self, task_name: str, product_id, messages: list) -> bool:
+        """提交一次请求，不等待；队列已满时丢弃并返回 False。"""
+        if self._closed:
+            return False
+        entry = {"time": datetime.now().isoformat(), "task": task_name, "product_id": product_id, "messages": messages}
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    def log_path(self, task_name: str) -> str:
+        return os.path.join(self.directory, task_log_filename(task_name)[:-len(".log")] + ".jsonl")
+
+    async def close(self):
+        """写出队列中剩余的日志并结束后台协程。"""
+        if self._closed:
+            return
+        self._closed = True
+        await self._queue.put(_CLOSE)
+        await self._task
+        for log in self._files.values():
+            log.wait()
+            log.close()
+
+    async def _run(self):
+        batch = []
+        deadline = 0.0
+        closing = False
+        get_task = None
+        while not closing:
+            if get_task is None:
+                get_task = asyncio.ensure_future(self._queue.get())
+            # 批次为空时一直等待第一条；否则最多等到批次的刷新期限
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            done, _ = await asyncio.wait({get_task}, timeout=timeout)
+            if get_task in done:
+                entry, get_task = get_task.result(), None
+                if entry is _CLOSE:
+                    closing = True
+                else:
+                    if not batch:
+                        deadline = time.monotonic() + self.flush_interval
+                    batch.append(entry)
+            if batch and (closing or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                try:
+                    await asyncio.to_thread(self._flush, batch)
+                except OSError as e:
+                    print(f"LOG: 写入AI请求日志出错: {e}（本批 {len(batch)} 条未保存）")
+                batch = []
+
+    def _flush(self, batch: List[dict]):
+        lines: Dict[str, List[str]] = {}
+        written = 0
+        for entry in batch:
+            messages, blob_bytes, skipped = strip_inline_images(entry["messages"], self.blobs)
+            written += blob_bytes
+            self.blob_bytes += blob_bytes
+            self.blobs_skipped += skipped
+            record = {**entry, "messages": messages}
+            lines.setdefault(entry["task"], []).append(json.dumps(record, ensure_ascii=False) + "\n")
+        for task_name, task_lines in lines.items():
+            log = self._files.get(task_name)
+            if log is None:
+                log = self._files[task_name] = RotatingLogFile(
+                    self.log_path(task_name), max_bytes=self.segment_bytes, rotate_hours=24, backups=10000)
+            data = "".join(task_lines).encode("utf-8")
+            log.write(data)
+            written += len(data)
+            self.log_bytes += len(data)
+        self.records += len(batch)
+        # 定期检查保留策略；写入量较大时提前检查，使总大小不会明显超过上限
+        self._written_since_sweep += written
+        if (time.monotonic() - self._last_sweep >= SWEEP_INTERVAL
+                or self._written_since_sweep >= self.segment_bytes):
+            self.sweep()
+
+    def sweep(self) -> int:
+        """
+        执行保留策略，返回删除的文件数：先删除超过保留天数的分段和图片，
+        总大小仍超过上限时按修改时间从旧到新删除（当前正在写入的日志文件不删除）。
+        """
+        self._last_sweep = time.monotonic()
+        self._written_since_sweep = 0
+        candidates, total = [], 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                total += stat.st_size
+                # 当前日志文件（*.jsonl）与写入中的临时文件不参与删除
+                if not name.endswith((".jsonl", ".tmp")):
+                    candidates.append((stat.st_mtime, stat.st_size, path))
+        candidates.sort()
+        expire_before = time.time() - self.retention_seconds
+        removed = 0
+        for mtime, size, path in candidates:
+            if mtime >= expire_before and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            self.blobs.forget()
+        return removed
+
+    def format_stats(self) -> str:
+        return (f"记录 {self.records} 条（丢弃 {self.dropped} 条），日志 {self.log_bytes / 1024:.1f} KB，"
+                f"新增图片 {self.blob_bytes / 1024:.1f} KB，重复图片 {self.blobs_skipped} 张")
+
+
+# 写入器与创建它的事件循环绑定
+_log: Optional[Tuple[AiRequestLog, asyncio.AbstractEventLoop]] = None
+
+
+def get_ai_request_log() -> AiRequestLog:
+    """获取当前事件循环内共享的 AI 请求日志写入器，首次调用时创建。"""
+    global _log
+    loop = asyncio.get_running_loop()
+    if _log is None or _log[1] is not loop or _log[0]._closed:
+        _log = (AiRequestLog(), loop)
+    return _log[0]
+
+
+async def close_ai_request_log():
+    """写完并关闭当前事件循环中的 AI 请求日志（进程退出或收到 SIGTERM 时调用）。"""
+    global _log
+    if _log is None or _log[1] is not asyncio.get_running_loop():
+        return
+    log, _ = _log
+    _log = None
+    await log.close()
+    if log.records or log.dropped:
+        print(f"LOG: [AI请求日志] {log.format_stats()}")
+
+
+def should_log_request(sample_rate: float = AI_REQUEST_LOG_SAMPLE_RATE) -> bool:
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def log_ai_request(task_name: str, product_id, messages: list) -> Optional[str]:
+    """把一次 AI 请求放入归档队列（不等待写盘），返回归档文件路径；队列已满时返回 None。"""
+    log = get_ai_request_log()
+    return log.log_path(task_name) if log.submit(task_name, product_id, messages) else None
@@ -0,0 +1,211 @@
+"""
+按商品内容缓存 AI 分析结论（ENABLE_AI_CACHE=true 时启用，默认启用）。
+
+全局注册表按商品ID复用结论，但同一商品被重新发布（新ID）、结果文件被删除后重新分析，
+或被另一个任务抓到时，内容没有变化，仍会重新下载图片并调用AI。
+本缓存的键是以下内容的稳定哈希：规范化后的商品数据（去掉爬取时间、商品ID、链接、想要人数等易变字段）、
+各图片的内容哈希（来自共享图片缓存，见 src/image_cache）、模型名称和最终的 prompt 文本。
+命中时跳过图片下载和AI调用。批量模式（只发送文本）的结论使用单独的命名空间，
+与看过图片得出的结论互不复用。
+
+缓存保存在 SQLite（WAL 模式，多个任务进程共用），超过 AI_CACHE_TTL_HOURS 的结论失效，
+条目数超过 AI_CACHE_MAX_ENTRIES 时按最近使用时间淘汰。命中率和节省的 token 数在内存中累加，
+任务结束时（flush_counters）一次性记入 counters 表。
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from src.config import (
+    AI_CACHE_FILE,
+    AI_CACHE_MAX_ENTRIES,
+    AI_CACHE_TTL_HOURS,
+    ENABLE_AI_CACHE,
+)
+
+COUNTER_NAMES = ("hits", "misses", "saved_prompt_tokens", "saved_completion_tokens")
+
+# 不影响分析结论、但每次抓取或重新发布都会变化的字段
+VOLATILE_RECORD_FIELDS = ("爬取时间", "搜索关键字", "任务名称", "图片信息", "ai_analysis")
+VOLATILE_ITEM_FIELDS = ("商品ID", "商品链接", "“想要”人数", "浏览量", "发布时间", "商品主图链接", "商品图片列表")
+# 每淘汰检查一次之间写入的条目数
+EVICT_CHECK_INTERVAL = 100
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def normalize_record(record: dict) -> dict:
+    """去掉易变字段并规范化空白，得到用于缓存键的商品数据。"""
+    normalized = {key: value for key, value in record.items() if key not in VOLATILE_RECORD_FIELDS}
+    item = normalized.get("商品信息")
+    if isinstance(item, dict):
+        normalized["商品信息"] = {key: value for key, value in item.items() if key not in VOLATILE_ITEM_FIELDS}
+    return _normalize(normalized)
+
+
+def listing_cache_key(record: dict, image_digests: List[str], model: str, prompt_text: str,
+                      namespace: Optional[str] = None) -> str:
+    """namespace 区分不同分析方式的结论（如批量模式的 "text-only"），默认的带图片分析不设置。"""
+    payload = {
+        "record": normalize_record(record),
+        "images": image_digests,
+        "model": model,
+        "prompt": hashlib.sha256(prompt_text.encode("utf-8")).hexdigest(),
+    }
+    if namespace:
+        payload["namespace"] = namespace
+    return hashlib.sha256(
+        json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class AiVerdictCache:
+    def __init__(self, db_path: str = AI_CACHE_FILE, ttl_hours: float = AI_CACHE_TTL_HOURS,
+                 max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " cache_key TEXT PRIMARY KEY, verdict_json TEXT NOT NULL, prompt_tokens INTEGER NOT NULL,"
+            " completion_tokens INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # 本进程内的计数只在内存中累加，任务结束时由 flush_counters 一次性累加到 counters 表中供 Web 服务读取
+        self.counters = {name: 0 for name in COUNTER_NAMES}
+        self._flushed = {name: 0 for name in COUNTER_NAMES}
+        self._puts_since_evict = 0
+
+    def _count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def get(self, cache_key: str) -> Optional[dict]:
+        """返回未过期的结论并刷新其使用时间；命中时把该结论当初消耗的 token 计入节省数。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict_json, prompt_tokens, completion_tokens FROM verdicts"
+                " WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, time.time() - self.ttl_seconds)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE verdicts SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+                self._count("hits")
+                self._count("saved_prompt_tokens", row[1])
+                self._count("saved_completion_tokens", row[2])
+            else:
+                self._count("misses")
+        return json.loads(row[0]) if row else None
+
+    def put(self, cache_key: str, verdict: dict, prompt_tokens: int = 0, completion_tokens: int = 0):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts"
+                " (cache_key, verdict_json, prompt_tokens, completion_tokens, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, json.dumps(verdict, ensure_ascii=False), prompt_tokens, completion_tokens, now, now)
+            )
+            self._puts_since_evict += 1
+            check = self._puts_since_evict >= EVICT_CHECK_INTERVAL
+        if check:
+            self.evict()
+
+    def evict(self) -> int:
+        """删除过期条目，并在条目数超过上限时按最近使用时间淘汰，返回删除的行数。"""
+        with self._lock:
+            self._puts_since_evict = 0
+            deleted = self._conn.execute(
+                "DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0] - self.max_entries
+            if excess > 0:
+                deleted += self._conn.execute(
+                    "DELETE FROM verdicts WHERE cache_key IN"
+                    " (SELECT cache_key FROM verdicts ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                ).rowcount
+        return deleted
+
+    def entry_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def flush_counters(self):
+        """把上次保存以来的本进程计数累加到 counters 表中。"""
+        with self._lock:
+            for name in COUNTER_NAMES:
+                delta = self.counters[name] - self._flushed[name]
+                if delta:
+                    self._conn.execute(
+                        "INSERT INTO counters (name, value) VALUES (?, ?)"
+                        " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                        (name, delta)
+                    )
+                    self._flushed[name] = self.counters[name]
+
+    def lifetime_counters(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM counters").fetchall()
+        counters = {name: 0 for name in COUNTER_NAMES}
+        counters.update(dict(rows))
+        return counters
+
+    def close(self):
+        self.flush_counters()
+        with self._lock:
+            self._conn.close()
+
+    def format_stats(self) -> str:
+        return format_counters(self.counters)
+
+
+def summarize_counters(counters: dict) -> dict:
+    total = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "hit_rate": round(counters["hits"] / total, 4) if total else 0.0,
+        "saved_tokens": counters["saved_prompt_tokens"] + counters["saved_completion_tokens"],
+    }
+
+
+def format_counters(counters: dict) -> str:
+    summary = summarize_counters(counters)
+    return (
+        f"命中 {summary['hits']}/{summary['hits'] + summary['misses']} ({summary['hit_rate']:.1%})，"
+        f"节省 {summary['hits']} 次AI调用、{summary['saved_tokens']} 个 token"
+        f"（输入 {summary['saved_prompt_tokens']}，输出 {summary['saved_completion_tokens']}）。"
+    )
+
+
+_cache = None
+
+
+def get_ai_verdict_cache() -> Optional[AiVerdictCache]:
+    """获取进程内共享的AI结论缓存；未启用时返回 None。"""
+    global _cache
+    if not ENABLE_AI_CACHE:
+        return None
+    if _cache is None:
+        _cache = AiVerdictCache()
+    return _cache
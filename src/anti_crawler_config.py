@@ -94,13 +94,62 @@ STEALTH_CONFIG = {
     }
 }
 
-# 延迟策略配置
-DELAY_STRATEGY = {
-    "page_load_delay": (2, 4),  # 页面加载延迟范围
-    "action_delay": (1, 3),     # 操作间延迟范围
-    "item_delay": (15, 30),     # 商品处理延迟范围
-    "page_delay": (25, 50),     # 翻页延迟范围
-    "retry_delay": (60, 300),   # 重试延迟范围
+# 浏览器页面资源拦截策略
+# 爬虫只读取页面发出的 mtop 接口JSON，图片、视频、字体、样式和第三方统计请求都可以直接拦截
+RESOURCE_BLOCKING_POLICY = {
+    # 始终放行的主机（后缀匹配）：mtop 接口域名，以及风控指纹/验证相关的域名（拦截后更容易触发验证）
+    "allowed_hosts": [
+        "h5api.m.goofish.com",
+        "h5api.m.taobao.com",
+        "acs.m.goofish.com",
+        "aliapp.org",
+        "baxia.alibaba.com",
+    ],
+    # 按资源类型拦截
+    "blocked_resource_types": ["image", "media", "font", "stylesheet"],
+    # 第三方统计与埋点主机（后缀匹配），无论资源类型一律拦截
+    "tracker_hosts": [
+        "mmstat.com",
+        "arms-retcode.aliyuncs.com",
+        "aplus.alibaba.com",
+        "google-analytics.com",
+        "googletagmanager.com",
+        "hm.baidu.com",
+        "cnzz.com",
+        "umeng.com",
+    ],
+    # 允许加载脚本的主机（后缀匹配），页面需要这些脚本才会发出 mtop 请求；其他来源的脚本会被拦截
+    "script_hosts": [
+        "goofish.com",
+        "alicdn.com",
+        "taobao.com",
+        "alibaba.com",
+    ],
+}
+
+# 表示触发了限流或人机验证的接口响应标记
+BLOCK_RESPONSE_MARKERS = ("RGV587_ERROR", "被挤爆啦", "FAIL_SYS_USER_VALIDATE")
+
+# 自适应请求节奏配置（见 src/pacing.py）
+# 每类接口一个令牌桶：interval 为相邻两次请求的平均间隔（秒），实际间隔在 ±jitter 比例内随机；
+# 连续 speedup_after 次正常响应后间隔乘以 speedup_factor（不低于 min_interval），
+# 遇到限流/验证时间隔乘以 backoff_factor（不高于 max_interval），并把当时的间隔乘以 floor_margin 记为安全下限，
+# 之后加速不再低于该下限。学到的间隔和下限会持久化，下次运行直接沿用（下限每次运行放宽为 floor_relax 倍）。
+PACING_STRATEGY = {
+    "endpoints": {
+        # 搜索翻页，原 random.uniform(25, 50)
+        "search": {"base_interval": 30, "min_interval": 10, "max_interval": 600, "burst": 2},
+        # 商品详情，原 random_sleep(3, 6)
+        "detail": {"base_interval": 4.5, "min_interval": 2, "max_interval": 300, "burst": 1},
+        # 用户主页及其分页接口，原 random_sleep(2, 4) / random_sleep(3, 5)
+        "profile": {"base_interval": 3.5, "min_interval": 1.5, "max_interval": 300, "burst": 1},
+    },
+    "jitter": 0.33,
+    "speedup_after": 5,
+    "speedup_factor": 0.9,
+    "backoff_factor": 2.0,
+    "floor_margin": 1.25,
+    "floor_relax": 0.95,
 }
 
 # 检测策略配置
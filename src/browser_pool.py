@@ -0,0 +1,145 @@
+"""
+进程级共享的浏览器池。
+
+spider_v2 在同一进程中并发运行多个任务。过去每个任务各自启动一个 Chromium 并创建上下文，
+任务数一多，启动时的内存占用就非常可观。浏览器池在整个进程内只启动一个浏览器，并且只在第一次
+真正需要页面时才启动（搜索和详情默认都走HTTP接口，多数任务根本用不到浏览器）。
+
+- 上下文数量受 BROWSER_MAX_CONTEXTS 限制，任务按需借出页面，用完归还；
+- 每个上下文保留一个页面重复使用，使用 BROWSER_PAGE_MAX_USES 次后关闭重建，避免渲染进程内存持续增长。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from src.anti_crawler_config import STEALTH_CONFIG
+from src.config import (
+    BROWSER_MAX_CONTEXTS,
+    BROWSER_PAGE_MAX_USES,
+    LOGIN_IS_EDGE,
+    RUN_HEADLESS,
+    RUNNING_IN_DOCKER,
+    STATE_FILE,
+)
+from src.resource_blocking import install_resource_blocking
+
+
+class _PooledContext:
+    def __init__(self, context):
+        self.context = context
+        self.page = None
+        self.page_uses = 0
+
+
+class BrowserPool:
+    def __init__(self, max_contexts: int = BROWSER_MAX_CONTEXTS, page_max_uses: int = BROWSER_PAGE_MAX_USES):
+        self.max_contexts = max(1, max_contexts)
+        self.page_max_uses = max(1, page_max_uses)
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        # 锁和信号量在首次使用时创建，保证绑定到正在运行的事件循环
+        self._launch_lock = None
+        self._slots = None
+        self.stats = {"leases": 0, "contexts_created": 0, "pages_created": 0}
+
+    @property
+    def launched(self) -> bool:
+        return self._browser is not None
+
+    async def _get_browser(self):
+        async with self._launch_lock:
+            if self._browser is None:
+                print("LOG: 首次需要浏览器，启动共享浏览器实例...")
+                self._playwright = await async_playwright().start()
+                if LOGIN_IS_EDGE:
+                    self._browser = await self._playwright.chromium.launch(headless=RUN_HEADLESS, channel="msedge")
+                elif RUNNING_IN_DOCKER:
+                    # Docker环境内，使用Playwright自带的chromium；本地环境，使用系统安装的Chrome
+                    self._browser = await self._playwright.chromium.launch(headless=RUN_HEADLESS)
+                else:
+                    self._browser = await self._playwright.chromium.launch(headless=RUN_HEADLESS, channel="chrome")
+            return self._browser
+
+    async def _new_context(self) -> _PooledContext:
+        browser = await self._get_browser()
+        # 使用配置文件中的隐身模式设置
+        context = await browser.new_context(storage_state=STATE_FILE, **STEALTH_CONFIG)
+        await install_resource_blocking(context)
+        self.stats["contexts_created"] += 1
+        print(f"LOG: [浏览器池] 已创建上下文 {self.stats['contexts_created']}/{self.max_contexts}")
+        return _PooledContext(context)
+
+    @asynccontextmanager
+    async def lease_page(self):
+        """
+        借出一个页面，退出 with 代码块时自动归还。
+
+        用法:
+            async with get_browser_pool().lease_page() as page:
+                await page.goto(...)
+        """
+        if self._slots is None:
+            self._launch_lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_contexts)
+
+        async with self._slots:
+            pooled = self._idle.pop() if self._idle else await self._new_context()
+            try:
+                if pooled.page is None or pooled.page.is_closed():
+                    pooled.page = await pooled.context.new_page()
+                    pooled.page_uses = 0
+                    self.stats["pages_created"] += 1
+                pooled.page_uses += 1
+                self.stats["leases"] += 1
+                yield pooled.page
+            finally:
+                await self._recycle_page(pooled)
+                self._idle.append(pooled)
+
+    async def _recycle_page(self, pooled: _PooledContext):
+        """归还页面：未达到使用上限时跳转到空白页复用，否则关闭，下次借出时重建。"""
+        if pooled.page is None:
+            return
+        try:
+            if pooled.page_uses >= self.page_max_uses:
+                await pooled.page.close()
+                pooled.page = None
+            elif not pooled.page.is_closed():
+                await pooled.page.goto("about:blank")
+        except Exception as e:
+            print(f"LOG: [浏览器池] 回收页面失败，将重建页面: {e}")
+            pooled.page = None
+
+    async def close(self):
+        if self._browser is not None:
+            print(
+                f"LOG: [浏览器池] 关闭共享浏览器。共借出页面 {self.stats['leases']} 次，"
+                f"创建上下文 {self.stats['contexts_created']} 个、页面 {self.stats['pages_created']} 个。"
+            )
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._launch_lock = None
+        self._slots = None
+
+
+_pool = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """获取进程内共享的浏览器池。"""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
+
+
+async def close_browser_pool():
+    """关闭共享浏览器（如果启动过）。应在进程退出前调用。"""
+    if _pool is not None:
+        await _pool.close()
@@ -11,6 +11,19 @@ load_dotenv()
 STATE_FILE = "xianyu_state.json"
 IMAGE_SAVE_DIR = "images"
 CONFIG_FILE = "config.json"
+RESULTS_DIR = "jsonl"
+# 已处理商品的持久化去重索引 (SQLite)
+SEEN_INDEX_FILE = os.path.join(RESULTS_DIR, "seen_index.db")
+# 结果文件的索引存储 (SQLite)，供 /api/results 分页、筛选和排序
+RESULTS_DB_FILE = os.path.join(RESULTS_DIR, "results.db")
+# 跨任务共享的缓存数据目录
+CACHE_DIR = "cache"
+ITEM_REGISTRY_FILE = os.path.join(CACHE_DIR, "item_registry.db")
+AI_CACHE_FILE = os.path.join(CACHE_DIR, "ai_verdicts.db")
+# 自适应请求节奏学到的各接口请求间隔，跨运行保留
+PACING_STATE_FILE = os.path.join(CACHE_DIR, "pacing_state.json")
+# AI请求的每分钟请求数 / token 数令牌桶，由同时运行的所有任务进程共享
+AI_RATE_STATE_FILE = os.path.join(CACHE_DIR, "ai_rate_limits.db")
 os.makedirs(IMAGE_SAVE_DIR, exist_ok=True)
 
 # 任务隔离的临时图片目录前缀
@@ -19,6 +32,10 @@ TASK_IMAGE_DIR_PREFIX = "task_images_"
 # --- API URL Patterns ---
 API_URL_PATTERN = "h5api.m.goofish.com/h5/mtop.taobao.idlemtopsearch.pc.search"
 DETAIL_API_URL_PATTERN = "h5api.m.goofish.com/h5/mtop.taobao.idle.pc.detail"
+SEARCH_API_URL = "https://h5api.m.goofish.com/h5/mtop.taobao.idlemtopsearch.pc.search/1.0/"
+DETAIL_API_URL = "https://h5api.m.goofish.com/h5/mtop.taobao.idle.pc.detail/1.0/"
+# mtop 接口签名使用的 appKey
+MTOP_APP_KEY = "34839810"
 
 # --- Environment Variables ---
 API_KEY = os.getenv("OPENAI_API_KEY")
@@ -46,6 +63,119 @@ AI_DEBUG_MODE = os.getenv("AI_DEBUG_MODE", "false").lower() == "true"
 SKIP_AI_ANALYSIS = os.getenv("SKIP_AI_ANALYSIS", "true").lower() == "true"
 ENABLE_THINKING = os.getenv("ENABLE_THINKING", "false").lower() == "true"
 
+# --- HTTP Client ---
+# 进程内共享连接池的大小，以及对单个主机的最大并发请求数
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "8"))
+
+# --- Image Download ---
+# 本进程内所有任务同时下载的图片数上限（对单个图片主机的并发仍受 HTTP_PER_HOST_LIMIT 限制）
+IMAGE_DOWNLOAD_CONCURRENCY = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", "16"))
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_DOWNLOAD_MAX_BYTES = 20 * 1024 * 1024
+# 跨任务、跨运行共享的图片缓存（按内容哈希存放，SQLite 索引），超过总大小上限时按最近使用时间淘汰
+IMAGE_CACHE_DIR = os.path.join(IMAGE_SAVE_DIR, "cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# 发给 AI 的图片在内存中按最长边缩小并重新编码（0 = 发送原图）；格式为 jpeg 或 webp
+AI_IMAGE_MAX_EDGE = int(os.getenv("AI_IMAGE_MAX_EDGE", "1024"))
+AI_IMAGE_FORMAT = os.getenv("AI_IMAGE_FORMAT", "jpeg").lower()
+AI_IMAGE_QUALITY = int(os.getenv("AI_IMAGE_QUALITY", "80"))
+# 同一商品内感知哈希（dHash）汉明距离不超过该值的图片视为近似重复，只发送一张；每个商品最多发送的图片数（0 = 不限）
+AI_IMAGE_DEDUP_DISTANCE = int(os.getenv("AI_IMAGE_DEDUP_DISTANCE", "10"))
+AI_MAX_IMAGES_PER_ITEM = int(os.getenv("AI_MAX_IMAGES_PER_ITEM", "6"))
+# 同一张图片出现在至少这么多个其他商品中时视为网图/盗图；开启 AI_SKIP_STOCK_PHOTO_ITEMS 后图片全为网图的商品不调用AI
+STOCK_PHOTO_MIN_LISTINGS = int(os.getenv("STOCK_PHOTO_MIN_LISTINGS", "5"))
+AI_SKIP_STOCK_PHOTO_ITEMS = os.getenv("AI_SKIP_STOCK_PHOTO_ITEMS", "false").lower() == "true"
+
+# --- Global Item Registry ---
+# 启用后，多个任务之间共享商品详情和AI结论，重叠的关键词不再重复访问详情页和调用AI
+ENABLE_GLOBAL_REGISTRY = os.getenv("ENABLE_GLOBAL_REGISTRY", "false").lower() == "true"
+GLOBAL_REGISTRY_TTL_HOURS = float(os.getenv("GLOBAL_REGISTRY_TTL_HOURS", "12"))
+
+# --- AI Verdict Cache ---
+# 按商品内容（去掉ID、链接等易变字段）、图片内容、模型和 prompt 缓存AI结论，内容相同的商品不再重复下载图片和调用AI
+ENABLE_AI_CACHE = os.getenv("ENABLE_AI_CACHE", "true").lower() == "true"
+AI_CACHE_TTL_HOURS = float(os.getenv("AI_CACHE_TTL_HOURS", "72"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "50000"))
+
+# --- Search Paging ---
+# 分页搜索时同时在途的页面请求数
+SEARCH_PAGE_CONCURRENCY = int(os.getenv("SEARCH_PAGE_CONCURRENCY", "2"))
+
+# --- Item Pipeline ---
+# 商品处理流水线每个阶段的并发 worker 数，以及阶段间队列的容量。
+# 详情阶段会请求闲鱼，默认单 worker 以保持礼貌的请求速率；AI分析与通知只涉及第三方服务，可以并发。
+PIPELINE_DETAIL_WORKERS = int(os.getenv("PIPELINE_DETAIL_WORKERS", "1"))
+PIPELINE_AI_WORKERS = int(os.getenv("PIPELINE_AI_WORKERS", "3"))
+PIPELINE_NOTIFY_WORKERS = int(os.getenv("PIPELINE_NOTIFY_WORKERS", "2"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "10"))
+
+# --- AI Dispatcher ---
+# 同一进程内所有任务的AI请求共用的并发上限，以及服务商的每分钟请求数 / token 数限额（0 表示不限）
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_RPM_LIMIT = int(os.getenv("AI_RPM_LIMIT", "0"))
+AI_TPM_LIMIT = int(os.getenv("AI_TPM_LIMIT", "0"))
+# 限流 (429)、超时和服务端错误的重试次数与指数退避的初始/最大间隔（秒），响应带 Retry-After 时按其等待
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "5"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "2"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "60"))
+
+# --- AI Batch Mode ---
+# 大于 1 时启用批量模式：只发送商品文本（不含图片），每次请求最多打包 AI_BATCH_SIZE 个商品共用一份 prompt
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "1"))
+# 批次中第一个商品最多等待的秒数，超时未凑满也发送
+AI_BATCH_MAX_WAIT = float(os.getenv("AI_BATCH_MAX_WAIT", "10"))
+# 模型的上下文窗口 (token)，批次大小按估算的输入和输出 token 数控制在其内
+AI_CONTEXT_WINDOW = int(os.getenv("AI_CONTEXT_WINDOW", "32000"))
+
+# --- Result Writer ---
+# 结果文件批量写入：攒够 RESULT_WRITE_BATCH_SIZE 条或最早一条等待 RESULT_WRITE_FLUSH_INTERVAL 秒后写出一批；
+# RESULT_FSYNC_POLICY 为 always（每批 fsync）/ interval（至多每 RESULT_FSYNC_INTERVAL 秒一次）/ never
+RESULT_WRITE_BATCH_SIZE = int(os.getenv("RESULT_WRITE_BATCH_SIZE", "100"))
+RESULT_WRITE_FLUSH_INTERVAL = float(os.getenv("RESULT_WRITE_FLUSH_INTERVAL", "1.0"))
+RESULT_WRITE_QUEUE_SIZE = int(os.getenv("RESULT_WRITE_QUEUE_SIZE", "1000"))
+RESULT_FSYNC_POLICY = os.getenv("RESULT_FSYNC_POLICY", "interval").lower()
+RESULT_FSYNC_INTERVAL = float(os.getenv("RESULT_FSYNC_INTERVAL", "5"))
+
+# --- Results Store ---
+# 结果查询后端: sqlite = 从带索引的结果存储中分页查询（结果文件增量导入）; jsonl = Web 服务在内存中为结果文件建立索引
+RESULTS_BACKEND = os.getenv("RESULTS_BACKEND", "sqlite").lower()
+# jsonl 后端下 Web 服务在内存中缓存索引的结果文件数（按最近访问淘汰）
+RESULT_INDEX_CACHE_FILES = int(os.getenv("RESULT_INDEX_CACHE_FILES", "8"))
+
+# --- Log Streaming ---
+# 实时日志推送在内存中保留的最近日志行数（新连接的客户端会先收到这些行）
+LOG_STREAM_BUFFER_LINES = int(os.getenv("LOG_STREAM_BUFFER_LINES", "1000"))
+
+# --- Task Logs ---
+# 每个任务的运行日志单独写入 logs/tasks/<任务名>.log，超过大小或跨过时间边界时轮转并压缩，保留最近若干个分段
+TASK_LOG_MAX_BYTES = int(os.getenv("TASK_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TASK_LOG_ROTATE_HOURS = float(os.getenv("TASK_LOG_ROTATE_HOURS", "24"))
+TASK_LOG_BACKUPS = int(os.getenv("TASK_LOG_BACKUPS", "10"))
+# 轮转分段的压缩方式: gzip / zstd（需要安装 zstandard）/ none
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gzip").lower()
+
+# --- AI Request Log ---
+# 按比例抽样记录发给 AI 的请求（0 = 不记录，1 = 全部记录），写入 logs/ai_requests/，图片按内容去重单独保存；
+# 超过保留天数未使用的日志和图片被删除，总大小不超过上限
+AI_REQUEST_LOG_SAMPLE_RATE = float(os.getenv("AI_REQUEST_LOG_SAMPLE_RATE", "0"))
+AI_REQUEST_LOG_MAX_BYTES = int(os.getenv("AI_REQUEST_LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+AI_REQUEST_LOG_RETENTION_DAYS = float(os.getenv("AI_REQUEST_LOG_RETENTION_DAYS", "7"))
+
+# --- Item Detail ---
+# 商品详情获取方式: api = 直接签名调用详情接口（遇到人机验证时退回浏览器）; browser = 始终打开详情页
+DETAIL_FETCH_MODE = os.getenv("DETAIL_FETCH_MODE", "api").lower()
+
+# --- Browser Pool ---
+# 进程内共享浏览器最多同时使用的上下文数，以及单个页面复用多少次后关闭重建
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", "2"))
+BROWSER_PAGE_MAX_USES = int(os.getenv("BROWSER_PAGE_MAX_USES", "50"))
+
+# --- Browser Resource Blocking ---
+# 浏览器页面是否拦截图片、字体、样式和第三方统计等请求（策略见 anti_crawler_config.RESOURCE_BLOCKING_POLICY），无头模式下默认开启
+BLOCK_PAGE_RESOURCES = os.getenv("BLOCK_PAGE_RESOURCES", "true" if RUN_HEADLESS else "false").lower() == "true"
+
 # --- Headers ---
 IMAGE_DOWNLOAD_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:139.0) Gecko/20100101 Firefox/139.0',
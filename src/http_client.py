@@ -0,0 +1,87 @@
+"""
+进程级共享的异步 HTTP 客户端。
+
+所有任务、所有页面共用同一个连接池（keep-alive，可用时启用 HTTP/2），
+并通过按主机划分的信号量限制对单个主机的并发请求数。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import httpx
+
+from src.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_PER_HOST_LIMIT,
+)
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# {verify: (client, loop)}，客户端与创建它的事件循环绑定
+_clients = {}
+# {host: (semaphore, loop)}
+_host_semaphores = {}
+
+
+def get_http_client(verify: bool = True) -> httpx.AsyncClient:
+    """
+    获取当前事件循环内共享的 AsyncClient，首次调用时创建。
+    verify=False 的客户端单独维护，用于需要跳过证书校验的闲鱼 API。
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(verify)
+    if entry:
+        client, client_loop = entry
+        if client_loop is loop and not client.is_closed:
+            return client
+
+    client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        verify=verify,
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    )
+    _clients[verify] = (client, loop)
+    return client
+
+
+def _get_host_semaphore(host: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    entry = _host_semaphores.get(host)
+    if entry and entry[1] is loop:
+        return entry[0]
+    semaphore = asyncio.Semaphore(HTTP_PER_HOST_LIMIT)
+    _host_semaphores[host] = (semaphore, loop)
+    return semaphore
+
+
+@asynccontextmanager
+async def host_slot(url: str):
+    """占用目标主机的一个并发名额，超过 HTTP_PER_HOST_LIMIT 的请求会排队等待。"""
+    async with _get_host_semaphore(urlparse(url).netloc):
+        yield
+
+
+async def request(method: str, url: str, verify: bool = True, **kwargs) -> httpx.Response:
+    """通过共享客户端发送请求，并遵守按主机的并发限制。"""
+    client = get_http_client(verify=verify)
+    async with host_slot(url):
+        return await client.request(method, url, **kwargs)
+
+
+async def close_http_clients():
+    """关闭当前事件循环创建的所有客户端，释放连接池。"""
+    loop = asyncio.get_running_loop()
+    for verify, (client, client_loop) in list(_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+            del _clients[verify]
@@ -0,0 +1,299 @@
+"""
+跨任务、跨运行共享的商品图片缓存。
+
+图片按内容的 SHA-256 保存在 images/cache/<前两位>/<哈希>.<扩展名>，同一张图片只存一份；
+SQLite 索引（WAL 模式，多个任务进程共用）记录 规范化URL（及处理方式）-> 内容哈希 的映射和每张图片的最近使用时间。
+同一商品被其他任务遇到、或之后被重新分析时直接使用缓存中的图片，不再重新下载；
+不同 URL 指向相同内容时也只保留一份文件。
+
+每放入 EVICT_CHECK_INTERVAL 张图片检查一次总大小，超过 IMAGE_CACHE_MAX_BYTES 时按最近使用时间从旧到新淘汰（LRU），
+最近 EVICTION_GRACE_SECONDS 秒内用过的图片不淘汰，避免删掉其他进程正要交给 AI 的图片。
+命中、去重和淘汰次数在内存中累加，任务结束时（flush_counters）一次性记入 counters 表。
+
+索引中还记录每个商品图片的感知哈希（dHash），用于发现被许多不同商品重复使用的网图/盗图。
+64 位哈希分为 4 段分别建索引：汉明距离不超过 3 的两个哈希至少有一段完全相同，查询只需按段查找候选再计算距离。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from src.config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES
+
+COUNTER_NAMES = ("hits", "misses", "dedup", "evictions")
+EVICTION_GRACE_SECONDS = 600
+# 每检查一次总大小之间放入的图片数
+EVICT_CHECK_INTERVAL = 50
+INDEX_FILENAME = "index.db"
+# 跨商品判断为同一张图片的最大汉明距离（受分段索引限制，不能超过 HASH_BANDS - 1）
+STOCK_PHOTO_DISTANCE = 3
+HASH_BANDS = 4
+IMAGE_HASH_RETENTION_DAYS = 30
+
+
+def normalize_image_url(url: str) -> str:
+    """
+    规范化图片 URL 作为缓存键：统一为 https、主机名小写、去掉默认端口和 #片段、查询参数排序。
+    """
+    url = url.strip()
+    if url.startswith("//"):
+        url = "https:" + url
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(("https", host, parts.path, query, ""))
+
+
+def cache_key(url: str, variant: str = "") -> str:
+    # 规范化后的 URL 不含 #片段，用 # 连接处理方式不会与原图的键冲突
+    key = normalize_image_url(url)
+    return f"{key}#{variant}" if variant else key
+
+
+def _hash_bands(value: int) -> List[int]:
+    return [(value >> (16 * band)) & 0xFFFF for band in range(HASH_BANDS)]
+
+
+def image_extension(url: str) -> str:
+    extension = os.path.splitext(urlsplit(url).path.split(".heic")[0])[1].lower()
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,5}", extension) else ".jpg"
+
+
+class ImageCache:
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_FILENAME), timeout=30,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " digest TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_hashes ("
+            " item_id TEXT NOT NULL, hash TEXT NOT NULL, band0 INTEGER NOT NULL, band1 INTEGER NOT NULL,"
+            " band2 INTEGER NOT NULL, band3 INTEGER NOT NULL, seen_at REAL NOT NULL,"
+            " PRIMARY KEY (item_id, hash)) WITHOUT ROWID"
+        )
+        for band in range(HASH_BANDS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS image_hashes_band{band} ON image_hashes (band{band})")
+        self._conn.execute("DELETE FROM image_hashes WHERE seen_at < ?",
+                           (time.time() - IMAGE_HASH_RETENTION_DAYS * 86400,))
+        # 本进程内的计数只在内存中累加，任务结束时由 flush_counters 一次性累加到 counters 表中供 Web 服务读取
+        self.counters = {name: 0 for name in COUNTER_NAMES}
+        self._flushed = {name: 0 for name in COUNTER_NAMES}
+        self._stores_since_evict = 0
+
+    def _count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def get(self, url: str, variant: str = "") -> Optional[str]:
+        """
+        返回 URL 对应的缓存图片路径并刷新其使用时间；未缓存（或文件已被删除）时返回 None。
+        variant 区分同一 URL 的不同处理结果（如为 AI 缩小后的图片），默认为原图。
+        """
+        key = cache_key(url, variant)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.digest, b.path FROM urls u JOIN blobs b ON b.digest = u.digest WHERE u.url = ?",
+                (key,)
+            ).fetchone()
+            path = os.path.join(self.directory, row[1]) if row else None
+            if row and not os.path.exists(path):
+                self._conn.execute("DELETE FROM blobs WHERE digest = ?", (row[0],))
+                path = None
+            if path:
+                self._conn.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), row[0]))
+            self._count("hits" if path else "misses")
+        return path
+
+    def content_digests(self, urls: List[str], variant: str = "") -> Optional[List[str]]:
+        """
+        返回各 URL 对应缓存图片的内容哈希（顺序与 urls 一致），不计入命中/未命中统计；
+        任一 URL 未缓存时返回 None。
+        """
+        keys = [cache_key(url, variant) for url in urls]
+        if not keys:
+            return []
+        with self._lock:
+            rows = dict(self._conn.execute(
+                f"SELECT u.url, u.digest FROM urls u JOIN blobs b ON b.digest = u.digest"
+                f" WHERE u.url IN ({','.join('?' * len(keys))})",
+                keys
+            ).fetchall())
+        if len(rows) < len(set(keys)):
+            return None
+        return [rows[key] for key in keys]
+
+    def temp_path(self, url: str) -> str:
+        """下载用的临时文件路径，下载完成后交给 add() 放入缓存。"""
+        return os.path.join(self.directory, "tmp", f"{uuid.uuid4().hex}{image_extension(url)}")
+
+    def add(self, url: str, file_path: str, variant: str = "") -> str:
+        """
+        把下载好的文件按内容哈希移入缓存并记录 URL 映射，返回缓存中的路径。
+        内容已存在时（其他 URL 指向同一张图片）删除该文件，复用已有的一份。会读取整个文件，宜在线程中调用。
+        """
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        return self._store(url, variant, sha256.hexdigest(), os.path.getsize(file_path), image_extension(url),
+                           lambda target: os.replace(file_path, target), lambda: os.remove(file_path))
+
+    def add_bytes(self, url: str, data: bytes, extension: str, variant: str = "") -> str:
+        """把内存中的图片内容（如为 AI 缩小后的图片）放入缓存，返回缓存中的路径。会写文件，宜在线程中调用。"""
+        def write(target: str):
+            tmp = self.temp_path(url)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+
+        return self._store(url, variant, hashlib.sha256(data).hexdigest(), len(data), extension, write, lambda: None)
+
+    def _store(self, url: str, variant: str, digest: str, size: int, extension: str, place, discard) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row and os.path.exists(os.path.join(self.directory, row[0])):
+                relative = row[0]
+                discard()
+                self._count("dedup")
+            else:
+                relative = os.path.join(digest[:2], digest + extension)
+                os.makedirs(os.path.join(self.directory, digest[:2]), exist_ok=True)
+                place(os.path.join(self.directory, relative))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (digest, path, size, last_used) VALUES (?, ?, ?, ?)",
+                (digest, relative, size, time.time())
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (cache_key(url, variant), digest)
+            )
+            self._stores_since_evict += 1
+            check = self._stores_since_evict >= EVICT_CHECK_INTERVAL
+        if check:
+            self.evict()
+        return os.path.join(self.directory, relative)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self) -> int:
+        """总大小超过上限时按最近使用时间淘汰图片，返回淘汰的数量。"""
+        self._stores_since_evict = 0
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT digest, path, size FROM blobs WHERE last_used < ? ORDER BY last_used",
+                (time.time() - EVICTION_GRACE_SECONDS,)
+            ).fetchall()
+            for digest, relative, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, relative))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                self._conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+                total -= size
+                evicted += 1
+            if evicted:
+                self._count("evictions", evicted)
+        return evicted
+
+    def record_item_hashes(self, item_id: str, hashes: List[int]) -> List[int]:
+        """
+        记录商品图片的感知哈希，返回每张图片出现在多少个其他商品中（汉明距离不超过 STOCK_PHOTO_DISTANCE）。
+        """
+        item_id = str(item_id)
+        now = time.time()
+        counts = []
+        with self._lock:
+            for value in hashes:
+                bands = _hash_bands(value)
+                rows = self._conn.execute(
+                    "SELECT item_id, hash FROM image_hashes WHERE item_id != ? AND ("
+                    + " OR ".join(f"band{band} = ?" for band in range(HASH_BANDS)) + ")",
+                    (item_id, *bands)
+                ).fetchall()
+                counts.append(len({other for other, other_hash in rows
+                                   if bin(int(other_hash, 16) ^ value).count("1") <= STOCK_PHOTO_DISTANCE}))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO image_hashes (item_id, hash, band0, band1, band2, band3, seen_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(item_id, f"{value:016x}", *_hash_bands(value), now) for value in hashes]
+            )
+        return counts
+
+    def flush_counters(self):
+        """把上次保存以来的本进程计数累加到 counters 表中。"""
+        with self._lock:
+            for name in COUNTER_NAMES:
+                delta = self.counters[name] - self._flushed[name]
+                if delta:
+                    self._conn.execute(
+                        "INSERT INTO counters (name, value) VALUES (?, ?)"
+                        " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                        (name, delta)
+                    )
+                    self._flushed[name] = self.counters[name]
+
+    def lifetime_counters(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM counters").fetchall()
+        counters = {name: 0 for name in COUNTER_NAMES}
+        counters.update(dict(rows))
+        return counters
+
+    def close(self):
+        self.flush_counters()
+        with self._lock:
+            self._conn.close()
+
+    def format_stats(self) -> str:
+        return format_counters(self.counters)
+
+
+def summarize_counters(counters: dict) -> dict:
+    total = counters["hits"] + counters["misses"]
+    return {**counters, "hit_rate": round(counters["hits"] / total, 4) if total else 0.0}
+
+
+def format_counters(counters: dict) -> str:
+    summary = summarize_counters(counters)
+    return (
+        f"命中 {summary['hits']}/{summary['hits'] + summary['misses']} ({summary['hit_rate']:.1%})，"
+        f"内容重复 {summary['dedup']} 张，淘汰 {summary['evictions']} 张。"
+    )
+
+
+_cache = None
+
+
+def get_image_cache() -> ImageCache:
+    """获取进程内共享的图片缓存实例。"""
+    global _cache
+    if _cache is None:
+        _cache = ImageCache()
+    return _cache
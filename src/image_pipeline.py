@@ -0,0 +1,158 @@
+"""
+发给 AI 的商品图片处理。
+
+图片在内存中解码，按最长边 AI_IMAGE_MAX_EDGE 等比缩小，再以 AI_IMAGE_FORMAT / AI_IMAGE_QUALITY 重新编码，
+直接生成 base64 data URL 交给 get_ai_analysis：上传体积和视觉模型按分辨率计费的图片 token 都随之减少。
+无法解码的图片（如 Pillow 不支持的 HEIC）按原样发送，并按实际内容标注 MIME 类型。
+
+闲鱼商品常有重复上传或略微裁剪的同一张照片。每张图片计算 64 位差异哈希（dHash），
+同一商品内汉明距离不超过 AI_IMAGE_DEDUP_DISTANCE 的视为近似重复，只发送一张；
+图片数超过 AI_MAX_IMAGES_PER_ITEM 时按多样性挑选（select_diverse_images）。
+"""
+import base64
+import io
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from src.config import AI_IMAGE_FORMAT, AI_IMAGE_MAX_EDGE, AI_IMAGE_QUALITY
+
+IMAGE_FORMATS = {"jpeg": ("JPEG", "image/jpeg", ".jpg"), "webp": ("WEBP", "image/webp", ".webp")}
+EXIF_ORIENTATION = 0x0112
+DHASH_SIZE = 8
+HASH_BITS = DHASH_SIZE * DHASH_SIZE
+MIME_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp",
+                   "image/bmp": ".bmp", "image/heic": ".heic", "image/avif": ".avif"}
+
+
+def sniff_image_mime(data: bytes) -> str:
+    """根据文件头判断图片的 MIME 类型，无法识别时按 JPEG 处理。"""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[4:8] == b"ftyp":
+        brand = data[8:12]
+        if brand in (b"avif", b"avis"):
+            return "image/avif"
+        if brand in (b"heic", b"heix", b"hevc", b"hevx", b"mif1", b"msf1"):
+            return "image/heic"
+    return "image/jpeg"
+
+
+def variant_name(max_edge: int = AI_IMAGE_MAX_EDGE, image_format: str = AI_IMAGE_FORMAT,
+                 quality: int = AI_IMAGE_QUALITY) -> str:
+    """处理参数的标识，用作图片缓存的 variant：参数改变后不会复用按旧参数处理的图片。"""
+    return f"ai-{max_edge}-{image_format}-{quality}"
+
+
+def prepare_ai_image(data: bytes, max_edge: int = AI_IMAGE_MAX_EDGE, image_format: str = AI_IMAGE_FORMAT,
+                     quality: int = AI_IMAGE_QUALITY) -> Tuple[bytes, str]:
+    """
+    把原始图片缩小并重新编码，返回 (图片内容, MIME 类型)。
+    max_edge <= 0、图片无法解码，或处理后反而比原图大且原图无需缩小时，返回原图。CPU 密集，宜在线程中调用。
+    """
+    original = (data, sniff_image_mime(data))
+    if max_edge <= 0:
+        return original
+    pil_format, mime, _ = IMAGE_FORMATS.get(image_format, IMAGE_FORMATS["jpeg"])
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            needs_resize = max(image.size) > max_edge
+            # 只解码到接近目标尺寸所需的分辨率（JPEG 可按 1/2、1/4、1/8 缩放解码）
+            image.draft("RGB", (max_edge, max_edge))
+            if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+                image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            # 默认的 BICUBIC + reducing_gap 先按整数倍快速缩小再精细缩放，比全程 LANCZOS 快约 1/3
+            image.thumbnail((max_edge, max_edge))
+            output = io.BytesIO()
+            image.save(output, pil_format, quality=quality)
+    except Exception:
+        return original
+    encoded = output.getvalue()
+    if not needs_resize and len(encoded) >= len(data):
+        return original
+    return encoded, mime
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """只读取文件头中的 (宽, 高)，不解码像素；无法识别时返回 None。"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def image_dhash(data: bytes) -> Optional[int]:
+    """
+    计算图片的 64 位差异哈希：缩小为 9x8 灰度图，逐行比较相邻像素的明暗。
+    对重新压缩、缩放和轻微裁剪不敏感。无法解码时返回 None。
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG 直接按 1/8 缩放解码，只需要很小的分辨率
+            image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+            pixels = np.asarray(image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BOX), dtype=np.int16)
+    except Exception:
+        return None
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distances(hashes: Sequence[int]) -> np.ndarray:
+    """哈希两两之间的汉明距离矩阵（向量化计算）。"""
+    values = np.array(hashes, dtype=np.uint64)
+    xor = values[:, None] ^ values[None, :]
+    return np.unpackbits(xor[..., None].view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def select_diverse_images(hashes: Sequence[Optional[int]], max_images: int, duplicate_distance: int) -> List[int]:
+    """
+    返回保留的图片下标（保持原顺序）。
+    先去掉与前面已保留图片的距离不超过 duplicate_distance 的近似重复图片；剩余图片超过 max_images（> 0）时，
+    保留第一张（封面），之后每次选与已选图片最小距离最大的一张。无法计算哈希（None）的图片视为与其他图片都不同。
+    """
+    if not hashes:
+        return []
+    distances = hamming_distances([h or 0 for h in hashes])
+    missing = np.array([h is None for h in hashes])
+    distances[missing, :] = HASH_BITS
+    distances[:, missing] = HASH_BITS
+    np.fill_diagonal(distances, 0)
+
+    kept = []
+    for i in range(len(hashes)):
+        if all(distances[i, j] > duplicate_distance for j in kept):
+            kept.append(i)
+    if max_images <= 0 or len(kept) <= max_images:
+        return kept
+
+    selected = [kept[0]]
+    candidates = kept[1:]
+    nearest = distances[candidates, kept[0]].copy()
+    while len(selected) < max_images:
+        best = int(np.argmax(nearest))
+        selected.append(candidates.pop(best))
+        nearest = np.delete(nearest, best)
+        if candidates:
+            nearest = np.minimum(nearest, distances[candidates, selected[-1]])
+    return sorted(selected)
@@ -0,0 +1,188 @@
+"""
+跨任务的全局商品注册表（可选，ENABLE_GLOBAL_REGISTRY=true 时启用）。
+
+多个任务的关键词可能相互重叠，同一个商品会被每个任务各自访问详情页、下载图片并调用AI。
+注册表按商品ID缓存详情JSON，按 (商品ID, 分析标准哈希) 缓存AI结论，
+其他任务再次遇到同一商品时直接复用；只有分析标准不同时才会重新评估。
+批量模式（只发送文本）的结论使用带命名空间的标准哈希，不会被当作看过图片的完整分析复用。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from src.config import (
+    ENABLE_GLOBAL_REGISTRY,
+    GLOBAL_REGISTRY_TTL_HOURS,
+    ITEM_REGISTRY_FILE,
+)
+
+COUNTER_NAMES = ("detail_hits", "detail_misses", "ai_hits", "ai_misses")
+# 每写入多少次检查一次过期条目
+PURGE_CHECK_INTERVAL = 100
+
+
+def criteria_hash(prompt_text: str, namespace: Optional[str] = None) -> str:
+    """
+    计算最终 AI prompt 文本的哈希，用于区分不同任务的分析标准。
+    namespace 区分不同分析方式的结论（如批量模式的 "text-only"），默认的带图片分析不设置。
+    """
+    if namespace:
+        prompt_text = f"{namespace}\n{prompt_text}"
+    return hashlib.sha256(prompt_text.encode('utf-8')).hexdigest()
+
+
+class ItemRegistry:
+    def __init__(self, db_path: str = ITEM_REGISTRY_FILE, ttl_hours: float = GLOBAL_REGISTRY_TTL_HOURS):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_hours * 3600
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " item_id TEXT PRIMARY KEY, detail_json TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " item_id TEXT NOT NULL, criteria_hash TEXT NOT NULL, verdict_json TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (item_id, criteria_hash)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # 本进程内的计数只在内存中累加，任务结束时由 flush_counters 一次性累加到 counters 表中供 Web 服务读取
+        self.counters = {name: 0 for name in COUNTER_NAMES}
+        self._flushed = {name: 0 for name in COUNTER_NAMES}
+        self._writes_since_purge = 0
+
+    def _count(self, name: str):
+        self.counters[name] += 1
+
+    def _after_write(self) -> bool:
+        """记录一次写入，返回是否需要检查过期条目（调用方需持有锁）。"""
+        self._writes_since_purge += 1
+        return self._writes_since_purge >= PURGE_CHECK_INTERVAL
+
+    def _fresh_since(self) -> float:
+        return time.time() - self.ttl_seconds
+
+    def get_detail(self, item_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT detail_json FROM details WHERE item_id = ? AND updated_at >= ?",
+                (str(item_id), self._fresh_since())
+            ).fetchone()
+            self._count("detail_hits" if row else "detail_misses")
+        return json.loads(row[0]) if row else None
+
+    def put_detail(self, item_id: str, detail_json: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO details (item_id, detail_json, updated_at) VALUES (?, ?, ?)",
+                (str(item_id), json.dumps(detail_json, ensure_ascii=False), time.time())
+            )
+            check = self._after_write()
+        if check:
+            self.purge_expired()
+
+    def get_verdict(self, item_id: str, prompt_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict_json FROM verdicts WHERE item_id = ? AND criteria_hash = ? AND updated_at >= ?",
+                (str(item_id), prompt_hash, self._fresh_since())
+            ).fetchone()
+            self._count("ai_hits" if row else "ai_misses")
+        return json.loads(row[0]) if row else None
+
+    def put_verdict(self, item_id: str, prompt_hash: str, verdict: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (item_id, criteria_hash, verdict_json, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                (str(item_id), prompt_hash, json.dumps(verdict, ensure_ascii=False), time.time())
+            )
+            check = self._after_write()
+        if check:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """删除超过有效期的缓存条目，返回删除的行数。"""
+        since = self._fresh_since()
+        with self._lock:
+            self._writes_since_purge = 0
+            deleted = self._conn.execute("DELETE FROM details WHERE updated_at < ?", (since,)).rowcount
+            deleted += self._conn.execute("DELETE FROM verdicts WHERE updated_at < ?", (since,)).rowcount
+        return deleted
+
+    def flush_counters(self):
+        """把上次保存以来的本进程计数累加到 counters 表中。"""
+        with self._lock:
+            for name in COUNTER_NAMES:
+                delta = self.counters[name] - self._flushed[name]
+                if delta:
+                    self._conn.execute(
+                        "INSERT INTO counters (name, value) VALUES (?, ?)"
+                        " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                        (name, delta)
+                    )
+                    self._flushed[name] = self.counters[name]
+
+    def lifetime_counters(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM counters").fetchall()
+        counters = {name: 0 for name in COUNTER_NAMES}
+        counters.update(dict(rows))
+        return counters
+
+    def close(self):
+        self.flush_counters()
+        with self._lock:
+            self._conn.close()
+
+    def format_stats(self) -> str:
+        return format_counters(self.counters)
+
+
+def summarize_counters(counters: dict) -> dict:
+    """根据命中/未命中计数计算命中率与节省的调用次数。"""
+    def rate(hits, misses):
+        total = hits + misses
+        return round(hits / total, 4) if total else 0.0
+
+    return {
+        **counters,
+        "detail_hit_rate": rate(counters["detail_hits"], counters["detail_misses"]),
+        "ai_hit_rate": rate(counters["ai_hits"], counters["ai_misses"]),
+        "saved_detail_calls": counters["detail_hits"],
+        "saved_ai_calls": counters["ai_hits"],
+    }
+
+
+def format_counters(counters: dict) -> str:
+    summary = summarize_counters(counters)
+    return (
+        f"详情命中 {summary['detail_hits']}/{summary['detail_hits'] + summary['detail_misses']} "
+        f"({summary['detail_hit_rate']:.1%})，"
+        f"AI结论命中 {summary['ai_hits']}/{summary['ai_hits'] + summary['ai_misses']} "
+        f"({summary['ai_hit_rate']:.1%})，"
+        f"共节省 {summary['saved_detail_calls']} 次详情请求、{summary['saved_ai_calls']} 次AI调用。"
+    )
+
+
+_registry = None
+
+
+def get_item_registry() -> Optional[ItemRegistry]:
+    """获取进程内共享的注册表实例；未启用时返回 None。"""
+    global _registry
+    if not ENABLE_GLOBAL_REGISTRY:
+        return None
+    if _registry is None:
+        _registry = ItemRegistry()
+    return _registry
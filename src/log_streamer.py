@@ -0,0 +1,340 @@
+"""
+运行日志的实时推送。
+
+每个任务的运行日志写在 logs/tasks/<任务名>.log（见 src/task_logs.py）。Web 服务只用一个 LogTailer
+跟踪这个目录：Linux 上通过 inotify 在文件变化时立即读取新增字节，其他平台退回到定时检查文件大小。
+读到的完整行（带所属任务名）放进有界的环形缓冲区，并分发给所有订阅者的队列；新连接的客户端先拿到
+缓冲区中最近的 N 行，再接收实时内容，订阅时可以按任务名筛选。
+
+日志轮转（改名）后，先通过仍打开的旧文件读完剩余内容，再切换到新文件；日志被清空时通知订阅者重置显示。
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import sys
+from collections import deque
+from typing import List, Optional, Tuple
+
+from src.config import LOG_STREAM_BUFFER_LINES
+from src.task_logs import TASK_LOG_DIR, decode_log_bytes, task_name_from_log
+
+# 没有 inotify 时检查文件变化的间隔；有 inotify 时也按这个间隔兜底检查一次
+POLL_INTERVAL = 0.5
+# 单个订阅者最多积压的行数，消费太慢时丢弃最旧的行
+SUBSCRIBER_QUEUE_SIZE = 1000
+# 一次最多读取的字节数，避免日志暴涨时一次性读入过多内容
+READ_CHUNK_SIZE = 1024 * 1024
+
+# inotify 事件：文件写入、关闭，以及目录中文件的创建、删除、移动（日志轮转）
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_INOTIFY_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+
+class _Inotify:
+    """通过 ctypes 调用 inotify 监听日志目录；不可用时 open() 返回 None。"""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.event = asyncio.Event()
+
+    @classmethod
+    def open(cls, directory: str) -> Optional["_Inotify"]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(directory), _INOTIFY_MASK) < 0:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        watcher = cls(fd)
+        asyncio.get_running_loop().add_reader(fd, watcher._on_readable)
+        return watcher
+
+    def _on_readable(self):
+        # 只关心“有变化”，在回调中直接读空事件，避免同一批事件重复唤醒
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self.event.set()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return
+        self.event.clear()
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class LogSubscription:
+    """一个订阅者：订阅时的缓冲区快照和后续新行的队列。"""
+
+    def __init__(self, task: Optional[str], backlog: List[dict]):
+        self.task = task
+        self.backlog = backlog
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def matches(self, entry: dict) -> bool:
+        return self.task is None or entry.get("task") == self.task
+
+    def put(self, entry: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(entry)
+
+
+class _FollowedFile:
+    """一个被跟踪的任务日志文件：保持打开，以便轮转改名后读完旧文件的剩余内容。"""
+
+    def __init__(self, path: str, task: str):
+        self.path = path
+        self.task = task
+        self.file = None
+        self.inode = None
+        self.position = 0
+        self.partial = b""
+
+    def open(self) -> bool:
+        try:
+            self.file = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.position, self.partial = 0, b""
+        return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class LogTailer:
+    """跟踪任务日志目录中的所有日志文件，把新增的行分发给所有订阅者。"""
+
+    def __init__(self, directory: str = TASK_LOG_DIR, buffer_lines: int = LOG_STREAM_BUFFER_LINES,
+                 poll_interval: float = POLL_INTERVAL, use_inotify: bool = True):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.buffer = deque(maxlen=max(1, buffer_lines))
+        self.subscribers = set()
+        self.last_id = 0
+        self.using_inotify = False
+        self._files = {}
+        self._task = None
+
+    def start(self):
+        """在当前事件循环中启动后台跟踪（重复调用无副作用）。"""
+        if self._task is None or self._task.done():
+            self._load_tail()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for followed in self._files.values():
+            followed.close()
+        self._files.clear()
+
+    def _entries_after(self, after_id: int, task: Optional[str]) -> List[dict]:
+        if after_id > self.last_id:
+            # 客户端的 ID 比当前还大，说明服务已重启，返回整个缓冲区
+            after_id = 0
+        return [entry for entry in self.buffer
+                if entry["id"] > after_id and (task is None or entry["task"] == task)]
+
+    def subscribe(self, task: Optional[str] = None, after_id: int = 0) -> LogSubscription:
+        """订阅新行。返回的订阅对象带有缓冲区中符合筛选条件、ID 大于 after_id 的行。"""
+        self.start()
+        subscription = LogSubscription(task, self._entries_after(after_id, task))
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription):
+        self.subscribers.discard(subscription)
+
+    def read_since(self, after_id: int = 0, task: Optional[str] = None) -> Tuple[str, int]:
+        """
+        返回缓冲区中 ID 大于 after_id 的行拼成的文本和最新的行 ID（供轮询接口使用）。
+        不筛选任务时每行前加上 "[任务名] "。
+        """
+        self.start()
+        entries = self._entries_after(after_id, task)
+        if task is None:
+            text = "".join(f"[{entry['task']}] {entry['text']}\n" for entry in entries)
+        else:
+            text = "".join(entry["text"] + "\n" for entry in entries)
+        return text, self.last_id
+
+    def _log_files(self) -> List[str]:
+        try:
+            with os.scandir(self.directory) as it:
+                entries = [entry for entry in it if entry.is_file() and task_name_from_log(entry.name) is not None]
+        except FileNotFoundError:
+            return []
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        return [entry.name for entry in entries]
+
+    def _load_tail(self):
+        """启动时把各日志文件末尾的最近几行放入缓冲区，之后从文件末尾开始跟踪。"""
+        for followed in self._files.values():
+            followed.close()
+        self._files.clear()
+        self.buffer.clear()
+        for name in self._log_files():
+            followed = _FollowedFile(os.path.join(self.directory, name), task_name_from_log(name))
+            if not followed.open():
+                continue
+            self._files[name] = followed
+            size = os.fstat(followed.file.fileno()).st_size
+            # 按平均每行 200 字节估算需要读取的尾部长度
+            start = max(0, size - self.buffer.maxlen * 200)
+            followed.file.seek(start)
+            data = followed.file.read(size - start)
+            followed.position = start + len(data)
+            lines = data.split(b"\n")
+            followed.partial = lines.pop()
+            if start > 0 and lines:
+                # 第一行可能是从中间截断的
+                lines.pop(0)
+            for line in lines[-self.buffer.maxlen:]:
+                self._append(followed.task, line)
+
+    def _append(self, task: str, raw: bytes) -> dict:
+        self.last_id += 1
+        entry = {"id": self.last_id, "task": task, "text": decode_log_bytes(raw.rstrip(b"\r"))}
+        self.buffer.append(entry)
+        return entry
+
+    def _publish(self, entry: dict):
+        for subscription in self.subscribers:
+            if subscription.matches(entry):
+                subscription.put(entry)
+
+    def _reset(self, task: str):
+        """日志被清空：丢弃缓冲区中该任务的行，并通知订阅者清空显示。"""
+        kept = [entry for entry in self.buffer if entry["task"] != task]
+        self.buffer.clear()
+        self.buffer.extend(kept)
+        self.last_id += 1
+        self._publish({"id": self.last_id, "task": task, "text": "", "reset": True})
+
+    def _read(self, followed: _FollowedFile, lines: List[Tuple[str, Optional[bytes]]]):
+        if os.fstat(followed.file.fileno()).st_size < followed.position:
+            # 日志被清空，从头读取
+            followed.position, followed.partial = 0, b""
+            followed.file.seek(0)
+            lines.append((followed.task, None))
+        while True:
+            data = followed.file.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            followed.position += len(data)
+            chunk = (followed.partial + data).split(b"\n")
+            # 最后一段没有换行符，可能仍在写入中，留到下次拼接
+            followed.partial = chunk.pop()
+            lines.extend((followed.task, line) for line in chunk)
+
+    def _read_files(self) -> List[Tuple[str, Optional[bytes]]]:
+        """
+        读取各日志文件上次位置之后新增的完整行，返回 [(任务名, 行)]，日志被清空时为 (任务名, None)。
+        只读文件、不改动缓冲区和订阅者，在工作线程中执行，避免大量日志时阻塞 Web 服务的事件循环。
+        """
+        lines = []
+        for name in self._log_files():
+            if name not in self._files:
+                # 新出现的日志文件从头读取
+                self._files[name] = _FollowedFile(os.path.join(self.directory, name), task_name_from_log(name))
+        for name, followed in list(self._files.items()):
+            if followed.file is not None:
+                self._read(followed, lines)
+                try:
+                    inode = os.stat(followed.path).st_ino
+                except FileNotFoundError:
+                    inode = None
+                if inode == followed.inode:
+                    continue
+                # 文件已被轮转（改名）或删除：旧文件已经读完，切换到新文件
+                followed.close()
+            if followed.open():
+                self._read(followed, lines)
+            else:
+                del self._files[name]
+        return lines
+
+    def _deliver(self, lines: List[Tuple[str, Optional[bytes]]]) -> int:
+        """把读到的行放入缓冲区并分发给订阅者，返回新增的行数。"""
+        count = 0
+        for task, line in lines:
+            if line is None:
+                self._reset(task)
+            else:
+                self._publish(self._append(task, line))
+                count += 1
+        return count
+
+    def read_new_lines(self) -> int:
+        """读取各日志文件上次位置之后新增的完整行并分发，返回新增的行数。"""
+        return self._deliver(self._read_files())
+
+    async def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        watcher = _Inotify.open(self.directory) if self.use_inotify else None
+        self.using_inotify = watcher is not None
+        try:
+            while True:
+                try:
+                    self._deliver(await asyncio.to_thread(self._read_files))
+                except OSError as e:
+                    print(f"LOG: 读取日志目录 {self.directory} 失败: {e}")
+                if watcher is not None:
+                    await watcher.wait(self.poll_interval * 10)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+
+def format_sse(entry: dict) -> str:
+    """把一行日志编码为 SSE 消息；日志被清空时发送单独的 reset 事件。"""
+    data = json.dumps({"task": entry["task"], "text": entry["text"]}, ensure_ascii=False)
+    if entry.get("reset"):
+        return f"id: {entry['id']}\nevent: reset\ndata: {data}\n\n"
+    return f"id: {entry['id']}\ndata: {data}\n\n"
+
+
+_tailer = None
+
+
+def get_log_tailer() -> LogTailer:
+    """获取进程内共享的日志跟踪器（首次订阅时在当前事件循环中启动）。"""
+    global _tailer
+    if _tailer is None:
+        _tailer = LogTailer()
+    return _tailer
@@ -0,0 +1,177 @@
+"""
+自适应请求节奏。
+
+每类闲鱼接口（search / detail / profile）各有一个令牌桶，请求前调用 acquire() 获取令牌。
+响应正常时逐步缩短请求间隔，遇到 RGV587_ERROR、"被挤爆啦"、FAIL_SYS_USER_VALIDATE 时按指数退避，
+学到的间隔保存在 PACING_STATE_FILE 中，下一次定时运行直接从安全速率开始。
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Optional
+
+from src.anti_crawler_config import BLOCK_RESPONSE_MARKERS, PACING_STRATEGY
+from src.config import PACING_STATE_FILE
+
+
+def is_block_response(ret_string: str) -> bool:
+    """接口响应的 ret 字段是否表示触发了限流或人机验证。"""
+    return any(marker in ret_string for marker in BLOCK_RESPONSE_MARKERS)
+
+
+class EndpointPacer:
+    """单个接口类别的令牌桶。"""
+
+    def __init__(self, name: str, base_interval: float, min_interval: float, max_interval: float,
+                 burst: int = 1, jitter: float = 0.0, interval: Optional[float] = None, floor: Optional[float] = None):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.burst = max(1, burst)
+        self.jitter = jitter
+        self.interval = min(max(interval if interval is not None else base_interval, min_interval), max_interval)
+        # 从限流中学到的安全间隔下限：加速时不会再低于它，避免反复试探触发限流
+        self.floor = min(floor, max_interval) if floor else None
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.clean_streak = 0
+        self.requests = 0
+        self.blocks = 0
+        self.waited_seconds = 0.0
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+
+    async def acquire(self):
+        """等待直到可以发出下一次请求。"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                wait = (1 - self.tokens) * self.interval
+                wait *= 1 + random.uniform(-self.jitter, self.jitter)
+                if wait > 0:
+                    self.waited_seconds += wait
+                    await asyncio.sleep(wait)
+                self._refill()
+            self.tokens = max(0.0, self.tokens - 1)
+            self.requests += 1
+
+    def record_success(self, speedup_after: int, speedup_factor: float) -> bool:
+        """记录一次正常响应；返回间隔是否发生了变化。"""
+        self.clean_streak += 1
+        if self.clean_streak < speedup_after:
+            return False
+        self.clean_streak = 0
+        new_interval = max(self.min_interval, self.floor or 0, self.interval * speedup_factor)
+        changed = new_interval != self.interval
+        self.interval = new_interval
+        return changed
+
+    def record_block(self, backoff_factor: float, floor_margin: float):
+        """
+        记录一次限流/验证响应：间隔指数增大，并清空令牌，下一次请求必须等待一个完整间隔；
+        同时把触发限流时的间隔乘以 floor_margin 记为新的安全下限。
+        """
+        self.blocks += 1
+        self.clean_streak = 0
+        self.floor = min(self.max_interval, max(self.floor or 0, self.interval * floor_margin))
+        self.interval = min(self.max_interval, self.interval * backoff_factor)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+
+class PacingEngine:
+    def __init__(self, strategy: dict = PACING_STRATEGY, state_file: Optional[str] = PACING_STATE_FILE):
+        self.strategy = strategy
+        self.state_file = state_file
+        saved_state = self._load_state()
+        self.pacers = {
+            name: EndpointPacer(
+                name,
+                jitter=strategy["jitter"],
+                interval=saved_state.get(name, {}).get("interval"),
+                # 每次新运行把学到的下限放宽一点，接口限流规则放松时可以逐步重新提速
+                floor=(saved_state.get(name, {}).get("floor") or 0) * strategy["floor_relax"] or None,
+                **endpoint,
+            )
+            for name, endpoint in strategy["endpoints"].items()
+        }
+
+    def _load_state(self) -> dict:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            endpoints = {
+                name: {"interval": float(value["interval"]), "floor": value.get("floor")}
+                for name, value in state.get("endpoints", {}).items()
+            }
+            print(f"LOG: [请求节奏] 已从 {self.state_file} 恢复上次学到的请求间隔: "
+                  + "，".join(f"{name} {value['interval']:.1f}s" for name, value in endpoints.items()))
+            return endpoints
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"LOG: [请求节奏] 读取状态文件失败，使用默认间隔: {e}")
+            return {}
+
+    def save_state(self):
+        if not self.state_file:
+            return
+        state = {
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoints": {
+                name: {"interval": pacer.interval, "floor": pacer.floor} for name, pacer in self.pacers.items()
+            },
+        }
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        # 先写临时文件再替换，避免多个任务进程同时写入时读到半个文件
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"LOG: [请求节奏] 保存状态文件失败: {e}")
+
+    async def acquire(self, endpoint: str):
+        await self.pacers[endpoint].acquire()
+
+    def record_response(self, endpoint: str, ret_string: str):
+        """
+        根据接口响应调整请求间隔：触发限流/验证时退避，正常响应累计到一定次数后加速。
+        其他错误（如网络错误、商品不存在）不影响节奏。
+        """
+        pacer = self.pacers[endpoint]
+        if is_block_response(ret_string):
+            pacer.record_block(self.strategy["backoff_factor"], self.strategy["floor_margin"])
+            print(f"LOG: [请求节奏] {endpoint} 接口触发限流/验证，请求间隔退避至 {pacer.interval:.1f}s")
+            self.save_state()
+        elif "SUCCESS" in ret_string:
+            if pacer.record_success(self.strategy["speedup_after"], self.strategy["speedup_factor"]):
+                self.save_state()
+
+    def format_stats(self) -> str:
+        return "，".join(
+            f"{name}: 间隔 {pacer.interval:.1f}s / 请求 {pacer.requests} 次 / 退避 {pacer.blocks} 次 / 等待 {pacer.waited_seconds:.0f}s"
+            for name, pacer in self.pacers.items()
+        )
+
+
+_engine = None
+
+
+def get_pacing_engine() -> PacingEngine:
+    """获取进程内共享的请求节奏引擎。"""
+    global _engine
+    if _engine is None:
+        _engine = PacingEngine()
+    return _engine
@@ -2,15 +2,28 @@ import json
 from datetime import datetime
 
 from src.config import AI_DEBUG_MODE
-from src.utils import safe_get
-
-
-async def _parse_search_results_json(json_data: dict, source: str) -> list:
+from src.utils import get_path
+
+# --- 预先构建的字段路径，解析循环中不再为每次查找构造参数 ---
+_RET = ("ret",)
+_RESULT_LIST = ("data", "resultList")
+_ITEM_MAIN = ("data", "item", "main")
+_CLICK_ARGS = ("clickParam", "args")
+_R1_TAGS = ("fishTags", "r1", "tagList")
+_TAG_CONTENT = ("data", "content")
+_RATE_ROLE = ("rateTagList", 0, "text")
+_HEAD_BASE = ("module", "base")
+_HEAD_AVATAR = ("avatar", "avatar")
+_HEAD_ITEM_COUNT = ("module", "tabs", "item", "number")
+_HEAD_RATE_COUNT = ("module", "tabs", "rate", "number")
+
+
+def parse_search_results(json_data: dict, source: str) -> list:
     """解析搜索API的JSON数据，返回基础商品信息列表。"""
     page_data = []
     try:
         # 首先检查API响应是否有错误
-        ret_field = await safe_get(json_data, "ret", default=[])
+        ret_field = get_path(json_data, _RET, [])
         if isinstance(ret_field, list) and ret_field:
             ret_string = str(ret_field)
             if "被挤爆啦" in ret_string or "RGV587_ERROR" in ret_string:
@@ -24,8 +37,8 @@ async def _parse_search_results_json(json_data: dict, source: str) -> list:
             elif "ERROR" in ret_string:
                 print(f"LOG: ({source}) API返回错误: {ret_string}")
                 return []
-        
-        items = await safe_get(json_data, "data", "resultList", default=[])
+
+        items = get_path(json_data, _RESULT_LIST, [])
         if not items:
             print(f"LOG: ({source}) API响应中未找到商品列表 (resultList)。")
             if AI_DEBUG_MODE:
@@ -35,29 +48,34 @@ async def _parse_search_results_json(json_data: dict, source: str) -> list:
             return []
 
         for item in items:
-            main_data = await safe_get(item, "data", "item", "main", "exContent", default={})
-            click_params = await safe_get(item, "data", "item", "main", "clickParam", "args", default={})
-
-            title = await safe_get(main_data, "title", default="未知标题")
-            price_parts = await safe_get(main_data, "price", default=[])
+            # data.item.main 只解析一次，其余字段都从它出发读取
+            main = get_path(item, _ITEM_MAIN, None)
+            if not isinstance(main, dict):
+                main = {}
+            main_data = main.get("exContent")
+            if not isinstance(main_data, dict):
+                main_data = {}
+            click_params = get_path(main, _CLICK_ARGS, {})
+            if not isinstance(click_params, dict):
+                click_params = {}
+
+            title = main_data.get("title", "未知标题")
+            price_parts = main_data.get("price", [])
             price = "".join([str(p.get("text", "")) for p in price_parts if isinstance(p, dict)]).replace("当前价", "").strip() if isinstance(price_parts, list) else "价格异常"
             if "万" in price: price = f"¥{float(price.replace('¥', '').replace('万', '')) * 10000:.0f}"
-            area = await safe_get(main_data, "area", default="地区未知")
-            seller = await safe_get(main_data, "userNickName", default="匿名卖家")
-            raw_link = await safe_get(item, "data", "item", "main", "targetUrl", default="")
-            image_url = await safe_get(main_data, "picUrl", default="")
+            area = main_data.get("area", "地区未知")
+            seller = main_data.get("userNickName", "匿名卖家")
+            raw_link = main.get("targetUrl", "")
             pub_time_ts = click_params.get("publishTime", "")
-            item_id = await safe_get(main_data, "itemId", default="未知ID")
-            original_price = await safe_get(main_data, "oriPrice", default="暂无")
-            wants_count = await safe_get(click_params, "wantNum", default='NaN')
-
+            item_id = main_data.get("itemId", "未知ID")
+            original_price = main_data.get("oriPrice", "暂无")
+            wants_count = click_params.get("wantNum", 'NaN')
 
             tags = []
-            if await safe_get(click_params, "tag") == "freeship":
+            if click_params.get("tag") == "freeship":
                 tags.append("包邮")
-            r1_tags = await safe_get(main_data, "fishTags", "r1", "tagList", default=[])
-            for tag_item in r1_tags:
-                content = await safe_get(tag_item, "data", "content", default="")
+            for tag_item in get_path(main_data, _R1_TAGS, []):
+                content = get_path(tag_item, _TAG_CONTENT, "")
                 if "验货宝" in content:
                     tags.append("验货宝")
 
@@ -80,7 +98,7 @@ async def _parse_search_results_json(json_data: dict, source: str) -> list:
         return []
 
 
-async def calculate_reputation_from_ratings(ratings_json: list) -> dict:
+def reputation_from_ratings(ratings_json: list) -> dict:
     """从原始评价API数据列表中，计算作为卖家和买家的好评数与好评率。"""
     seller_total = 0
     seller_positive = 0
@@ -88,10 +106,9 @@ async def calculate_reputation_from_ratings(ratings_json: list) -> dict:
     buyer_positive = 0
 
     for card in ratings_json:
-        # 使用 safe_get 保证安全访问
-        data = await safe_get(card, 'cardData', default={})
-        role_tag = await safe_get(data, 'rateTagList', 0, 'text', default='')
-        rate_type = await safe_get(data, 'rate') # 1=好评, 0=中评, -1=差评
+        data = card.get('cardData') or {}
+        role_tag = get_path(data, _RATE_ROLE, '')
+        rate_type = data.get('rate') # 1=好评, 0=中评, -1=差评
 
         if "卖家" in role_tag:
             seller_total += 1
@@ -114,7 +131,7 @@ async def calculate_reputation_from_ratings(ratings_json: list) -> dict:
     }
 
 
-async def _parse_user_items_data(items_json: list) -> list:
+def parse_user_items(items_json: list) -> list:
     """解析用户主页的商品列表API的JSON数据。"""
     parsed_list = []
     for card in items_json:
@@ -137,34 +154,38 @@ async def _parse_user_items_data(items_json: list) -> list:
     return parsed_list
 
 
-async def parse_user_head_data(head_json: dict) -> dict:
+def parse_user_head(head_json: dict) -> dict:
     """解析用户头部API的JSON数据。"""
     data = head_json.get('data', {})
-    ylz_tags = await safe_get(data, 'module', 'base', 'ylzTags', default=[])
+    base = get_path(data, _HEAD_BASE, {})
+    if not isinstance(base, dict):
+        base = {}
     seller_credit, buyer_credit = {}, {}
-    for tag in ylz_tags:
-        if await safe_get(tag, 'attributes', 'role') == 'seller':
-            seller_credit = {'level': await safe_get(tag, 'attributes', 'level'), 'text': tag.get('text')}
-        elif await safe_get(tag, 'attributes', 'role') == 'buyer':
-            buyer_credit = {'level': await safe_get(tag, 'attributes', 'level'), 'text': tag.get('text')}
+    for tag in base.get('ylzTags') or []:
+        attributes = tag.get('attributes') or {}
+        role = attributes.get('role', '暂无')
+        if role == 'seller':
+            seller_credit = {'level': attributes.get('level', '暂无'), 'text': tag.get('text')}
+        elif role == 'buyer':
+            buyer_credit = {'level': attributes.get('level', '暂无'), 'text': tag.get('text')}
     return {
-        "卖家昵称": await safe_get(data, 'module', 'base', 'displayName'),
-        "卖家头像链接": await safe_get(data, 'module', 'base', 'avatar', 'avatar'),
-        "卖家个性签名": await safe_get(data, 'module', 'base', 'introduction', default=''),
-        "卖家在售/已售商品数": await safe_get(data, 'module', 'tabs', 'item', 'number'),
-        "卖家收到的评价总数": await safe_get(data, 'module', 'tabs', 'rate', 'number'),
+        "卖家昵称": base.get('displayName', '暂无'),
+        "卖家头像链接": get_path(base, _HEAD_AVATAR),
+        "卖家个性签名": base.get('introduction', ''),
+        "卖家在售/已售商品数": get_path(data, _HEAD_ITEM_COUNT),
+        "卖家收到的评价总数": get_path(data, _HEAD_RATE_COUNT),
         "卖家信用等级": seller_credit.get('text', '暂无'),
         "买家信用等级": buyer_credit.get('text', '暂无')
     }
 
 
-async def parse_ratings_data(ratings_json: list) -> list:
+def parse_ratings(ratings_json: list) -> list:
     """解析评价列表API的JSON数据。"""
     parsed_list = []
     for card in ratings_json:
-        data = await safe_get(card, 'cardData', default={})
-        rate_tag = await safe_get(data, 'rateTagList', 0, 'text', default='未知角色')
-        rate_type = await safe_get(data, 'rate')
+        data = card.get('cardData') or {}
+        rate_tag = get_path(data, _RATE_ROLE, '未知角色')
+        rate_type = data.get('rate')
         if rate_type == 1: rate_text = "好评"
         elif rate_type == 0: rate_text = "中评"
         elif rate_type == -1: rate_text = "差评"
@@ -176,6 +197,28 @@ async def parse_ratings_data(ratings_json: list) -> list:
             "评价来源角色": rate_tag,
             "评价者昵称": data.get('raterUserNick'),
             "评价时间": data.get('gmtCreate'),
-            "评价图片": await safe_get(data, 'pictCdnUrlList', default=[])
+            "评价图片": data.get('pictCdnUrlList', [])
         })
     return parsed_list
+
+
+# --- 兼容旧调用的异步包装 ---
+
+async def _parse_search_results_json(json_data: dict, source: str) -> list:
+    return parse_search_results(json_data, source)
+
+
+async def calculate_reputation_from_ratings(ratings_json: list) -> dict:
+    return reputation_from_ratings(ratings_json)
+
+
+async def _parse_user_items_data(items_json: list) -> list:
+    return parse_user_items(items_json)
+
+
+async def parse_user_head_data(head_json: dict) -> dict:
+    return parse_user_head(head_json)
+
+
+async def parse_ratings_data(ratings_json: list) -> list:
+    return parse_ratings(ratings_json)
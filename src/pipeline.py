@@ -0,0 +1,134 @@
+"""
+基于有界 asyncio 队列的分阶段处理流水线。
+
+每个阶段有自己的队列和一组并发 worker，处理结果交给下一阶段。队列有上限，
+下游处理不过来时上游的 put 会等待（背压），因此请求闲鱼的阶段可以保持单 worker 的礼貌速率，
+而AI分析、通知等只与第三方服务有关的阶段可以并发重叠执行。
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+_STOP = object()
+
+
+class Stage:
+    """
+    流水线中的一个阶段。
+
+    Args:
+        name: 阶段名称，用于统计输出
+        handler: 异步处理函数，接收上一阶段的输出；返回 None 表示该条目到此为止，不再传给下一阶段
+        workers: 并发 worker 数
+        on_input_done: 可选的异步回调，该阶段的全部输入都已被 worker 取走（不会再有新条目）时调用一次，
+            例如让攒批的处理函数立即发送最后一个未凑满的批次
+    """
+
+    def __init__(self, name: str, handler: Callable[[object], Awaitable[Optional[object]]], workers: int = 1,
+                 on_input_done: Optional[Callable[[], Awaitable[None]]] = None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.on_input_done = on_input_done
+        self.input_done = False
+        self.queue = None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.busy_seconds = 0.0
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage], queue_size: int = 10):
+        self.name = name
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.stop_requested = False
+        self._worker_tasks = []
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            stage.queue = asyncio.Queue(maxsize=self.queue_size)
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            self._worker_tasks.append([
+                asyncio.ensure_future(self._worker(stage, next_stage)) for _ in range(stage.workers)
+            ])
+        return self
+
+    def request_stop(self):
+        """
+        由阶段处理函数调用（例如检测到反爬验证），通知生产者不再提交新条目，第一个阶段丢弃排队中的条目；
+        下游阶段照常处理已经持有的条目。
+        """
+        self.stop_requested = True
+
+    async def put(self, item):
+        """向第一个阶段提交条目；队列已满时等待，形成背压。"""
+        stage = self.stages[0]
+        await stage.queue.put(item)
+        stage.max_depth = max(stage.max_depth, stage.queue.qsize())
+
+    async def _worker(self, stage: Stage, next_stage: Optional[Stage]):
+        while True:
+            item = await stage.queue.get()
+            if item is _STOP:
+                # 结束标记排在所有条目之后，第一个收到它时该阶段的条目都已被 worker 取走
+                if stage.on_input_done and not stage.input_done:
+                    stage.input_done = True
+                    try:
+                        await stage.on_input_done()
+                    except Exception as e:
+                        print(f"   错误: 流水线阶段 [{stage.name}] 输入结束回调失败: {e}")
+                return
+            # 停止时只丢弃尚未进入第一个阶段的条目；已经通过第一个阶段的条目（如已完成AI分析）继续处理完，
+            # 保证它们被通知和保存，下次运行不会重复分析
+            if self.stop_requested and stage is self.stages[0]:
+                stage.dropped += 1
+                continue
+            started = time.perf_counter()
+            try:
+                result = await stage.handler(item)
+            except Exception as e:
+                stage.errors += 1
+                print(f"   错误: 流水线阶段 [{stage.name}] 处理失败: {e}")
+                continue
+            finally:
+                stage.busy_seconds += time.perf_counter() - started
+
+            if result is None:
+                stage.dropped += 1
+                continue
+            stage.processed += 1
+            if next_stage is not None:
+                await next_stage.queue.put(result)
+                next_stage.max_depth = max(next_stage.max_depth, next_stage.queue.qsize())
+
+    async def join(self):
+        """生产者提交完毕后调用：按阶段顺序依次排空队列并结束 worker。"""
+        for stage, tasks in zip(self.stages, self._worker_tasks):
+            for _ in tasks:
+                await stage.queue.put(_STOP)
+            await asyncio.gather(*tasks)
+
+    async def cancel(self):
+        """异常退出时取消所有仍在运行的 worker。"""
+        for tasks in self._worker_tasks:
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*[task for tasks in self._worker_tasks for task in tasks], return_exceptions=True)
+
+    def format_stats(self) -> str:
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        lines = [f"LOG: [流水线] {self.name} 运行 {elapsed:.1f}s，各阶段统计:"]
+        for stage in self.stages:
+            throughput = stage.processed / elapsed if elapsed > 0 else 0.0
+            depth = stage.queue.qsize() if stage.queue is not None else 0
+            lines.append(
+                f"   - {stage.name:<8} worker={stage.workers} 完成 {stage.processed}，丢弃 {stage.dropped}，"
+                f"错误 {stage.errors}，队列深度 当前 {depth}/最大 {stage.max_depth}，"
+                f"忙碌 {stage.busy_seconds:.1f}s，吞吐 {throughput:.2f} 条/秒"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,116 @@
+"""
+浏览器页面的资源拦截与流量统计。
+
+爬虫打开详情页或用户主页只是为了捕获页面发出的 mtop 接口JSON，
+通过 context.route 拦截图片、视频、字体、样式和第三方统计请求，可以显著减少每个页面的下载量和就绪时间。
+"""
+import asyncio
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from src.anti_crawler_config import RESOURCE_BLOCKING_POLICY
+from src.config import BLOCK_PAGE_RESOURCES
+
+
+def _host_matches(host: str, suffixes) -> bool:
+    return any(host == suffix or host.endswith("." + suffix) for suffix in suffixes)
+
+
+def should_block(url: str, resource_type: str, policy: dict = RESOURCE_BLOCKING_POLICY) -> bool:
+    """根据拦截策略判断一个请求是否应被拦截。"""
+    host = (urlparse(url).hostname or "").lower()
+    if not host:
+        # data:、blob: 等本地资源不经过网络
+        return False
+    if _host_matches(host, policy["allowed_hosts"]):
+        return False
+    if _host_matches(host, policy["tracker_hosts"]):
+        return True
+    if resource_type in policy["blocked_resource_types"]:
+        return True
+    if resource_type == "script" and not _host_matches(host, policy["script_hosts"]):
+        return True
+    return False
+
+
+async def install_resource_blocking(context, policy: dict = RESOURCE_BLOCKING_POLICY, enabled: Optional[bool] = None):
+    """
+    在浏览器上下文上安装资源拦截路由，对该上下文中打开的所有页面生效。
+
+    Args:
+        context: Playwright BrowserContext
+        policy: 拦截策略，默认使用 anti_crawler_config.RESOURCE_BLOCKING_POLICY
+        enabled: 是否启用，默认取 BLOCK_PAGE_RESOURCES 配置
+    """
+    if enabled is None:
+        enabled = BLOCK_PAGE_RESOURCES
+    if not enabled:
+        return
+
+    async def handle_route(route):
+        request = route.request
+        if should_block(request.url, request.resource_type, policy):
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handle_route)
+    print("LOG: 已为浏览器页面启用资源拦截（图片/视频/字体/样式/第三方统计）。")
+
+
+class PageTrafficStats:
+    """统计单个页面的请求数、被拦截数、传输字节数和就绪耗时。"""
+
+    def __init__(self, page):
+        self._page = page
+        self.started = time.perf_counter()
+        self.ready_seconds = None
+        self.requests = 0
+        self.blocked = 0
+        self.bytes_transferred = 0
+        self._pending = set()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_finished)
+        page.on("requestfailed", self._on_request_failed)
+
+    def detach(self):
+        """移除监听器。页面被复用时，下一次统计需要重新开始。"""
+        self._page.remove_listener("request", self._on_request)
+        self._page.remove_listener("requestfinished", self._on_request_finished)
+        self._page.remove_listener("requestfailed", self._on_request_failed)
+
+    def _on_request(self, request):
+        self.requests += 1
+
+    def _on_request_finished(self, request):
+        task = asyncio.ensure_future(self._add_sizes(request))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _on_request_failed(self, request):
+        # Chromium 中被拦截的请求以 net::ERR_BLOCKED_BY_CLIENT 失败
+        if "blockedbyclient" in (request.failure or "").lower().replace("_", ""):
+            self.blocked += 1
+
+    async def _add_sizes(self, request):
+        try:
+            sizes = await request.sizes()
+            self.bytes_transferred += sizes["responseHeadersSize"] + max(sizes["responseBodySize"], 0)
+        except Exception:
+            # 页面关闭后无法再读取请求大小，忽略即可
+            pass
+
+    def mark_ready(self):
+        """在页面拿到所需的接口数据时调用，记录页面就绪耗时。"""
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self.started
+
+    async def log(self, label: str):
+        if self._pending:
+            await asyncio.wait(list(self._pending), timeout=2)
+        ready = f"{self.ready_seconds:.2f}s" if self.ready_seconds is not None else "未就绪"
+        print(
+            f"   [页面流量] {label}: 请求 {self.requests} 个（拦截 {self.blocked} 个），"
+            f"传输 {self.bytes_transferred / 1024:.1f} KB，就绪耗时 {ready}"
+        )
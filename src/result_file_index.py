@@ -0,0 +1,189 @@
+"""
+结果文件的内存索引（RESULTS_BACKEND=jsonl 时使用）。
+
+每个 JSONL 结果文件维护一份紧凑的 NumPy 索引：每条记录的字节偏移，以及预先计算好的排序键
+（数值价格、发布时间、爬取时间）和是否推荐标记。文件增长时只读取上次记录的大小之后新增的字节；
+文件被截断或替换时整体重建。排序、筛选都在数组上完成，排序结果按查询条件缓存到文件下次变化为止，
+每次请求只 seek 并解析当前页的记录。长时间未访问的文件索引按 LRU 淘汰。
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Tuple
+
+import numpy as np
+
+from src.config import RESULT_INDEX_CACHE_FILES
+from src.results_store import parse_price
+
+SORT_KEYS = ("crawl_time", "publish_time", "price")
+
+
+def _crawl_time_key(value) -> float:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return float("-inf")
+
+
+def _publish_time_key(value) -> float:
+    # 与旧版按字符串排序的结果一致："未知时间" 排在所有日期之后，缺失的发布时间排在最前
+    if value is None:
+        return float("-inf")
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M").timestamp()
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+class ResultFileIndex:
+    """单个结果文件的索引。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.inode = None
+        self.mtime = None
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.keys = {name: np.empty(0, dtype=np.float64) for name in SORT_KEYS}
+        self.recommended = np.empty(0, dtype=bool)
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def refresh(self) -> int:
+        """
+        根据文件当前的大小/inode/修改时间更新索引，返回新增的记录数。
+        文件不存在时抛出 FileNotFoundError。
+        """
+        stat = os.stat(self.path)
+        if stat.st_ino == self.inode and stat.st_size == self.size and stat.st_mtime == self.mtime:
+            return 0
+        if stat.st_ino != self.inode or stat.st_size < self.size:
+            self._reset()
+
+        offsets, recommended = [], []
+        keys = {name: [] for name in SORT_KEYS}
+        position = self.size
+        with open(self.path, "rb") as f:
+            f.seek(position)
+            for line in f:
+                # 末尾没有换行符的行可能仍在写入中，留到下次刷新
+                if not line.endswith(b"\n"):
+                    break
+                line_offset, position = position, position + len(line)
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                info = record.get("商品信息") or {}
+                ai_analysis = record.get("ai_analysis") or {}
+                offsets.append(line_offset)
+                keys["crawl_time"].append(_crawl_time_key(record.get("爬取时间", "")))
+                keys["publish_time"].append(_publish_time_key(info.get("发布时间")))
+                keys["price"].append(parse_price(info.get("当前售价", "0")))
+                recommended.append(isinstance(ai_analysis, dict) and ai_analysis.get("is_recommended") is True)
+
+        self.size = position
+        self.inode = stat.st_ino
+        self.mtime = stat.st_mtime
+        if offsets:
+            self.offsets = np.concatenate([self.offsets, np.array(offsets, dtype=np.int64)])
+            for name in SORT_KEYS:
+                self.keys[name] = np.concatenate([self.keys[name], np.array(keys[name], dtype=np.float64)])
+            self.recommended = np.concatenate([self.recommended, np.array(recommended, dtype=bool)])
+            self._orders.clear()
+        return len(offsets)
+
+    def _order(self, sort_by: str, sort_order: str, recommended_only: bool) -> np.ndarray:
+        """返回排序（及筛选）后的记录下标，按查询条件缓存到索引下次变化为止。"""
+        cache_key = (sort_by, sort_order, recommended_only)
+        order = self._orders.get(cache_key)
+        if order is None:
+            positions = np.flatnonzero(self.recommended) if recommended_only else np.arange(len(self.offsets))
+            keys = self.keys[sort_by][positions]
+            # 稳定排序；倒序时对键取负，排序键相同的记录仍保持文件中的先后顺序（与旧版 list.sort 一致）
+            order = positions[np.argsort(-keys if sort_order == "desc" else keys, kind="stable")]
+            self._orders[cache_key] = order
+        return order
+
+    def query(self, page: int, limit: int, recommended_only: bool = False,
+              sort_by: str = "crawl_time", sort_order: str = "desc") -> Tuple[int, List[dict]]:
+        """返回 (筛选后的总数, 当前页记录)，只读取当前页记录所在的字节。"""
+        sort_by = sort_by if sort_by in SORT_KEYS else "crawl_time"
+        order = self._order(sort_by, sort_order, recommended_only)
+        start = max(0, (page - 1) * limit)
+        items = []
+        page_offsets = self.offsets[order[start:start + max(0, limit)]]
+        if len(page_offsets):
+            with open(self.path, "rb") as f:
+                for offset in page_offsets:
+                    f.seek(int(offset))
+                    items.append(json.loads(f.readline()))
+        return len(order), items
+
+    def memory_bytes(self) -> int:
+        arrays = [self.offsets, self.recommended, *self.keys.values(), *self._orders.values()]
+        return sum(array.nbytes for array in arrays)
+
+
+class ResultIndexCache:
+    """按文件缓存索引，超过 max_files 个时淘汰最久未访问的文件。"""
+
+    def __init__(self, max_files: int = RESULT_INDEX_CACHE_FILES):
+        self.max_files = max(1, max_files)
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def query(self, path: str, page: int, limit: int, recommended_only: bool = False,
+              sort_by: str = "crawl_time", sort_order: str = "desc") -> Tuple[int, List[dict]]:
+        with self._lock:
+            index = self._indexes.pop(path, None)
+            if index is None:
+                index = ResultFileIndex(path)
+            self._indexes[path] = index
+            while len(self._indexes) > self.max_files:
+                self._indexes.popitem(last=False)
+            try:
+                index.refresh()
+            except FileNotFoundError:
+                del self._indexes[path]
+                raise
+            return index.query(page, limit, recommended_only, sort_by, sort_order)
+
+    def evict(self, path: str):
+        with self._lock:
+            self._indexes.pop(path, None)
+
+    def stats(self) -> List[dict]:
+        """每个已缓存文件的记录数与索引内存占用，按最近访问排序。"""
+        with self._lock:
+            return [
+                {
+                    "file": os.path.basename(path),
+                    "records": len(index),
+                    "indexed_bytes": index.size,
+                    "memory_bytes": index.memory_bytes(),
+                    "cached_orders": len(index._orders),
+                }
+                for path, index in reversed(self._indexes.items())
+            ]
+
+
+_cache = None
+
+
+def get_result_index_cache() -> ResultIndexCache:
+    """获取进程内共享的结果文件索引缓存。"""
+    global _cache
+    if _cache is None:
+        _cache = ResultIndexCache()
+    return _cache
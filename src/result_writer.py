@@ -0,0 +1,197 @@
+"""
+批量写入 JSONL 结果文件。
+
+每个结果文件对应一个写入器：生产者调用 write() 把记录放入有界的 asyncio 队列（写入器跟不上时等待），
+后台 writer 协程把队列中的记录攒成批次，达到 RESULT_WRITE_BATCH_SIZE 条或最早的一条已等待
+RESULT_WRITE_FLUSH_INTERVAL 秒时一次性追加写入。并发的生产者由同一个 writer 串行化，
+多个任务进程写同一个关键词文件时以文件锁（flock）保证整批写入不会与其他进程交错。
+fsync 策略由 RESULT_FSYNC_POLICY 控制：always 每批都 fsync；interval 至多每 RESULT_FSYNC_INTERVAL 秒一次；
+never 交给操作系统。进程退出前必须调用 close_jsonl_writers()，把尚未落盘的记录写完。
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Callable, List, Optional
+
+from src.config import (
+    RESULT_FSYNC_INTERVAL,
+    RESULT_FSYNC_POLICY,
+    RESULT_WRITE_BATCH_SIZE,
+    RESULT_WRITE_FLUSH_INTERVAL,
+    RESULT_WRITE_QUEUE_SIZE,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 flock，只依赖进程内的串行化
+    fcntl = None
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+_CLOSE = object()
+
+
+class JsonlWriter:
+    """
+    单个 JSONL 文件的批量写入器。
+
+    Args:
+        path: 结果文件路径
+        on_flushed: 可选回调，每批记录成功写入后以该批记录列表在线程池中调用（例如更新去重索引），
+            不阻塞事件循环；同一写入器的回调按批次顺序依次执行
+    """
+
+    def __init__(self, path: str, batch_size: int = RESULT_WRITE_BATCH_SIZE,
+                 flush_interval: float = RESULT_WRITE_FLUSH_INTERVAL, fsync_policy: str = RESULT_FSYNC_POLICY,
+                 fsync_interval: float = RESULT_FSYNC_INTERVAL, queue_size: int = RESULT_WRITE_QUEUE_SIZE,
+                 on_flushed: Optional[Callable[[List[dict]], None]] = None):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"未知的 fsync 策略: {fsync_policy}，可选值: {', '.join(FSYNC_POLICIES)}")
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.on_flushed = on_flushed
+        self.written = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.failed = 0
+        self._queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        self._task = asyncio.ensure_future(self._run())
+        self._closed = False
+
+    async def write(self, record: dict):
+        """提交一条记录；记录在生产者一侧序列化，队列已满时等待 writer 写出。"""
+        if self._closed:
+            raise RuntimeError(f"结果文件 {self.path} 的写入器已关闭")
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        await self._queue.put((line, record))
+
+    async def close(self):
+        """写出队列中剩余的全部记录并结束 writer。"""
+        if self._closed:
+            return
+        self._closed = True
+        await self._queue.put(_CLOSE)
+        await self._task
+
+    async def _run(self):
+        batch = []
+        deadline = 0.0
+        closing = False
+        get_task = None
+        while not closing:
+            if get_task is None:
+                get_task = asyncio.ensure_future(self._queue.get())
+            # 批次为空时一直等待第一条记录；否则最多等到批次的刷新期限
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            done, _ = await asyncio.wait({get_task}, timeout=timeout)
+            if get_task in done:
+                entry, get_task = get_task.result(), None
+                while True:
+                    if entry is _CLOSE:
+                        closing = True
+                        break
+                    if not batch:
+                        deadline = time.monotonic() + self.flush_interval
+                    batch.append(entry)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        entry = self._queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+            if batch and (closing or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                await self._flush(batch, final=closing)
+                batch = []
+        # 关闭时最后一批为空，但之前的批次还没有 fsync 过
+        if self._unsynced:
+            await asyncio.to_thread(self._fsync_file)
+
+    async def _flush(self, batch: list, final: bool = False):
+        data = "".join(line for line, _ in batch).encode("utf-8")
+        do_fsync = self.fsync_policy == "always" or (self.fsync_policy == "interval" and (
+            final or time.monotonic() - self._last_fsync >= self.fsync_interval
+        ))
+        try:
+            await asyncio.to_thread(self._append, data, do_fsync)
+        except OSError as e:
+            self.failed += len(batch)
+            print(f"写入文件 {self.path} 出错: {e}（本批 {len(batch)} 条记录未保存）")
+            return
+        self.written += len(batch)
+        self.batches += 1
+        if self.on_flushed:
+            try:
+                await asyncio.to_thread(self.on_flushed, [record for _, record in batch])
+            except Exception as e:
+                print(f"结果文件 {self.path} 写入后回调出错: {e}")
+
+    def _append(self, data: bytes, do_fsync: bool):
+        # 每批重新打开文件：结果文件在任务运行期间被 Web 界面删除时，下一批会写入新文件
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "ab") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.write(data)
+                f.flush()
+                if do_fsync:
+                    os.fsync(f.fileno())
+                    self.fsyncs += 1
+                    self._last_fsync = time.monotonic()
+                self._unsynced = self.fsync_policy == "interval" and not do_fsync
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _fsync_file(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+            self.fsyncs += 1
+            self._unsynced = False
+        finally:
+            os.close(fd)
+
+    def format_stats(self) -> str:
+        return (f"{os.path.basename(self.path)}: 写入 {self.written} 条 / {self.batches} 批，"
+                f"fsync {self.fsyncs} 次，失败 {self.failed} 条")
+
+
+# {path: (writer, loop)}，写入器与创建它的事件循环绑定
+_writers = {}
+
+
+def get_jsonl_writer(path: str, on_flushed: Optional[Callable[[List[dict]], None]] = None) -> JsonlWriter:
+    """获取当前事件循环内该文件共享的写入器，首次调用时创建。"""
+    loop = asyncio.get_running_loop()
+    entry = _writers.get(path)
+    if entry:
+        writer, writer_loop = entry
+        if writer_loop is loop and not writer._closed:
+            return writer
+    writer = JsonlWriter(path, on_flushed=on_flushed)
+    _writers[path] = (writer, loop)
+    return writer
+
+
+async def close_jsonl_writers():
+    """写出并关闭当前事件循环中的全部写入器（进程退出或收到 SIGTERM 时调用）。"""
+    loop = asyncio.get_running_loop()
+    for path, (writer, writer_loop) in list(_writers.items()):
+        if writer_loop is not loop:
+            continue
+        await writer.close()
+        if writer.written or writer.failed:
+            print(f"LOG: [结果写入] {writer.format_stats()}")
+        del _writers[path]
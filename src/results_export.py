@@ -0,0 +1,188 @@
+"""
+结果流式导出（CSV / NDJSON / Parquet）。
+
+记录通过 ResultsStore.query_page 的游标分块读取，每块编码后立即产出，
+内存占用只与块大小有关，与导出的总行数无关。CSV 和 Parquet 需要固定的列，
+会先用一遍游标扫描收集展开后的列名（只保留列名），再扫描第二遍输出数据；
+两遍扫描都限定在导出开始时的最大记录ID内，期间导入的新记录不会出现在第二遍中而缺少列。
+导出内容在响应开始后才逐块生成，筛选参数在 export_results 中提前校验，无效时直接抛出 ValueError。
+"""
+import csv
+import io
+import json
+from typing import Iterator, List, Optional
+
+from src.results_store import ResultsStore, validate_query_filters
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson; charset=utf-8", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# 展开为 "父字段.子字段" 列的嵌套字段，其余嵌套值（列表、更深层的对象）以 JSON 字符串保存
+FLATTEN_FIELDS = ("商品信息", "卖家信息", "ai_analysis")
+
+
+def _price_value(value) -> Optional[float]:
+    try:
+        return float(str(value).replace("¥", "").replace(",", "").strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def _bool_value(value) -> Optional[bool]:
+    return value if isinstance(value, bool) else None
+
+
+# Parquet 中按原始值转换类型的列：{列名: (pyarrow 类型名, 转换函数)}，其余列为可空字符串
+PARQUET_TYPED_COLUMNS = {
+    "商品信息.当前售价": ("float64", _price_value),
+    "ai_analysis.is_recommended": ("bool_", _bool_value),
+}
+
+
+def _cell(value):
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def flatten_record(record: dict) -> dict:
+    """把一条结果记录展开为 {列名: 字符串值}。"""
+    row = {}
+    for key, value in record.items():
+        if key in FLATTEN_FIELDS and isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                row[f"{key}.{sub_key}"] = _cell(sub_value)
+        else:
+            row[key] = _cell(value)
+    return row
+
+
+def iter_result_chunks(store: ResultsStore, scope: str, chunk_size: int = 1000, **filters) -> Iterator[List[dict]]:
+    """按游标分块遍历筛选后的全部记录。"""
+    cursor = None
+    while True:
+        items, cursor = store.query_page(scope, limit=chunk_size, cursor=cursor, **filters)
+        if items:
+            yield items
+        if cursor is None:
+            return
+
+
+def collect_columns(store: ResultsStore, scope: str, **filters) -> List[str]:
+    """扫描一遍记录，按首次出现的顺序收集展开后的列名（调用方通过 max_id 固定扫描范围）。"""
+    columns = {}
+    for chunk in iter_result_chunks(store, scope, **filters):
+        for record in chunk:
+            for column in flatten_record(record):
+                columns.setdefault(column, None)
+    return list(columns)
+
+
+def export_ndjson(store: ResultsStore, scope: str, **filters) -> Iterator[bytes]:
+    """逐块输出原始记录，每行一条 JSON（保留嵌套结构）。"""
+    for chunk in iter_result_chunks(store, scope, **filters):
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk).encode("utf-8")
+
+
+def export_csv(store: ResultsStore, scope: str, **filters) -> Iterator[bytes]:
+    """逐块输出展开后的 CSV；带 UTF-8 BOM，Excel 可以直接正确显示中文。"""
+    filters["max_id"] = store.max_id(scope)
+    columns = collect_columns(store, scope, **filters)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for chunk in iter_result_chunks(store, scope, **filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(flatten_record(record) for record in chunk)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """供 ParquetWriter 写入的文件对象，写入的字节在每个行组之后被取走。"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def export_parquet(store: ResultsStore, scope: str, **filters) -> Iterator[bytes]:
+    """
+    每个游标分块写成一个行组并立即输出。售价为 float64、是否推荐为 bool（见 PARQUET_TYPED_COLUMNS），
+    其余列为可空字符串。需要安装 pyarrow。
+    """
+    filters["max_id"] = store.max_id(scope)
+    columns = collect_columns(store, scope, **filters)
+    schema = pa.schema([
+        (column, getattr(pa, PARQUET_TYPED_COLUMNS[column][0])() if column in PARQUET_TYPED_COLUMNS else pa.string())
+        for column in columns
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for chunk in iter_result_chunks(store, scope, chunk_size=10000, **filters):
+            rows = []
+            for record in chunk:
+                row = flatten_record(record)
+                for column, (_, convert) in PARQUET_TYPED_COLUMNS.items():
+                    if column in row:
+                        parent, child = column.split(".", 1)
+                        row[column] = convert(record[parent].get(child))
+                rows.append(row)
+            writer.write_table(pa.Table.from_pydict(
+                {column: [row.get(column) for row in rows] for column in columns}, schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_results(store: ResultsStore, scope: str, export_format: str, **filters) -> Iterator[bytes]:
+    """按格式返回导出内容的字节块迭代器；格式或筛选参数无效时立即抛出 ValueError（在开始输出之前）。"""
+    validate_query_filters(filters.get("sort_by", "crawl_time"), filters.get("sort_order", "desc"),
+                           filters.get("publish_after"), filters.get("publish_before"))
+    if export_format == "ndjson":
+        return export_ndjson(store, scope, **filters)
+    if export_format == "csv":
+        return export_csv(store, scope, **filters)
+    if export_format == "parquet":
+        if not PARQUET_AVAILABLE:
+            raise ValueError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        return export_parquet(store, scope, **filters)
+    raise ValueError(f"不支持的导出格式: {export_format}，可选值: {', '.join(EXPORT_FORMATS)}")
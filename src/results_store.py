@@ -0,0 +1,374 @@
+"""
+带索引的结果存储。
+
+JSONL 结果文件仍然是唯一的写入目标，本模块把它们增量导入到 SQLite（WAL 模式）中，
+为爬取时间、发布时间、数值价格、是否推荐、任务名和关键词建立索引，商品标签与AI风险标签单独成表，
+结果接口可以直接按索引取出排序、筛选后的一页，而不必每次解析整个文件。
+query_page() 使用游标（keyset）分页：游标编码了上一页最后一条记录的排序键和记录ID，
+每页的耗时与文件大小无关，翻页期间新写入的记录也不会让页边界错位。
+每个结果文件（作用域）记录已导入的字节偏移，之后只导入文件末尾新增的完整行；
+文件被删除、截断或替换时自动清空该作用域并重新导入。
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from src.config import RESULTS_DB_FILE
+
+# 表结构版本；结果存储只是结果文件的索引，版本升级时直接重建并重新导入
+SCHEMA_VERSION = 2
+
+# 接口 sort_by 参数与索引列的对应关系
+SORT_COLUMNS = {
+    "crawl_time": "crawl_time",
+    "publish_time": "publish_time",
+    "price": "price",
+}
+SORT_ORDERS = ("asc", "desc")
+# 发布时间筛选值："YYYY-MM-DD HH:MM" 或其前缀（如 "2025"、"2025-01"、"2025-01-01"）
+PUBLISH_TIME_PATTERN = re.compile(r"^\d{4}(-\d{2}(-\d{2}( \d{2}(:\d{2})?)?)?)?$")
+
+
+def parse_price(value) -> float:
+    """把 "¥1,234" 形式的售价转换为数字，无法解析时为 0（与旧版排序规则一致）。"""
+    try:
+        return float(str(value).replace("¥", "").replace(",", "").strip())
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def index_columns(record: dict) -> tuple:
+    """从一条结果记录中提取建立索引的列。"""
+    info = record.get("商品信息") or {}
+    ai_analysis = record.get("ai_analysis") or {}
+    return (
+        str(info.get("商品ID") or ""),
+        record.get("任务名称"),
+        record.get("搜索关键字"),
+        record.get("爬取时间", ""),
+        info.get("发布时间", "0000-00-00 00:00"),
+        parse_price(info.get("当前售价", "0")),
+        1 if isinstance(ai_analysis, dict) and ai_analysis.get("is_recommended") is True else 0,
+        info.get("发货地区"),
+    )
+
+
+def record_tags(record: dict) -> List[Tuple[str, str]]:
+    """返回记录的 (类别, 标签) 列表：tag 为商品标签（包邮、验货宝等），risk 为AI分析给出的风险标签。"""
+    info = record.get("商品信息") or {}
+    ai_analysis = record.get("ai_analysis") or {}
+    tags = {("tag", str(tag)) for tag in info.get("商品标签") or [] if tag}
+    if isinstance(ai_analysis, dict) and isinstance(ai_analysis.get("risk_tags"), list):
+        tags.update(("risk", str(tag)) for tag in ai_analysis["risk_tags"] if tag)
+    return sorted(tags)
+
+
+def validate_query_filters(sort_by: str = "crawl_time", sort_order: str = "desc",
+                           publish_after: Optional[str] = None, publish_before: Optional[str] = None):
+    """校验排序方式和发布时间筛选值，无效时抛出 ValueError。"""
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError(f"不支持的排序字段: {sort_by}，可选值: {', '.join(SORT_COLUMNS)}")
+    if sort_order not in SORT_ORDERS:
+        raise ValueError(f"不支持的排序方向: {sort_order}，可选值: {', '.join(SORT_ORDERS)}")
+    for name, value in (("publish_after", publish_after), ("publish_before", publish_before)):
+        if value and not PUBLISH_TIME_PATTERN.match(value):
+            raise ValueError(f"{name} 格式无效: {value}，应为 \"YYYY-MM-DD HH:MM\" 或其前缀（如 \"2025-01-01\"）")
+
+
+def encode_cursor(sort_by: str, sort_order: str, sort_value, row_id: int) -> str:
+    payload = json.dumps([sort_by, sort_order, sort_value, row_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> tuple:
+    """解析游标，返回 (排序键, 记录ID)；游标无效或与当前排序方式不一致时抛出 ValueError。"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort_by, cursor_order, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"无效的游标: {e}")
+    if (cursor_sort_by, cursor_order) != (sort_by, sort_order):
+        raise ValueError("游标与当前的排序方式不一致，请从第一页重新开始")
+    # 排序键和记录ID作为 SQL 参数绑定，只接受标量
+    if sort_value is not None and not isinstance(sort_value, (str, int, float)):
+        raise ValueError("无效的游标: 排序键类型不正确")
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("无效的游标: 记录ID类型不正确")
+    return sort_value, row_id
+
+
+class ResultsStore:
+    def __init__(self, db_path: str = RESULTS_DB_FILE):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._rebuild_schema()
+
+    def _rebuild_schema(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        # 另一个进程可能已经先完成了重建
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            self._conn.execute("COMMIT")
+            return
+        if self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone():
+            print(f"LOG: 结果存储 {self.db_path} 的表结构已更新，将在下次查询时从结果文件重新导入。")
+        for table in ("results", "result_tags", "scopes"):
+            self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute(
+            "CREATE TABLE results ("
+            " id INTEGER PRIMARY KEY, scope TEXT NOT NULL, item_id TEXT,"
+            " task_name TEXT, keyword TEXT, crawl_time TEXT, publish_time TEXT,"
+            " price REAL, is_recommended INTEGER NOT NULL DEFAULT 0, region TEXT, record TEXT NOT NULL)"
+        )
+        for column in SORT_COLUMNS.values():
+            self._conn.execute(f"CREATE INDEX idx_results_{column} ON results (scope, {column})")
+            self._conn.execute(
+                f"CREATE INDEX idx_results_rec_{column} ON results (scope, is_recommended, {column})"
+            )
+        self._conn.execute("CREATE INDEX idx_results_task ON results (task_name)")
+        self._conn.execute("CREATE INDEX idx_results_keyword ON results (keyword)")
+        self._conn.execute(
+            "CREATE TABLE result_tags ("
+            " scope TEXT NOT NULL, kind TEXT NOT NULL, tag TEXT NOT NULL, result_id INTEGER NOT NULL,"
+            " PRIMARY KEY (scope, kind, tag, result_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE scopes ("
+            " scope TEXT PRIMARY KEY, file_offset INTEGER NOT NULL, inode INTEGER, imported_at TEXT NOT NULL)"
+        )
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute("COMMIT")
+
+    def sync_scope(self, scope: str, jsonl_path: str, batch_size: int = 5000) -> int:
+        """
+        把结果文件中尚未导入的完整行导入存储。
+
+        Returns:
+            本次导入的记录数
+        """
+        try:
+            stat = os.stat(jsonl_path)
+        except FileNotFoundError:
+            self.clear_scope(scope)
+            return 0
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_offset, inode FROM scopes WHERE scope = ?", (scope,)
+            ).fetchone()
+            if row and row[0] == stat.st_size and row[1] == stat.st_ino:
+                return 0
+
+            # 在写事务中重新读取偏移，避免 Web 服务与爬虫进程同时导入同一段内容
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT file_offset, inode FROM scopes WHERE scope = ?", (scope,)
+                ).fetchone()
+                offset = row[0] if row else 0
+                if row and (row[1] != stat.st_ino or stat.st_size < offset):
+                    # 文件被替换或截断，整个作用域重新导入
+                    self._conn.execute("DELETE FROM results WHERE scope = ?", (scope,))
+                    self._conn.execute("DELETE FROM result_tags WHERE scope = ?", (scope,))
+                    offset = 0
+                imported, offset = self._import_from(scope, jsonl_path, offset, batch_size)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scopes (scope, file_offset, inode, imported_at) VALUES (?, ?, ?, ?)",
+                    (scope, offset, stat.st_ino, datetime.now().isoformat())
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return imported
+
+    def _import_from(self, scope: str, jsonl_path: str, offset: int, batch_size: int) -> Tuple[int, int]:
+        imported = 0
+        batch = []
+        with open(jsonl_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                # 末尾没有换行符的行可能仍在写入中，留到下次导入
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                batch.append((record, line.decode("utf-8").rstrip("\n")))
+                if len(batch) >= batch_size:
+                    imported += self._insert_batch(scope, batch)
+                    batch = []
+        if batch:
+            imported += self._insert_batch(scope, batch)
+        return imported, offset
+
+    def _insert_batch(self, scope: str, batch: list) -> int:
+        tag_rows = []
+        for record, raw in batch:
+            cursor = self._conn.execute(
+                "INSERT INTO results (scope, item_id, task_name, keyword, crawl_time, publish_time, price,"
+                " is_recommended, region, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, *index_columns(record), raw)
+            )
+            tag_rows.extend((scope, kind, tag, cursor.lastrowid) for kind, tag in record_tags(record))
+        if tag_rows:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO result_tags (scope, kind, tag, result_id) VALUES (?, ?, ?, ?)", tag_rows
+            )
+        return len(batch)
+
+    def query(self, scope: str, page: int = 1, limit: int = 20, recommended_only: bool = False,
+              sort_by: str = "crawl_time", sort_order: str = "desc") -> Tuple[int, List[dict]]:
+        """
+        返回 (筛选后的总数, 当前页记录)。未知的 sort_by 按爬取时间排序，与旧接口一致。
+        """
+        column = SORT_COLUMNS.get(sort_by, "crawl_time")
+        direction = "DESC" if sort_order == "desc" else "ASC"
+        where = "scope = ?" + (" AND is_recommended = 1" if recommended_only else "")
+        offset = max(0, (page - 1) * limit)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM results WHERE {where}", (scope,)).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT record FROM results WHERE {where} ORDER BY {column} {direction}, id {direction}"
+                " LIMIT ? OFFSET ?",
+                (scope, max(0, limit), offset)
+            ).fetchall()
+        return total, [json.loads(record) for (record,) in rows]
+
+    def query_page(self, scope: str, limit: int = 20, cursor: Optional[str] = None,
+                   sort_by: str = "crawl_time", sort_order: str = "desc", recommended_only: bool = False,
+                   min_price: Optional[float] = None, max_price: Optional[float] = None,
+                   publish_after: Optional[str] = None, publish_before: Optional[str] = None,
+                   tags: Optional[List[str]] = None, risk_tags: Optional[List[str]] = None,
+                   region: Optional[str] = None, max_id: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        游标分页查询，返回 (当前页记录, 下一页游标)；没有更多记录时下一页游标为 None。
+
+        Args:
+            cursor: 上一页返回的游标，为空时从第一页开始
+            min_price / max_price: 售价范围（含边界）
+            publish_after / publish_before: 发布时间范围，格式 "YYYY-MM-DD HH:MM" 或其前缀（如 "2025-01-01"）
+            tags: 商品必须同时带有的商品标签，如 ["包邮", "验货宝"]
+            risk_tags: 商品必须同时带有的AI风险标签
+            region: 发货地区包含该字符串
+            max_id: 只返回记录ID不超过该值的记录（导出时固定扫描范围，忽略之后导入的记录）
+
+        排序方式或发布时间格式无效时抛出 ValueError。
+        """
+        validate_query_filters(sort_by, sort_order, publish_after, publish_before)
+        column = SORT_COLUMNS[sort_by]
+        direction, comparison = ("ASC", ">") if sort_order == "asc" else ("DESC", "<")
+
+        conditions, params = ["scope = ?"], [scope]
+        if recommended_only:
+            conditions.append("is_recommended = 1")
+        if min_price is not None:
+            conditions.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            params.append(max_price)
+        if publish_after or publish_before:
+            # 排除 "未知时间" 等无法比较的发布时间
+            conditions.append("publish_time GLOB '[0-9][0-9][0-9][0-9]-*'")
+        if publish_after:
+            conditions.append("publish_time >= ?")
+            params.append(publish_after)
+        if publish_before:
+            # 前缀形式的上界包含当天/当月的全部记录
+            conditions.append("publish_time <= ?")
+            params.append(publish_before + "\uffff")
+        for kind, values in (("tag", tags), ("risk", risk_tags)):
+            for value in values or []:
+                # 按排序索引顺序扫描，逐行用主键探测标签表，不必先取出带该标签的全部记录
+                conditions.append(
+                    "EXISTS (SELECT 1 FROM result_tags WHERE scope = ? AND kind = ? AND tag = ?"
+                    " AND result_id = results.id)"
+                )
+                params.extend([scope, kind, value])
+        if region:
+            conditions.append("instr(region, ?) > 0")
+            params.append(region)
+        if max_id is not None:
+            conditions.append("id <= ?")
+            params.append(max_id)
+        if cursor:
+            sort_value, row_id = decode_cursor(cursor, sort_by, sort_order)
+            conditions.append(f"({column}, id) {comparison} (?, ?)")
+            params.extend([sort_value, row_id])
+
+        limit = max(1, limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {column}, record FROM results WHERE {' AND '.join(conditions)}"
+                f" ORDER BY {column} {direction}, id {direction} LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, last_value, _ = rows[-1]
+            next_cursor = encode_cursor(sort_by, sort_order, last_value, last_id)
+        return [json.loads(record) for _, _, record in rows], next_cursor
+
+    def max_id(self, scope: str) -> int:
+        """返回作用域内最大的记录ID，没有记录时为 0。"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM results WHERE scope = ?", (scope,)).fetchone()
+        return row[0] or 0
+
+    def count(self, scope: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def clear_scope(self, scope: str):
+        """删除一个作用域的全部记录（例如对应的结果文件被删除时）。"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM results WHERE scope = ?", (scope,))
+            self._conn.execute("DELETE FROM result_tags WHERE scope = ?", (scope,))
+            self._conn.execute("DELETE FROM scopes WHERE scope = ?", (scope,))
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_results_store = None
+
+
+def get_results_store() -> ResultsStore:
+    """获取进程内共享的结果存储实例。"""
+    global _results_store
+    if _results_store is None:
+        _results_store = ResultsStore()
+    return _results_store
+
+
+if __name__ == "__main__":
+    # 导入 jsonl/ 目录下的全部结果文件: python -m src.results_store [jsonl目录]
+    jsonl_dir = sys.argv[1] if len(sys.argv) > 1 else "jsonl"
+    store = get_results_store()
+    for filename in sorted(os.listdir(jsonl_dir)):
+        if filename.endswith(".jsonl"):
+            count = store.sync_scope(filename, os.path.join(jsonl_dir, filename))
+            print(f"{filename}: 新导入 {count} 条，共 {store.count(filename)} 条")
+    store.close()
@@ -1,166 +1,146 @@
 import asyncio
+import hashlib
 import json
 import os
 import random
 import time
 from datetime import datetime
 from urllib.parse import urlencode
-import requests
 
 from playwright.async_api import (
     Response,
     TimeoutError as PlaywrightTimeoutError,
-    async_playwright,
 )
 
 from src.ai_handler import (
-    download_all_images,
+    TEXT_ONLY_NAMESPACE,
+    ai_verdict_cache_key,
+    prepare_images_for_ai,
     get_ai_analysis,
     send_ntfy_notification,
     cleanup_task_images,
 )
 from src.config import (
+    AI_BATCH_SIZE,
     AI_DEBUG_MODE,
+    AI_SKIP_STOCK_PHOTO_ITEMS,
     API_URL_PATTERN,
+    DETAIL_API_URL,
     DETAIL_API_URL_PATTERN,
-    LOGIN_IS_EDGE,
+    DETAIL_FETCH_MODE,
+    MTOP_APP_KEY,
+    PIPELINE_AI_WORKERS,
+    PIPELINE_DETAIL_WORKERS,
+    PIPELINE_NOTIFY_WORKERS,
+    PIPELINE_QUEUE_SIZE,
     RUN_HEADLESS,
-    RUNNING_IN_DOCKER,
+    SEARCH_API_URL,
+    SEARCH_PAGE_CONCURRENCY,
     STATE_FILE,
 )
+from src.http_client import request as http_request
 from src.parsers import (
-    _parse_search_results_json,
-    _parse_user_items_data,
-    calculate_reputation_from_ratings,
-    parse_ratings_data,
-    parse_user_head_data,
+    parse_ratings,
+    parse_search_results,
+    parse_user_head,
+    parse_user_items,
+    reputation_from_ratings,
 )
+from src.pacing import get_pacing_engine, is_block_response
+from src.pipeline import Pipeline, Stage
+from src.ai_batcher import AiBatcher
+from src.ai_dispatcher import get_ai_dispatcher
+from src.ai_verdict_cache import get_ai_verdict_cache
+from src.image_cache import get_image_cache
+from src.item_registry import criteria_hash, get_item_registry
+from src.seen_index import get_item_key, get_seen_index
 from src.utils import (
     format_registration_days,
-    get_link_unique_key,
-    random_sleep,
-    safe_get,
+    get_result_file_path,
+    get_path,
     save_to_jsonl,
 )
 from src.anti_crawler_config import (
     get_all_detection_selectors,
     get_retry_delay,
     should_retry,
-    STEALTH_CONFIG,
     SUSPICIOUS_INDICATORS,
     JS_ERROR_KEYWORDS,
     MANUAL_INTERVENTION,
 )
+from src.browser_pool import get_browser_pool
+from src.resource_blocking import PageTrafficStats
 from src.simple_captcha_solver import simple_captcha_solver
 
 
-async def search_xianyu_api(keyword, min_price=None, max_price=None, 
-                           personal_only=False, page_number=1, 
-                           rows_per_page=30):
+# 通过 mtop 接口响应刷新的令牌 Cookie（如 _m_h5_tk 过期后服务端下发的新值），优先于状态文件中的旧值
+_refreshed_cookies = {}
+
+
+def _load_mtop_auth():
     """
-    直接调用闲鱼搜索API获取商品数据
-    
-    Args:
-        keyword: 搜索关键词
-        min_price: 最低价格
-        max_price: 最高价格
-        personal_only: 是否只搜索个人卖家
-        page_number: 页码
-        rows_per_page: 每页商品数量
-    
+    从 xianyu_state.json 读取Cookie，并提取 mtop 接口签名所需的 _m_h5_tk 令牌。
+
     Returns:
-        API响应数据
+        (Cookie请求头字符串, _m_h5_tk)
     """
-    import urllib.parse
-    
-    # 从xianyu_state.json读取Cookie和认证信息
     try:
         with open(STATE_FILE, 'r', encoding='utf-8') as f:
             state_data = json.load(f)
-        
+
         # 提取Cookie信息
-        cookies = state_data.get('cookies', [])
         cookie_dict = {}
-        for cookie in cookies:
+        for cookie in state_data.get('cookies', []):
             cookie_dict[cookie['name']] = cookie['value']
-        
+        cookie_dict.update(_refreshed_cookies)
+
         # 构建Cookie字符串
         cookie_str = "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
         print(f"LOG: 从 {STATE_FILE} 加载了 {len(cookie_dict)} 个Cookie")
-        
+
         # 提取认证令牌
         m_h5_tk = cookie_dict.get('_m_h5_tk', '')
-        m_h5_tk_enc = cookie_dict.get('_m_h5_tk_enc', '')
         tb_token = cookie_dict.get('_tb_token_', '')
-        
         print(f"LOG: 认证令牌 - _m_h5_tk: {m_h5_tk[:20]}..., _tb_token_: {tb_token[:20]}...")
-        
+        return cookie_str, m_h5_tk
+
     except Exception as e:
         print(f"LOG: 读取Cookie失败: {e}")
-        cookie_str = ""
-        m_h5_tk = ""
-        m_h5_tk_enc = ""
-        tb_token = ""
-    
-    # 构建API URL
-    base_url = "https://h5api.m.goofish.com/h5/mtop.taobao.idlemtopsearch.pc.search/1.0/"
-    
-    # 构建请求体
-    request_body = {
-        "pageNumber": page_number,
-        "keyword": keyword,
-        "fromFilter": True,
-        "rowsPerPage": rows_per_page,
-        "sortValue": "",
-        "sortField": "",
-        "customDistance": "",
-        "gps": "",
-        "propValueStr": {},
-        "customGps": "",
-        "searchReqFromPage": "pcSearch",
-        "extraFilterValue": "{}",
-        "userPositionJson": "{}"
-    }
-    
-    # 添加价格筛选
-    if min_price or max_price:
-        price_range = ""
-        if min_price:
-            price_range += f"{min_price},"
-        else:
-            price_range += ","
-        if max_price:
-            price_range += f"{max_price};"
-        else:
-            price_range += ";"
-        request_body["propValueStr"]["searchFilter"] = f"priceRange:{price_range}"
-    
-    # 添加个人卖家筛选
-    if personal_only:
-        if "searchFilter" not in request_body["propValueStr"]:
-            request_body["propValueStr"]["searchFilter"] = ""
-        request_body["propValueStr"]["searchFilter"] += "sellerType:1;"
-    
-    # 生成时间戳和签名
-    timestamp = str(int(time.time() * 1000))
-    
-    # 尝试生成简单的签名（基于令牌和时间戳）
-    import hashlib
+        return "", ""
+
+
+def _sign_mtop_request(m_h5_tk: str, timestamp: str, data_str: str) -> str:
+    """基于 _m_h5_tk 令牌、时间戳和请求数据生成 mtop 签名。"""
     if m_h5_tk and '_' in m_h5_tk:
         # 提取令牌的前半部分
         token_part = m_h5_tk.split('_')[0]
-        # 简单的签名生成（实际算法可能更复杂）
-        sign_data = f"{token_part}&{timestamp}&34839810&{json.dumps(request_body, ensure_ascii=False, separators=(',', ':'))}"
+        sign_data = f"{token_part}&{timestamp}&{MTOP_APP_KEY}&{data_str}"
         sign = hashlib.md5(sign_data.encode('utf-8')).hexdigest()
         print(f"LOG: 生成签名: {sign[:20]}...")
-    else:
-        sign = ""
-        print("LOG: 无法生成签名，缺少_m_h5_tk令牌")
-    
+        return sign
+    print("LOG: 无法生成签名，缺少_m_h5_tk令牌")
+    return ""
+
+
+async def _call_mtop_api(api: str, url: str, request_body: dict, spm_cnt: str, spm_pre: str = "",
+                         referer: str = "https://www.goofish.com/", retry_on_token_expired: bool = True) -> dict:
+    """
+    使用状态文件中的Cookie对请求签名，并通过共享连接池调用 h5api 上的 mtop 接口。
+
+    令牌过期时，服务端会在响应中下发新的 _m_h5_tk，此时刷新令牌并自动重试一次。
+    网络或HTTP错误以 {"ret": ["HTTP_ERROR::..."/"REQUEST_ERROR::..."]} 的形式返回，与mtop自身的错误格式一致。
+    """
+    cookie_str, m_h5_tk = _load_mtop_auth()
+
+    # 签名与请求体必须使用完全相同的数据字符串
+    data_str = json.dumps(request_body, ensure_ascii=False, separators=(',', ':'))
+    timestamp = str(int(time.time() * 1000))
+    sign = _sign_mtop_request(m_h5_tk, timestamp, data_str)
+
     # 构建查询参数
     params = {
         "jsv": "2.7.2",
-        "appKey": "34839810",
+        "appKey": MTOP_APP_KEY,
         "t": timestamp,
         "sign": sign,
         "v": "1.0",
@@ -168,12 +148,13 @@ async def search_xianyu_api(keyword, min_price=None, max_price=None,
         "accountSite": "xianyu",
         "dataType": "json",
         "timeout": "20000",
-        "api": "mtop.taobao.idlemtopsearch.pc.search",
+        "api": api,
         "sessionOption": "AutoLoginOnly",
-        "spm_cnt": "a21ybx.search.0.0",
-        "spm_pre": "a21ybx.search.searchInput.0"
+        "spm_cnt": spm_cnt,
     }
-    
+    if spm_pre:
+        params["spm_pre"] = spm_pre
+
     # 设置请求头 - 使用从文件读取的Cookie
     headers = {
         "Host": "h5api.m.goofish.com",
@@ -188,36 +169,237 @@ async def search_xianyu_api(keyword, min_price=None, max_price=None,
         "sec-fetch-site": "same-site",
         "sec-fetch-mode": "cors",
         "sec-fetch-dest": "empty",
-        "referer": "https://www.goofish.com/",
+        "referer": referer,
         "accept-language": "zh-CN,zh;q=0.9",
         "priority": "u=1, i"
     }
-    
+
     # 将请求体编码为URL格式
-    data = urllib.parse.urlencode({"data": json.dumps(request_body, ensure_ascii=False)})
-    
+    data = urlencode({"data": data_str})
+
     try:
-        # 禁用SSL验证以解决证书问题
-        response = requests.post(
-            base_url,
+        # 使用进程内共享的异步连接池，不再阻塞事件循环；禁用SSL验证以解决证书问题
+        response = await http_request(
+            "POST",
+            url,
+            verify=False,
             params=params,
-            data=data,
+            content=data,
             headers=headers,
             timeout=30,
-            verify=False  # 禁用SSL验证
         )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
+
+        if response.status_code != 200:
             print(f"API请求失败，状态码: {response.status_code}")
             return {"ret": [f"HTTP_ERROR::{response.status_code}"], "data": {}}
-            
+
+        result = response.json()
+        ret_string = str(result.get("ret", []))
+        if "FAIL_SYS_TOKEN" in ret_string:
+            new_token = response.cookies.get("_m_h5_tk")
+            if new_token and retry_on_token_expired:
+                print("LOG: mtop令牌已过期，使用服务端下发的新令牌重试...")
+                _refreshed_cookies["_m_h5_tk"] = new_token
+                if response.cookies.get("_m_h5_tk_enc"):
+                    _refreshed_cookies["_m_h5_tk_enc"] = response.cookies.get("_m_h5_tk_enc")
+                return await _call_mtop_api(api, url, request_body, spm_cnt, spm_pre, referer,
+                                            retry_on_token_expired=False)
+        return result
+
     except Exception as e:
         print(f"API请求异常: {e}")
         return {"ret": [f"REQUEST_ERROR::{str(e)}"], "data": {}}
 
 
+async def search_xianyu_api(keyword, min_price=None, max_price=None, 
+                           personal_only=False, page_number=1, 
+                           rows_per_page=30):
+    """
+    直接调用闲鱼搜索API获取商品数据
+    
+    Args:
+        keyword: 搜索关键词
+        min_price: 最低价格
+        max_price: 最高价格
+        personal_only: 是否只搜索个人卖家
+        page_number: 页码
+        rows_per_page: 每页商品数量
+    
+    Returns:
+        API响应数据
+    """
+    # 构建请求体
+    request_body = {
+        "pageNumber": page_number,
+        "keyword": keyword,
+        "fromFilter": True,
+        "rowsPerPage": rows_per_page,
+        "sortValue": "",
+        "sortField": "",
+        "customDistance": "",
+        "gps": "",
+        "propValueStr": {},
+        "customGps": "",
+        "searchReqFromPage": "pcSearch",
+        "extraFilterValue": "{}",
+        "userPositionJson": "{}"
+    }
+    
+    # 添加价格筛选
+    if min_price or max_price:
+        price_range = ""
+        if min_price:
+            price_range += f"{min_price},"
+        else:
+            price_range += ","
+        if max_price:
+            price_range += f"{max_price};"
+        else:
+            price_range += ";"
+        request_body["propValueStr"]["searchFilter"] = f"priceRange:{price_range}"
+    
+    # 添加个人卖家筛选
+    if personal_only:
+        if "searchFilter" not in request_body["propValueStr"]:
+            request_body["propValueStr"]["searchFilter"] = ""
+        request_body["propValueStr"]["searchFilter"] += "sellerType:1;"
+
+    return await _call_mtop_api(
+        api="mtop.taobao.idlemtopsearch.pc.search",
+        url=SEARCH_API_URL,
+        request_body=request_body,
+        spm_cnt="a21ybx.search.0.0",
+        spm_pre="a21ybx.search.searchInput.0",
+    )
+
+
+async def fetch_item_detail_api(item_id: str, item_url: str = "https://www.goofish.com/") -> dict:
+    """
+    直接调用闲鱼商品详情API (mtop.taobao.idle.pc.detail)，无需打开浏览器页面。
+
+    Returns:
+        API响应数据，与详情页中捕获到的JSON结构相同
+    """
+    return await _call_mtop_api(
+        api="mtop.taobao.idle.pc.detail",
+        url=DETAIL_API_URL,
+        request_body={"itemId": str(item_id)},
+        spm_cnt="a21ybx.item.0.0",
+        referer=item_url,
+    )
+
+
+async def _check_search_response(search_result: dict, keyword: str) -> bool:
+    """
+    检查搜索API响应中的限流、反爬验证与请求错误，并打印处理建议。
+
+    Returns:
+        True 表示当前任务应停止继续请求
+    """
+    ret_field = get_path(search_result, ("ret",), [])
+    if not (isinstance(ret_field, list) and ret_field):
+        return False
+
+    ret_string = str(ret_field)
+    if "被挤爆啦" in ret_string or "RGV587_ERROR" in ret_string:
+        print(f"\n==================== API限流检测 ====================")
+        print(f"检测到闲鱼API限流错误: {ret_string}")
+        print("建议解决方案:")
+        print("1. 等待30-60分钟后重试")
+        print("2. 降低爬取频率，增加随机延迟")
+        print("3. 检查是否有其他程序同时在访问闲鱼")
+        print("4. 考虑使用代理IP轮换")
+        print("========================================================")
+        return True
+    elif "FAIL_SYS_USER_VALIDATE" in ret_string:
+        print(f"\n==================== 反爬虫验证检测 ====================")
+        print(f"检测到闲鱼反爬虫验证: {ret_string}")
+        print("建议解决方案:")
+        print("1. 重新登录获取新的认证状态")
+        print("2. 设置 RUN_HEADLESS=false 手动处理验证")
+        print("3. 等待更长时间后重试")
+        print("========================================================")
+        return True
+    elif "HTTP_ERROR" in ret_string or "REQUEST_ERROR" in ret_string:
+        print(f"\n==================== API请求错误 ====================")
+        print(f"API请求失败: {ret_string}")
+        print("建议解决方案:")
+        print("1. 检查网络连接")
+        print("2. 检查API接口是否正常")
+        print("3. 稍后重试")
+        print("========================================================")
+        return True
+    return False
+
+
+async def stream_search_items(keyword, max_pages=1, min_price=None, max_price=None,
+                              personal_only=False, is_seen=None, rows_per_page=30):
+    """
+    分页搜索阶段：以有限并发请求第 1..max_pages 页，并按页序逐个产出解析后的商品。
+
+    - 同时在途的页面请求数不超过 SEARCH_PAGE_CONCURRENCY；
+    - 每页请求前从请求节奏引擎获取 search 令牌，间隔随响应情况自适应调整；
+    - 接口报错、resultList 为空，或某页商品全部已处理过（is_seen 均为 True）时提前停止。
+
+    Args:
+        is_seen: 可选的回调，接收解析后的商品字典，返回该商品是否已处理过
+    """
+    concurrency = max(1, SEARCH_PAGE_CONCURRENCY)
+    pacing = get_pacing_engine()
+    pending = {}
+    next_page = 1
+
+    async def fetch_page(page_number):
+        await pacing.acquire("search")
+        print(f"LOG: 正在请求搜索结果第 {page_number}/{max_pages} 页...")
+        search_result = await search_xianyu_api(
+            keyword=keyword,
+            min_price=min_price,
+            max_price=max_price,
+            personal_only=personal_only,
+            page_number=page_number,
+            rows_per_page=rows_per_page
+        )
+        pacing.record_response("search", str(search_result.get('ret', [])))
+        return search_result
+
+    def launch_pages():
+        nonlocal next_page
+        while next_page <= max_pages and len(pending) < concurrency:
+            pending[next_page] = asyncio.create_task(fetch_page(next_page))
+            next_page += 1
+
+    launch_pages()
+    page_number = 1
+    try:
+        while page_number in pending:
+            search_result = await pending.pop(page_number)
+            launch_pages()
+            print(f"LOG: 第 {page_number} 页API调用完成，响应状态: {search_result.get('ret', '未知')}")
+
+            if await _check_search_response(search_result, keyword):
+                return
+
+            page_items = parse_search_results(search_result, f"API搜索第{page_number}页")
+            if not page_items:
+                print(f"LOG: 第 {page_number} 页未获取到任何商品数据，停止翻页。")
+                return
+
+            print(f"LOG: 第 {page_number} 页成功获取到 {len(page_items)} 个商品")
+            all_seen = is_seen is not None and all(is_seen(item) for item in page_items)
+
+            for item in page_items:
+                yield item
+
+            if all_seen:
+                print(f"LOG: 第 {page_number} 页的商品均已处理过，停止翻页。")
+                return
+            page_number += 1
+    finally:
+        for task in pending.values():
+            task.cancel()
+
+
 async def check_anti_crawler_measures(page, keyword: str) -> bool:
     """
     增强的反爬虫检测机制
@@ -405,7 +587,9 @@ async def scrape_user_profile(context, user_id: str) -> dict:
     """
     print(f"   -> 开始采集用户ID: {user_id} 的完整信息...")
     profile_data = {}
+    pacing = get_pacing_engine()
     page = await context.new_page()
+    traffic_stats = PageTrafficStats(page)
 
     # 为各项异步任务准备Future和数据容器
     head_api_future = asyncio.get_event_loop().create_future()
@@ -448,30 +632,35 @@ async def scrape_user_profile(context, user_id: str) -> dict:
 
     try:
         # --- 任务1: 导航并采集头部信息 ---
+        await pacing.acquire("profile")
         await page.goto(f"https://www.goofish.com/personal?userId={user_id}", wait_until="domcontentloaded", timeout=20000)
         head_data = await asyncio.wait_for(head_api_future, timeout=15)
-        profile_data = await parse_user_head_data(head_data)
+        traffic_stats.mark_ready()
+        pacing.record_response("profile", str(head_data.get('ret', [])))
+        profile_data = parse_user_head(head_data)
 
         # --- 任务2: 滚动加载所有商品 (默认页面) ---
         print("      [采集阶段] 开始采集该用户的商品列表...")
-        await random_sleep(2, 4) # 等待第一页商品API完成
         while not stop_item_scrolling.is_set():
+            # 每次滚动都会触发一次分页接口请求
+            await pacing.acquire("profile")
             await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
             try:
                 await asyncio.wait_for(stop_item_scrolling.wait(), timeout=8)
             except asyncio.TimeoutError:
                 print("      [滚动超时] 商品列表可能已加载完毕。")
                 break
-        profile_data["卖家发布的商品列表"] = await _parse_user_items_data(all_items)
+        profile_data["卖家发布的商品列表"] = parse_user_items(all_items)
 
         # --- 任务3: 点击并采集所有评价 ---
         print("      [采集阶段] 开始采集该用户的评价列表...")
         rating_tab_locator = page.locator("//div[text()='信用及评价']/ancestor::li")
         if await rating_tab_locator.count() > 0:
+            await pacing.acquire("profile")
             await rating_tab_locator.click()
-            await random_sleep(3, 5) # 等待第一页评价API完成
 
             while not stop_rating_scrolling.is_set():
+                await pacing.acquire("profile")
                 await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
                 try:
                     await asyncio.wait_for(stop_rating_scrolling.wait(), timeout=8)
@@ -479,8 +668,8 @@ async def scrape_user_profile(context, user_id: str) -> dict:
                     print("      [滚动超时] 评价列表可能已加载完毕。")
                     break
 
-            profile_data['卖家收到的评价列表'] = await parse_ratings_data(all_ratings)
-            reputation_stats = await calculate_reputation_from_ratings(all_ratings)
+            profile_data['卖家收到的评价列表'] = parse_ratings(all_ratings)
+            reputation_stats = reputation_from_ratings(all_ratings)
             profile_data.update(reputation_stats)
         else:
             print("      [警告] 未找到评价选项卡，跳过评价采集。")
@@ -489,12 +678,259 @@ async def scrape_user_profile(context, user_id: str) -> dict:
         print(f"   [错误] 采集用户 {user_id} 信息时发生错误: {e}")
     finally:
         page.remove_listener("response", handle_response)
+        await traffic_stats.log(f"用户主页 {user_id}")
         await page.close()
         print(f"   -> 用户 {user_id} 信息采集完成。")
 
     return profile_data
 
 
+async def _fetch_detail_via_browser(page, item_data: dict):
+    """
+    在给定页面中打开商品详情页并捕获 mtop 详情API的响应。
+
+    Returns:
+        详情API的JSON数据；页面超时或响应失败时返回 None
+    """
+    traffic_stats = PageTrafficStats(page)
+    try:
+        async with page.expect_response(lambda r: DETAIL_API_URL_PATTERN in r.url, timeout=25000) as detail_info:
+            await page.goto(item_data["商品链接"], wait_until="domcontentloaded", timeout=25000)
+
+        detail_response = await detail_info.value
+        traffic_stats.mark_ready()
+        if detail_response.ok:
+            return await detail_response.json()
+
+        print(f"   错误: 获取商品详情API响应失败，状态码: {detail_response.status}")
+        if AI_DEBUG_MODE:
+            print(f"--- [DETAIL DEBUG] FAILED RESPONSE from {item_data['商品链接']} ---")
+            try:
+                print(await detail_response.text())
+            except Exception as e:
+                print(f"无法读取响应内容: {e}")
+            print("----------------------------------------------------")
+    except PlaywrightTimeoutError:
+        print(f"   错误: 访问商品详情页或等待API响应超时。")
+    except Exception as e:
+        print(f"   错误: 处理商品详情时发生未知错误: {e}")
+    finally:
+        await traffic_stats.log(f"商品详情页 {item_data['商品ID']}")
+        traffic_stats.detach()
+    return None
+
+
+async def _fetch_item_detail(item_data: dict):
+    """
+    获取商品详情JSON。
+
+    DETAIL_FETCH_MODE=api（默认）时直接签名调用详情API，只有在接口要求人机验证（FAIL_SYS_USER_VALIDATE）时
+    才退回到打开浏览器详情页的方式，限流类响应交给请求节奏退避；DETAIL_FETCH_MODE=browser 时始终使用浏览器。
+    浏览器页面从进程共享的浏览器池中借出，浏览器只在第一次需要时启动。
+
+    Args:
+        item_data: 搜索结果中解析出的商品信息
+
+    Returns:
+        详情API的JSON数据；获取失败时返回 None
+    """
+    pacing = get_pacing_engine()
+    # 每个商品只占用一个 detail 令牌：退回浏览器时复用同一次许可
+    await pacing.acquire("detail")
+    if DETAIL_FETCH_MODE != "browser":
+        detail_json = await fetch_item_detail_api(item_data['商品ID'], item_data.get('商品链接') or "https://www.goofish.com/")
+        ret_string = str(get_path(detail_json, ('ret',), []))
+        pacing.record_response("detail", ret_string)
+        if "SUCCESS" in ret_string:
+            return detail_json
+        if "FAIL_SYS_USER_VALIDATE" not in ret_string:
+            # 限流类响应（RGV587_ERROR、被挤爆啦）已由请求节奏退避处理，不再打开浏览器加重请求
+            if is_block_response(ret_string):
+                print(f"   [详情] 详情API触发限流，跳过该商品（下次运行重试）: {ret_string}")
+            else:
+                print(f"   错误: 商品详情API返回异常: {ret_string}")
+            return None
+        print("   [详情] 详情API触发了人机验证，退回到浏览器详情页获取...")
+
+    # 浏览器方式：打开完整详情页，从页面请求中捕获详情API响应
+    async with get_browser_pool().lease_page() as page:
+        detail_json = await _fetch_detail_via_browser(page, item_data)
+    if detail_json is not None:
+        pacing.record_response("detail", str(get_path(detail_json, ('ret',), [])))
+    return detail_json
+
+
+async def _handle_detail_block(detail_json: dict) -> bool:
+    """检测详情API响应中的反爬验证，命中时执行长时间休眠。返回 True 表示任务应终止。"""
+    ret_string = str(get_path(detail_json, ('ret',), []))
+    if "FAIL_SYS_USER_VALIDATE" not in ret_string:
+        return False
+
+    print("\n==================== CRITICAL BLOCK DETECTED ====================")
+    print("检测到闲鱼反爬虫验证 (FAIL_SYS_USER_VALIDATE)，程序将终止。")
+    long_sleep_duration = random.randint(300, 600)
+    print(f"为避免账户风险，将执行一次长时间休眠 ({long_sleep_duration} 秒) 后再退出...")
+    await asyncio.sleep(long_sleep_duration)
+    print("长时间休眠结束，现在将安全退出。")
+    print("===================================================================")
+    return True
+
+
+async def _build_item_record(task_config: dict, item_data: dict, detail_json: dict) -> dict:
+    """根据商品详情构建一条待分析、待保存的结果记录。"""
+    keyword = task_config['keyword']
+
+    # 解析商品详情数据并更新 item_data
+    item_do = get_path(detail_json, ('data', 'itemDO'), {})
+    seller_do = get_path(detail_json, ('data', 'sellerDO'), {})
+
+    reg_days_raw = get_path(seller_do, ('userRegDay',), 0)
+    registration_duration_text = format_registration_days(reg_days_raw)
+
+    # --- START: 新增代码块 ---
+
+    # 1. 提取卖家的芝麻信用信息
+    # zhima_credit_text = get_path(seller_do, ('zhimaLevelInfo', 'levelName'))
+
+    # 2. 提取该商品的完整图片列表
+    # image_infos = get_path(item_do, ('imageInfos',), [])
+    # if image_infos:
+    #     # 使用列表推导式获取所有有效的图片URL
+    #     all_image_urls = [img.get('url') for img in image_infos if img.get('url')]
+    #     if all_image_urls:
+    #         item_data['商品图片列表'] = all_image_urls
+    #         # (可选) 仍然保留主图链接，以防万一
+    #         item_data['商品主图链接'] = all_image_urls[0]
+
+    # --- END: 新增代码块 ---
+    # item_data['“想要”人数'] = get_path(item_do, ('wantCnt',), item_data.get('“想要”人数', 'NaN'))
+    # item_data['浏览量'] = get_path(item_do, ('browseCnt',), '-')
+    # ...[此处可添加更多从详情页解析出的商品信息]...
+
+    # 调用核心函数采集卖家信息
+    user_profile_data = {}
+    # user_id = get_path(seller_do, ('sellerId',))
+    # if user_id:
+    #     # 新的、高效的调用方式:
+    #     user_profile_data = await scrape_user_profile(context, str(user_id))
+    # else:
+    #     print("   [警告] 未能从详情API中获取到卖家ID。")
+    # user_profile_data['卖家芝麻信用'] = zhima_credit_text
+    # user_profile_data['卖家注册时长'] = registration_duration_text
+
+    # 构建基础记录
+    final_record = {
+        "爬取时间": datetime.now().isoformat(),
+        "搜索关键字": keyword,
+        "任务名称": task_config.get('task_name', 'Untitled Task'),
+        "商品信息": item_data,
+        "卖家信息": user_profile_data
+    }
+    return final_record
+
+
+async def _analyze_item_record(task_config: dict, final_record: dict, registry=None, batcher=None):
+    """
+    对结果记录执行AI分析（或复用全局注册表中的结论），结果写入 final_record['ai_analysis']。
+    传入 batcher（批量模式）时只发送商品文本，与同一任务的其他商品打包成一次请求。
+
+    Returns:
+        需要发送通知时返回通知理由，否则返回 None
+    """
+    item_data = final_record['商品信息']
+    ai_prompt_text = task_config.get('ai_prompt_text', '')
+
+    # --- START: Real-time AI Analysis ---
+    from src.config import SKIP_AI_ANALYSIS
+
+    # 检查是否跳过AI分析并直接发送通知
+    if SKIP_AI_ANALYSIS:
+        print(f"   -> 环境变量 SKIP_AI_ANALYSIS 已设置，跳过AI分析并直接发送通知...")
+        # 直接发送通知，将所有商品标记为推荐
+        return "商品已跳过AI分析，直接通知"
+    else:
+        ai_analysis_result = None
+        if ai_prompt_text:
+            # 批量模式的结论只基于文本，与带图片分析的结论分开保存
+            prompt_hash = criteria_hash(ai_prompt_text, TEXT_ONLY_NAMESPACE if batcher else None)
+            cached_verdict = registry.get_verdict(item_data['商品ID'], prompt_hash) if registry else None
+            if cached_verdict:
+                # 其他任务已用相同的分析标准评估过该商品，直接复用结果，无需下载图片和调用AI
+                print(f"   -> [全局注册表] 商品 #{item_data['商品ID']} 已在相同标准下分析过，复用AI结果。")
+                ai_analysis_result = cached_verdict
+                final_record['ai_analysis'] = ai_analysis_result
+            else:
+                # 内容相同的商品（重新发布、被其他任务抓到）复用AI结果缓存中的结论；
+                # 图片都已在共享图片缓存中时可在下载前算出缓存键，命中则无需下载图片和调用AI
+                ai_cache = get_ai_verdict_cache()
+                image_urls = item_data.get('商品图片列表', [])
+                cache_key = ai_verdict_cache_key(final_record, image_urls, ai_prompt_text,
+                                                 text_only=bool(batcher)) if ai_cache else None
+                cached_verdict = ai_cache.get(cache_key) if cache_key else None
+                if not cached_verdict and batcher:
+                    print(f"   -> 商品 #{item_data['商品ID']} 加入批量AI分析（仅文本）...")
+                elif not cached_verdict:
+                    print(f"   -> 开始对商品 #{item_data['商品ID']} 进行实时AI分析...")
+                    # 1. Download images（在内存中缩小并编码为 data URL，不写临时文件；去除近似重复图片）
+                    image_data_urls, image_info, image_sizes = await prepare_images_for_ai(item_data['商品ID'], image_urls)
+                    # 图片信息（含疑似网图数）随商品记录一起提供给AI，作为风险参考
+                    final_record['图片信息'] = image_info
+                    if ai_cache and cache_key is None:
+                        cache_key = ai_verdict_cache_key(final_record, image_urls, ai_prompt_text)
+                        cached_verdict = ai_cache.get(cache_key) if cache_key else None
+
+                # 2. Get AI analysis
+                if cached_verdict:
+                    print(f"   -> [AI结果缓存] 商品 #{item_data['商品ID']} 与之前分析过的商品内容相同，复用AI结果。")
+                    ai_analysis_result = cached_verdict
+                    final_record['ai_analysis'] = ai_analysis_result
+                    if registry:
+                        registry.put_verdict(item_data['商品ID'], prompt_hash, ai_analysis_result)
+                elif not batcher and AI_SKIP_STOCK_PHOTO_ITEMS and image_info['发送给AI'] and image_info['疑似网图'] >= image_info['发送给AI']:
+                    print(f"   -> 商品 #{item_data['商品ID']} 的图片均为多个商品使用过的网图，跳过AI分析。")
+                    final_record['ai_analysis'] = {
+                        'prompt_version': 'stock-photo-check',
+                        'is_recommended': False,
+                        'reason': '商品图片均在多个其他商品中出现过（疑似网图/盗图），未进行AI分析。',
+                        'risk_tags': ['疑似网图'],
+                        'criteria_analysis': {},
+                    }
+                else:
+                    try:
+                        # 注意：这里我们将整个记录传给AI，让它拥有最全的上下文
+                        usage = {}
+                        if batcher:
+                            ai_analysis_result = await batcher.evaluate(final_record, usage)
+                        else:
+                            ai_analysis_result = await get_ai_analysis(final_record, prompt_text=ai_prompt_text,
+                                                                       image_data_urls=image_data_urls, image_sizes=image_sizes,
+                                                                       usage=usage,
+                                                                       priority=task_config.get('ai_priority', 0))
+                        if ai_analysis_result:
+                            final_record['ai_analysis'] = ai_analysis_result
+                            print(f"   -> AI分析完成。推荐状态: {ai_analysis_result.get('is_recommended')}")
+                            if registry:
+                                registry.put_verdict(item_data['商品ID'], prompt_hash, ai_analysis_result)
+                            # 有图片未能获取时不缓存：结论基于不完整的图片
+                            if cache_key:
+                                ai_cache.put(cache_key, ai_analysis_result,
+                                             usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+                        else:
+                            final_record['ai_analysis'] = {'error': 'AI analysis returned None after retries.'}
+                    except Exception as e:
+                        print(f"   -> AI分析过程中发生严重错误: {e}")
+                        final_record['ai_analysis'] = {'error': str(e)}
+        else:
+            print("   -> 任务未配置AI prompt，跳过分析。")
+
+        # 3. 被推荐的商品需要发送通知
+        if ai_analysis_result and ai_analysis_result.get('is_recommended'):
+            print(f"   -> 商品被AI推荐，准备发送通知...")
+            return ai_analysis_result.get("reason", "无")
+    # --- END: Real-time AI Analysis ---
+    return None
+
+
 async def scrape_xianyu(task_config: dict, debug_limit: int = 0, retry_count: int = 0):
     """
     【核心执行器】
@@ -510,312 +946,152 @@ async def scrape_xianyu(task_config: dict, debug_limit: int = 0, retry_count: in
     personal_only = task_config.get('personal_only', False)
     min_price = task_config.get('min_price')
     max_price = task_config.get('max_price')
-    ai_prompt_text = task_config.get('ai_prompt_text', '')
 
-    processed_item_count = 0
-    stop_scraping = False
+    # 使用持久化的去重索引，首次运行时会从已有的 JSONL 结果文件一次性迁移
+    output_filename = get_result_file_path(keyword)
+    seen_scope = os.path.basename(output_filename)
+    seen_index = get_seen_index()
+    # 首次迁移需要读取整个结果文件，在线程中进行，避免阻塞同一进程中其他任务的事件循环
+    await asyncio.to_thread(seen_index.ensure_scope, seen_scope, output_filename)
+    seen_count = await asyncio.to_thread(seen_index.count, seen_scope)
+    print(f"LOG: 去重索引已就绪，{output_filename} 中已记录 {seen_count} 个已处理过的商品。")
 
-    processed_links = set()
-    output_filename = os.path.join("jsonl", f"{keyword.replace(' ', '_')}_full_data.jsonl")
-    if os.path.exists(output_filename):
-        print(f"LOG: 发现已存在文件 {output_filename}，正在加载历史记录以去重...")
-        try:
-            with open(output_filename, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        record = json.loads(line)
-                        link = record.get('商品信息', {}).get('商品链接', '')
-                        if link:
-                            processed_links.add(get_link_unique_key(link))
-                    except json.JSONDecodeError:
-                        print(f"   [警告] 文件中有一行无法解析为JSON，已跳过。")
-            print(f"LOG: 加载完成，已记录 {len(processed_links)} 个已处理过的商品。")
-        except IOError as e:
-            print(f"   [警告] 读取历史文件时发生错误: {e}")
-    else:
-        print(f"LOG: 输出文件 {output_filename} 不存在，将创建新文件。")
+    # 可选的跨任务全局注册表，用于复用其他任务已获取的详情和AI结果
+    registry = get_item_registry()
+    if registry:
+        purged = await asyncio.to_thread(registry.purge_expired)
+        if purged:
+            print(f"LOG: [全局注册表] 已清理 {purged} 条过期缓存。")
 
-    async with async_playwright() as p:
-        if LOGIN_IS_EDGE:
-            browser = await p.chromium.launch(headless=RUN_HEADLESS, channel="msedge")
+    task_name = task_config.get('task_name', 'Untitled Task')
+    counters = {"queued": 0, "saved": 0}
+
+    # 批量模式：同一任务的商品（仅文本）打包成一次AI请求；AI阶段需要足够的 worker 同时等待才能凑满批次
+    ai_prompt_text = task_config.get('ai_prompt_text', '')
+    batcher = None
+    ai_workers = PIPELINE_AI_WORKERS
+    if AI_BATCH_SIZE > 1 and ai_prompt_text:
+        batcher = AiBatcher(ai_prompt_text, task_name, task_config.get('ai_priority', 0))
+        ai_workers = max(PIPELINE_AI_WORKERS, 2 * AI_BATCH_SIZE)
+
+    # --- 流水线各阶段：详情(请求闲鱼，保持礼貌速率) -> AI分析 -> 通知 -> 保存 ---
+    async def detail_stage(item_data):
+        detail_json = registry.get_detail(item_data['商品ID']) if registry else None
+        if detail_json is not None:
+            print(f"-> 复用全局注册表中的详情: {item_data['商品标题'][:30]}...")
         else:
-            # Docker环境内，使用Playwright自带的chromium；本地环境，使用系统安装的Chrome
-            if RUNNING_IN_DOCKER:
-                browser = await p.chromium.launch(headless=RUN_HEADLESS)
-            else:
-                browser = await p.chromium.launch(headless=RUN_HEADLESS, channel="chrome")
-        # 使用配置文件中的隐身模式设置
-        context = await browser.new_context(
-            storage_state=STATE_FILE,
-            **STEALTH_CONFIG
-        )
-        page = await context.new_page()
+            print(f"-> 获取商品详情: {item_data['商品标题'][:30]}...")
+            # 请求间隔由请求节奏引擎控制（detail 令牌桶）
+            detail_json = await _fetch_item_detail(item_data)
+            if detail_json is None:
+                return None
+            if await _handle_detail_block(detail_json):
+                pipeline.request_stop()
+                return None
+            if registry:
+                registry.put_detail(item_data['商品ID'], detail_json)
+        return await _build_item_record(task_config, item_data, detail_json)
 
-        try:
-            print("LOG: 步骤 1 - 直接调用闲鱼搜索API...")
-            print(f"   -> 搜索关键词: {keyword}")
-            print(f"   -> 价格范围: {min_price or '无限制'} - {max_price or '无限制'}")
-            print(f"   -> 个人卖家: {'是' if personal_only else '否'}")
-
-            # 直接调用搜索API
-            search_result = await search_xianyu_api(
-                keyword=keyword,
-                min_price=min_price,
-                max_price=max_price,
-                personal_only=personal_only,
-                page_number=1,
-                rows_per_page=30
-            )
-            
-            print(f"LOG: API调用完成，响应状态: {search_result.get('ret', '未知')}")
-
-            # 检查API响应是否有错误
-            ret_field = await safe_get(search_result, "ret", default=[])
-            if isinstance(ret_field, list) and ret_field:
-                ret_string = str(ret_field)
-                if "被挤爆啦" in ret_string or "RGV587_ERROR" in ret_string:
-                    print(f"\n==================== API限流检测 ====================")
-                    print(f"检测到闲鱼API限流错误: {ret_string}")
-                    print("建议解决方案:")
-                    print("1. 等待30-60分钟后重试")
-                    print("2. 降低爬取频率，增加随机延迟")
-                    print("3. 检查是否有其他程序同时在访问闲鱼")
-                    print("4. 考虑使用代理IP轮换")
-                    print("========================================================")
-                    await browser.close()
-                    return 0
-                elif "FAIL_SYS_USER_VALIDATE" in ret_string:
-                    print(f"\n==================== 反爬虫验证检测 ====================")
-                    print(f"检测到闲鱼反爬虫验证: {ret_string}")
-                    print("建议解决方案:")
-                    print("1. 重新登录获取新的认证状态")
-                    print("2. 设置 RUN_HEADLESS=false 手动处理验证")
-                    print("3. 等待更长时间后重试")
-                    print("========================================================")
-                    await browser.close()
-                    return 0
-                elif "HTTP_ERROR" in ret_string or "REQUEST_ERROR" in ret_string:
-                    print(f"\n==================== API请求错误 ====================")
-                    print(f"API请求失败: {ret_string}")
-                    print("建议解决方案:")
-                    print("1. 检查网络连接")
-                    print("2. 检查API接口是否正常")
-                    print("3. 稍后重试")
-                    print("========================================================")
-                    await browser.close()
-                    return 0
-
-            # 解析搜索结果
-            search_items = await _parse_search_results_json(search_result, "API搜索")
-            if not search_items:
-                print("LOG: 未获取到任何商品数据，任务结束。")
-                await browser.close()
-                return 0
-            
-            print(f"LOG: 成功获取到 {len(search_items)} 个商品")
+    async def ai_stage(final_record):
+        notify_reason = await _analyze_item_record(task_config, final_record, registry, batcher)
+        return final_record, notify_reason
 
-            # 由于使用API直接获取数据，跳过页面操作和反爬虫检测
-            print("LOG: 步骤 2 - 开始处理商品数据...")
-            
-            # 应用调试限制
-            if debug_limit > 0:
-                search_items = search_items[:debug_limit]
-                print(f"LOG: 调试模式：限制处理前 {debug_limit} 个商品")
-            
-            all_items = search_items
-            print(f"LOG: 总共获取到 {len(all_items)} 个商品")
-
-            # 处理所有商品
-            for i, item_data in enumerate(all_items, 1):
-                if debug_limit > 0 and processed_item_count >= debug_limit:
-                    print(f"LOG: 已达到调试上限 ({debug_limit})，停止处理商品。")
-                    stop_scraping = True
-                    break
+    async def notify_stage(staged):
+        final_record, notify_reason = staged
+        if notify_reason:
+            await send_ntfy_notification(final_record['商品信息'], notify_reason)
+        return final_record
 
-                    unique_key = get_link_unique_key(item_data["商品链接"])
-                    if unique_key in processed_links:
-                        print(f"   -> [页内进度 {i}/{total_items_on_page}] 商品 '{item_data['商品标题'][:20]}...' 已存在，跳过。")
-                        continue
+    async def save_stage(final_record):
+        # 保存包含AI结果的完整记录
+        await save_to_jsonl(final_record, keyword)
+        counters["saved"] += 1
+        print(f"   -> 商品处理流程完毕。累计处理 {counters['saved']} 个新商品。")
+        return final_record
 
-                    print(f"-> [页内进度 {i}/{total_items_on_page}] 发现新商品，获取详情: {item_data['商品标题'][:30]}...")
-                    # --- 修改: 访问详情页前的等待时间，模拟用户在列表页上看了一会儿 ---
-                    await random_sleep(3, 6) # 原来是 (2, 4)
+    pipeline = Pipeline(f"任务 '{task_name}'", [
+        Stage("详情", detail_stage, PIPELINE_DETAIL_WORKERS),
+        # 商品全部进入AI阶段后立即发送最后一个未凑满的批次，不必等待 AI_BATCH_MAX_WAIT
+        Stage("AI分析", ai_stage, ai_workers, on_input_done=batcher.close if batcher else None),
+        Stage("通知", notify_stage, PIPELINE_NOTIFY_WORKERS),
+        Stage("保存", save_stage, 1),
+    ], queue_size=PIPELINE_QUEUE_SIZE).start()
 
-                    detail_page = await context.new_page()
-                    try:
-                        async with detail_page.expect_response(lambda r: DETAIL_API_URL_PATTERN in r.url, timeout=25000) as detail_info:
-                            await detail_page.goto(item_data["商品链接"], wait_until="domcontentloaded", timeout=25000)
-
-                        detail_response = await detail_info.value
-                        if detail_response.ok:
-                            detail_json = await detail_response.json()
-
-                            ret_string = str(await safe_get(detail_json, 'ret', default=[]))
-                            if "FAIL_SYS_USER_VALIDATE" in ret_string:
-                                print("\n==================== CRITICAL BLOCK DETECTED ====================")
-                                print("检测到闲鱼反爬虫验证 (FAIL_SYS_USER_VALIDATE)，程序将终止。")
-                                long_sleep_duration = random.randint(300, 600)
-                                print(f"为避免账户风险，将执行一次长时间休眠 ({long_sleep_duration} 秒) 后再退出...")
-                                await asyncio.sleep(long_sleep_duration)
-                                print("长时间休眠结束，现在将安全退出。")
-                                print("===================================================================")
-                                stop_scraping = True
-                                break
-
-                            # 解析商品详情数据并更新 item_data
-                            item_do = await safe_get(detail_json, 'data', 'itemDO', default={})
-                            seller_do = await safe_get(detail_json, 'data', 'sellerDO', default={})
-
-                            reg_days_raw = await safe_get(seller_do, 'userRegDay', default=0)
-                            registration_duration_text = format_registration_days(reg_days_raw)
-
-                            # --- START: 新增代码块 ---
-
-                            # 1. 提取卖家的芝麻信用信息
-                            # zhima_credit_text = await safe_get(seller_do, 'zhimaLevelInfo', 'levelName')
-
-                            # 2. 提取该商品的完整图片列表
-                            # image_infos = await safe_get(item_do, 'imageInfos', default=[])
-                            # if image_infos:
-                            #     # 使用列表推导式获取所有有效的图片URL
-                            #     all_image_urls = [img.get('url') for img in image_infos if img.get('url')]
-                            #     if all_image_urls:
-                            #         item_data['商品图片列表'] = all_image_urls
-                            #         # (可选) 仍然保留主图链接，以防万一
-                            #         item_data['商品主图链接'] = all_image_urls[0]
-
-                            # --- END: 新增代码块 ---
-                            # item_data['“想要”人数'] = await safe_get(item_do, 'wantCnt', default=item_data.get('“想要”人数', 'NaN'))
-                            # item_data['浏览量'] = await safe_get(item_do, 'browseCnt', default='-')
-                            # ...[此处可添加更多从详情页解析出的商品信息]...
-
-                            # 调用核心函数采集卖家信息
-                            user_profile_data = {}
-                            # user_id = await safe_get(seller_do, 'sellerId')
-                            # if user_id:
-                            #     # 新的、高效的调用方式:
-                            #     user_profile_data = await scrape_user_profile(context, str(user_id))
-                            # else:
-                            #     print("   [警告] 未能从详情API中获取到卖家ID。")
-                            # user_profile_data['卖家芝麻信用'] = zhima_credit_text
-                            # user_profile_data['卖家注册时长'] = registration_duration_text
-
-                            # 构建基础记录
-                            final_record = {
-                                "爬取时间": datetime.now().isoformat(),
-                                "搜索关键字": keyword,
-                                "任务名称": task_config.get('task_name', 'Untitled Task'),
-                                "商品信息": item_data,
-                                "卖家信息": user_profile_data
-                            }
-
-                            # --- START: Real-time AI Analysis & Notification ---
-                            from src.config import SKIP_AI_ANALYSIS
-                            
-                            # 检查是否跳过AI分析并直接发送通知
-                            if SKIP_AI_ANALYSIS:
-                                print(f"   -> 环境变量 SKIP_AI_ANALYSIS 已设置，跳过AI分析并直接发送通知...")
-                                # 下载图片 (暂时删除删除图片)
-                              
-                                # image_urls = item_data.get('商品图片列表', [])
-                                # downloaded_image_paths = await download_all_images(item_data['商品ID'], image_urls, task_config.get('task_name', 'default'))
-                                
-                                # 删除下载的图片文件，节省空间
-                                # for img_path in downloaded_image_paths:
-                                #     try:
-                                #         if os.path.exists(img_path):
-                                #             os.remove(img_path)
-                                #             print(f"   [图片] 已删除临时图片文件: {img_path}")
-                                #     except Exception as e:
-                                #         print(f"   [图片] 删除图片文件时出错: {e}")
-                                
-                                # 直接发送通知，将所有商品标记为推荐
-                                print(f"   -> 商品已跳过AI分析，准备发送通知...")
-                                await send_ntfy_notification(item_data, "商品已跳过AI分析，直接通知")
-                            else:
-                                print(f"   -> 开始对商品 #{item_data['商品ID']} 进行实时AI分析...")
-                                # 1. Download images
-                                image_urls = item_data.get('商品图片列表', [])
-                                downloaded_image_paths = await download_all_images(item_data['商品ID'], image_urls, task_config.get('task_name', 'default'))
-
-                                # 2. Get AI analysis
-                                ai_analysis_result = None
-                                if ai_prompt_text:
-                                    try:
-                                        # 注意：这里我们将整个记录传给AI，让它拥有最全的上下文
-                                        ai_analysis_result = await get_ai_analysis(final_record, downloaded_image_paths, prompt_text=ai_prompt_text)
-                                        if ai_analysis_result:
-                                            final_record['ai_analysis'] = ai_analysis_result
-                                            print(f"   -> AI分析完成。推荐状态: {ai_analysis_result.get('is_recommended')}")
-                                        else:
-                                            final_record['ai_analysis'] = {'error': 'AI analysis returned None after retries.'}
-                                    except Exception as e:
-                                        print(f"   -> AI分析过程中发生严重错误: {e}")
-                                        final_record['ai_analysis'] = {'error': str(e)}
-                                else:
-                                    print("   -> 任务未配置AI prompt，跳过分析。")
-
-                                # 删除下载的图片文件，节省空间
-                                for img_path in downloaded_image_paths:
-                                    try:
-                                        if os.path.exists(img_path):
-                                            os.remove(img_path)
-                                            print(f"   [图片] 已删除临时图片文件: {img_path}")
-                                    except Exception as e:
-                                        print(f"   [图片] 删除图片文件时出错: {e}")
-
-                                # 3. Send notification if recommended
-                                if ai_analysis_result and ai_analysis_result.get('is_recommended'):
-                                    print(f"   -> 商品被AI推荐，准备发送通知...")
-                                    await send_ntfy_notification(item_data, ai_analysis_result.get("reason", "无"))
-                            # --- END: Real-time AI Analysis & Notification ---
-
-                            # 4. 保存包含AI结果的完整记录
-                            await save_to_jsonl(final_record, keyword)
-
-                            processed_links.add(unique_key)
-                            processed_item_count += 1
-                            print(f"   -> 商品处理流程完毕。累计处理 {processed_item_count} 个新商品。")
-
-                            # --- 修改: 增加单个商品处理后的主要延迟 ---
-                            print("   [反爬] 执行一次主要的随机延迟以模拟用户浏览间隔...")
-                            #await random_sleep(15, 30) # 原来是 (8, 15)，这是最重要的修改之一
-                        else:
-                            print(f"   错误: 获取商品详情API响应失败，状态码: {detail_response.status}")
-                            if AI_DEBUG_MODE:
-                                print(f"--- [DETAIL DEBUG] FAILED RESPONSE from {item_data['商品链接']} ---")
-                                try:
-                                    print(await detail_response.text())
-                                except Exception as e:
-                                    print(f"无法读取响应内容: {e}")
-                                print("----------------------------------------------------")
-
-                    except PlaywrightTimeoutError:
-                        print(f"   错误: 访问商品详情页或等待API响应超时。")
-                    except Exception as e:
-                        print(f"   错误: 处理商品详情时发生未知错误: {e}")
-                    finally:
-                        await detail_page.close()
-                        # --- 修改: 增加关闭页面后的短暂整理时间 ---
-                        await random_sleep(2, 4) # 原来是 (1, 2.5)
-
-                # --- 新增: 在处理完一页所有商品后，翻页前，增加一个更长的“休息”时间 ---
-                if not stop_scraping and page_num < max_pages:
-                    print(f"--- 第 {page_num} 页处理完毕，准备翻页。执行一次页面间的长时休息... ---")
-                    await random_sleep(25, 50)
-
-        except PlaywrightTimeoutError as e:
-            print(f"\n操作超时错误: 页面元素或网络响应未在规定时间内出现。\n{e}")
-        except Exception as e:
-            print(f"\n爬取过程中发生未知错误: {e}")
-        finally:
-            print("\nLOG: 任务执行完毕，浏览器将在5秒后自动关闭...")
-            await asyncio.sleep(5)
-            if debug_limit:
-                input("按回车键关闭浏览器...")
-            await browser.close()
+    search_stream = stream_search_items(
+        keyword=keyword,
+        max_pages=max_pages,
+        min_price=min_price,
+        max_price=max_price,
+        personal_only=personal_only,
+        is_seen=lambda item: seen_index.contains(seen_scope, get_item_key(item)),
+    )
+    # 已提交到流水线但尚未保存的商品，避免同一商品在多个搜索页中出现时被重复处理
+    queued_keys = set()
+    completed = False
+    try:
+        print("LOG: 步骤 1 - 直接调用闲鱼搜索API...")
+        print(f"   -> 搜索关键词: {keyword}")
+        print(f"   -> 价格范围: {min_price or '无限制'} - {max_price or '无限制'}")
+        print(f"   -> 个人卖家: {'是' if personal_only else '否'}")
+        print(f"   -> 最大页数: {max_pages}")
+
+        # 由于使用API直接获取数据，跳过页面操作和反爬虫检测。
+        # 搜索结果以流的形式逐个产出，并提交给处理流水线；流水线队列满时这里会等待（背压）。
+        print("LOG: 步骤 2 - 开始处理商品数据...")
+        if debug_limit > 0:
+            print(f"LOG: 调试模式：限制处理前 {debug_limit} 个商品")
+
+        i = 0
+        async for item_data in search_stream:
+            if pipeline.stop_requested:
+                break
+            if debug_limit > 0 and counters["queued"] >= debug_limit:
+                print(f"LOG: 已达到调试上限 ({debug_limit})，停止处理商品。")
+                break
+
+            i += 1
+            item_key = get_item_key(item_data)
+            if item_key in queued_keys or seen_index.contains(seen_scope, item_key):
+                print(f"   -> [进度 {i}] 商品 '{item_data['商品标题'][:20]}...' 已存在，跳过。")
+                continue
+
+            print(f"-> [进度 {i}] 发现新商品，加入处理队列: {item_data['商品标题'][:30]}...")
+            queued_keys.add(item_key)
+            counters["queued"] += 1
+            await pipeline.put(item_data)
+
+        # 等待已提交的商品全部处理完毕
+        await pipeline.join()
+        completed = True
+
+    except PlaywrightTimeoutError as e:
+        print(f"\n操作超时错误: 页面元素或网络响应未在规定时间内出现。\n{e}")
+    except Exception as e:
+        print(f"\n爬取过程中发生未知错误: {e}")
+    finally:
+        # 提前退出循环时，取消仍在进行中的分页请求
+        await search_stream.aclose()
+        if not completed:
+            await pipeline.cancel()
+            if batcher:
+                batcher.cancel()
+        print(pipeline.format_stats())
+        pacing = get_pacing_engine()
+        print(f"LOG: [请求节奏] {pacing.format_stats()}")
+        pacing.save_state()
+        if registry:
+            print(f"LOG: [全局注册表] {registry.format_stats()}")
+            registry.flush_counters()
+        print(f"LOG: [图片缓存] {get_image_cache().format_stats()}")
+        get_image_cache().flush_counters()
+        if get_ai_verdict_cache():
+            print(f"LOG: [AI结果缓存] {get_ai_verdict_cache().format_stats()}")
+            get_ai_verdict_cache().flush_counters()
+        print(f"LOG: [AI调度] {get_ai_dispatcher().format_stats()}")
+        if batcher:
+            print(f"LOG: [AI批量] {batcher.format_stats()}")
 
     # 清理任务图片目录
     cleanup_task_images(task_config.get('task_name', 'default'))
 
-    return processed_item_count
+    return counters["saved"]
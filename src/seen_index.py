@@ -0,0 +1,167 @@
+"""
+持久化的已处理商品索引。
+
+以 SQLite 保存每个结果文件（作用域）中已写入过的商品ID，任务启动时无需再逐行
+解析整个 JSONL 文件来重建去重集合，成员查询为一次主键查找。
+爬虫进程与 Web 服务进程共用同一个数据库文件（WAL 模式，支持多进程并发访问）。
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+from src.config import SEEN_INDEX_FILE
+from src.utils import get_link_unique_key
+
+
+def get_item_key(item_info: dict) -> str:
+    """返回商品在去重索引中的键：优先使用商品ID，缺失时退回到商品链接的唯一标识。"""
+    item_id = str(item_info.get('商品ID') or '')
+    if item_id and item_id != '未知ID':
+        return item_id
+    return get_link_unique_key(item_info.get('商品链接', ''))
+
+
+class SeenIndex:
+    def __init__(self, db_path: str = SEEN_INDEX_FILE):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " scope TEXT NOT NULL, item_id TEXT NOT NULL,"
+            " PRIMARY KEY (scope, item_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scopes (scope TEXT PRIMARY KEY, migrated_at TEXT NOT NULL)"
+        )
+
+    def contains(self, scope: str, item_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM seen WHERE scope = ? AND item_id = ?", (scope, item_id)
+            ).fetchone()
+        return row is not None
+
+    def add(self, scope: str, item_id: str):
+        self.add_many(scope, [item_id])
+
+    def add_many(self, scope: str, item_ids):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO seen (scope, item_id) VALUES (?, ?)",
+                    ((scope, item_id) for item_id in item_ids if item_id)
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def count(self, scope: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def clear_scope(self, scope: str):
+        """删除一个作用域的全部记录（例如对应的结果文件被删除时）。"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM seen WHERE scope = ?", (scope,))
+            self._conn.execute("DELETE FROM scopes WHERE scope = ?", (scope,))
+            self._conn.execute("COMMIT")
+
+    def ensure_scope(self, scope: str, jsonl_path: str) -> int:
+        """
+        在任务启动时调用，保证作用域与结果文件一致：
+        - 首次遇到该作用域且结果文件已存在时，从 JSONL 一次性迁移；
+        - 结果文件已被手动删除时，清空该作用域，行为与旧版"删除文件即重置去重"一致。
+
+        Returns:
+            本次迁移写入的记录数
+        """
+        with self._lock:
+            migrated = self._conn.execute(
+                "SELECT 1 FROM scopes WHERE scope = ?", (scope,)
+            ).fetchone() is not None
+
+        if not os.path.exists(jsonl_path):
+            if migrated:
+                print(f"LOG: 结果文件 {jsonl_path} 已不存在，清空其去重索引。")
+                self.clear_scope(scope)
+            self._mark_migrated(scope)
+            return 0
+
+        if migrated:
+            return 0
+        return self.migrate_from_jsonl(scope, jsonl_path)
+
+    def migrate_from_jsonl(self, scope: str, jsonl_path: str, batch_size: int = 10000) -> int:
+        """逐行读取已有的 JSONL 结果文件，把其中的商品键批量写入索引。"""
+        print(f"LOG: 正在从 {jsonl_path} 迁移历史记录到去重索引（仅需执行一次）...")
+        migrated_count = 0
+        batch = []
+        try:
+            with open(jsonl_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"   [警告] 文件中有一行无法解析为JSON，已跳过。")
+                        continue
+                    key = get_item_key(record.get('商品信息', {}))
+                    if key:
+                        batch.append(key)
+                    if len(batch) >= batch_size:
+                        self.add_many(scope, batch)
+                        migrated_count += len(batch)
+                        batch = []
+        except IOError as e:
+            print(f"   [警告] 读取历史文件时发生错误: {e}")
+            return migrated_count
+
+        if batch:
+            self.add_many(scope, batch)
+            migrated_count += len(batch)
+        self._mark_migrated(scope)
+        print(f"LOG: 迁移完成，共写入 {migrated_count} 条记录。")
+        return migrated_count
+
+    def _mark_migrated(self, scope: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scopes (scope, migrated_at) VALUES (?, ?)",
+                (scope, datetime.now().isoformat())
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_seen_index = None
+
+
+def get_seen_index() -> SeenIndex:
+    """获取进程内共享的去重索引实例。"""
+    global _seen_index
+    if _seen_index is None:
+        _seen_index = SeenIndex()
+    return _seen_index
+
+
+if __name__ == "__main__":
+    # 一次性迁移 jsonl/ 目录下的全部结果文件: python -m src.seen_index [jsonl目录]
+    jsonl_dir = sys.argv[1] if len(sys.argv) > 1 else "jsonl"
+    index = get_seen_index()
+    for filename in sorted(os.listdir(jsonl_dir)):
+        if filename.endswith(".jsonl"):
+            index.ensure_scope(filename, os.path.join(jsonl_dir, filename))
+            print(f"{filename}: {index.count(filename)} 个商品")
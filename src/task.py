@@ -19,6 +19,8 @@ class Task(BaseModel):
     cron: Optional[str] = None
     ai_prompt_base_file: str
     ai_prompt_criteria_file: str
+    # AI请求排队时的优先级，数值大者优先
+    ai_priority: Optional[int] = 0
     is_running: Optional[bool] = False
 
 
@@ -34,6 +36,7 @@ class TaskUpdate(BaseModel):
     cron: Optional[str] = None
     ai_prompt_base_file: Optional[str] = None
     ai_prompt_criteria_file: Optional[str] = None
+    ai_priority: Optional[int] = None
     is_running: Optional[bool] = None
 
 
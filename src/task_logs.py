@@ -0,0 +1,356 @@
+"""
+按任务分文件的运行日志。
+
+Web 服务启动的每个任务进程，其 stdout/stderr 经管道转发写入 logs/tasks/<任务名>.log。
+写入在线程池中进行，不占用 Web 服务的事件循环。
+当前文件超过 TASK_LOG_MAX_BYTES，或跨过 TASK_LOG_ROTATE_HOURS 的时间边界时轮转为
+<任务名>.log.<时间戳>，随后在后台线程中压缩（gzip，安装了 zstandard 时可选 zstd），
+每个任务只保留最近 TASK_LOG_BACKUPS 个压缩分段。轮转只发生在行边界上。
+
+read_log_lines 从当前文件向更早的压缩分段倒序读取，只解压需要的分段。
+"""
+import asyncio
+import gzip
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.config import LOG_COMPRESSION, TASK_LOG_BACKUPS, TASK_LOG_MAX_BYTES, TASK_LOG_ROTATE_HOURS
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+TASK_LOG_DIR = os.path.join("logs", "tasks")
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# 压缩在单独的线程中进行，避免阻塞事件循环
+_compress_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compress")
+
+
+def decode_log_bytes(data: bytes) -> str:
+    """按 UTF-8 解码，失败时尝试 GBK 并忽略无法解码的字符。"""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("gbk", errors="ignore")
+
+
+def task_log_filename(task_name: str) -> str:
+    """任务名 -> 日志文件名；只转义路径分隔符等不能出现在文件名中的字符，保持可逆。"""
+    escaped = re.sub(r'[%/\\\x00-\x1f:*?"<>|]', lambda m: f"%{ord(m.group()):02X}", task_name)
+    if escaped.startswith("."):
+        escaped = "%2E" + escaped[1:]
+    return escaped + ".log"
+
+
+def task_name_from_log(filename: str) -> Optional[str]:
+    """日志文件名 -> 任务名；不是当前日志文件（例如轮转后的分段）时返回 None。"""
+    if not filename.endswith(".log"):
+        return None
+    return re.sub(r"%([0-9A-F]{2})", lambda m: chr(int(m.group(1), 16)), filename[:-4])
+
+
+def task_log_path(task_name: str, log_dir: str = TASK_LOG_DIR) -> str:
+    return os.path.join(log_dir, task_log_filename(task_name))
+
+
+def _open_segment(path: str):
+    """以二进制方式打开日志分段，按扩展名透明解压。"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise OSError(f"读取 {path} 需要安装 zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def list_segments(path: str) -> List[str]:
+    """返回当前日志文件轮转出的分段路径，按从新到旧排序。"""
+    directory, base = os.path.split(path)
+    prefix = base + "."
+    try:
+        names = [name for name in os.listdir(directory or ".")
+                 if name.startswith(prefix) and not name.endswith(".tmp")]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names, key=_segment_sort_key, reverse=True)]
+
+
+def _segment_sort_key(name: str):
+    # 分段名形如 <文件名>.<YYYYmmdd-HHMMSS>[-序号][.gz|.zst]
+    match = re.search(r"\.(\d{8}-\d{6})(?:-(\d+))?(?:\.gz|\.zst)?$", name)
+    if match is None:
+        return ("", 0)
+    return (match.group(1), int(match.group(2) or 0))
+
+
+def _compress_file(source: str, compression: str) -> str:
+    target = source + COMPRESSED_SUFFIXES[compression]
+    tmp = target + ".tmp"
+    with open(source, "rb") as src:
+        if compression == "zstd":
+            with open(tmp, "wb") as dst:
+                zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+        else:
+            with gzip.open(tmp, "wb", compresslevel=6) as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+    os.replace(tmp, target)
+    os.remove(source)
+    return target
+
+
+class RotatingLogFile:
+    """
+    按大小/时间轮转的追加写日志文件（线程安全）。
+    backups 为保留的分段数；max_total_bytes 大于 0 时，所有分段的总大小超过它就删除最旧的分段。
+    """
+
+    def __init__(self, path: str, max_bytes: int = TASK_LOG_MAX_BYTES,
+                 rotate_hours: float = TASK_LOG_ROTATE_HOURS, backups: int = TASK_LOG_BACKUPS,
+                 max_total_bytes: int = 0, compression: str = LOG_COMPRESSION):
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            print("LOG: 未安装 zstandard，日志分段改用 gzip 压缩。")
+            compression = "gzip"
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_hours * 3600
+        self.backups = max(0, backups)
+        self.max_total_bytes = max_total_bytes
+        self.compression = compression if compression in COMPRESSED_SUFFIXES else None
+        self._file = None
+        self._last_write = None
+        self._at_line_start = True
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "ab", buffering=0)
+        stat = os.fstat(self._file.fileno())
+        self._last_write = stat.st_mtime if stat.st_size else time.time()
+
+    def _time_bucket(self, timestamp: float) -> int:
+        # 按本地时间对齐轮转边界（例如 24 小时即每天零点）
+        return int((timestamp + time.localtime(timestamp).tm_gmtoff) // self.rotate_interval)
+
+    def _should_rotate(self, now: float) -> bool:
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            return False
+        if self.max_bytes > 0 and size >= self.max_bytes:
+            return True
+        return self.rotate_interval > 0 and self._time_bucket(self._last_write) != self._time_bucket(now)
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        with self._lock:
+            now = time.time()
+            if self._file is None:
+                self._open()
+            if self._at_line_start and self._should_rotate(now):
+                self._rotate()
+            self._file.write(data)
+            self._last_write = now
+            self._at_line_start = data.endswith(b"\n")
+
+    def rotate(self) -> Optional[Future]:
+        """立即轮转当前文件（为空时不轮转），返回后台压缩任务。"""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if os.fstat(self._file.fileno()).st_size == 0:
+                return None
+            return self._rotate()
+
+    def _rotate(self) -> Future:
+        self._file.close()
+        stamp = datetime.fromtimestamp(self._last_write).strftime("%Y%m%d-%H%M%S")
+        # 同一秒内多次轮转时加序号，序号只增不减，保证分段按名称排序即为时间顺序
+        same_second = [_segment_sort_key(os.path.basename(segment))[1]
+                       for segment in list_segments(self.path)
+                       if _segment_sort_key(os.path.basename(segment))[0] == stamp]
+        target = f"{self.path}.{stamp}" if not same_second else f"{self.path}.{stamp}-{max(same_second) + 1}"
+        os.replace(self.path, target)
+        self._open()
+        future = _compress_executor.submit(self._finish_segment, target)
+        self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+
+    def _finish_segment(self, segment: str):
+        try:
+            # 分段可能已在压缩前被保留策略删除
+            if self.compression and os.path.exists(segment):
+                _compress_file(segment, self.compression)
+        except OSError as e:
+            print(f"LOG: 压缩日志分段 {segment} 失败: {e}")
+        self.apply_retention()
+
+    def apply_retention(self):
+        """按保留分段数和总大小删除最旧的分段。"""
+        segments = list_segments(self.path)
+        keep, total = [], 0
+        for segment in segments:
+            if segment.endswith(".tmp"):
+                continue
+            try:
+                size = os.path.getsize(segment)
+            except OSError:
+                continue
+            if len(keep) >= self.backups or (self.max_total_bytes > 0 and total + size > self.max_total_bytes):
+                try:
+                    os.remove(segment)
+                except OSError:
+                    pass
+                continue
+            keep.append(segment)
+            total += size
+
+    def wait(self):
+        """等待已提交的压缩任务完成。"""
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def clear_log(path: str):
+    """清空当前日志文件（保留文件，正在写入的进程继续追加），并删除所有分段。"""
+    for segment in list_segments(path):
+        try:
+            os.remove(segment)
+        except OSError:
+            pass
+    if os.path.exists(path):
+        with open(path, "wb"):
+            pass
+
+
+def _tail_plain(path: str, end: Optional[int], count: int) -> Tuple[List[bytes], int]:
+    """从未压缩文件的 end 处向前倒序按块读取，返回 (最多 count 行, 第一行的起始偏移)。"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        end = size if end is None else min(end, size)
+        position, data = end, b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(64 * 1024, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.split(b"\n")
+    if data.endswith(b"\n"):
+        lines.pop()
+    start = position
+    if position > 0:
+        # 第一段是被块边界截断的行
+        start += len(lines.pop(0)) + 1
+    if len(lines) > count:
+        start += sum(len(line) + 1 for line in lines[:-count])
+        lines = lines[-count:]
+    return lines, start
+
+
+def _tail_compressed(path: str, end: Optional[int], count: int) -> Tuple[List[bytes], int]:
+    """压缩分段无法倒序读取：顺序解压到 end，只保留最后 count 行。"""
+    window = deque(maxlen=count)
+    position = 0
+    with _open_segment(path) as f:
+        for line in f:
+            if end is not None and position >= end:
+                break
+            window.append((position, line.rstrip(b"\n")))
+            position += len(line)
+    if not window:
+        return [], 0
+    return [line for _, line in window], window[0][0]
+
+
+def read_log_lines(path: str, count: int = 200, before: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """
+    读取 before 位置之前（默认从最新处）最多 count 行，按时间先后返回，可跨越轮转分段。
+    返回 (行列表, 继续向前读取用的位置)；已读到最早分段的开头时位置为 None。
+    位置格式为 "<分段文件名>:<偏移>"：分段文件名为空表示当前文件，偏移为空表示从该分段末尾读起。
+    """
+    sources = [path] + list_segments(path)
+    names = ["" if source == path else os.path.basename(source) for source in sources]
+    index, end = 0, None
+    if before:
+        name, _, offset = before.rpartition(":")
+        if name not in names or not (offset.isdigit() or offset == ""):
+            raise ValueError("无效的日志位置")
+        index, end = names.index(name), int(offset) if offset else None
+
+    collected: List[bytes] = []
+    while index < len(sources) and len(collected) < count:
+        source = sources[index]
+        reader = _tail_compressed if source.endswith((".gz", ".zst")) else _tail_plain
+        try:
+            lines, start = reader(source, end, count - len(collected))
+        except FileNotFoundError:
+            # 分段刚被压缩或按保留策略删除
+            lines, start = [], 0
+        collected = lines + collected
+        if start > 0:
+            return [decode_log_bytes(line.rstrip(b"\r")) for line in collected], f"{names[index]}:{start}"
+        index, end = index + 1, None
+    cursor = f"{names[index]}:" if index < len(sources) else None
+    return [decode_log_bytes(line.rstrip(b"\r")) for line in collected], cursor
+
+
+async def relay_task_output(stream: asyncio.StreamReader, log: RotatingLogFile):
+    """
+    把任务进程的输出管道转写到它的日志文件，直到进程关闭输出。
+    写入和轮转（重命名、打开新文件）在线程池中进行，磁盘较慢时也不会阻塞 Web 服务的事件循环。
+    """
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            break
+        await asyncio.to_thread(log.write, chunk)
+
+
+_task_logs: Dict[str, RotatingLogFile] = {}
+
+
+def get_task_log(task_name: str) -> RotatingLogFile:
+    """获取任务的日志文件（同一任务的定时运行和手动运行共用一个实例）。"""
+    log = _task_logs.get(task_name)
+    if log is None:
+        log = _task_logs[task_name] = RotatingLogFile(task_log_path(task_name))
+    return log
+
+
+def close_task_logs():
+    for log in _task_logs.values():
+        log.close()
+    _task_logs.clear()
+
+
+_relays = set()
+
+
+def start_output_relay(process: asyncio.subprocess.Process, task_name: str) -> asyncio.Task:
+    """为任务进程启动输出转写（保存任务引用，避免运行中被垃圾回收）。"""
+    relay = asyncio.get_running_loop().create_task(relay_task_output(process.stdout, get_task_log(task_name)))
+    _relays.add(relay)
+    relay.add_done_callback(_relays.discard)
+    return relay
@@ -44,16 +44,24 @@ def retry_on_failure(retries=3, delay=5):
     return decorator
 
 
-async def safe_get(data, *keys, default="暂无"):
-    """安全获取嵌套字典值"""
-    for key in keys:
-        try:
+def get_path(data, path: tuple, default="暂无"):
+    """
+    按预先构建好的键路径（元组）同步读取嵌套字典/列表中的值，任一层缺失时返回 default。
+    解析循环中请把路径定义为模块级常量，避免每次调用都重新构造参数元组。
+    """
+    try:
+        for key in path:
             data = data[key]
-        except (KeyError, TypeError, IndexError):
-            return default
+    except (KeyError, TypeError, IndexError):
+        return default
     return data
 
 
+async def safe_get(data, *keys, default="暂无"):
+    """安全获取嵌套字典值（兼容旧调用的异步包装，新代码请直接使用同步的 get_path）"""
+    return get_path(data, keys, default)
+
+
 async def random_sleep(min_seconds: float, max_seconds: float):
     """异步等待一个在指定范围内的随机时间。"""
     delay = random.uniform(min_seconds, max_seconds)
@@ -78,18 +86,43 @@ def get_link_unique_key(link: str) -> str:
     return link.split('&', 1)[0]
 
 
+def get_result_file_path(keyword: str, output_dir: str = "jsonl") -> str:
+    """返回关键词对应的 .jsonl 结果文件路径。"""
+    return os.path.join(output_dir, f"{keyword.replace(' ', '_')}_full_data.jsonl")
+
+
 async def save_to_jsonl(data_record: dict, keyword: str):
-    """将一个包含商品和卖家信息的完整记录追加保存到 .jsonl 文件。"""
-    output_dir = "jsonl"
-    os.makedirs(output_dir, exist_ok=True)
-    filename = os.path.join(output_dir, f"{keyword.replace(' ', '_')}_full_data.jsonl")
+    """
+    将一个包含商品和卖家信息的完整记录提交给该关键词结果文件的批量写入器（见 src/result_writer.py），
+    记录写入文件后再批量更新去重索引和结果存储。
+    """
+    filename = get_result_file_path(keyword, "jsonl")
+    from src.result_writer import get_jsonl_writer
     try:
-        with open(filename, "a", encoding="utf-8") as f:
-            f.write(json.dumps(data_record, ensure_ascii=False) + "\n")
-        return True
-    except IOError as e:
+        writer = get_jsonl_writer(filename, on_flushed=_index_updater(os.path.basename(filename), filename))
+        await writer.write(data_record)
+    except (TypeError, ValueError, RuntimeError) as e:
         print(f"写入文件 {filename} 出错: {e}")
         return False
+    return True
+
+
+def _index_updater(scope: str, filename: str):
+    """每批记录写入文件后，更新去重索引，并把新增的行导入结果存储（由写入器在线程池中调用）。"""
+    def update(records: list):
+        from src.config import RESULTS_BACKEND
+        from src.seen_index import get_item_key, get_seen_index
+        try:
+            get_seen_index().add_many(scope, [get_item_key(record.get('商品信息', {})) for record in records])
+        except Exception as e:
+            print(f"更新去重索引出错: {e}")
+        if RESULTS_BACKEND == "sqlite":
+            from src.results_store import get_results_store
+            try:
+                get_results_store().sync_scope(scope, filename)
+            except Exception as e:
+                print(f"更新结果存储出错: {e}")
+    return update
 
 
 def format_registration_days(total_days: int) -> str:
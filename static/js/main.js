@@ -2,6 +2,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const mainContent = document.getElementById('main-content');
     const navLinks = document.querySelectorAll('.nav-link');
     let logRefreshInterval = null;
+    let logEventSource = null;
     let taskRefreshInterval = null;
 
     // --- Templates for each section ---
@@ -48,6 +49,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 <div class="section-header">
                     <h2>运行日志</h2>
                     <div class="log-controls">
+                        <select id="log-task-filter">
+                            <option value="">全部任务</option>
+                        </select>
                         <label>
                             <input type="checkbox" id="auto-refresh-logs-checkbox">
                             自动刷新
@@ -407,9 +411,10 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function fetchLogs(fromPos = 0) {
+    async function fetchLogs(fromPos = 0, task = '') {
         try {
-            const response = await fetch(`/api/logs?from_pos=${fromPos}`);
+            const taskParam = task ? `&task=${encodeURIComponent(task)}` : '';
+            const response = await fetch(`/api/logs?from_pos=${fromPos}${taskParam}`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -755,6 +760,10 @@ document.addEventListener('DOMContentLoaded', function() {
             clearInterval(logRefreshInterval);
             logRefreshInterval = null;
         }
+        if (logEventSource) {
+            logEventSource.close();
+            logEventSource = null;
+        }
         if (taskRefreshInterval) {
             clearInterval(taskRefreshInterval);
             taskRefreshInterval = null;
@@ -807,8 +816,19 @@ document.addEventListener('DOMContentLoaded', function() {
         const refreshBtn = document.getElementById('refresh-logs-btn');
         const autoRefreshCheckbox = document.getElementById('auto-refresh-logs-checkbox');
         const clearBtn = document.getElementById('clear-logs-btn');
+        const taskFilter = document.getElementById('log-task-filter');
         let currentLogSize = 0;
 
+        const tasks = await fetchTasks();
+        if (tasks) {
+            taskFilter.innerHTML += tasks.map(task => {
+                const option = document.createElement('option');
+                option.value = task.task_name;
+                option.textContent = task.task_name;
+                return option.outerHTML;
+            }).join('');
+        }
+
         const updateLogs = async (isFullRefresh = false) => {
             // For incremental updates, check if user is at the bottom BEFORE adding new content.
             const shouldAutoScroll = isFullRefresh || (logContainer.scrollHeight - logContainer.clientHeight <= logContainer.scrollTop + 5);
@@ -818,7 +838,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 logContainer.textContent = '正在加载...';
             }
 
-            const logData = await fetchLogs(currentLogSize);
+            const logData = await fetchLogs(currentLogSize, taskFilter.value);
 
             if (isFullRefresh) {
                 // If the log is empty, show a message instead of a blank screen.
@@ -839,27 +859,72 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         };
 
-        refreshBtn.addEventListener('click', () => updateLogs(true));
+        const stopLiveLogs = () => {
+            if (logRefreshInterval) {
+                clearInterval(logRefreshInterval);
+                logRefreshInterval = null;
+            }
+            if (logEventSource) {
+                logEventSource.close();
+                logEventSource = null;
+            }
+        };
+
+        // Live logs are pushed by the server (SSE); fall back to polling if EventSource is unavailable.
+        const startLiveLogs = () => {
+            stopLiveLogs();
+            if (!window.EventSource) {
+                logRefreshInterval = setInterval(() => updateLogs(false), 1000);
+                return;
+            }
+            const task = taskFilter.value;
+            logEventSource = new EventSource(task ? `/api/logs/stream?task=${encodeURIComponent(task)}` : '/api/logs/stream');
+            // The stream starts with the server's buffer of recent lines.
+            logContainer.textContent = '';
+            logEventSource.onmessage = (event) => {
+                const shouldAutoScroll = logContainer.scrollHeight - logContainer.clientHeight <= logContainer.scrollTop + 5;
+                const data = JSON.parse(event.data);
+                logContainer.textContent += (task ? data.text : `[${data.task}] ${data.text}`) + '\n';
+                if (shouldAutoScroll) {
+                    logContainer.scrollTop = logContainer.scrollHeight;
+                }
+            };
+            logEventSource.addEventListener('reset', () => {
+                logContainer.textContent = '';
+            });
+        };
+
+        refreshBtn.addEventListener('click', () => {
+            if (logEventSource) {
+                startLiveLogs();
+            } else {
+                updateLogs(true);
+            }
+        });
 
         clearBtn.addEventListener('click', async () => {
             if (confirm('你确定要清空所有运行日志吗？此操作不可恢复。')) {
                 const result = await clearLogs();
                 if (result) {
-                    await updateLogs(true);
+                    if (!logEventSource) await updateLogs(true);
                     alert('日志已清空。');
                 }
             }
         });
 
+        taskFilter.addEventListener('change', () => {
+            if (autoRefreshCheckbox.checked) {
+                startLiveLogs();
+            } else {
+                updateLogs(true);
+            }
+        });
+
         autoRefreshCheckbox.addEventListener('change', () => {
             if (autoRefreshCheckbox.checked) {
-                if (logRefreshInterval) clearInterval(logRefreshInterval);
-                logRefreshInterval = setInterval(() => updateLogs(false), 1000);
+                startLiveLogs();
             } else {
-                if (logRefreshInterval) {
-                    clearInterval(logRefreshInterval);
-                    logRefreshInterval = null;
-                }
+                stopLiveLogs();
             }
         });
 
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src import ai_batcher, scraper
+from src.ai_batcher import AiBatcher, parse_batch_verdicts
+from src.ai_dispatcher import AiDispatcher
+from src.item_registry import ItemRegistry, criteria_hash
+
+VERDICT = {
+    "prompt_version": "1",
+    "is_recommended": True,
+    "reason": "ok",
+    "risk_tags": [],
+    "criteria_analysis": {name: {} for name in ("model_chip", "battery_health", "condition", "history",
+                                                "seller_type", "shipping", "seller_credit")},
+}
+
+
+def _record(product_id):
+    return {"商品信息": {"商品ID": product_id, "商品标题": f"商品{product_id}"}}
+
+
+def _response(results):
+    response = MagicMock()
+    response.choices[0].message.content = json.dumps({"results": results}, ensure_ascii=False)
+    response.usage.prompt_tokens = 1000
+    response.usage.completion_tokens = 200 * max(1, len(results))
+    return response
+
+
+def _mock_client(create):
+    client = MagicMock()
+    client.with_options.return_value.chat.completions.create = create
+    return client
+
+
+def test_parse_batch_verdicts():
+    """Test parsing verdict arrays keyed by product ID, with or without code fences and wrappers"""
+    content = "```json\n" + json.dumps({"results": [{"商品ID": 1, "reason": "a"}, {"reason": "no id"}]}) + "\n```"
+    assert parse_batch_verdicts(content) == {"1": {"reason": "a"}}
+    assert parse_batch_verdicts(json.dumps([{"商品ID": "2", "reason": "b"}])) == {"2": {"reason": "b"}}
+    assert parse_batch_verdicts("说明文字 {\"results\": [{\"商品ID\": \"3\"}]} 结束") == {"3": {}}
+    assert parse_batch_verdicts("not json") == {}
+
+
+@pytest.mark.asyncio
+async def test_batch_packs_items_and_requeues_failures():
+    """Test that items share one request and only items with missing or invalid verdicts are re-queued"""
+    requests = []
+
+    async def create(**params):
+        items = json.loads(params["messages"][1]["content"].split("```json\n")[1].split("\n```")[0])
+        ids = [item["商品信息"]["商品ID"] for item in items]
+        requests.append(ids)
+        if len(requests) == 1:
+            # 第一次请求：商品 2 缺失，商品 3 格式不合格
+            return _response([{"商品ID": "1", **VERDICT}, {"商品ID": "3", "reason": "bad"}])
+        return _response([{"商品ID": product_id, **VERDICT} for product_id in ids])
+
+    batcher = AiBatcher("prompt", batch_size=3, max_wait=0.01)
+    with patch.object(ai_batcher, "client", _mock_client(create)), \
+            patch.object(ai_batcher, "should_log_request", return_value=False), \
+            patch.object(ai_batcher, "get_ai_dispatcher", return_value=AiDispatcher(4, 0, 0)):
+        usage = {}
+        results = await asyncio.gather(
+            batcher.evaluate(_record("1"), usage), batcher.evaluate(_record("2")), batcher.evaluate(_record("3")))
+
+    assert requests == [["1", "2", "3"], ["2", "3"]]
+    assert all(result["reason"] == "ok" for result in results)
+    assert "商品ID" not in results[0]
+    assert usage == {"prompt_tokens": 334, "completion_tokens": 134}
+    assert (batcher.requests, batcher.items, batcher.requeued, batcher.failed) == (2, 3, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_batch_size_adapts_to_context_window():
+    """Test that a batch is sent early when the next item would not fit the context window"""
+    sizes = []
+
+    async def create(**params):
+        items = json.loads(params["messages"][1]["content"].split("```json\n")[1].split("\n```")[0])
+        sizes.append(len(items))
+        return _response([{"商品ID": item["商品信息"]["商品ID"], **VERDICT} for item in items])
+
+    batcher = AiBatcher("prompt", batch_size=10, max_wait=0.01, context_window=4000)
+    with patch.object(ai_batcher, "client", _mock_client(create)), \
+            patch.object(ai_batcher, "should_log_request", return_value=False), \
+            patch.object(ai_batcher, "get_ai_dispatcher", return_value=AiDispatcher(4, 0, 0)):
+        results = await asyncio.gather(*(batcher.evaluate(_record(str(n))) for n in range(6)))
+
+    # 每个结论预留 800 token，4000 * 0.8 的预算内最多放 3 个商品
+    assert max(sizes) <= 3
+    assert sum(sizes) == 6
+    assert all(results)
+
+
+@pytest.mark.asyncio
+async def test_close_sends_partial_batch_and_requeues_without_waiting():
+    """Test that close() flushes the last partial batch and re-queued items without waiting max_wait"""
+    requests = []
+
+    async def create(**params):
+        items = json.loads(params["messages"][1]["content"].split("```json\n")[1].split("\n```")[0])
+        ids = [item["商品信息"]["商品ID"] for item in items]
+        requests.append(ids)
+        # 第一次请求缺失商品 2 的结论
+        return _response([{"商品ID": product_id, **VERDICT} for product_id in ids
+                          if len(requests) > 1 or product_id != "2"])
+
+    batcher = AiBatcher("prompt", batch_size=5, max_wait=30)
+    with patch.object(ai_batcher, "client", _mock_client(create)), \
+            patch.object(ai_batcher, "should_log_request", return_value=False), \
+            patch.object(ai_batcher, "get_ai_dispatcher", return_value=AiDispatcher(4, 0, 0)):
+        evaluations = asyncio.gather(batcher.evaluate(_record("1")), batcher.evaluate(_record("2")))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(batcher.close(), 1)
+        results = await evaluations
+
+    assert requests == [["1", "2"], ["2"]]
+    assert all(result["reason"] == "ok" for result in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_verdicts_use_separate_registry_namespace(tmp_path):
+    """Test that text-only batch verdicts and full image-based verdicts are not reused for each other"""
+    registry = ItemRegistry(str(tmp_path / "registry.db"))
+    full_verdict = {**VERDICT, "reason": "看过图片"}
+    text_verdict = {**VERDICT, "reason": "仅文本"}
+    registry.put_verdict("1", criteria_hash("prompt"), full_verdict)
+    batcher = MagicMock()
+    batcher.evaluate = AsyncMock(return_value=text_verdict)
+
+    with patch("src.config.SKIP_AI_ANALYSIS", False), patch.object(scraper, "get_ai_verdict_cache", return_value=None):
+        record = _record("1")
+        assert await scraper._analyze_item_record({"ai_prompt_text": "prompt"}, record, registry, batcher) == "仅文本"
+        # 第二次批量分析复用注册表中的纯文本结论
+        await scraper._analyze_item_record({"ai_prompt_text": "prompt"}, _record("1"), registry, batcher)
+
+    assert batcher.evaluate.await_count == 1
+    assert registry.get_verdict("1", criteria_hash("prompt"))["reason"] == "看过图片"
+    assert registry.get_verdict("1", criteria_hash("prompt", "text-only"))["reason"] == "仅文本"
+    registry.close()
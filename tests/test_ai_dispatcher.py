@@ -0,0 +1,173 @@
+import asyncio
+import pytest
+import sqlite3
+import time
+import httpx
+from openai import BadRequestError, RateLimitError
+from src.ai_dispatcher import (
+    DEFAULT_IMAGE_TOKENS,
+    AiDispatcher,
+    SharedRateState,
+    TokenBucket,
+    estimate_prompt_tokens,
+    retry_after_seconds,
+)
+
+
+def _error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "https://api.example.com"))
+    return cls("error", response=response, body=None)
+
+
+def test_estimate_prompt_tokens():
+    """Test that text is estimated from its length and images from the given sizes"""
+    messages = [{"role": "user", "content": [
+        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AAAA"}},
+        {"type": "text", "text": "商品" * 30},
+    ]}]
+    assert estimate_prompt_tokens(messages, [(280, 140)]) == 10 * 5 + 60
+    assert estimate_prompt_tokens(messages) == DEFAULT_IMAGE_TOKENS + 60
+
+
+def test_retry_after_header():
+    """Test Retry-After parsing in seconds and milliseconds"""
+    assert retry_after_seconds(_error(RateLimitError, 429, {"retry-after": "7"})) == 7
+    assert retry_after_seconds(_error(RateLimitError, 429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(_error(RateLimitError, 429)) is None
+
+
+def test_token_bucket_wait_time():
+    """Test that the bucket makes requests wait for refill and lets oversized requests through when full"""
+    bucket = TokenBucket(600)
+    assert bucket.capacity == 30
+    assert bucket.wait_time(1000) == 0
+    bucket.take(30)
+    assert bucket.wait_time(10) == pytest.approx(1.0, abs=0.05)
+    bucket.adjust(-20)
+    assert bucket.wait_time(10) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_and_priority():
+    """Test that queued requests respect the concurrency cap and are granted by priority"""
+    dispatcher = AiDispatcher(max_concurrency=1, rpm_limit=0, tpm_limit=0)
+    release = asyncio.Event()
+    order = []
+
+    async def request(name):
+        order.append(name)
+        if name == "first":
+            await release.wait()
+        return name
+
+    first = asyncio.create_task(dispatcher.call(lambda: request("first"), 100))
+    await asyncio.sleep(0)
+    low = asyncio.create_task(dispatcher.call(lambda: request("low"), 100, priority=0))
+    high = asyncio.create_task(dispatcher.call(lambda: request("high"), 100, priority=5))
+    await asyncio.sleep(0.01)
+    assert order == ["first"]
+    release.set()
+    assert await asyncio.gather(first, low, high) == ["first", "low", "high"]
+    assert order == ["first", "high", "low"]
+    assert dispatcher.active == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_retry_honors_retry_after():
+    """Test that 429 responses are retried after Retry-After while other errors are raised immediately"""
+    dispatcher = AiDispatcher(max_concurrency=2, rpm_limit=0, tpm_limit=0, max_retries=3, base_delay=10)
+    attempts = []
+
+    async def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise _error(RateLimitError, 429, {"retry-after": "0.05"})
+        return "ok"
+
+    assert await dispatcher.call(flaky, 100) == "ok"
+    assert attempts[1] - attempts[0] >= 0.05
+    assert (dispatcher.rate_limited, dispatcher.retries, dispatcher.requests) == (1, 1, 1)
+
+    async def bad_request():
+        raise _error(BadRequestError, 400)
+
+    with pytest.raises(BadRequestError):
+        await dispatcher.call(bad_request, 100)
+    assert dispatcher.failures == 1
+    assert dispatcher.active == 0
+
+
+@pytest.mark.asyncio
+async def test_rpm_limit_spaces_requests(tmp_path):
+    """Test that requests beyond the burst wait for the RPM bucket to refill"""
+    dispatcher = AiDispatcher(max_concurrency=10, rpm_limit=1200, tpm_limit=0, state_file=str(tmp_path / "rate.db"))
+
+    async def request():
+        return time.monotonic()
+
+    started = time.monotonic()
+    times = await asyncio.gather(*(dispatcher.call(request, 10) for _ in range(63)))
+    # 桶容量 60（3 秒额度），之后每 0.05 秒补充一个
+    assert max(times) - started >= 0.1
+
+
+def test_shared_rate_state_across_instances(tmp_path):
+    """Test that bucket levels and 429 pauses are shared by dispatchers in different processes"""
+    first = SharedRateState(str(tmp_path / "rate.db"))
+    second = SharedRateState(str(tmp_path / "rate.db"))
+    # 600 RPM：桶容量 30，两个实例共用同一份额度
+    assert first.try_acquire({"rpm": (600, 20)}) == 0
+    assert second.try_acquire({"rpm": (600, 20)}) == pytest.approx(1.0, abs=0.05)
+    assert second.try_acquire({"rpm": (600, 10)}) == 0
+    # 额度不足时不扣除任何一个桶
+    assert first.try_acquire({"rpm": (600, 1), "tpm": (6000, 100)}) > 0
+    second.adjust("rpm", 600, -10)
+    assert first.try_acquire({"tpm": (6000, 100)}) == 0
+
+    second.pause(time.time() + 5)
+    assert first.try_acquire({}) == pytest.approx(5, abs=0.1)
+    first.close()
+    second.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_rate_state_lock_does_not_block_event_loop(tmp_path):
+    """Test that waiting for another process's lock on the shared buckets keeps the event loop running"""
+    path = str(tmp_path / "rate.db")
+    dispatcher = AiDispatcher(max_concurrency=2, rpm_limit=600, tpm_limit=0, state_file=path)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+
+    async def request():
+        return "ok"
+
+    call = asyncio.ensure_future(dispatcher.call(request, 10))
+    started = time.monotonic()
+    for _ in range(10):
+        await asyncio.sleep(0.01)
+    assert time.monotonic() - started < 1
+    assert not call.done()
+    holder.execute("COMMIT")
+    assert await asyncio.wait_for(call, 5) == "ok"
+    holder.close()
+    dispatcher.shared.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_attempts_refund_reserved_tokens(tmp_path):
+    """Test that the TPM budget reserved for a failed attempt is refunded"""
+    for state_file in (None, str(tmp_path / "rate.db")):
+        dispatcher = AiDispatcher(max_concurrency=1, rpm_limit=0, tpm_limit=60000, max_retries=2, base_delay=0,
+                                  state_file=state_file)
+
+        async def rate_limited():
+            raise _error(RateLimitError, 429, {"retry-after": "0"})
+
+        with pytest.raises(RateLimitError):
+            await dispatcher.call(rate_limited, 1000)
+        # 桶容量 3000（3 秒额度）：三次失败的尝试都退还了预留额度，完整的预留仍可立即发放
+        if dispatcher.shared:
+            assert dispatcher.shared.try_acquire({"tpm": (60000, 3000)}) == 0
+            dispatcher.shared.close()
+        else:
+            assert dispatcher.tpm.wait_time(3000) == 0
@@ -3,17 +3,20 @@ import asyncio
 import base64
 import os
 import json
-from unittest.mock import patch, mock_open, MagicMock, AsyncMock
+import httpx
+import io
+from unittest.mock import patch, MagicMock, AsyncMock
 from src.ai_handler import (
     safe_print,
     _download_single_image,
     download_all_images,
+    prepare_images_for_ai,
     cleanup_task_images,
-    encode_image_to_base64,
     validate_ai_response_format,
     send_ntfy_notification,
     get_ai_analysis
 )
+from src.image_cache import ImageCache
 
 
 def test_safe_print():
@@ -23,52 +26,113 @@ def test_safe_print():
     assert True  # If no exception, test passes
 
 
-@patch("src.ai_handler.requests.get")
 @pytest.mark.asyncio
-async def test_download_single_image(mock_requests_get):
+async def test_download_single_image(tmp_path):
     """Test the _download_single_image function"""
-    # Mock response
-    mock_response = MagicMock()
-    mock_response.iter_content.return_value = [b"data1", b"data2"]
-    mock_requests_get.return_value = mock_response
-    
-    # Test data
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, content=b"data1data2")
+
     url = "https://test.com/image.jpg"
-    save_path = "/tmp/test_image.jpg"
-    
-    # Call function
-    result = await _download_single_image(url, save_path)
-    
-    # Verify
+    save_path = str(tmp_path / "test_image.jpg")
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with patch("src.ai_handler.get_http_client", return_value=client):
+            result = await _download_single_image(url, save_path)
+
     assert result == save_path
-    mock_requests_get.assert_called_once_with(url, headers=MagicMock(), timeout=20, stream=True)
-    mock_response.raise_for_status.assert_called_once()
+    assert len(requests_seen) == 1
+    with open(save_path, "rb") as f:
+        assert f.read() == b"data1data2"
+    assert not os.path.exists(save_path + ".part")
+
+
+async def _fake_download(url, save_path):
+    with open(save_path, "wb") as f:
+        f.write(url.encode())
+    return save_path
 
 
-@patch("src.ai_handler.os.makedirs")
-@patch("src.ai_handler.os.path.exists")
-@patch("src.ai_handler._download_single_image")
 @pytest.mark.asyncio
-async def test_download_all_images(mock_download_single, mock_exists, mock_makedirs):
+async def test_download_all_images(tmp_path):
     """Test the download_all_images function"""
-    # Mock os.path.exists to return False (files don't exist)
-    mock_exists.return_value = False
-    
-    # Mock _download_single_image to return successfully
-    mock_download_single.return_value = "/tmp/image1.jpg"
-    
-    # Test data
-    product_id = "12345"
+    cache = ImageCache(str(tmp_path))
     image_urls = ["https://test.com/image1.jpg", "https://test.com/image2.jpg"]
-    task_name = "test_task"
-    
-    # Call function
-    result = await download_all_images(product_id, image_urls, task_name)
-    
-    # Verify
-    assert len(result) == 2
-    assert "/tmp/image1.jpg" in result
-    mock_makedirs.assert_called_once()
+
+    with patch("src.ai_handler.get_image_cache", return_value=cache), \
+            patch("src.ai_handler._download_single_image", side_effect=_fake_download) as mock_download_single:
+        result = await download_all_images("12345", image_urls, "test_task")
+        assert len(result) == 2
+        assert all(path.startswith(str(tmp_path)) for path in result)
+        with open(result[0], "rb") as f:
+            assert f.read() == image_urls[0].encode()
+
+        # 再次分析（或其他任务遇到同一商品）时直接使用缓存
+        assert await download_all_images("12345", image_urls, "other_task") == result
+        assert mock_download_single.call_count == 2
+    assert cache.counters["hits"] == 2
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_download_all_images_runs_concurrently(tmp_path):
+    """Test that images of one item are downloaded concurrently and kept in order"""
+    active = 0
+    peak = 0
+
+    async def fake_download(url, save_path):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.05)
+        active -= 1
+        return None if url.endswith("3.jpg") else await _fake_download(url, save_path)
+
+    cache = ImageCache(str(tmp_path))
+    image_urls = [f"https://test.com/{i}.jpg" for i in range(1, 6)]
+    with patch("src.ai_handler.get_image_cache", return_value=cache), \
+            patch("src.ai_handler._download_single_image", side_effect=fake_download):
+        result = await download_all_images("1", image_urls, "task")
+
+    assert peak == 5
+    contents = []
+    for path in result:
+        with open(path, "rb") as f:
+            contents.append(f.read().decode())
+    assert contents == [image_urls[0], image_urls[1], image_urls[3], image_urls[4]]
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_prepare_images_for_ai(tmp_path):
+    """Test in-memory download, downscaling and reuse of processed images"""
+    from PIL import Image
+    import io
+
+    def png(size):
+        output = io.BytesIO()
+        Image.effect_noise(size, 64).convert("RGB").save(output, "PNG")
+        return output.getvalue()
+
+    originals = {"https://test.com/1.png": png((1600, 1200)), "https://test.com/2.png": png((300, 200))}
+    # 同一张照片重新上传（不同 URL）
+    originals["https://test.com/3.png"] = originals["https://test.com/1.png"]
+    cache = ImageCache(str(tmp_path))
+    with patch("src.ai_handler.get_image_cache", return_value=cache), \
+            patch("src.ai_handler._fetch_image_bytes", side_effect=lambda url: originals[url]) as fetch:
+        result, info, sizes = await prepare_images_for_ai("1", list(originals) + ["not a url"])
+        assert [url.split(";")[0] for url in result] == ["data:image/jpeg", "data:image/jpeg"]
+        with Image.open(io.BytesIO(base64.b64decode(result[0].split(",", 1)[1]))) as image:
+            assert image.size == (1024, 768)
+        assert sizes == [(1024, 768), (300, 200)]
+        assert sum(len(url) for url in result) < sum(len(data) for data in originals.values())
+        assert info == {"图片总数": 3, "近似重复": 1, "超出数量上限": 0, "疑似网图": 0, "发送给AI": 2}
+        # 处理后的图片已缓存，再次分析时不再下载
+        assert await prepare_images_for_ai("1", list(originals)) == (result, info, sizes)
+        assert fetch.call_count == 3
+    assert not os.listdir(tmp_path / "tmp")
+    cache.close()
 
 
 @patch("src.ai_handler.os.path.exists")
@@ -88,27 +152,6 @@ def test_cleanup_task_images(mock_rmtree, mock_exists):
     mock_rmtree.assert_called_once()
 
 
-@patch("src.ai_handler.os.path.exists")
-@patch("builtins.open", new_callable=mock_open, read_data=b"test image data")
-def test_encode_image_to_base64(mock_file, mock_exists):
-    """Test the encode_image_to_base64 function"""
-    # Mock os.path.exists to return True (file exists)
-    mock_exists.return_value = True
-    
-    # Test data
-    image_path = "/tmp/test_image.jpg"
-    
-    # Call function
-    result = encode_image_to_base64(image_path)
-    
-    # Verify
-    assert result is not None
-    assert isinstance(result, str)
-    # Should be base64 encoded "test image data"
-    expected = base64.b64encode(b"test image data").decode('utf-8')
-    assert result == expected
-
-
 def test_validate_ai_response_format():
     """Test the validate_ai_response_format function"""
     # Test valid response
@@ -172,16 +215,19 @@ async def test_send_ntfy_notification(mock_requests_post):
     mock_requests_post.assert_called_once()
 
 
+@patch("src.ai_handler.should_log_request", return_value=False)
 @patch("src.ai_handler.client")
-@patch("src.ai_handler.encode_image_to_base64")
 @pytest.mark.asyncio
-async def test_get_ai_analysis(mock_encode_image, mock_client):
+async def test_get_ai_analysis(mock_client, mock_should_log, tmp_path):
     """Test the get_ai_analysis function"""
-    # Mock encode_image_to_base64 to return a base64 string
-    mock_encode_image.return_value = "dGVzdCBpbWFnZSBkYXRh"  # "test image data" base64 encoded
-    
+    from PIL import Image
+
+    # 本地 PNG 图片与下载的图片一样缩小并按实际格式标注 MIME 类型
+    image_path = tmp_path / "image1.png"
+    Image.new("RGB", (2000, 1000), (200, 30, 30)).save(image_path, "PNG")
+
     # Mock AI client response
-    mock_completion = AsyncMock()
+    mock_completion = MagicMock()
     mock_completion.choices = [MagicMock()]
     mock_completion.choices[0].message.content = json.dumps({
         "prompt_version": "1.0",
@@ -208,7 +254,8 @@ async def test_get_ai_analysis(mock_encode_image, mock_client):
             "seller_credit": {"status": "high", "comment": "test"}
         }
     })
-    mock_client.chat.completions.create.return_value = mock_completion
+    create = AsyncMock(return_value=mock_completion)
+    mock_client.with_options.return_value.chat.completions.create = create
     
     # Test data
     product_data = {
@@ -217,7 +264,7 @@ async def test_get_ai_analysis(mock_encode_image, mock_client):
             "商品标题": "Test Product"
         }
     }
-    image_paths = ["/tmp/image1.jpg"]
+    image_paths = [str(image_path), str(tmp_path / "missing.jpg")]
     prompt_text = "Test prompt"
     
     # Call function
@@ -226,4 +273,10 @@ async def test_get_ai_analysis(mock_encode_image, mock_client):
     # Verify
     assert result is not None
     assert result["is_recommended"] is True
-    assert result["reason"] == "test reason"
\ No newline at end of file
+    assert result["reason"] == "test reason"
+    content = create.call_args.kwargs["messages"][0]["content"]
+    assert [part["type"] for part in content] == ["image_url", "text"]
+    data_url = content[0]["image_url"]["url"]
+    assert data_url.startswith("data:image/jpeg;base64,")
+    with Image.open(io.BytesIO(base64.b64decode(data_url.split(",", 1)[1]))) as image:
+        assert image.size == (1024, 512)
\ No newline at end of file
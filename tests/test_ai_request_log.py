@@ -0,0 +1,85 @@
+import pytest
+import base64
+import json
+import os
+import time
+from src.ai_request_log import AiRequestLog, BlobStore, strip_inline_images
+
+
+def _messages(*images):
+    content = [{"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + base64.b64encode(image).decode()}}
+               for image in images]
+    content.append({"type": "text", "text": "请分析这个商品"})
+    return [{"role": "user", "content": content}]
+
+
+def _read_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_strip_inline_images_deduplicates(tmp_path):
+    """Test that inline images are replaced by content-addressed references"""
+    blobs = BlobStore(str(tmp_path))
+    original = _messages(b"image-a", b"image-b", b"image-a")
+    messages, written, skipped = strip_inline_images(original, blobs)
+
+    assert written == len(b"image-a") + len(b"image-b")
+    assert skipped == 1
+    parts = messages[0]["content"]
+    assert parts[0]["image_url"]["url"] == parts[2]["image_url"]["url"]
+    assert parts[0]["image_url"]["url"].startswith("blob:sha256:")
+    with open(tmp_path / parts[1]["image_url"]["blob"], "rb") as f:
+        assert f.read() == b"image-b"
+    assert parts[3] == {"type": "text", "text": "请分析这个商品"}
+    # 原消息仍会用于重试，不能被修改
+    assert original[0]["content"][0]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+
+    # 重启后（新的实例）也能识别已保存的图片
+    assert strip_inline_images(_messages(b"image-b"), BlobStore(str(tmp_path)))[1:] == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_requests_are_batched_per_task(tmp_path):
+    """Test batched writes to per-task logs and flushing on close"""
+    log = AiRequestLog(str(tmp_path), batch_size=10, flush_interval=60)
+    for i in range(3):
+        assert log.submit("相机", str(i), _messages(b"same image"))
+    assert log.submit("手机", "9", _messages(b"other image"))
+    await log.close()
+
+    records = _read_records(log.log_path("相机"))
+    assert [record["product_id"] for record in records] == ["0", "1", "2"]
+    assert all(record["task"] == "相机" for record in records)
+    assert len(_read_records(log.log_path("手机"))) == 1
+    assert log.records == 4
+    assert log.blob_bytes == len(b"same image") + len(b"other image")
+    assert log.blobs_skipped == 2
+    assert not log.submit("相机", "3", _messages())
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking(tmp_path):
+    """Test that a full queue drops log entries"""
+    log = AiRequestLog(str(tmp_path), queue_size=2, flush_interval=60)
+    results = [log.submit("相机", str(i), _messages()) for i in range(4)]
+    assert results == [True, True, False, False]
+    assert log.dropped == 2
+    await log.close()
+
+
+@pytest.mark.asyncio
+async def test_sweep_applies_retention_and_size_cap(tmp_path):
+    """Test removal of expired files and of the oldest files over the size cap"""
+    log = AiRequestLog(str(tmp_path), max_bytes=2500, retention_days=1)
+    blobs = BlobStore(str(tmp_path))
+    paths = [os.path.join(tmp_path, blobs.put(bytes([i]) * 1000, "jpg")[0]) for i in range(4)]
+    now = time.time()
+    os.utime(paths[0], (now - 3 * 86400, now - 3 * 86400))
+    for i, path in enumerate(paths[1:], start=1):
+        os.utime(path, (now - 100 + i, now - 100 + i))
+
+    # 1 个过期，剩余 3000 字节超过上限，再删除最旧的 1 个
+    assert log.sweep() == 2
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+    await log.close()
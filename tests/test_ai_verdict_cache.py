@@ -0,0 +1,101 @@
+import pytest
+import time
+from unittest.mock import AsyncMock, patch
+from src import ai_handler, scraper
+from src.ai_verdict_cache import AiVerdictCache, listing_cache_key, normalize_record, summarize_counters
+from src.image_cache import ImageCache
+
+
+def _record(item_id="1", **overrides):
+    item = {
+        "商品标题": "iPhone 13  128G\n国行",
+        "当前售价": "¥2999",
+        "商品ID": item_id,
+        "商品链接": f"https://www.goofish.com/item?id={item_id}",
+        "“想要”人数": "3",
+        "发布时间": "2026-10-01 12:00",
+    }
+    item.update(overrides)
+    return {"爬取时间": "2026-10-18T10:00:00", "任务名称": "task", "商品信息": item, "卖家信息": {"卖家昵称": "a"}}
+
+
+def test_listing_cache_key_ignores_volatile_fields():
+    """Test that relisted items with the same content share a key, while content, images, model and prompt do not"""
+    key = listing_cache_key(_record("1"), ["d1"], "model", "prompt")
+    relisted = _record("2", **{"“想要”人数": "10", "商品标题": "iPhone 13 128G 国行"})
+    relisted["爬取时间"] = "2026-10-19T08:00:00"
+    relisted["图片信息"] = {"图片总数": 1}
+    assert listing_cache_key(relisted, ["d1"], "model", "prompt") == key
+    assert "商品ID" not in normalize_record(relisted)["商品信息"]
+
+    assert listing_cache_key(_record("1", 当前售价="¥2500"), ["d1"], "model", "prompt") != key
+    assert listing_cache_key(_record("1"), ["d2"], "model", "prompt") != key
+    assert listing_cache_key(_record("1"), ["d1"], "other-model", "prompt") != key
+    assert listing_cache_key(_record("1"), ["d1"], "model", "new prompt") != key
+    assert listing_cache_key(_record("1"), [], "model", "prompt", namespace="text-only") != \
+        listing_cache_key(_record("1"), [], "model", "prompt")
+
+
+def test_cache_hits_and_saved_tokens(tmp_path):
+    """Test hits, misses and saved token counters, shared between instances"""
+    cache = AiVerdictCache(str(tmp_path / "ai.db"))
+    assert cache.get("k") is None
+    cache.put("k", {"is_recommended": True, "reason": "好"}, 1200, 80)
+    assert cache.get("k") == {"is_recommended": True, "reason": "好"}
+    assert cache.counters == {"hits": 1, "misses": 1, "saved_prompt_tokens": 1200, "saved_completion_tokens": 80}
+    # 计数只在 flush_counters 时写入数据库，重复调用不会重复累加
+    assert cache.lifetime_counters()["hits"] == 0
+    cache.flush_counters()
+    cache.flush_counters()
+
+    other = AiVerdictCache(str(tmp_path / "ai.db"))
+    assert other.get("k")["reason"] == "好"
+    other.flush_counters()
+    summary = summarize_counters(other.lifetime_counters())
+    assert summary["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+    assert summary["saved_tokens"] == 2 * 1280
+
+
+def test_ttl_and_eviction(tmp_path):
+    """Test that expired verdicts are ignored and the least recently used entries are evicted"""
+    cache = AiVerdictCache(str(tmp_path / "ai.db"), ttl_hours=1, max_entries=2)
+    with patch("src.ai_verdict_cache.time.time", return_value=time.time() - 7200):
+        cache.put("old", {"is_recommended": False})
+    assert cache.get("old") is None
+
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.put("c", {"n": 3})
+    cache.get("a")
+    assert cache.evict() == 2
+    assert cache.entry_count() == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+
+
+@pytest.mark.asyncio
+async def test_analyze_item_record_reuses_cached_verdict(tmp_path):
+    """Test that a relisted item reuses the cached verdict without preparing images or calling the AI"""
+    cache = AiVerdictCache(str(tmp_path / "ai.db"))
+    verdict = {"is_recommended": True, "reason": "价格合适"}
+    task_config = {"ai_prompt_text": "prompt"}
+
+    def fake_analysis(record, prompt_text="", image_data_urls=None, usage=None, priority=0, image_sizes=None):
+        usage["prompt_tokens"] = 1000
+        usage["completion_tokens"] = 50
+        return verdict
+
+    with patch("src.config.SKIP_AI_ANALYSIS", False), \
+            patch.object(scraper, "get_ai_verdict_cache", return_value=cache), \
+            patch.object(ai_handler, "get_image_cache", return_value=ImageCache(str(tmp_path / "images"))), \
+            patch.object(scraper, "prepare_images_for_ai", AsyncMock(return_value=([], {"发送给AI": 0}, []))) as prepare, \
+            patch.object(scraper, "get_ai_analysis", AsyncMock(side_effect=fake_analysis)) as analysis:
+        assert await scraper._analyze_item_record(task_config, _record("1")) == "价格合适"
+        relisted = _record("2")
+        assert await scraper._analyze_item_record(task_config, relisted) == "价格合适"
+
+    assert relisted["ai_analysis"] == verdict
+    assert prepare.await_count == 1
+    assert analysis.await_count == 1
+    assert cache.counters["hits"] == 1
+    assert cache.counters["saved_prompt_tokens"] == 1000
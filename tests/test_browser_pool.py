@@ -0,0 +1,61 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from src.browser_pool import BrowserPool, _PooledContext
+
+
+def _make_context():
+    context = MagicMock()
+
+    async def new_page():
+        page = MagicMock()
+        page.closed = False
+        page.is_closed.side_effect = lambda: page.closed
+
+        async def close():
+            page.closed = True
+        page.close = AsyncMock(side_effect=close)
+        page.goto = AsyncMock()
+        return page
+
+    context.new_page = AsyncMock(side_effect=new_page)
+    return _PooledContext(context)
+
+
+@pytest.mark.asyncio
+async def test_pool_bounds_contexts():
+    """Test that concurrent leases never create more than max_contexts contexts"""
+    pool = BrowserPool(max_contexts=2, page_max_uses=10)
+    pool._new_context = AsyncMock(side_effect=lambda: _make_context())
+    active, peak = 0, 0
+
+    async def use_page():
+        nonlocal active, peak
+        async with pool.lease_page():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*[use_page() for _ in range(6)])
+    assert peak == 2
+    assert pool._new_context.await_count == 2
+    assert pool.stats["leases"] == 6
+
+
+@pytest.mark.asyncio
+async def test_pool_recycles_pages():
+    """Test that pages are reused and rebuilt after page_max_uses leases"""
+    pool = BrowserPool(max_contexts=1, page_max_uses=2)
+    pool._new_context = AsyncMock(side_effect=lambda: _make_context())
+
+    pages = []
+    for _ in range(3):
+        async with pool.lease_page() as page:
+            pages.append(page)
+
+    assert pages[0] is pages[1]
+    assert pages[0].closed
+    assert pages[2] is not pages[0]
+    pages[0].goto.assert_awaited_once_with("about:blank")
+    assert pool.stats["pages_created"] == 2
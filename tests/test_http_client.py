@@ -0,0 +1,51 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from src import http_client
+from src.http_client import get_http_client, host_slot, close_http_clients
+
+
+@pytest.mark.asyncio
+async def test_get_http_client_is_shared():
+    """Test that the same client is reused within one event loop"""
+    client_a = get_http_client(verify=False)
+    client_b = get_http_client(verify=False)
+    assert client_a is client_b
+
+    # 不同的证书校验设置使用独立的客户端
+    assert get_http_client(verify=True) is not client_a
+
+    await close_http_clients()
+    assert client_a.is_closed
+    assert get_http_client(verify=False) is not client_a
+    await close_http_clients()
+
+
+@pytest.mark.asyncio
+async def test_host_slot_limits_concurrency():
+    """Test that host_slot bounds concurrent requests per host"""
+    active = 0
+    peak = 0
+
+    async def fake_request(url):
+        nonlocal active, peak
+        async with host_slot(url):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    with patch.object(http_client, "HTTP_PER_HOST_LIMIT", 2):
+        http_client._host_semaphores.clear()
+        await asyncio.gather(*[fake_request("https://a.example.com/x") for _ in range(6)])
+        assert peak == 2
+
+        # 不同主机互不影响
+        peak = 0
+        await asyncio.gather(
+            fake_request("https://a.example.com/x"),
+            fake_request("https://b.example.com/x"),
+            fake_request("https://c.example.com/x"),
+        )
+        assert peak == 3
+    http_client._host_semaphores.clear()
@@ -0,0 +1,83 @@
+import pytest
+import os
+import time
+from unittest.mock import patch
+from src.image_cache import ImageCache, normalize_image_url, summarize_counters
+
+
+def _downloaded(cache, url, data: bytes) -> str:
+    path = cache.temp_path(url)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_normalize_image_url():
+    """Test that equivalent image URLs map to the same cache key"""
+    expected = "https://img.alicdn.com/bao/1.jpg?a=1&b=2"
+    assert normalize_image_url("http://IMG.alicdn.com:80/bao/1.jpg?b=2&a=1#x") == expected
+    assert normalize_image_url("//img.alicdn.com/bao/1.jpg?a=1&b=2") == expected
+    assert normalize_image_url("https://img.alicdn.com/bao/2.jpg") != expected
+
+
+def test_cache_hits_and_content_dedup(tmp_path):
+    """Test URL hits, content deduplication across URLs and sharing between instances"""
+    cache = ImageCache(str(tmp_path))
+    assert cache.get("https://a.com/1.jpg") is None
+    path = cache.add("https://a.com/1.jpg", _downloaded(cache, "https://a.com/1.jpg", b"image"))
+    assert cache.get("http://a.com/1.jpg") == path
+
+    # 不同 URL 相同内容只保留一份
+    assert cache.add("https://b.com/x.png", _downloaded(cache, "https://b.com/x.png", b"image")) == path
+    assert os.listdir(tmp_path / "tmp") == []
+    assert cache.total_bytes() == len(b"image")
+    assert cache.counters == {"hits": 1, "misses": 1, "dedup": 1, "evictions": 0}
+    cache.flush_counters()
+
+    # 其他进程（新的实例）共享同一索引
+    other = ImageCache(str(tmp_path))
+    assert other.get("https://b.com/x.png") == path
+    other.flush_counters()
+    assert summarize_counters(other.lifetime_counters())["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+
+    # 文件被删除后视为未命中
+    os.remove(path)
+    assert other.get("https://a.com/1.jpg") is None
+    other.close()
+    cache.close()
+
+
+def test_lru_eviction(tmp_path):
+    """Test that the least recently used images are evicted over the size cap"""
+    cache = ImageCache(str(tmp_path), max_bytes=2500)
+    now = time.time()
+    with patch("src.image_cache.time.time", return_value=now - 3600):
+        for i in range(3):
+            url = f"https://a.com/{i}.jpg"
+            cache.add(url, _downloaded(cache, url, bytes([i]) * 1000))
+    with patch("src.image_cache.time.time", return_value=now - 1800):
+        assert cache.get("https://a.com/0.jpg")
+
+    # 第 4 张图片使总大小超过上限，下一次检查时淘汰最久未使用的 1.jpg 和 2.jpg
+    with patch("src.image_cache.EVICT_CHECK_INTERVAL", 4):
+        cache.add("https://a.com/3.jpg", _downloaded(cache, "https://a.com/3.jpg", b"\x03" * 1000))
+    assert cache.counters["evictions"] == 2
+    assert cache.get("https://a.com/1.jpg") is None
+    assert cache.get("https://a.com/2.jpg") is None
+    assert cache.get("https://a.com/0.jpg") and cache.get("https://a.com/3.jpg")
+    cache.close()
+
+
+def test_record_item_hashes_counts_other_listings(tmp_path):
+    """Test cross-listing near-duplicate counting through the banded hash index"""
+    cache = ImageCache(str(tmp_path))
+    stock, own = 0x0123456789ABCDEF, 0xFEDCBA9876543210
+    for item in range(3):
+        # 其他卖家重新压缩后的同一张图片，有 1-3 位不同
+        assert cache.record_item_hashes(str(item), [stock ^ ((1 << item + 1) - 1)]) == [item]
+    assert cache.record_item_hashes("9", [stock, own]) == [3, 0]
+    # 同一商品再次记录时不计算自己
+    assert cache.record_item_hashes("9", [stock]) == [3]
+    # 超过距离阈值的不算同一张图片
+    assert cache.record_item_hashes("10", [stock ^ 0xF0F0]) == [0]
+    cache.close()
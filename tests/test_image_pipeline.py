@@ -0,0 +1,103 @@
+import pytest
+import base64
+import io
+import random
+from PIL import Image, ImageDraw, ImageFilter
+from src.image_pipeline import (
+    hamming_distances,
+    image_dhash,
+    prepare_ai_image,
+    select_diverse_images,
+    sniff_image_mime,
+    to_data_url,
+    variant_name,
+)
+
+
+def _image_bytes(size, mode="RGB", image_format="JPEG"):
+    image = Image.effect_noise(size, 64).convert(mode)
+    output = io.BytesIO()
+    image.save(output, image_format)
+    return output.getvalue()
+
+
+def test_sniff_image_mime():
+    """Test MIME detection from file signatures"""
+    assert sniff_image_mime(_image_bytes((8, 8))) == "image/jpeg"
+    assert sniff_image_mime(_image_bytes((8, 8), image_format="PNG")) == "image/png"
+    assert sniff_image_mime(_image_bytes((8, 8), image_format="WEBP")) == "image/webp"
+    assert sniff_image_mime(b"\x00\x00\x00\x18ftypheic....") == "image/heic"
+    assert sniff_image_mime(b"unknown") == "image/jpeg"
+
+
+@pytest.mark.parametrize("image_format,mime", [("jpeg", "image/jpeg"), ("webp", "image/webp")])
+def test_prepare_ai_image_downscales(image_format, mime):
+    """Test downscaling to the max edge and re-encoding"""
+    original = _image_bytes((2000, 1000), image_format="PNG")
+    data, result_mime = prepare_ai_image(original, max_edge=512, image_format=image_format, quality=70)
+    assert result_mime == mime
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.size == (512, 256)
+    assert len(data) < len(original)
+
+
+def test_prepare_ai_image_flattens_transparency():
+    """Test that transparent images are composited onto white for JPEG"""
+    image = Image.new("RGBA", (1200, 1200), (255, 0, 0, 0))
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    data, mime = prepare_ai_image(output.getvalue(), max_edge=600, image_format="jpeg", quality=80)
+    assert mime == "image/jpeg"
+    with Image.open(io.BytesIO(data)) as result:
+        assert result.getpixel((10, 10))[0] > 240
+
+
+def test_prepare_ai_image_keeps_original():
+    """Test that undecodable, disabled or already small images are sent as-is"""
+    assert prepare_ai_image(b"not an image", max_edge=512) == (b"not an image", "image/jpeg")
+    small = _image_bytes((100, 100))
+    assert prepare_ai_image(small, max_edge=0) == (small, "image/jpeg")
+    assert prepare_ai_image(small, max_edge=512, quality=100) == (small, "image/jpeg")
+
+
+def test_data_url_and_variant():
+    """Test data URL encoding and processing variants"""
+    assert to_data_url(b"abc", "image/webp") == "data:image/webp;base64," + base64.b64encode(b"abc").decode()
+    assert variant_name(1024, "jpeg", 80) != variant_name(768, "jpeg", 80)
+
+
+def _photo(seed, crop=0.0, size=(800, 600)):
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 300)),
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    if crop:
+        image = image.crop((int(size[0] * crop), int(size[1] * crop),
+                            size[0] - int(size[0] * crop), size[1] - int(size[1] * crop)))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=85)
+    return output.getvalue()
+
+
+def test_image_dhash_matches_near_duplicates():
+    """Test that re-encoded and slightly cropped photos have close dHashes"""
+    original = image_dhash(_photo(1))
+    resized, _ = prepare_ai_image(_photo(1), max_edge=400, quality=60)
+    assert hamming_distances([original, image_dhash(resized)])[0, 1] <= 2
+    assert hamming_distances([original, image_dhash(_photo(1, crop=0.03))])[0, 1] <= 10
+    assert hamming_distances([original, image_dhash(_photo(2))])[0, 1] > 10
+    assert image_dhash(b"not an image") is None
+
+
+def test_select_diverse_images():
+    """Test near-duplicate removal and the diversity-based image budget"""
+    hashes = [0, 0b1, 2 ** 64 - 1, 0xFFFFFFFF, None, 0xFFFF]
+    # 下标 1 与封面只差 1 位，视为重复
+    assert select_diverse_images(hashes, 0, 4) == [0, 2, 3, 4, 5]
+    # 保留封面，再依次选与已选图片差异最大的
+    assert select_diverse_images(hashes, 3, 4) == [0, 2, 4]
+    assert select_diverse_images([], 3, 4) == []
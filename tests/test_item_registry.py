@@ -0,0 +1,64 @@
+import time
+from unittest.mock import patch
+from src.item_registry import ItemRegistry, criteria_hash, summarize_counters
+
+
+def test_criteria_hash():
+    """Test that different prompts produce different hashes"""
+    assert criteria_hash("prompt a") == criteria_hash("prompt a")
+    assert criteria_hash("prompt a") != criteria_hash("prompt b")
+    assert criteria_hash("prompt a", "text-only") != criteria_hash("prompt a")
+
+
+def test_registry_reuses_detail_and_verdict(tmp_path):
+    """Test detail/verdict reuse and hit counters"""
+    registry = ItemRegistry(str(tmp_path / "registry.db"))
+    prompt_a, prompt_b = criteria_hash("a"), criteria_hash("b")
+
+    assert registry.get_detail("1") is None
+    registry.put_detail("1", {"data": {"itemDO": {"title": "测试"}}})
+    assert registry.get_detail("1")["data"]["itemDO"]["title"] == "测试"
+
+    registry.put_verdict("1", prompt_a, {"is_recommended": True})
+    assert registry.get_verdict("1", prompt_a) == {"is_recommended": True}
+    # 分析标准不同时需要重新评估
+    assert registry.get_verdict("1", prompt_b) is None
+
+    assert registry.counters == {"detail_hits": 1, "detail_misses": 1, "ai_hits": 1, "ai_misses": 1}
+    # 计数只在内存中累加，flush_counters 后才写入数据库，重复保存不会重复累加
+    assert registry.lifetime_counters() == {"detail_hits": 0, "detail_misses": 0, "ai_hits": 0, "ai_misses": 0}
+    registry.flush_counters()
+    registry.flush_counters()
+    assert registry.lifetime_counters() == registry.counters
+    registry.close()
+
+
+def test_registry_ttl(tmp_path):
+    """Test that expired entries are not reused"""
+    registry = ItemRegistry(str(tmp_path / "registry.db"), ttl_hours=1)
+    registry.put_detail("1", {"data": {}})
+    with patch("src.item_registry.time.time", return_value=time.time() + 7200):
+        assert registry.get_detail("1") is None
+        assert registry.purge_expired() == 1
+    registry.close()
+
+
+def test_registry_purges_expired_every_n_writes(tmp_path):
+    """Test that expired entries are purged automatically after PURGE_CHECK_INTERVAL writes"""
+    registry = ItemRegistry(str(tmp_path / "registry.db"), ttl_hours=1)
+    with patch("src.item_registry.time.time", return_value=time.time() - 7200):
+        registry.put_detail("old", {"data": {}})
+    with patch("src.item_registry.PURGE_CHECK_INTERVAL", 3):
+        registry.put_detail("1", {"data": {}})
+        assert registry._conn.execute("SELECT COUNT(*) FROM details").fetchone()[0] == 2
+        registry.put_verdict("1", criteria_hash("a"), {"is_recommended": True})
+    assert registry._conn.execute("SELECT COUNT(*) FROM details").fetchone()[0] == 1
+    registry.close()
+
+
+def test_summarize_counters():
+    """Test hit-rate calculation"""
+    summary = summarize_counters({"detail_hits": 3, "detail_misses": 1, "ai_hits": 0, "ai_misses": 0})
+    assert summary["detail_hit_rate"] == 0.75
+    assert summary["ai_hit_rate"] == 0.0
+    assert summary["saved_detail_calls"] == 3
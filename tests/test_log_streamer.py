@@ -0,0 +1,126 @@
+import pytest
+import asyncio
+import os
+import sys
+import threading
+from src.log_streamer import LogTailer, format_sse
+from src.task_logs import decode_log_bytes, task_log_path
+
+
+def _append(path, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def test_decode_log_bytes_falls_back_to_gbk():
+    """Test UTF-8 decoding with the GBK fallback"""
+    assert decode_log_bytes("任务".encode("utf-8")) == "任务"
+    assert decode_log_bytes("任务".encode("gbk")) == "任务"
+
+
+def test_read_new_lines_buffers_and_handles_truncation(tmp_path):
+    """Test the ring buffer, partial lines and reset after truncation"""
+    path = task_log_path("相机", str(tmp_path))
+    _append(path, b"".join(f"old {i}\n".encode() for i in range(5)))
+    tailer = LogTailer(str(tmp_path), buffer_lines=3)
+    tailer._load_tail()
+    assert [entry["text"] for entry in tailer.buffer] == ["old 2", "old 3", "old 4"]
+
+    other = task_log_path("手机", str(tmp_path))
+    _append(other, "新行\n".encode("utf-8"))
+    _append(path, "写入".encode("utf-8"))
+    assert tailer.read_new_lines() == 1
+    _append(path, "中\n".encode("utf-8"))
+    assert tailer.read_new_lines() == 1
+    assert [entry["task"] for entry in tailer.buffer] == ["相机", "手机", "相机"]
+    assert tailer.buffer[-1]["text"] == "写入中"
+
+    with open(path, "wb") as f:
+        f.write(b"after clear\n")
+    assert tailer.read_new_lines() == 1
+    assert [(entry["task"], entry["text"]) for entry in tailer.buffer] == [("手机", "新行"), ("相机", "after clear")]
+
+
+@pytest.mark.asyncio
+async def test_read_new_lines_follows_rotation(tmp_path):
+    """Test that lines written just before a rename rotation are not lost"""
+    path = task_log_path("相机", str(tmp_path))
+    _append(path, b"first\n")
+    tailer = LogTailer(str(tmp_path))
+    tailer.start()
+
+    try:
+        _append(path, b"before rotation\n")
+        os.rename(path, path + ".20250101-000000")
+        _append(path, b"after rotation\n")
+        assert tailer.read_new_lines() == 2
+        assert [entry["text"] for entry in tailer.buffer] == ["first", "before rotation", "after rotation"]
+
+        text, last_id = tailer.read_since(1)
+        assert text == "[相机] before rotation\n[相机] after rotation\n"
+        assert last_id == 3
+        assert tailer.read_since(1, task="手机") == ("", 3)
+    finally:
+        await tailer.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_inotify", [True, False])
+async def test_subscribers_receive_filtered_lines(tmp_path, use_inotify):
+    """Test fan-out to subscribers with per-task filtering and backlog replay"""
+    a, b = task_log_path("a", str(tmp_path)), task_log_path("b", str(tmp_path))
+    _append(a, b"backlog\n")
+    tailer = LogTailer(str(tmp_path), buffer_lines=10, poll_interval=0.05, use_inotify=use_inotify)
+    everything = tailer.subscribe()
+    only_b = tailer.subscribe(task="b")
+    assert [entry["text"] for entry in everything.backlog] == ["backlog"]
+    assert only_b.backlog == []
+
+    try:
+        await asyncio.sleep(0.05)
+        _append(a, b"live a\n")
+        _append(b, b"live b\n")
+        lines = [await asyncio.wait_for(everything.queue.get(), 2) for _ in range(2)]
+        assert sorted((entry["task"], entry["text"]) for entry in lines) == [("a", "live a"), ("b", "live b")]
+        entry = await asyncio.wait_for(only_b.queue.get(), 2)
+        assert entry["text"] == "live b"
+        assert only_b.queue.empty()
+
+        # 断线重连时只补发 Last-Event-ID 之后的行
+        resumed = tailer.subscribe(after_id=lines[0]["id"])
+        assert [entry["id"] for entry in resumed.backlog] == [lines[1]["id"]]
+    finally:
+        await tailer.stop()
+    if use_inotify and sys.platform.startswith("linux"):
+        assert tailer.using_inotify
+
+
+@pytest.mark.asyncio
+async def test_background_reads_run_off_event_loop(tmp_path):
+    """Test that the background tailer reads log files in a worker thread"""
+    path = task_log_path("a", str(tmp_path))
+    _append(path, b"")
+    tailer = LogTailer(str(tmp_path), poll_interval=0.05, use_inotify=False)
+    original = tailer._read_files
+    threads = []
+
+    def record_thread():
+        threads.append(threading.current_thread())
+        return original()
+
+    tailer._read_files = record_thread
+    subscription = tailer.subscribe()
+    try:
+        _append(path, b"line\n")
+        entry = await asyncio.wait_for(subscription.queue.get(), 2)
+        assert entry["text"] == "line"
+    finally:
+        await tailer.stop()
+    assert threads and threading.main_thread() not in threads
+
+
+def test_format_sse():
+    """Test SSE encoding of log lines and reset events"""
+    assert format_sse({"id": 3, "task": "a", "text": "行"}) == 'id: 3\ndata: {"task": "a", "text": "行"}\n\n'
+    assert format_sse({"id": 4, "task": "a", "text": "", "reset": True}) == \
+        'id: 4\nevent: reset\ndata: {"task": "a", "text": ""}\n\n'
@@ -0,0 +1,83 @@
+import pytest
+import json
+import time
+from src.pacing import EndpointPacer, PacingEngine, is_block_response
+
+
+def _strategy(**overrides):
+    strategy = {
+        "endpoints": {"search": {"base_interval": 10, "min_interval": 5, "max_interval": 40, "burst": 1}},
+        "jitter": 0,
+        "speedup_after": 2,
+        "speedup_factor": 0.5,
+        "backoff_factor": 2.0,
+        "floor_margin": 1.5,
+        "floor_relax": 1.0,
+    }
+    strategy.update(overrides)
+    return strategy
+
+
+def test_is_block_response():
+    """Test detection of throttling and verification responses"""
+    assert is_block_response("['RGV587_ERROR::SM::哎哟喂,被挤爆啦,请稍后重试']")
+    assert is_block_response("['FAIL_SYS_USER_VALIDATE::请验证']")
+    assert not is_block_response("['SUCCESS::调用成功']")
+
+
+def test_engine_speeds_up_and_backs_off(tmp_path):
+    """Test multiplicative speed-up, exponential back-off and clamping"""
+    engine = PacingEngine(_strategy(), state_file=str(tmp_path / "pacing.json"))
+    pacer = engine.pacers["search"]
+
+    engine.record_response("search", "['SUCCESS::调用成功']")
+    assert pacer.interval == 10
+    engine.record_response("search", "['SUCCESS::调用成功']")
+    assert pacer.interval == 5
+    engine.record_response("search", "['SUCCESS::调用成功']")
+    engine.record_response("search", "['SUCCESS::调用成功']")
+    assert pacer.interval == 5  # 不低于 min_interval
+
+    # 网络错误等不影响节奏
+    engine.record_response("search", "['REQUEST_ERROR::timeout']")
+    assert pacer.interval == 5
+
+    engine.record_response("search", "['RGV587_ERROR::SM::被挤爆啦']")
+    assert pacer.interval == 10
+    # 触发限流时的间隔 5s * 1.5 成为新的安全下限
+    assert pacer.floor == 7.5
+    for _ in range(4):
+        engine.record_response("search", "['SUCCESS::调用成功']")
+    assert pacer.interval == 7.5
+
+    for expected in (15, 30, 40):
+        engine.record_response("search", "['RGV587_ERROR::SM::被挤爆啦']")
+        assert pacer.interval == expected
+    assert pacer.blocks == 4
+    assert pacer.floor == 40
+
+
+def test_engine_persists_learned_interval(tmp_path):
+    """Test that the learned interval is restored on the next run"""
+    state_file = str(tmp_path / "pacing.json")
+    engine = PacingEngine(_strategy(), state_file=state_file)
+    engine.record_response("search", "['FAIL_SYS_USER_VALIDATE::请验证']")
+    with open(state_file, "r", encoding="utf-8") as f:
+        assert json.load(f)["endpoints"]["search"]["interval"] == 20
+
+    restored = PacingEngine(_strategy(floor_relax=0.8), state_file=state_file)
+    assert restored.pacers["search"].interval == 20
+    assert restored.pacers["search"].floor == 12
+
+
+@pytest.mark.asyncio
+async def test_pacer_spaces_requests():
+    """Test that the token bucket allows a burst and then spaces requests"""
+    pacer = EndpointPacer("search", base_interval=0.05, min_interval=0.01, max_interval=1, burst=2)
+    start = time.monotonic()
+    await pacer.acquire()
+    await pacer.acquire()
+    assert time.monotonic() - start < 0.03
+    await pacer.acquire()
+    assert time.monotonic() - start >= 0.045
+    assert pacer.requests == 3
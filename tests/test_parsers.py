@@ -0,0 +1,79 @@
+import pytest
+import json
+import os
+from src.parsers import (
+    _parse_search_results_json,
+    parse_ratings,
+    parse_search_results,
+    parse_user_head,
+    reputation_from_ratings,
+)
+
+
+def _load_search_fixture():
+    fixture_path = os.path.join(os.path.dirname(__file__), "fixtures", "search_response.json")
+    with open(fixture_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_parse_search_results():
+    """Test parsing a recorded search response"""
+    items = parse_search_results(_load_search_fixture(), "fixture")
+    assert len(items) == 30
+    first = items[0]
+    assert first["商品ID"] == "780000000000"
+    assert first["商品链接"] == "https://www.goofish.com/item?id=780000000000&categoryId=126862528"
+    assert first["商品标签"] == ["包邮", "验货宝"]
+    assert first["发布时间"] != "未知时间"
+    assert all(item["当前售价"].startswith("¥") for item in items)
+
+
+def test_parse_search_results_handles_errors_and_missing_fields():
+    """Test error responses and items with missing nested fields"""
+    assert parse_search_results({"ret": ["RGV587_ERROR::SM::被挤爆啦"]}, "fixture") == []
+    items = parse_search_results({"ret": ["SUCCESS::调用成功"], "data": {"resultList": [{"data": None}]}}, "fixture")
+    assert items[0]["商品标题"] == "未知标题"
+    assert items[0]["商品ID"] == "未知ID"
+
+
+@pytest.mark.asyncio
+async def test_async_wrapper_matches_sync_parser():
+    """Test that the async compatibility wrapper returns the same result"""
+    data = _load_search_fixture()
+    assert await _parse_search_results_json(data, "fixture") == parse_search_results(data, "fixture")
+
+
+def test_parse_ratings_and_reputation():
+    """Test rating parsing and reputation statistics"""
+    ratings = [
+        {"cardData": {"rateId": 1, "rate": 1, "rateTagList": [{"text": "卖家"}]}},
+        {"cardData": {"rateId": 2, "rate": -1, "rateTagList": [{"text": "卖家"}]}},
+        {"cardData": {"rateId": 3, "rate": 1, "rateTagList": [{"text": "买家"}]}},
+        {"cardData": {"rateId": 4}},
+    ]
+    parsed = parse_ratings(ratings)
+    assert [r["评价类型"] for r in parsed] == ["好评", "差评", "好评", "未知"]
+    assert parsed[3]["评价来源角色"] == "未知角色"
+    assert reputation_from_ratings(ratings) == {
+        "作为卖家的好评数": "1/2",
+        "作为卖家的好评率": "50.00%",
+        "作为买家的好评数": "1/1",
+        "作为买家的好评率": "100.00%",
+    }
+
+
+def test_parse_user_head():
+    """Test parsing the user head API response"""
+    head = {"data": {"module": {
+        "base": {"displayName": "卖家A", "ylzTags": [
+            {"text": "卖家信用极好", "attributes": {"role": "seller", "level": 5}},
+        ]},
+        "tabs": {"item": {"number": 12}},
+    }}}
+    profile = parse_user_head(head)
+    assert profile["卖家昵称"] == "卖家A"
+    assert profile["卖家信用等级"] == "卖家信用极好"
+    assert profile["买家信用等级"] == "暂无"
+    assert profile["卖家在售/已售商品数"] == 12
+    assert profile["卖家收到的评价总数"] == "暂无"
+    assert profile["卖家头像链接"] == "暂无"
@@ -0,0 +1,122 @@
+import pytest
+import asyncio
+from src.pipeline import Pipeline, Stage
+
+
+@pytest.mark.asyncio
+async def test_pipeline_passes_items_through_stages():
+    """Test that items flow through all stages and None drops an item"""
+    saved = []
+
+    async def double(x):
+        return x * 2
+
+    async def drop_odd(x):
+        return None if x % 3 == 0 else x
+
+    async def save(x):
+        saved.append(x)
+        return x
+
+    pipeline = Pipeline("test", [Stage("double", double, 2), Stage("filter", drop_odd, 2), Stage("save", save)]).start()
+    for i in range(1, 7):
+        await pipeline.put(i)
+    await pipeline.join()
+
+    assert sorted(saved) == [2, 4, 8, 10]
+    assert [stage.processed for stage in pipeline.stages] == [6, 4, 4]
+    assert pipeline.stages[1].dropped == 2
+    assert "吞吐" in pipeline.format_stats()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_overlaps_slow_stage_and_counts_errors():
+    """Test per-stage concurrency, error isolation and stop requests"""
+    active, peak = 0, 0
+
+    async def slow(x):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        if x == 3:
+            raise ValueError("boom")
+        return x
+
+    pipeline = Pipeline("test", [Stage("slow", slow, 3)], queue_size=2).start()
+    for i in range(6):
+        await pipeline.put(i)
+    await pipeline.join()
+    assert peak == 3
+    assert pipeline.stages[0].processed == 5
+    assert pipeline.stages[0].errors == 1
+
+    async def stopper(x):
+        pipeline.request_stop()
+        return x
+
+    pipeline = Pipeline("test", [Stage("stop", stopper, 1)]).start()
+    for i in range(3):
+        await pipeline.put(i)
+    await pipeline.join()
+    assert pipeline.stop_requested
+    assert pipeline.stages[0].processed == 1
+    assert pipeline.stages[0].dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_pipeline_stop_drains_downstream_stages():
+    """Test that a stop only drops items not yet past the first stage"""
+    analyzed, saved = [], []
+
+    async def detail(x):
+        if x == 3:
+            pipeline.request_stop()
+            return None
+        return x
+
+    async def analyze(x):
+        await asyncio.sleep(0.01)
+        analyzed.append(x)
+        return x
+
+    async def save(x):
+        saved.append(x)
+        return x
+
+    pipeline = Pipeline("test", [Stage("detail", detail), Stage("analyze", analyze), Stage("save", save)],
+                        queue_size=10).start()
+    for i in range(6):
+        await pipeline.put(i)
+    await pipeline.join()
+
+    assert sorted(analyzed) == [0, 1, 2]
+    assert sorted(saved) == [0, 1, 2]
+    assert pipeline.stages[0].dropped == 3
+    assert pipeline.stages[1].dropped == pipeline.stages[2].dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_calls_on_input_done_once_input_is_taken():
+    """Test that on_input_done runs once, after every item was taken, and can release waiting workers"""
+    release = asyncio.Event()
+    taken = []
+    calls = []
+
+    async def wait_for_release(x):
+        taken.append(x)
+        await release.wait()
+        return x
+
+    async def input_done():
+        calls.append(sorted(taken))
+        release.set()
+
+    pipeline = Pipeline("test", [Stage("wait", wait_for_release, 4, on_input_done=input_done)]).start()
+    for i in range(3):
+        await pipeline.put(i)
+    await asyncio.wait_for(pipeline.join(), 1)
+
+    assert calls == [[0, 1, 2]]
+    assert pipeline.stages[0].processed == 3
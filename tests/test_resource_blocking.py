@@ -0,0 +1,33 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.resource_blocking import install_resource_blocking, should_block
+
+
+def test_should_block_by_type_and_host():
+    """Test the default blocking policy"""
+    # mtop 接口始终放行
+    assert not should_block("https://h5api.m.goofish.com/h5/mtop.taobao.idle.pc.detail/1.0/", "fetch")
+    # 页面与首方脚本放行
+    assert not should_block("https://www.goofish.com/item?id=1", "document")
+    assert not should_block("https://g.alicdn.com/idleFish-F2e/app.js", "script")
+    # 图片、字体、样式拦截
+    assert should_block("https://img.alicdn.com/bao/uploaded/i1/a.jpg", "image")
+    assert should_block("https://g.alicdn.com/font/iconfont.woff2", "font")
+    assert should_block("https://g.alicdn.com/idleFish-F2e/app.css", "stylesheet")
+    # 第三方统计和第三方脚本拦截
+    assert should_block("https://gm.mmstat.com/fsp.1.1", "fetch")
+    assert should_block("https://www.googletagmanager.com/gtag/js", "script")
+    assert should_block("https://cdn.example.com/sdk.js", "script")
+    # 本地资源不拦截
+    assert not should_block("data:image/png;base64,AAAA", "image")
+
+
+@pytest.mark.asyncio
+async def test_install_resource_blocking_respects_switch():
+    """Test that routes are only installed when blocking is enabled"""
+    context = MagicMock()
+    context.route = AsyncMock()
+    await install_resource_blocking(context, enabled=False)
+    context.route.assert_not_called()
+    await install_resource_blocking(context, enabled=True)
+    context.route.assert_awaited_once()
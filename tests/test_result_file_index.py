@@ -0,0 +1,100 @@
+import pytest
+import json
+from src.result_file_index import ResultFileIndex, ResultIndexCache
+from src.results_store import parse_price
+
+
+def _record(item_id, crawl_time, price, publish_time, recommended=False):
+    return {
+        "爬取时间": crawl_time,
+        "商品信息": {"商品ID": item_id, "当前售价": price, "发布时间": publish_time},
+        "ai_analysis": {"is_recommended": recommended},
+    }
+
+
+RECORDS = [
+    _record("1", "2025-01-01T00:00:01", "¥300", "2025-01-03 10:00", recommended=True),
+    _record("2", "2025-01-01T00:00:02", "¥1,000", "2025-01-01 10:00"),
+    _record("3", "2025-01-01T00:00:03", "价格异常", "未知时间", recommended=True),
+    _record("4", "2025-01-01T00:00:04", "¥300", "2025-01-02 10:00"),
+    _record("5", "2025-01-01T00:00:05", "¥50", "2025-01-01 10:00"),
+]
+
+
+def _write(path, records, mode="a"):
+    with open(path, mode, encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _legacy_ids(records, recommended_only, sort_by, sort_order):
+    """旧版接口在内存中筛选、排序的结果。"""
+    results = [r for r in records if not recommended_only or r["ai_analysis"]["is_recommended"] is True]
+
+    def get_sort_key(item):
+        info = item["商品信息"]
+        if sort_by == "publish_time":
+            return info.get("发布时间", "0000-00-00 00:00")
+        elif sort_by == "price":
+            return parse_price(info.get("当前售价", "0"))
+        return item.get("爬取时间", "")
+
+    results.sort(key=get_sort_key, reverse=(sort_order == "desc"))
+    return [r["商品信息"]["商品ID"] for r in results]
+
+
+@pytest.mark.parametrize("sort_by", ["crawl_time", "publish_time", "price"])
+@pytest.mark.parametrize("sort_order", ["asc", "desc"])
+@pytest.mark.parametrize("recommended_only", [False, True])
+def test_query_matches_legacy_ordering(tmp_path, sort_by, sort_order, recommended_only):
+    """Test that index ordering matches the legacy in-memory sort, including ties"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _write(path, RECORDS)
+    index = ResultFileIndex(path)
+    index.refresh()
+
+    total, items = index.query(1, 10, recommended_only, sort_by, sort_order)
+    expected = _legacy_ids(RECORDS, recommended_only, sort_by, sort_order)
+    assert total == len(expected)
+    assert [item["商品信息"]["商品ID"] for item in items] == expected
+
+
+def test_refresh_reads_only_appended_records(tmp_path):
+    """Test incremental refresh, partial lines and rebuild after truncation"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _write(path, RECORDS[:2])
+    index = ResultFileIndex(path)
+    assert index.refresh() == 2
+    assert index.refresh() == 0
+
+    _write(path, RECORDS[2:4])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"爬取时间": "2025')
+    assert index.refresh() == 2
+    assert len(index) == 4
+
+    _write(path, RECORDS[4:], mode="w")
+    assert index.refresh() == 1
+    assert index.query(1, 10)[1] == RECORDS[4:]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test LRU eviction and per-file memory statistics"""
+    paths = []
+    for name in ("a", "b", "c"):
+        path = str(tmp_path / f"{name}_full_data.jsonl")
+        _write(path, RECORDS)
+        paths.append(path)
+
+    cache = ResultIndexCache(max_files=2)
+    cache.query(paths[0], 1, 2)
+    cache.query(paths[1], 1, 2)
+    cache.query(paths[0], 1, 2)
+    cache.query(paths[2], 1, 2)
+
+    stats = cache.stats()
+    assert [s["file"] for s in stats] == ["c_full_data.jsonl", "a_full_data.jsonl"]
+    assert all(s["records"] == len(RECORDS) and s["memory_bytes"] > 0 for s in stats)
+
+    with pytest.raises(FileNotFoundError):
+        cache.query(str(tmp_path / "missing.jsonl"), 1, 2)
@@ -0,0 +1,89 @@
+import pytest
+import asyncio
+import json
+import threading
+from src.result_writer import JsonlWriter, close_jsonl_writers, get_jsonl_writer
+
+
+def _read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_producers_are_batched(tmp_path):
+    """Test that concurrent producers are serialized into whole-line batches"""
+    path = str(tmp_path / "out" / "kw_full_data.jsonl")
+    flushed = []
+    writer = JsonlWriter(path, batch_size=50, flush_interval=0.05, fsync_policy="never", on_flushed=flushed.extend)
+
+    async def producer(index):
+        for n in range(20):
+            await writer.write({"商品信息": {"商品ID": f"{index}-{n}", "商品标题": "标题" * 50}})
+
+    await asyncio.gather(*[producer(i) for i in range(10)])
+    await writer.close()
+
+    records = _read_lines(path)
+    assert len(records) == 200
+    assert {r["商品信息"]["商品ID"] for r in records} == {f"{i}-{n}" for i in range(10) for n in range(20)}
+    assert writer.written == 200
+    assert writer.batches < 200
+    assert len(flushed) == 200
+
+
+@pytest.mark.asyncio
+async def test_on_flushed_runs_off_event_loop(tmp_path):
+    """Test that the flush callback runs in a worker thread rather than on the event loop"""
+    threads = []
+    writer = JsonlWriter(str(tmp_path / "kw_full_data.jsonl"), batch_size=1, fsync_policy="never",
+                         on_flushed=lambda records: threads.append(threading.get_ident()))
+    await writer.write({"id": 1})
+    await writer.close()
+    assert threads and threads[0] != threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_flushes_after_interval(tmp_path):
+    """Test that a partial batch is written once the flush interval elapses"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    writer = JsonlWriter(path, batch_size=100, flush_interval=0.05, fsync_policy="never")
+    await writer.write({"id": 1})
+    await asyncio.sleep(0.2)
+    assert _read_lines(path) == [{"id": 1}]
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_pending_records(tmp_path):
+    """Test that close() writes queued records and applies the fsync policy"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    writer = JsonlWriter(path, batch_size=100, flush_interval=60, fsync_policy="interval", fsync_interval=60)
+    for i in range(3):
+        await writer.write({"id": i})
+    await writer.close()
+
+    assert [r["id"] for r in _read_lines(path)] == [0, 1, 2]
+    assert writer.batches == 1
+    assert writer.fsyncs == 1
+    with pytest.raises(RuntimeError):
+        await writer.write({"id": 3})
+
+
+@pytest.mark.asyncio
+async def test_shared_writer_per_path(tmp_path):
+    """Test that writers are shared per file and closed together"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    writer = get_jsonl_writer(path)
+    assert get_jsonl_writer(path) is writer
+    await writer.write({"id": 1})
+    await close_jsonl_writers()
+    assert _read_lines(path) == [{"id": 1}]
+    assert get_jsonl_writer(path) is not writer
+    await close_jsonl_writers()
+
+
+def test_rejects_unknown_fsync_policy(tmp_path):
+    """Test validation of the fsync policy"""
+    with pytest.raises(ValueError):
+        JsonlWriter(str(tmp_path / "a.jsonl"), fsync_policy="sometimes")
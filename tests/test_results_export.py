@@ -0,0 +1,105 @@
+import pytest
+import csv
+import io
+import json
+from src.results_export import export_results, flatten_record, iter_result_chunks
+from src.results_store import ResultsStore
+
+
+def _record(item_id, price, tags):
+    return {
+        "爬取时间": f"2025-01-01T00:00:{int(item_id):02d}",
+        "商品信息": {"商品ID": item_id, "当前售价": price, "商品标签": tags},
+        "卖家信息": {"卖家昵称": f"卖家{item_id}"},
+        "ai_analysis": {"is_recommended": item_id == "1", "risk_tags": []},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "kw_full_data.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(25):
+            f.write(json.dumps(_record(str(i), f"¥{i * 10}", ["包邮"] if i % 2 else []), ensure_ascii=False) + "\n")
+        # 只出现在个别记录中的字段也要成为一列
+        extra = _record("25", "¥250", [])
+        extra["卖家信息"]["卖家注册时长"] = "来闲鱼3年"
+        f.write(json.dumps(extra, ensure_ascii=False) + "\n")
+    store = ResultsStore(str(tmp_path / "results.db"))
+    store.sync_scope("kw_full_data.jsonl", str(path))
+    yield store
+    store.close()
+
+
+def test_flatten_record():
+    """Test flattening nested fields into dotted string columns"""
+    row = flatten_record(_record("1", "¥10", ["包邮", "验货宝"]))
+    assert row["爬取时间"] == "2025-01-01T00:00:01"
+    assert row["商品信息.商品ID"] == "1"
+    assert json.loads(row["商品信息.商品标签"]) == ["包邮", "验货宝"]
+    assert row["卖家信息.卖家昵称"] == "卖家1"
+    assert row["ai_analysis.is_recommended"] == "true"
+
+
+def test_iter_result_chunks_respects_chunk_size(store):
+    """Test that records are read in bounded chunks"""
+    chunks = list(iter_result_chunks(store, "kw_full_data.jsonl", chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 6]
+
+
+def test_export_csv_with_filters(store):
+    """Test CSV export of filtered records with all discovered columns"""
+    data = b"".join(export_results(store, "kw_full_data.jsonl", "csv", tags=["包邮"], sort_order="asc"))
+    assert data.startswith("\ufeff".encode("utf-8"))
+    rows = list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+    assert [row["商品信息.商品ID"] for row in rows] == [str(i) for i in range(1, 25, 2)]
+    # 列只从筛选后的记录中收集
+    assert "卖家信息.卖家注册时长" not in rows[0]
+
+    data = b"".join(export_results(store, "kw_full_data.jsonl", "csv", min_price=250))
+    rows = list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+    assert rows[0]["卖家信息.卖家注册时长"] == "来闲鱼3年"
+
+
+def test_export_ndjson_keeps_records(store):
+    """Test NDJSON export of the original nested records"""
+    data = b"".join(export_results(store, "kw_full_data.jsonl", "ndjson", recommended_only=True))
+    assert [json.loads(line) for line in data.decode("utf-8").splitlines()] == [_record("1", "¥10", ["包邮"])]
+
+
+def test_export_parquet(store):
+    """Test Parquet export when pyarrow is installed"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(export_results(store, "kw_full_data.jsonl", "parquet"))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 26
+    assert "商品信息.商品ID" in table.column_names
+    assert str(table.schema.field("商品信息.当前售价").type) == "double"
+    assert str(table.schema.field("ai_analysis.is_recommended").type) == "bool"
+    assert table.column("商品信息.当前售价").to_pylist()[:2] == [250.0, 240.0]
+    assert table.column("ai_analysis.is_recommended").to_pylist().count(True) == 1
+
+
+def test_export_rejects_unknown_format(store):
+    """Test validation of the export format"""
+    with pytest.raises(ValueError):
+        export_results(store, "kw_full_data.jsonl", "xml")
+
+
+def test_export_validates_filters_before_streaming(store):
+    """Test that invalid filters raise before the lazy export starts"""
+    for filters in ({"publish_after": "yesterday"}, {"publish_before": "2025/01/01"}, {"sort_by": "title"}):
+        with pytest.raises(ValueError):
+            export_results(store, "kw_full_data.jsonl", "csv", **filters)
+
+
+def test_export_pins_scan_to_snapshot(store, tmp_path):
+    """Test that records imported between the column scan and the data scan are not exported"""
+    chunks = export_results(store, "kw_full_data.jsonl", "csv", sort_order="asc")
+    header = next(chunks)
+    path = str(tmp_path / "kw_full_data.jsonl")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(_record("26", "¥260", []), ensure_ascii=False) + "\n")
+    store.sync_scope("kw_full_data.jsonl", path)
+    rows = list(csv.DictReader(io.StringIO((header + b"".join(chunks)).decode("utf-8-sig"))))
+    assert len(rows) == 26
@@ -0,0 +1,168 @@
+import pytest
+import json
+import os
+from src.results_store import ResultsStore, encode_cursor, parse_price
+
+
+def _record(item_id, crawl_time, price, publish_time="2025-01-01 10:00", recommended=False):
+    return {
+        "爬取时间": crawl_time,
+        "搜索关键字": "相机",
+        "任务名称": "测试任务",
+        "商品信息": {"商品ID": item_id, "当前售价": price, "发布时间": publish_time},
+        "ai_analysis": {"is_recommended": recommended},
+    }
+
+
+def _append(path, records, trailing=""):
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.write(trailing)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def test_parse_price():
+    """Test numeric price parsing with the legacy fallback"""
+    assert parse_price("¥1,299") == 1299.0
+    assert parse_price("价格异常") == 0.0
+    assert parse_price(None) == 0.0
+
+
+def test_sync_scope_imports_incrementally(store, tmp_path):
+    """Test that only complete lines appended since the last sync are imported"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _append(path, [_record("1", "2025-01-01T00:00:01", "¥10"), _record("2", "2025-01-01T00:00:02", "¥20")])
+    assert store.sync_scope("kw_full_data.jsonl", path) == 2
+    assert store.sync_scope("kw_full_data.jsonl", path) == 0
+
+    # 写入中途的半行不会被导入，补全后下次同步再导入
+    _append(path, [_record("3", "2025-01-01T00:00:03", "¥30")], trailing='{"爬取时间": "2025')
+    assert store.sync_scope("kw_full_data.jsonl", path) == 1
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('-01-01T00:00:04", "商品信息": {"商品ID": "4"}}\n')
+    assert store.sync_scope("kw_full_data.jsonl", path) == 1
+    assert store.count("kw_full_data.jsonl") == 4
+
+
+def test_sync_scope_resets_on_truncate_and_delete(store, tmp_path):
+    """Test that a truncated or deleted result file resets the scope"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _append(path, [_record(str(i), f"2025-01-01T00:00:0{i}", "¥1") for i in range(5)])
+    store.sync_scope("kw_full_data.jsonl", path)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(_record("9", "2025-01-02T00:00:00", "¥1")) + "\n")
+    assert store.sync_scope("kw_full_data.jsonl", path) == 1
+    assert store.count("kw_full_data.jsonl") == 1
+
+    os.remove(path)
+    assert store.sync_scope("kw_full_data.jsonl", path) == 0
+    assert store.count("kw_full_data.jsonl") == 0
+
+
+def test_query_sorts_filters_and_pages(store, tmp_path):
+    """Test sorted, filtered and paginated queries"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _append(path, [
+        _record("1", "2025-01-01T00:00:01", "¥300", "2025-01-03 10:00", recommended=True),
+        _record("2", "2025-01-01T00:00:02", "¥1,000", "2025-01-01 10:00"),
+        _record("3", "2025-01-01T00:00:03", "价格异常", "未知时间", recommended=True),
+        _record("4", "2025-01-01T00:00:04", "¥50", "2025-01-02 10:00"),
+    ])
+    store.sync_scope("kw_full_data.jsonl", path)
+
+    def ids(items):
+        return [item["商品信息"]["商品ID"] for item in items]
+
+    total, items = store.query("kw_full_data.jsonl")
+    assert total == 4
+    assert ids(items) == ["4", "3", "2", "1"]
+
+    total, items = store.query("kw_full_data.jsonl", sort_by="price", sort_order="asc")
+    assert ids(items) == ["3", "4", "1", "2"]
+
+    total, items = store.query("kw_full_data.jsonl", sort_by="publish_time", sort_order="desc", page=2, limit=2)
+    assert total == 4
+    assert ids(items) == ["4", "2"]
+
+    total, items = store.query("kw_full_data.jsonl", recommended_only=True, sort_order="asc")
+    assert total == 2
+    assert ids(items) == ["1", "3"]
+
+    assert store.query("other.jsonl") == (0, [])
+
+
+def _tagged(item_id, crawl_time, price, publish_time, tags, region, risk_tags):
+    record = _record(item_id, crawl_time, price, publish_time)
+    record["商品信息"].update({"商品标签": tags, "发货地区": region})
+    record["ai_analysis"]["risk_tags"] = risk_tags
+    return record
+
+
+def test_query_page_walks_all_records_with_cursor(store, tmp_path):
+    """Test that cursor pages cover every record exactly once and survive appends"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    # 价格大量重复，验证排序键相同的记录按记录ID稳定分页
+    _append(path, [_record(str(i), f"2025-01-01T00:00:{i:02d}", f"¥{i % 3}") for i in range(25)])
+    store.sync_scope("kw_full_data.jsonl", path)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        items, cursor = store.query_page("kw_full_data.jsonl", limit=7, cursor=cursor, sort_by="price", sort_order="asc")
+        seen.extend(item["商品信息"]["商品ID"] for item in items)
+        pages += 1
+        if pages == 1:
+            # 翻页期间写入的新记录不会让已取出的页边界错位
+            _append(path, [_record("new", "2025-01-02T00:00:00", "¥99")])
+            store.sync_scope("kw_full_data.jsonl", path)
+        if cursor is None:
+            break
+
+    assert pages == 4
+    assert seen[:-1] == sorted((str(i) for i in range(25)), key=lambda i: (int(i) % 3, int(i)))
+    assert seen[-1] == "new"
+
+
+def test_query_page_filters(store, tmp_path):
+    """Test price, publish time, tag, risk tag and region filters"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _append(path, [
+        _tagged("1", "2025-01-01T00:00:01", "¥100", "2025-01-01 10:00", ["包邮"], "广东深圳", []),
+        _tagged("2", "2025-01-01T00:00:02", "¥200", "2025-01-02 10:00", ["包邮", "验货宝"], "上海", ["电池老化"]),
+        _tagged("3", "2025-01-01T00:00:03", "¥300", "未知时间", ["验货宝"], "广东广州", ["电池老化", "疑似商家"]),
+    ])
+    store.sync_scope("kw_full_data.jsonl", path)
+
+    def ids(**filters):
+        items, _ = store.query_page("kw_full_data.jsonl", sort_order="asc", **filters)
+        return [item["商品信息"]["商品ID"] for item in items]
+
+    assert ids(min_price=150, max_price=300) == ["2", "3"]
+    assert ids(publish_after="2025-01-01 12:00") == ["2"]
+    assert ids(publish_before="2025-01-01") == ["1"]
+    assert ids(tags=["包邮", "验货宝"]) == ["2"]
+    assert ids(risk_tags=["电池老化"]) == ["2", "3"]
+    assert ids(region="广东") == ["1", "3"]
+
+
+def test_query_page_rejects_mismatched_cursor(store, tmp_path):
+    """Test that a cursor cannot be reused with another sort order"""
+    path = str(tmp_path / "kw_full_data.jsonl")
+    _append(path, [_record(str(i), f"2025-01-01T00:00:0{i}", "¥1") for i in range(3)])
+    store.sync_scope("kw_full_data.jsonl", path)
+    _, cursor = store.query_page("kw_full_data.jsonl", limit=1)
+    with pytest.raises(ValueError):
+        store.query_page("kw_full_data.jsonl", limit=1, cursor=cursor, sort_by="price")
+    with pytest.raises(ValueError):
+        store.query_page("kw_full_data.jsonl", cursor="not-a-cursor")
+    # 排序键或记录ID不是标量的游标在绑定参数前被拒绝
+    for sort_value, row_id in ((["2025"], 1), ({"a": 1}, 1), ("2025", [1]), ("2025", True)):
+        with pytest.raises(ValueError):
+            store.query_page("kw_full_data.jsonl", cursor=encode_cursor("crawl_time", "desc", sort_value, row_id))
@@ -0,0 +1,55 @@
+import json
+import os
+from src.seen_index import SeenIndex, get_item_key
+
+
+def _write_jsonl(path, item_ids):
+    with open(path, "w", encoding="utf-8") as f:
+        for item_id in item_ids:
+            record = {"商品信息": {"商品ID": item_id, "商品链接": f"https://www.goofish.com/item?id={item_id}&x=1"}}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.write("not json\n")
+
+
+def test_get_item_key():
+    """Test that the item ID is preferred over the link"""
+    assert get_item_key({"商品ID": "123", "商品链接": "https://a?id=1&b=2"}) == "123"
+    assert get_item_key({"商品ID": "未知ID", "商品链接": "https://a?id=1&b=2"}) == "https://a?id=1"
+
+
+def test_seen_index_add_and_contains(tmp_path):
+    """Test basic membership, scoping and clearing"""
+    index = SeenIndex(str(tmp_path / "seen.db"))
+    index.add("a.jsonl", "1")
+    index.add_many("a.jsonl", ["2", "3", "3"])
+    index.add("b.jsonl", "1")
+
+    assert index.contains("a.jsonl", "1")
+    assert not index.contains("a.jsonl", "4")
+    assert index.count("a.jsonl") == 3
+
+    index.clear_scope("a.jsonl")
+    assert not index.contains("a.jsonl", "1")
+    assert index.contains("b.jsonl", "1")
+    index.close()
+
+
+def test_seen_index_migrates_once(tmp_path):
+    """Test one-time migration from an existing JSONL file"""
+    jsonl_path = str(tmp_path / "kw_full_data.jsonl")
+    _write_jsonl(jsonl_path, ["1", "2", "3"])
+
+    index = SeenIndex(str(tmp_path / "seen.db"))
+    assert index.ensure_scope("kw_full_data.jsonl", jsonl_path) == 3
+    assert index.contains("kw_full_data.jsonl", "2")
+
+    # 再次启动时不再重新扫描文件
+    _write_jsonl(jsonl_path, ["9"])
+    assert index.ensure_scope("kw_full_data.jsonl", jsonl_path) == 0
+    assert not index.contains("kw_full_data.jsonl", "9")
+
+    # 结果文件被删除后，作用域随之清空
+    os.remove(jsonl_path)
+    index.ensure_scope("kw_full_data.jsonl", jsonl_path)
+    assert index.count("kw_full_data.jsonl") == 0
+    index.close()
@@ -0,0 +1,115 @@
+import pytest
+import asyncio
+import gzip
+import os
+from src.task_logs import (
+    RotatingLogFile,
+    clear_log,
+    list_segments,
+    read_log_lines,
+    relay_task_output,
+    task_log_filename,
+    task_name_from_log,
+)
+
+
+def test_task_log_filename_round_trip():
+    """Test that task names map to safe file names and back"""
+    for name in ("Sony A7M4", "相机/镜头", ".hidden", "50%折扣"):
+        filename = task_log_filename(name)
+        assert "/" not in filename and not filename.startswith(".")
+        assert task_name_from_log(filename) == name
+    assert task_name_from_log("相机.log.20250101-000000.gz") is None
+
+
+def test_rotates_by_size_on_line_boundaries(tmp_path):
+    """Test size rotation, gzip compression and the backup limit"""
+    path = str(tmp_path / "task.log")
+    log = RotatingLogFile(path, max_bytes=100, rotate_hours=0, backups=2, compression="gzip")
+    for i in range(30):
+        log.write(f"line {i:02d} ".encode())
+        log.write(b"x" * 10 + b"\n")
+    log.wait()
+    log.close()
+
+    segments = list_segments(path)
+    assert len(segments) == 2
+    assert all(segment.endswith(".gz") for segment in segments)
+    # 轮转只发生在行边界上，每个分段都由完整的行组成
+    with gzip.open(segments[0], "rb") as f:
+        assert all(line.endswith(b"x" * 10 + b"\n") for line in f)
+    assert os.path.getsize(path) < 100 + 21
+
+
+def test_rotates_when_crossing_time_boundary(tmp_path, monkeypatch):
+    """Test time-based rotation aligned to the interval boundary"""
+    path = str(tmp_path / "task.log")
+    log = RotatingLogFile(path, max_bytes=0, rotate_hours=1, compression="none")
+    now = [1_700_000_000.0]
+    monkeypatch.setattr("src.task_logs.time.time", lambda: now[0])
+    log.write(b"first\n")
+    now[0] += 60
+    log.write(b"same hour\n")
+    assert list_segments(path) == []
+    now[0] += 3600
+    log.write(b"next hour\n")
+    log.wait()
+    log.close()
+    assert len(list_segments(path)) == 1
+    with open(path, "rb") as f:
+        assert f.read() == b"next hour\n"
+
+
+def test_read_log_lines_across_segments(tmp_path):
+    """Test paging backwards through the current file and compressed segments"""
+    path = str(tmp_path / "task.log")
+    log = RotatingLogFile(path, max_bytes=0, rotate_hours=0, backups=10, compression="gzip")
+    for i in range(25):
+        log.write(f"line {i}\n".encode())
+        if i % 10 == 9:
+            log.rotate()
+    log.wait()
+    log.close()
+
+    collected, before, pages = [], None, 0
+    while True:
+        lines, before = read_log_lines(path, 7, before)
+        collected = lines + collected
+        pages += 1
+        if before is None:
+            break
+    assert collected == [f"line {i}" for i in range(25)]
+    assert pages == 4
+
+    with pytest.raises(ValueError):
+        read_log_lines(path, 7, "missing.gz:0")
+
+
+def test_clear_log_keeps_open_writer(tmp_path):
+    """Test that clearing removes segments and a running writer keeps appending"""
+    path = str(tmp_path / "task.log")
+    log = RotatingLogFile(path, max_bytes=0, rotate_hours=0)
+    log.write(b"old\n")
+    log.rotate()
+    log.wait()
+    log.write(b"current\n")
+    clear_log(path)
+    log.write(b"new\n")
+    log.close()
+    assert list_segments(path) == []
+    assert read_log_lines(path) == (["new"], None)
+
+
+@pytest.mark.asyncio
+async def test_relay_task_output(tmp_path):
+    """Test relaying a subprocess pipe into the task log"""
+    path = str(tmp_path / "task.log")
+    log = RotatingLogFile(path)
+    process = await asyncio.create_subprocess_exec(
+        "sh", "-c", "echo 标准输出; echo 错误输出 >&2",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    await relay_task_output(process.stdout, log)
+    await process.wait()
+    log.close()
+    assert sorted(read_log_lines(path)[0]) == sorted(["标准输出", "错误输出"])
@@ -8,11 +8,12 @@ import signal
 import sys
 import base64
 from contextlib import asynccontextmanager
+from urllib.parse import quote
 from dotenv import dotenv_values
 from fastapi import FastAPI, Request, HTTPException, Depends, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from src.prompt_utils import generate_criteria, update_config_with_new_task
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
@@ -20,7 +21,23 @@ from typing import List, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from src.config import (
+    AI_CACHE_FILE,
+    ENABLE_AI_CACHE,
+    ENABLE_GLOBAL_REGISTRY,
+    IMAGE_CACHE_DIR,
+    ITEM_REGISTRY_FILE,
+    RESULTS_BACKEND,
+)
 from src.file_operator import FileOperator
+from src import ai_verdict_cache, image_cache
+from src.item_registry import COUNTER_NAMES, ItemRegistry, summarize_counters
+from src.log_streamer import format_sse, get_log_tailer
+from src.result_file_index import get_result_index_cache
+from src.results_export import EXPORT_FORMATS, export_results
+from src.results_store import get_results_store
+from src.seen_index import get_seen_index
+from src.task_logs import TASK_LOG_DIR, clear_log, close_task_logs, read_log_lines, start_output_relay, task_log_path
 from src.task import get_task, update_task
 
 
@@ -62,6 +79,7 @@ class Task(BaseModel):
     cron: Optional[str] = None
     ai_prompt_base_file: str
     ai_prompt_criteria_file: str
+    ai_priority: Optional[int] = 0
     is_running: Optional[bool] = False
 
 
@@ -77,6 +95,7 @@ class TaskUpdate(BaseModel):
     cron: Optional[str] = None
     ai_prompt_base_file: Optional[str] = None
     ai_prompt_criteria_file: Optional[str] = None
+    ai_priority: Optional[int] = None
     is_running: Optional[bool] = None
 
 
@@ -143,6 +162,8 @@ async def lifespan(app: FastAPI):
         await asyncio.gather(*stop_tasks)
         print("所有爬虫进程已终止。")
 
+    await get_log_tailer().stop()
+    close_task_logs()
     await _set_all_tasks_stopped_in_config()
 
 
@@ -356,29 +377,26 @@ async def run_single_task(task_id: int, task_name: str):
     由调度器调用的函数，用于启动单个爬虫任务。
     """
     print(f"定时任务触发: 正在为任务 '{task_name}' 启动爬虫...")
-    log_file_handle = None
     try:
         # 更新任务状态为“运行中”
         await update_task_running_status(task_id, True)
 
-        # 确保日志目录存在，并以追加模式打开日志文件
-        os.makedirs("logs", exist_ok=True)
-        log_file_path = os.path.join("logs", "scraper.log")
-        log_file_handle = open(log_file_path, 'a', encoding='utf-8')
-
         # 使用与Web服务器相同的Python解释器来运行爬虫脚本
-        # 将 stdout 和 stderr 重定向到日志文件
+        # stdout 和 stderr 经管道转写到该任务自己的日志文件（按大小/时间轮转）
         # 在非 Windows 系统上，使用 setsid 创建新进程组，以便能终止整个进程树
+        log_file_path = task_log_path(task_name)
         preexec_fn = os.setsid if sys.platform != "win32" else None
         process = await asyncio.create_subprocess_exec(
             sys.executable, "-u", "spider_v2.py", "--task-name", task_name,
-            stdout=log_file_handle,
-            stderr=log_file_handle,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
             preexec_fn=preexec_fn
         )
+        relay = start_output_relay(process, task_name)
 
-        # 等待进程结束
+        # 等待进程结束，并写完剩余的输出
         await process.wait()
+        await relay
         if process.returncode == 0:
             print(f"定时任务 '{task_name}' 执行成功。日志已写入 {log_file_path}")
         else:
@@ -387,9 +405,6 @@ async def run_single_task(task_id: int, task_name: str):
     except Exception as e:
         print(f"启动定时任务 '{task_name}' 时发生错误: {e}")
     finally:
-        # 确保文件句柄被关闭
-        if log_file_handle:
-            log_file_handle.close()
         # 任务结束后，更新状态为“已停止”
         await update_task_running_status(task_id, False)
 
@@ -656,17 +671,15 @@ async def start_task_process(task_id: int, task_name: str):
         return
 
     try:
-        os.makedirs("logs", exist_ok=True)
-        log_file_path = os.path.join("logs", "scraper.log")
-        log_file_handle = open(log_file_path, 'a', encoding='utf-8')
-
+        log_file_path = task_log_path(task_name)
         preexec_fn = os.setsid if sys.platform != "win32" else None
         process = await asyncio.create_subprocess_exec(
             sys.executable, "-u", "spider_v2.py", "--task-name", task_name,
-            stdout=log_file_handle,
-            stderr=log_file_handle,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
             preexec_fn=preexec_fn
         )
+        start_output_relay(process, task_name)
         scraper_processes[task_id] = process
         print(f"启动任务 '{task_name}' (PID: {process.pid})，日志输出到 {log_file_path}")
 
@@ -749,57 +762,83 @@ async def stop_single_task(task_id: int, username: str = Depends(verify_credenti
 
 
 @app.get("/api/logs")
-async def get_logs(from_pos: int = 0, username: str = Depends(verify_credentials)):
+async def get_logs(from_pos: int = 0, task: Optional[str] = None, username: str = Depends(verify_credentials)):
     """
-    获取爬虫日志文件的内容。支持从指定位置增量读取。
+    获取最近的运行日志，支持增量读取：from_pos 为上次返回的 new_pos（日志行 ID），只返回之后的新行。
+    日志由实时推送使用的同一个跟踪器保存在内存中，不会为每次请求读取文件；指定 task 时只返回该任务的日志。
     """
-    log_file_path = os.path.join("logs", "scraper.log")
-    if not os.path.exists(log_file_path):
-        return JSONResponse(content={"new_content": "日志文件不存在或尚未创建。", "new_pos": 0})
+    new_content, new_pos = get_log_tailer().read_since(from_pos, task or None)
+    return {"new_content": new_content, "new_pos": new_pos}
+
 
+@app.get("/api/logs/history")
+async def get_log_history(task: str, lines: int = 200, before: Optional[str] = None,
+                          username: str = Depends(verify_credentials)):
+    """
+    读取任务日志中 before 位置之前的最多 lines 行，可跨越已轮转、压缩的日志分段。
+    返回的 before 用于继续向前翻阅，为空表示已到最早的日志。
+    """
+    lines = max(1, min(lines, 5000))
     try:
-        # 使用二进制模式打开以精确获取文件大小和位置
-        async with aiofiles.open(log_file_path, 'rb') as f:
-            await f.seek(0, os.SEEK_END)
-            file_size = await f.tell()
+        history, next_before = await asyncio.to_thread(read_log_lines, task_log_path(task), lines, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"读取日志文件时出错: {e}")
+    return {"lines": history, "before": next_before}
 
-            # 如果客户端的位置已经是最新的，直接返回
-            if from_pos >= file_size:
-                return {"new_content": "", "new_pos": file_size}
 
-            await f.seek(from_pos)
-            new_bytes = await f.read()
+@app.get("/api/logs/stream")
+async def stream_logs(request: Request, task: Optional[str] = None, username: str = Depends(verify_credentials)):
+    """
+    以 Server-Sent Events 实时推送运行日志。
+    先发送内存中最近的日志行，之后有新行写入时立即推送；指定 task 时只推送该任务的日志。
+    断线重连时浏览器会带上 Last-Event-ID，只补发之后的行。
+    """
+    try:
+        after_id = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        after_id = 0
+    tailer = get_log_tailer()
 
-        # 解码获取的字节
+    async def event_stream():
+        subscription = tailer.subscribe(task=task or None, after_id=after_id)
         try:
-            new_content = new_bytes.decode('utf-8')
-        except UnicodeDecodeError:
-            # 如果 utf-8 失败，尝试用 gbk 读取，并忽略无法解码的字符
-            new_content = new_bytes.decode('gbk', errors='ignore')
-
-        return {"new_content": new_content, "new_pos": file_size}
+            yield "retry: 3000\n\n" + "".join(format_sse(entry) for entry in subscription.backlog)
+            while True:
+                try:
+                    entry = await asyncio.wait_for(subscription.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 定期发送注释行，避免代理因连接空闲而断开
+                    yield ": keepalive\n\n"
+                    continue
+                # 一次取完队列中已有的行，合并成一个数据块发送
+                entries = [entry]
+                while not subscription.queue.empty():
+                    entries.append(subscription.queue.get_nowait())
+                yield "".join(format_sse(entry) for entry in entries)
+        finally:
+            tailer.unsubscribe(subscription)
 
-    except Exception as e:
-        # 返回错误信息，同时保持位置不变，以便下次重试
-        return JSONResponse(
-            status_code=500,
-            content={"new_content": f"\n读取日志文件时出错: {e}", "new_pos": from_pos}
-        )
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.delete("/api/logs", response_model=dict)
 async def clear_logs(username: str = Depends(verify_credentials)):
     """
-    清空日志文件内容。
+    清空所有任务的日志：当前日志文件被清空（正在运行的任务继续写入），已轮转的分段被删除。
     """
-    log_file_path = os.path.join("logs", "scraper.log")
-    if not os.path.exists(log_file_path):
+    if not os.path.isdir(TASK_LOG_DIR):
         return {"message": "日志文件不存在，无需清空。"}
 
     try:
-        # 使用 'w' 模式打开文件会清空内容
-        async with aiofiles.open(log_file_path, 'w', encoding='utf-8') as f:
-            await f.write("")
+        log_files = [entry.path for entry in os.scandir(TASK_LOG_DIR) if entry.name.endswith(".log")]
+        for log_file_path in log_files:
+            await asyncio.to_thread(clear_log, log_file_path)
         return {"message": "日志已成功清空。"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"清空日志文件时出错: {e}")
@@ -872,15 +911,39 @@ async def delete_result_file(filename: str, username: str = Depends(verify_crede
 
     try:
         os.remove(filepath)
+        # 同步清空该文件的去重索引，下次运行时这些商品会被重新处理
+        get_seen_index().clear_scope(filename)
+        get_results_store().clear_scope(filename)
+        get_result_index_cache().evict(filepath)
         return {"message": f"结果文件 '{filename}' 已成功删除。"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除结果文件时出错: {e}")
 
 
-@app.get("/api/results/{filename}")
-async def get_result_file_content(filename: str, page: int = 1, limit: int = 20, recommended_only: bool = False, sort_by: str = "crawl_time", sort_order: str = "desc", username: str = Depends(verify_credentials)):
+@app.get("/api/results/index/stats")
+async def get_result_index_stats(username: str = Depends(verify_credentials)):
     """
-    读取指定的 .jsonl 文件内容，支持分页、筛选和排序。
+    返回 jsonl 后端下内存中已缓存索引的结果文件，及每个文件的记录数和索引内存占用。
+    """
+    files = get_result_index_cache().stats()
+    return {
+        "backend": RESULTS_BACKEND,
+        "total_memory_bytes": sum(f["memory_bytes"] for f in files),
+        "files": files
+    }
+
+
+def _split_list_param(value: str) -> List[str]:
+    """把逗号分隔的查询参数（如 tags=包邮,验货宝）拆分为列表。"""
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+@app.get("/api/results/{filename}/items")
+async def query_result_items(filename: str, limit: int = 20, cursor: Optional[str] = None, sort_by: str = "crawl_time", sort_order: str = "desc", recommended_only: bool = False, min_price: Optional[float] = None, max_price: Optional[float] = None, publish_after: Optional[str] = None, publish_before: Optional[str] = None, tags: str = "", risk_tags: str = "", region: Optional[str] = None, username: str = Depends(verify_credentials)):
+    """
+    游标分页查询结果，支持按价格、发布时间、商品标签（逗号分隔，如 包邮,验货宝）、发货地区和AI风险标签筛选。
+    响应中的 next_cursor 传给下一次请求即可翻页，为 null 时表示没有更多结果。
+    筛选依赖 SQL 索引，无论 RESULTS_BACKEND 取何值都先把结果文件增量导入 SQLite 结果存储再查询。
     """
     if not filename.endswith(".jsonl") or "/" in filename or ".." in filename:
         raise HTTPException(status_code=400, detail="无效的文件名。")
@@ -889,44 +952,93 @@ async def get_result_file_content(filename: str, page: int = 1, limit: int = 20,
     if not os.path.exists(filepath):
         raise HTTPException(status_code=404, detail="结果文件未找到。")
 
-    results = []
+    limit = max(1, min(limit, 500))
+    store = get_results_store()
     try:
-        async with aiofiles.open(filepath, 'r', encoding='utf-8') as f:
-            async for line in f:
-                try:
-                    record = json.loads(line)
-                    if recommended_only:
-                        if record.get("ai_analysis", {}).get("is_recommended") is True:
-                            results.append(record)
-                    else:
-                        results.append(record)
-                except json.JSONDecodeError:
-                    continue
+        await asyncio.to_thread(store.sync_scope, filename, filepath)
+        items, next_cursor = await asyncio.to_thread(
+            store.query_page, filename,
+            limit=limit, cursor=cursor, sort_by=sort_by, sort_order=sort_order,
+            recommended_only=recommended_only, min_price=min_price, max_price=max_price,
+            publish_after=publish_after, publish_before=publish_before,
+            tags=_split_list_param(tags), risk_tags=_split_list_param(risk_tags), region=region,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"读取结果文件时出错: {e}")
 
-    # --- Sorting logic ---
-    def get_sort_key(item):
-        info = item.get("商品信息", {})
-        if sort_by == "publish_time":
-            # Handles "未知时间" by placing it at the end/start depending on order
-            return info.get("发布时间", "0000-00-00 00:00")
-        elif sort_by == "price":
-            price_str = str(info.get("当前售价", "0")).replace("¥", "").replace(",", "").strip()
-            try:
-                return float(price_str)
-            except (ValueError, TypeError):
-                return 0.0 # Default for unparsable prices
-        else: # default to crawl_time
-            return item.get("爬取时间", "")
-
-    is_reverse = (sort_order == "desc")
-    results.sort(key=get_sort_key, reverse=is_reverse)
-
-    total_items = len(results)
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_results = results[start:end]
+    return {
+        "limit": limit,
+        "items": items,
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/api/results/{filename}/export")
+async def export_result_file(filename: str, format: str = "csv", sort_by: str = "crawl_time", sort_order: str = "desc", recommended_only: bool = False, min_price: Optional[float] = None, max_price: Optional[float] = None, publish_after: Optional[str] = None, publish_before: Optional[str] = None, tags: str = "", risk_tags: str = "", region: Optional[str] = None, username: str = Depends(verify_credentials)):
+    """
+    流式导出结果（format 可选 csv / ndjson / parquet），筛选参数与 /api/results/{filename}/items 相同。
+    CSV 和 Parquet 会把 商品信息 / 卖家信息 / ai_analysis 展开为 "字段.子字段" 列；数据分块输出，不会一次性载入内存。
+    与 /items 一样始终使用 SQLite 结果存储，与 RESULTS_BACKEND 无关。
+    """
+    if not filename.endswith(".jsonl") or "/" in filename or ".." in filename:
+        raise HTTPException(status_code=400, detail="无效的文件名。")
+
+    filepath = os.path.join("jsonl", filename)
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=404, detail="结果文件未找到。")
+
+    store = get_results_store()
+    try:
+        await asyncio.to_thread(store.sync_scope, filename, filepath)
+        chunks = export_results(
+            store, filename, format,
+            sort_by=sort_by, sort_order=sort_order, recommended_only=recommended_only,
+            min_price=min_price, max_price=max_price, publish_after=publish_after, publish_before=publish_before,
+            tags=_split_list_param(tags), risk_tags=_split_list_param(risk_tags), region=region,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = EXPORT_FORMATS[format]
+    export_name = quote(f"{filename[:-len('.jsonl')]}.{extension}")
+    # 同步生成器由 Starlette 在线程池中逐块迭代，查询和编码不会阻塞事件循环
+    return StreamingResponse(chunks, media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename*=UTF-8''{export_name}"
+    })
+
+
+@app.get("/api/results/{filename}")
+async def get_result_file_content(filename: str, page: int = 1, limit: int = 20, recommended_only: bool = False, sort_by: str = "crawl_time", sort_order: str = "desc", username: str = Depends(verify_credentials)):
+    """
+    读取指定的 .jsonl 文件内容，支持分页、筛选和排序。
+    """
+    if not filename.endswith(".jsonl") or "/" in filename or ".." in filename:
+        raise HTTPException(status_code=400, detail="无效的文件名。")
+
+    filepath = os.path.join("jsonl", filename)
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=404, detail="结果文件未找到。")
+
+    if RESULTS_BACKEND == "sqlite":
+        try:
+            # 只导入结果文件末尾新增的行，然后由索引直接取出排序、筛选后的一页
+            store = get_results_store()
+            await asyncio.to_thread(store.sync_scope, filename, filepath)
+            total_items, paginated_results = await asyncio.to_thread(
+                store.query, filename, page, limit, recommended_only, sort_by, sort_order
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"读取结果文件时出错: {e}")
+    else:
+        # 以结果文件为准：内存索引只读取文件新增的部分，并且只解析当前页的记录
+        try:
+            total_items, paginated_results = await asyncio.to_thread(
+                get_result_index_cache().query, filepath, page, limit, recommended_only, sort_by, sort_order
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"读取结果文件时出错: {e}")
 
     return {
         "total_items": total_items,
@@ -976,6 +1088,57 @@ async def get_system_status(username: str = Depends(verify_credentials)):
     return status
 
 
+@app.get("/api/registry/stats")
+async def get_registry_stats(username: str = Depends(verify_credentials)):
+    """
+    获取跨任务全局注册表的累计命中统计（节省的详情请求和AI调用次数）。
+    """
+    counters = {name: 0 for name in COUNTER_NAMES}
+    if os.path.exists(ITEM_REGISTRY_FILE):
+        registry = ItemRegistry()
+        try:
+            counters = registry.lifetime_counters()
+        finally:
+            registry.close()
+    return {"enabled": ENABLE_GLOBAL_REGISTRY, **summarize_counters(counters)}
+
+
+@app.get("/api/image-cache/stats")
+async def get_image_cache_stats(username: str = Depends(verify_credentials)):
+    """
+    获取共享图片缓存的累计命中统计和当前占用空间。
+    """
+    counters = {name: 0 for name in image_cache.COUNTER_NAMES}
+    total_bytes = 0
+    if os.path.exists(os.path.join(IMAGE_CACHE_DIR, image_cache.INDEX_FILENAME)):
+        cache = image_cache.ImageCache()
+        try:
+            counters = cache.lifetime_counters()
+            total_bytes = cache.total_bytes()
+        finally:
+            cache.close()
+    return {**image_cache.summarize_counters(counters), "total_bytes": total_bytes,
+            "max_bytes": image_cache.IMAGE_CACHE_MAX_BYTES}
+
+
+@app.get("/api/ai-cache/stats")
+async def get_ai_cache_stats(username: str = Depends(verify_credentials)):
+    """
+    获取AI结论缓存的累计命中率、节省的 token 数和当前条目数。
+    """
+    counters = {name: 0 for name in ai_verdict_cache.COUNTER_NAMES}
+    entries = 0
+    if os.path.exists(AI_CACHE_FILE):
+        cache = ai_verdict_cache.AiVerdictCache()
+        try:
+            counters = cache.lifetime_counters()
+            entries = cache.entry_count()
+        finally:
+            cache.close()
+    return {"enabled": ENABLE_AI_CACHE, **ai_verdict_cache.summarize_counters(counters), "entries": entries,
+            "max_entries": ai_verdict_cache.AI_CACHE_MAX_ENTRIES}
+
+
 PROMPTS_DIR = "prompts"
 
 @app.get("/api/prompts")
@@ -1208,5 +1371,6 @@ if __name__ == "__main__":
     print(f"启动 Web 管理界面，请在浏览器访问 http://127.0.0.1:{server_port}")
 
     # 启动 Uvicorn 服务器
-    uvicorn.run(app, host="0.0.0.0", port=server_port)
+    # 实时日志推送是长连接，关闭服务时最多等待 5 秒后直接断开
+    uvicorn.run(app, host="0.0.0.0", port=server_port, timeout_graceful_shutdown=5)
 